@@ -43,7 +43,18 @@ python -m app.scripts.populate_tags || echo "⚠️ Tag population finished with
 echo "🎭 Updating character tags..."
 python -m app.scripts.update_character_tags || echo "⚠️ Character tags update finished with warnings"
 
-# 4. Запуск основного сервера Gunicorn
+# 4. База стран по IP для регистрации: скачивается, если файла нет или он старше 30 дней
+echo "🌍 Updating GeoIP database..."
+python -m app.scripts.update_geoip_database --max-age-days 30 || echo "⚠️ GeoIP update failed, country detection may be unavailable"
+
+# Метрики Prometheus от 8 воркеров собираются через общий каталог,
+# файлы прошлого запуска исказили бы счетчики
+if [ -n "$PROMETHEUS_MULTIPROC_DIR" ]; then
+    rm -rf "$PROMETHEUS_MULTIPROC_DIR"
+    mkdir -p "$PROMETHEUS_MULTIPROC_DIR"
+fi
+
+# 5. Запуск основного сервера Gunicorn
 # 'exec' заменяет текущий процесс оболочки на Gunicorn, 
 # что важно для корректной обработки сигналов Docker (SIGTERM)
 echo "🎯 Starting Gunicorn Server..."
@@ -35,12 +35,14 @@ try:
     from app.models.subscription import UserSubscription
     from app.models.payment_transaction import PaymentTransaction
     from app.models.image_generation_history import ImageGenerationHistory
-    from app.models.balance_history import BalanceHistory
+    from app.models.balance_history import BalanceHistory, BalanceMonthlySummary
     from app.models.user_gallery import UserGallery
     from app.models.user_gallery_unlock import UserGalleryUnlock
     from app.models.chat_history import ChatHistory
-    from app.models.character_comment import CharacterComment
+    from app.models.character_comment import CharacterComment, CharacterCommentCount
     from app.models.bug_report import BugReport, BugComment
+    from app.models.user_conversation import UserConversation
+    from app.models.character_photo import CharacterPhoto
     target_metadata = Base.metadata
 except Exception as e:
     # Avoid non-ASCII output to prevent Windows encoding issues
@@ -0,0 +1,50 @@
+"""add bug report list indexes
+
+- bug_reports (created_at, id) и (status, created_at, id): keyset-страницы
+  списка баг-репортов, с фильтром по статусу и без;
+- bug_comments (bug_report_id, created_at, id): комментарии страницы
+  репортов по порядку и последний комментарий каждого репорта; заменяет
+  одноколоночный ix_bug_comments_bug_report_id.
+
+Revision ID: a0b1c2d3e4f6
+Revises: f0a1b2c3d4e5
+Create Date: 2026-10-19 18:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'a0b1c2d3e4f6'
+down_revision: Union[str, Sequence[str], None] = 'f0a1b2c3d4e5'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+# (имя индекса, определение)
+INDEXES = (
+    ("ix_bug_reports_created", "bug_reports (created_at, id)"),
+    ("ix_bug_reports_status_created", "bug_reports (status, created_at, id)"),
+    ("ix_bug_comments_report_created", "bug_comments (bug_report_id, created_at, id)"),
+)
+
+# Префикс нового составного индекса
+REPLACED_INDEX = ("ix_bug_comments_bug_report_id", "bug_comments (bug_report_id)")
+
+
+def upgrade() -> None:
+    """Create bug report list indexes."""
+    # CONCURRENTLY нельзя выполнять в транзакции, таблицы не блокируются на запись
+    with op.get_context().autocommit_block():
+        for name, definition in INDEXES:
+            op.execute(f"CREATE INDEX CONCURRENTLY IF NOT EXISTS {name} ON {definition}")
+        op.execute(f"DROP INDEX CONCURRENTLY IF EXISTS {REPLACED_INDEX[0]}")
+
+
+def downgrade() -> None:
+    """Drop bug report list indexes."""
+    with op.get_context().autocommit_block():
+        op.execute(f"CREATE INDEX CONCURRENTLY IF NOT EXISTS {REPLACED_INDEX[0]} ON {REPLACED_INDEX[1]}")
+        for name, _definition in reversed(INDEXES):
+            op.execute(f"DROP INDEX CONCURRENTLY IF EXISTS {name}")
@@ -0,0 +1,69 @@
+"""add character comment counts and keyset index
+
+- character_comment_counts: количество комментариев персонажа, поддерживается
+  триггером на character_comments (определения в app/models/character_comment.py)
+  и заполняется из существующих комментариев;
+- character_comments (character_name, created_at, id): keyset-страницы
+  комментариев; заменяет одноколоночный ix_character_comments_character_name.
+
+Revision ID: b0c1d2e3f4a5
+Revises: a0b1c2d3e4f6
+Create Date: 2026-10-19 19:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+from app.models.character_comment import (
+    COMMENT_COUNT_FUNCTION_NAMES,
+    COMMENT_COUNT_TRIGGERS,
+    comment_count_ddl_statements,
+)
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'b0c1d2e3f4a5'
+down_revision: Union[str, Sequence[str], None] = 'a0b1c2d3e4f6'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+KEYSET_INDEX = ("ix_character_comments_character_created", "character_comments (character_name, created_at, id)")
+REPLACED_INDEX = ("ix_character_comments_character_name", "character_comments (character_name)")
+
+
+def upgrade() -> None:
+    """Create character_comment_counts with its trigger and the keyset index."""
+    op.create_table(
+        'character_comment_counts',
+        sa.Column('character_name', sa.String(), nullable=False),
+        sa.Column('comments_count', sa.Integer(), server_default='0', nullable=False),
+        sa.PrimaryKeyConstraint('character_name'),
+    )
+    # Триггер и заполнение в одной транзакции: новые комментарии не потеряются
+    op.execute("LOCK TABLE character_comments IN SHARE MODE")
+    for statement in comment_count_ddl_statements():
+        op.execute(statement)
+    op.execute(
+        "INSERT INTO character_comment_counts (character_name, comments_count) "
+        "SELECT character_name, count(*) FROM character_comments GROUP BY character_name"
+    )
+
+    # CONCURRENTLY нельзя выполнять в транзакции, таблицы не блокируются на запись
+    with op.get_context().autocommit_block():
+        op.execute(f"CREATE INDEX CONCURRENTLY IF NOT EXISTS {KEYSET_INDEX[0]} ON {KEYSET_INDEX[1]}")
+        op.execute(f"DROP INDEX CONCURRENTLY IF EXISTS {REPLACED_INDEX[0]}")
+
+
+def downgrade() -> None:
+    """Drop the trigger, functions, character_comment_counts and the keyset index."""
+    with op.get_context().autocommit_block():
+        op.execute(f"CREATE INDEX CONCURRENTLY IF NOT EXISTS {REPLACED_INDEX[0]} ON {REPLACED_INDEX[1]}")
+        op.execute(f"DROP INDEX CONCURRENTLY IF EXISTS {KEYSET_INDEX[0]}")
+
+    for name, table, _definition in COMMENT_COUNT_TRIGGERS:
+        op.execute(f"DROP TRIGGER IF EXISTS {name} ON {table}")
+    for signature in COMMENT_COUNT_FUNCTION_NAMES:
+        op.execute(f"DROP FUNCTION IF EXISTS {signature}")
+    op.drop_table('character_comment_counts')
@@ -0,0 +1,60 @@
+"""add trigram and full-text search indexes for characters and users
+
+Индексы для app/api/endpoints/search.py: GIN по tsvector имен и описания,
+GIN trigram по склеенным именам (подстрока и опечатки) и по username.
+Выражения индексов должны совпадать с выражениями в search.py, иначе
+планировщик их не использует.
+
+Revision ID: b7c8d9e0f1a2
+Revises: f1a2b3c4d5e6
+Create Date: 2026-10-19 13:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'b7c8d9e0f1a2'
+down_revision: Union[str, Sequence[str], None] = 'f1a2b3c4d5e6'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+CHARACTER_NAMES_SQL = (
+    "coalesce(name, '') || ' ' || coalesce(display_name, '') || ' ' || "
+    "coalesce(name_ru, '') || ' ' || coalesce(name_en, '')"
+)
+CHARACTER_SEARCH_TEXT_SQL = f"lower({CHARACTER_NAMES_SQL})"
+CHARACTER_SEARCH_VECTOR_SQL = (
+    f"setweight(to_tsvector('simple'::regconfig, {CHARACTER_NAMES_SQL}), 'A') || "
+    "setweight(to_tsvector('simple'::regconfig, coalesce(description, '')), 'B')"
+)
+
+
+def upgrade() -> None:
+    """Create pg_trgm extension and search indexes."""
+    op.execute("CREATE EXTENSION IF NOT EXISTS pg_trgm")
+    # CONCURRENTLY нельзя выполнять в транзакции, таблицы не блокируются на запись
+    with op.get_context().autocommit_block():
+        op.execute(
+            "CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_characters_search_vector "
+            f"ON characters USING gin (({CHARACTER_SEARCH_VECTOR_SQL}))"
+        )
+        op.execute(
+            "CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_characters_search_text_trgm "
+            f"ON characters USING gin (({CHARACTER_SEARCH_TEXT_SQL}) gin_trgm_ops)"
+        )
+        op.execute(
+            "CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_users_username_trgm "
+            "ON users USING gin (username gin_trgm_ops)"
+        )
+
+
+def downgrade() -> None:
+    """Drop search indexes (extension is left in place)."""
+    with op.get_context().autocommit_block():
+        op.execute("DROP INDEX CONCURRENTLY IF EXISTS ix_users_username_trgm")
+        op.execute("DROP INDEX CONCURRENTLY IF EXISTS ix_characters_search_text_trgm")
+        op.execute("DROP INDEX CONCURRENTLY IF EXISTS ix_characters_search_vector")
@@ -0,0 +1,80 @@
+"""add balance monthly summaries and history keyset index
+
+- balance_monthly_summaries: помесячные итоги истории баланса, поддерживаются
+  триггерами на balance_history (определения в app/models/balance_history.py)
+  и заполняются из существующей истории;
+- balance_history (user_id, created_at, id): keyset-страницы истории с
+  фильтром по датам; заменяет одноколоночный ix_balance_history_user_id.
+
+Revision ID: c0d1e2f3a4b5
+Revises: b0c1d2e3f4a5
+Create Date: 2026-10-19 20:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+from app.models.balance_history import (
+    BALANCE_MONTH_SQL,
+    BALANCE_SUMMARY_FUNCTION_NAMES,
+    BALANCE_SUMMARY_TRIGGERS,
+    balance_summary_ddl_statements,
+)
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'c0d1e2f3a4b5'
+down_revision: Union[str, Sequence[str], None] = 'b0c1d2e3f4a5'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+KEYSET_INDEX = ("ix_balance_history_user_created", "balance_history (user_id, created_at, id)")
+REPLACED_INDEX = ("ix_balance_history_user_id", "balance_history (user_id)")
+
+
+def upgrade() -> None:
+    """Create balance_monthly_summaries with its triggers and the keyset index."""
+    op.create_table(
+        'balance_monthly_summaries',
+        sa.Column('user_id', sa.Integer(), nullable=False),
+        sa.Column('month', sa.Date(), nullable=False),
+        sa.Column('credits', sa.Integer(), nullable=False),
+        sa.Column('debits', sa.Integer(), nullable=False),
+        sa.Column('operations', sa.Integer(), nullable=False),
+        sa.Column('closing_balance', sa.Integer(), nullable=False),
+        sa.Column('last_entry_at', sa.DateTime(), nullable=False),
+        sa.ForeignKeyConstraint(['user_id'], ['users.id'], ondelete='CASCADE'),
+        sa.PrimaryKeyConstraint('user_id', 'month', name='pk_balance_monthly_summaries'),
+    )
+    # Триггеры и заполнение в одной транзакции: новые записи не потеряются
+    op.execute("LOCK TABLE balance_history IN SHARE MODE")
+    for statement in balance_summary_ddl_statements():
+        op.execute(statement)
+    month = BALANCE_MONTH_SQL.format(at='created_at')
+    op.execute(
+        "INSERT INTO balance_monthly_summaries "
+        "(user_id, month, credits, debits, operations, closing_balance, last_entry_at) "
+        f"SELECT user_id, {month}, sum(greatest(amount, 0)), sum(greatest(-amount, 0)), count(*), "
+        "(array_agg(balance_after ORDER BY created_at DESC, id DESC))[1], max(created_at) "
+        f"FROM balance_history GROUP BY user_id, {month}"
+    )
+
+    # CONCURRENTLY нельзя выполнять в транзакции, таблицы не блокируются на запись
+    with op.get_context().autocommit_block():
+        op.execute(f"CREATE INDEX CONCURRENTLY IF NOT EXISTS {KEYSET_INDEX[0]} ON {KEYSET_INDEX[1]}")
+        op.execute(f"DROP INDEX CONCURRENTLY IF EXISTS {REPLACED_INDEX[0]}")
+
+
+def downgrade() -> None:
+    """Drop the triggers, functions, balance_monthly_summaries and the keyset index."""
+    with op.get_context().autocommit_block():
+        op.execute(f"CREATE INDEX CONCURRENTLY IF NOT EXISTS {REPLACED_INDEX[0]} ON {REPLACED_INDEX[1]}")
+        op.execute(f"DROP INDEX CONCURRENTLY IF EXISTS {KEYSET_INDEX[0]}")
+
+    for name, table, _definition in BALANCE_SUMMARY_TRIGGERS:
+        op.execute(f"DROP TRIGGER IF EXISTS {name} ON {table}")
+    for signature in BALANCE_SUMMARY_FUNCTION_NAMES:
+        op.execute(f"DROP FUNCTION IF EXISTS {signature}")
+    op.drop_table('balance_monthly_summaries')
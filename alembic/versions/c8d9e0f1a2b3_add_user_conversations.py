@@ -0,0 +1,73 @@
+"""add user_conversations summary table
+
+Сводка переписки пользователя с персонажем для списка чатов. Поддерживается
+триггерами на chat_history, chat_messages и image_generation_history
+(определения в app/models/user_conversation.py). Триггеры ищут персонажа
+по lower(trim(name)), для этого добавляется индекс по выражению. Существующие данные
+заполняются скриптом app/scripts/backfill_user_conversations.py.
+
+Revision ID: c8d9e0f1a2b3
+Revises: b7c8d9e0f1a2
+Create Date: 2026-10-19 14:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+from app.models.user_conversation import (
+    CONVERSATION_FUNCTION_NAMES,
+    CONVERSATION_TRIGGERS,
+    conversation_ddl_statements,
+)
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'c8d9e0f1a2b3'
+down_revision: Union[str, Sequence[str], None] = 'b7c8d9e0f1a2'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Create user_conversations with maintenance triggers."""
+    op.create_table(
+        'user_conversations',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('user_id', sa.Integer(), nullable=False),
+        sa.Column('character_key', sa.String(length=100), nullable=False),
+        sa.Column('character_id', sa.Integer(), nullable=True),
+        sa.Column('last_message_at', sa.DateTime(timezone=True), nullable=False),
+        sa.Column('last_message_preview', sa.Text(), nullable=True),
+        sa.Column('message_count', sa.Integer(), nullable=False, server_default='0'),
+        sa.Column('last_image_url', sa.String(length=1000), nullable=True),
+        sa.Column('updated_at', sa.DateTime(timezone=True), server_default=sa.text('now()'), nullable=False),
+        sa.ForeignKeyConstraint(['user_id'], ['users.id'], ondelete='CASCADE'),
+        sa.ForeignKeyConstraint(['character_id'], ['characters.id'], ondelete='CASCADE'),
+        sa.PrimaryKeyConstraint('id'),
+        sa.UniqueConstraint('user_id', 'character_key', name='uq_user_conversations_user_character'),
+    )
+    op.create_index(
+        'ix_user_conversations_user_last_message',
+        'user_conversations',
+        ['user_id', 'last_message_at'],
+    )
+    op.create_index(
+        'ix_characters_name_key',
+        'characters',
+        [sa.text('lower(trim(name))')],
+    )
+    for statement in conversation_ddl_statements():
+        op.execute(statement)
+
+
+def downgrade() -> None:
+    """Drop triggers, functions and user_conversations."""
+    for name, table, _definition in CONVERSATION_TRIGGERS:
+        op.execute(f"DROP TRIGGER IF EXISTS {name} ON {table}")
+    for signature in CONVERSATION_FUNCTION_NAMES:
+        op.execute(f"DROP FUNCTION IF EXISTS {signature}")
+    op.drop_index('ix_characters_name_key', table_name='characters')
+    op.drop_index('ix_user_conversations_user_last_message', table_name='user_conversations')
+    op.drop_table('user_conversations')
@@ -0,0 +1,41 @@
+"""convert users.country ISO codes to country names
+
+Локальная база DB-IP lite дает только коды стран, и до перевода кода в
+название (app/utils/country_names.py) в users.country могли попасть коды
+("RU") вместо названий в написании ip-api ("Russia"). Такие строки
+переводятся в названия, чтобы статистика по странам не делилась.
+
+Revision ID: d1e2f3a4b5c6
+Revises: c0d1e2f3a4b5
+Create Date: 2026-10-20 10:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+
+from app.utils.country_names import COUNTRY_NAMES
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'd1e2f3a4b5c6'
+down_revision: Union[str, Sequence[str], None] = 'c0d1e2f3a4b5'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Replace two-letter country codes in users.country with country names."""
+    values = ", ".join(
+        "('{}', '{}')".format(code, name.replace("'", "''")) for code, name in sorted(COUNTRY_NAMES.items())
+    )
+    op.execute(
+        "UPDATE users SET country = country_names.name "
+        f"FROM (VALUES {values}) AS country_names (code, name) "
+        "WHERE users.country = country_names.code"
+    )
+
+
+def downgrade() -> None:
+    """Data migration: original codes are not restored."""
+    pass
@@ -0,0 +1,36 @@
+"""add composite index for paginated chat history
+
+Страницы истории выбираются по (user_id, character_name, session_id)
+с курсором по id, индекс покрывает и фильтр, и порядок.
+
+Revision ID: d9e0f1a2b3c4
+Revises: c8d9e0f1a2b3
+Create Date: 2026-10-19 15:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'd9e0f1a2b3c4'
+down_revision: Union[str, Sequence[str], None] = 'c8d9e0f1a2b3'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Create ix_chat_history_conversation."""
+    # CONCURRENTLY нельзя выполнять в транзакции, таблица не блокируется на запись
+    with op.get_context().autocommit_block():
+        op.execute(
+            "CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_chat_history_conversation "
+            "ON chat_history (user_id, character_name, session_id, id)"
+        )
+
+
+def downgrade() -> None:
+    """Drop ix_chat_history_conversation."""
+    with op.get_context().autocommit_block():
+        op.execute("DROP INDEX CONCURRENTLY IF EXISTS ix_chat_history_conversation")
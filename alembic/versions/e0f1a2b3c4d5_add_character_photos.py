@@ -0,0 +1,64 @@
+"""add character_photos index
+
+Индекс фотографий персонажа для галереи. Поддерживается триггерами на
+chat_history, image_generation_history и user_gallery (определения в
+app/models/character_photo.py). Существующие данные заполняются скриптом
+app/scripts/backfill_character_photos.py.
+
+Revision ID: e0f1a2b3c4d5
+Revises: d9e0f1a2b3c4
+Create Date: 2026-10-19 16:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+from app.models.character_photo import (
+    PHOTO_FUNCTION_NAMES,
+    PHOTO_TRIGGERS,
+    photo_ddl_statements,
+)
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'e0f1a2b3c4d5'
+down_revision: Union[str, Sequence[str], None] = 'd9e0f1a2b3c4'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Create character_photos with maintenance triggers."""
+    op.create_table(
+        'character_photos',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('character_key', sa.String(length=100), nullable=False),
+        sa.Column('user_id', sa.Integer(), nullable=False),
+        sa.Column('image_url', sa.String(length=1000), nullable=False),
+        sa.Column('prompt', sa.Text(), nullable=True),
+        sa.Column('generation_time', sa.Integer(), nullable=True),
+        sa.Column('source', sa.String(length=20), nullable=False),
+        sa.Column('created_at', sa.DateTime(timezone=True), nullable=False),
+        sa.ForeignKeyConstraint(['user_id'], ['users.id'], ondelete='CASCADE'),
+        sa.PrimaryKeyConstraint('id'),
+        sa.UniqueConstraint('character_key', 'user_id', 'image_url', name='uq_character_photos_character_user_url'),
+    )
+    op.create_index(
+        'ix_character_photos_character_user_created',
+        'character_photos',
+        ['character_key', 'user_id', 'created_at', 'id'],
+    )
+    for statement in photo_ddl_statements():
+        op.execute(statement)
+
+
+def downgrade() -> None:
+    """Drop triggers, functions and character_photos."""
+    for name, table, _definition in PHOTO_TRIGGERS:
+        op.execute(f"DROP TRIGGER IF EXISTS {name} ON {table}")
+    for signature in PHOTO_FUNCTION_NAMES:
+        op.execute(f"DROP FUNCTION IF EXISTS {signature}")
+    op.drop_index('ix_character_photos_character_user_created', table_name='character_photos')
+    op.drop_table('character_photos')
@@ -0,0 +1,57 @@
+"""add composite and partial indexes for chat, history and gallery queries
+
+- chat_messages (session_id, timestamp, id): сообщения сессии по времени
+  без сортировки всей сессии;
+- chat_sessions (user_id, character_id, started_at) и частичный
+  (character_id, started_at) WHERE user_id IS NULL для гостей: последняя
+  сессия пользователя с персонажем;
+- chat_history (user_id, character_name, created_at) WHERE image_url IS NOT NULL:
+  последние фото пользователя с персонажем;
+- user_gallery (user_id, created_at): страницы галереи.
+
+Планы запросов проверяются тестами tests/test_query_plans.py.
+
+Revision ID: f0a1b2c3d4e5
+Revises: e0f1a2b3c4d5
+Create Date: 2026-10-19 17:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'f0a1b2c3d4e5'
+down_revision: Union[str, Sequence[str], None] = 'e0f1a2b3c4d5'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+# (имя индекса, определение)
+INDEXES = (
+    ("ix_chat_messages_session_timestamp",
+     'chat_messages (session_id, "timestamp", id)'),
+    ("ix_chat_sessions_user_character_started",
+     "chat_sessions (user_id, character_id, started_at)"),
+    ("ix_chat_sessions_guest_character_started",
+     "chat_sessions (character_id, started_at) WHERE user_id IS NULL"),
+    ("ix_chat_history_user_character_images",
+     "chat_history (user_id, character_name, created_at) WHERE image_url IS NOT NULL"),
+    ("ix_user_gallery_user_created",
+     "user_gallery (user_id, created_at)"),
+)
+
+
+def upgrade() -> None:
+    """Create chat, history and gallery indexes."""
+    # CONCURRENTLY нельзя выполнять в транзакции, таблицы не блокируются на запись
+    with op.get_context().autocommit_block():
+        for name, definition in INDEXES:
+            op.execute(f"CREATE INDEX CONCURRENTLY IF NOT EXISTS {name} ON {definition}")
+
+
+def downgrade() -> None:
+    """Drop chat, history and gallery indexes."""
+    with op.get_context().autocommit_block():
+        for name, _definition in reversed(INDEXES):
+            op.execute(f"DROP INDEX CONCURRENTLY IF EXISTS {name}")
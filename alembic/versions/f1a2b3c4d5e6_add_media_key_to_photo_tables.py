@@ -0,0 +1,53 @@
+"""add media_key and media_variants to photo tables
+
+Нормализованная ссылка на объект в бакете (ключ + доступные варианты)
+для character_main_photos, paid_album_photos и user_gallery.
+Существующие строки заполняются скриптом app/scripts/backfill_media_keys.py.
+
+Revision ID: f1a2b3c4d5e6
+Revises: 9f413d78d036
+Create Date: 2026-10-19 12:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'f1a2b3c4d5e6'
+down_revision: Union[str, Sequence[str], None] = '9f413d78d036'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+PHOTO_TABLES = ('character_main_photos', 'paid_album_photos', 'user_gallery')
+
+
+def upgrade() -> None:
+    """Add media_key/media_variants columns to photo tables."""
+    from sqlalchemy import inspect
+    conn = op.get_bind()
+    inspector = inspect(conn)
+
+    for table in PHOTO_TABLES:
+        columns = [col['name'] for col in inspector.get_columns(table)]
+        if 'media_key' not in columns:
+            op.add_column(table, sa.Column('media_key', sa.String(length=500), nullable=True))
+        if 'media_variants' not in columns:
+            op.add_column(table, sa.Column('media_variants', sa.String(length=64), nullable=True))
+
+
+def downgrade() -> None:
+    """Remove media_key/media_variants columns from photo tables."""
+    from sqlalchemy import inspect
+    conn = op.get_bind()
+    inspector = inspect(conn)
+
+    for table in PHOTO_TABLES:
+        columns = [col['name'] for col in inspector.get_columns(table)]
+        if 'media_variants' in columns:
+            op.drop_column(table, 'media_variants')
+        if 'media_key' in columns:
+            op.drop_column(table, 'media_key')
@@ -2,16 +2,18 @@
 Роутер для административных эндпоинтов.
 """
 
-from fastapi import APIRouter, HTTPException, Depends
+from fastapi import APIRouter, HTTPException, Depends, Query
 from pydantic import BaseModel, Field
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import select, func, and_, or_
+from sqlalchemy import select, func, and_, or_, tuple_, cast, String
+from sqlalchemy.dialects.postgresql import distinct_on
 from datetime import datetime, timedelta, timezone
-from typing import List, Dict, Any
-from app.database.db_depends import get_db
+from typing import List, Dict, Any, Optional
+from app.database.db_depends import get_db, get_read_db
 from app.models.user import Users
 from app.models.subscription import UserSubscription, SubscriptionType, SubscriptionStatus
 from app.auth.dependencies import get_current_user
+from app.utils.pagination import encode_cursor, decode_cursor, parse_cursor_datetime
 import logging
 
 logger = logging.getLogger(__name__)
@@ -33,7 +35,7 @@ def require_admin(current_user: Users = Depends(get_current_user)) -> Users:
 @admin_router.get("/stats/")
 async def get_admin_stats(
     current_user: Users = Depends(require_admin),
-    db: AsyncSession = Depends(get_db)
+    db: AsyncSession = Depends(get_read_db)
 ) -> Dict[str, Any]:
     """
     Получает детальную статистику для администратора:
@@ -42,200 +44,14 @@ async def get_admin_stats(
     - Регистрации по странам
     - Активность пользователей
     - Статистика контента
+    
+    Итоги берутся из инкрементальных счетчиков, остальное - из снимка,
+    который пересчитывается каждые 15 минут (см. поле freshness).
     """
     try:
         logger.info(f"[ADMIN STATS] Запрос статистики от админа {current_user.email}")
-        
-        # Общее количество пользователей
-        total_users_result = await db.execute(
-            select(func.count(Users.id))
-        )
-        total_users = total_users_result.scalar() or 0
-
-        # Новые пользователи за последние 24 часа
-        last_24h = datetime.utcnow() - timedelta(hours=24)
-        new_users_24h_result = await db.execute(
-            select(func.count(Users.id)).where(Users.created_at >= last_24h)
-        )
-        new_users_24h = new_users_24h_result.scalar() or 0
-
-        # Новые пользователи за последние 7 дней
-        last_7d = datetime.utcnow() - timedelta(days=7)
-        new_users_7d_result = await db.execute(
-            select(func.count(Users.id)).where(Users.created_at >= last_7d)
-        )
-        new_users_7d = new_users_7d_result.scalar() or 0
-
-        # Статистика по подпискам
-        # FREE подписки
-        free_subs_result = await db.execute(
-            select(func.count(UserSubscription.id)).where(
-                and_(
-                    UserSubscription.subscription_type == SubscriptionType.FREE,
-                    UserSubscription.status == SubscriptionStatus.ACTIVE
-                )
-            )
-        )
-        free_subscriptions = free_subs_result.scalar() or 0
-
-        # STANDARD подписки
-        standard_subs_result = await db.execute(
-            select(func.count(UserSubscription.id)).where(
-                and_(
-                    UserSubscription.subscription_type == SubscriptionType.STANDARD,
-                    UserSubscription.status == SubscriptionStatus.ACTIVE
-                )
-            )
-        )
-        standard_subscriptions = standard_subs_result.scalar() or 0
-
-        # PREMIUM подписки
-        premium_subs_result = await db.execute(
-            select(func.count(UserSubscription.id)).where(
-                and_(
-                    UserSubscription.subscription_type == SubscriptionType.PREMIUM,
-                    UserSubscription.status == SubscriptionStatus.ACTIVE
-                )
-            )
-        )
-        premium_subscriptions = premium_subs_result.scalar() or 0
-
-        # Всего платных подписок
-        paid_subscriptions = standard_subscriptions + premium_subscriptions
-
-        # Регистрации по странам
-        registrations_by_country: List[Dict[str, Any]] = []
-        country_stats_result = await db.execute(
-            select(
-                Users.country,
-                func.count(Users.id).label('count')
-            )
-            .where(Users.country.isnot(None))
-            .group_by(Users.country)
-            .order_by(func.count(Users.id).desc())
-        )
-        for row in country_stats_result:
-            registrations_by_country.append({
-                "country": row.country,
-                "count": row.count
-            })
-
-        # Статистика контента
-        # Количество персонажей
-        try:
-            from app.chat_bot.models.models import CharacterDB
-            characters_result = await db.execute(
-                select(func.count(CharacterDB.id))
-            )
-            total_characters = characters_result.scalar() or 0
-        except Exception:
-            total_characters = 0
-
-        # Количество сгенерированных изображений
-        try:
-            from app.models.image_generation_history import ImageGenerationHistory
-            images_result = await db.execute(
-                select(func.count(ImageGenerationHistory.id))
-            )
-            total_images = images_result.scalar() or 0
-        except Exception:
-            total_images = 0
-
-        # Количество сообщений в чате
-        try:
-            from app.models.chat_history import ChatHistory
-            messages_result = await db.execute(
-                select(func.count(ChatHistory.id))
-            )
-            total_messages = messages_result.scalar() or 0
-        except Exception:
-            total_messages = 0
-
-        # Активные пользователи (отправляли сообщения за последние 24 часа)
-        try:
-            active_users_result = await db.execute(
-                select(func.count(func.distinct(ChatHistory.user_id)))
-                .where(ChatHistory.created_at >= last_24h)
-            )
-            active_users_24h = active_users_result.scalar() or 0
-        except Exception:
-            active_users_24h = 0
-
-        # Общее количество монет в системе
-        total_coins_result = await db.execute(
-            select(func.sum(Users.coins))
-        )
-        total_coins = total_coins_result.scalar() or 0
-
-        # Статистика по купленным подпискам за всё время
-        # Подсчитываем сколько пользователей когда-либо имели платную подписку (STANDARD, PREMIUM, PRO)
-        try:
-            paid_subscriptions_all_time_result = await db.execute(
-                select(func.count(func.distinct(UserSubscription.user_id))).where(
-                    UserSubscription.subscription_type.in_([
-                        SubscriptionType.STANDARD,
-                        SubscriptionType.PREMIUM
-                    ])
-                )
-            )
-            paid_subscriptions_all_time = paid_subscriptions_all_time_result.scalar() or 0
-        except Exception:
-            paid_subscriptions_all_time = 0
-        
-        # Статистика по типам купленных подписок за всё время
-        try:
-            standard_all_time_result = await db.execute(
-                select(func.count(func.distinct(UserSubscription.user_id))).where(
-                    UserSubscription.subscription_type == SubscriptionType.STANDARD
-                )
-            )
-            standard_all_time = standard_all_time_result.scalar() or 0
-        except Exception:
-            standard_all_time = 0
-        
-        try:
-            premium_all_time_result = await db.execute(
-                select(func.count(func.distinct(UserSubscription.user_id))).where(
-                    UserSubscription.subscription_type == SubscriptionType.PREMIUM
-                )
-            )
-            premium_all_time = premium_all_time_result.scalar() or 0
-        except Exception:
-            premium_all_time = 0
-        
-        pro_all_time = 0
-
-        return {
-            "total_visits": total_users,
-            "new_registrations": total_users,
-            "new_users_24h": new_users_24h,
-            "new_users_7d": new_users_7d,
-            "subscriptions_purchased": paid_subscriptions,
-            "subscriptions": {
-                "free": free_subscriptions,
-                "standard": standard_subscriptions,
-                "premium": premium_subscriptions,
-                "total_paid": paid_subscriptions
-            },
-            "subscriptions_all_time": {
-                "total_paid": paid_subscriptions_all_time,
-                "standard": standard_all_time,
-                "premium": premium_all_time,
-                "pro": pro_all_time
-            },
-            "registrations_by_country": registrations_by_country,
-            "content": {
-                "total_characters": total_characters,
-                "total_images": total_images,
-                "total_messages": total_messages
-            },
-            "activity": {
-                "active_users_24h": active_users_24h
-            },
-            "economy": {
-                "total_coins": total_coins
-            }
-        }
+        from app.services.admin_stats import get_admin_stats as load_admin_stats
+        return await load_admin_stats(db)
     except Exception as e:
         logger.error(
             f"[ADMIN STATS] Ошибка получения статистики: {e}",
@@ -301,6 +117,37 @@ async def get_users_list(
         result = await db.execute(query)
         users = result.scalars().all()
         
+        # Статистика чатов для всей страницы сгруппированными запросами
+        chat_sessions_counts: Dict[str, int] = {}
+        chat_messages_counts: Dict[str, int] = {}
+        if users:
+            try:
+                from app.chat_bot.models.models import ChatSession, ChatMessageDB
+                user_id_strs = [str(user.id) for user in users]
+                session_user_key = func.trim(ChatSession.user_id)
+                
+                sessions_result = await db.execute(
+                    select(session_user_key.label("user_key"), func.count(ChatSession.id))
+                    .where(session_user_key.in_(user_id_strs))
+                    .group_by(session_user_key)
+                )
+                chat_sessions_counts = {row[0]: row[1] for row in sessions_result.all()}
+                
+                if chat_sessions_counts:
+                    messages_result = await db.execute(
+                        select(session_user_key.label("user_key"), func.count(ChatMessageDB.id))
+                        .select_from(ChatMessageDB)
+                        .join(ChatSession, ChatMessageDB.session_id == ChatSession.id)
+                        .where(
+                            session_user_key.in_(list(chat_sessions_counts)),
+                            ChatMessageDB.role == "user"
+                        )
+                        .group_by(session_user_key)
+                    )
+                    chat_messages_counts = {row[0]: row[1] for row in messages_result.all()}
+            except Exception as chat_error:
+                logger.warning(f"[ADMIN] Ошибка получения статистики чатов: {chat_error}")
+        
         users_list = []
         for user in users:
             subscription_info = None
@@ -316,48 +163,8 @@ async def get_users_list(
                     "voice_used": user.subscription.voice_used
                 }
             
-            # Статистика чатов
-            try:
-                from app.chat_bot.models.models import ChatSession, ChatMessageDB
-                user_id_str = str(user.id)
-                
-                # Проверяем, есть ли у пользователя чат-сессии
-                chat_sessions_result = await db.execute(
-                    select(func.count(ChatSession.id)).where(
-                        or_(
-                            ChatSession.user_id == user_id_str,
-                            func.trim(ChatSession.user_id) == user_id_str
-                        )
-                    )
-                )
-                chat_sessions_count = chat_sessions_result.scalar() or 0
-                
-                # Подсчитываем общее количество сообщений пользователя
-                total_chat_messages = 0
-                if chat_sessions_count > 0:
-                    # Получаем все session_id для этого пользователя
-                    sessions_result = await db.execute(
-                        select(ChatSession.id).where(
-                            or_(
-                                ChatSession.user_id == user_id_str,
-                                func.trim(ChatSession.user_id) == user_id_str
-                            )
-                        )
-                    )
-                    session_ids = [row[0] for row in sessions_result.all()]
-                    
-                    if session_ids:
-                        messages_result = await db.execute(
-                            select(func.count(ChatMessageDB.id)).where(
-                                ChatMessageDB.session_id.in_(session_ids),
-                                ChatMessageDB.role == "user"
-                            )
-                        )
-                        total_chat_messages = messages_result.scalar() or 0
-            except Exception as chat_error:
-                logger.warning(f"[ADMIN] Ошибка получения статистики чата для user_id={user.id}: {chat_error}")
-                chat_sessions_count = 0
-                total_chat_messages = 0
+            chat_sessions_count = chat_sessions_counts.get(str(user.id), 0)
+            total_chat_messages = chat_messages_counts.get(str(user.id), 0)
             
             has_subscription = subscription_info is not None and subscription_info.get("type") != "free"
             has_chat = chat_sessions_count > 0
@@ -591,13 +398,168 @@ async def get_user_details(
         )
 
 
+# Колонки таблицы пользователей, по которым доступна сортировка
+USERS_TABLE_SORTS = ("created_at", "id", "messages_count", "photos_count", "last_login")
+# Сортировки по колонкам Users: страница выбирается по индексу, статистика считается только для нее
+USERS_TABLE_USER_SORTS = ("created_at", "id", "messages_count")
+# Подставляется вместо NULL, чтобы пользователи без данных участвовали в keyset-пагинации
+# (Users.created_at хранится без часового пояса, время сообщений - с ним)
+USERS_TABLE_MIN_DATETIME = datetime(1970, 1, 1)
+
+
+def _users_table_sort_key(sort: str):
+    """Выражение сортировки по колонке Users (без подзапросов статистики)."""
+    if sort == "created_at":
+        return func.coalesce(Users.created_at, USERS_TABLE_MIN_DATETIME)
+    if sort == "messages_count":
+        return func.coalesce(Users.total_messages_sent, 0)
+    return Users.id
+
+
+def _users_table_stats_query(user_ids: List[int] = None):
+    """
+    Один запрос со статистикой таблицы пользователей: сгруппированные подзапросы
+    (фото, последнее сообщение, бустер, активная подписка), присоединенные к Users.
+    Если переданы user_ids, подзапросы группируют только строки этих пользователей.
+    """
+    from app.models.chat_history import ChatHistory
+    from app.models.image_generation_history import ImageGenerationHistory
+    from app.models.payment_transaction import PaymentTransaction
+    from app.chat_bot.models.models import ChatSession, ChatMessageDB
+
+    photos = select(
+        ImageGenerationHistory.user_id.label("user_id"),
+        func.count(ImageGenerationHistory.id).label("photos_count")
+    ).group_by(ImageGenerationHistory.user_id)
+
+    history = select(
+        ChatHistory.user_id.label("user_id"),
+        func.max(ChatHistory.created_at).label("last_at")
+    ).group_by(ChatHistory.user_id)
+
+    session_user_key = func.trim(ChatSession.user_id)
+    chats = select(
+        session_user_key.label("user_key"),
+        func.max(ChatMessageDB.timestamp).label("last_at")
+    ).select_from(ChatMessageDB).join(
+        ChatSession, ChatMessageDB.session_id == ChatSession.id
+    ).group_by(session_user_key)
+
+    boosters = select(PaymentTransaction.user_id.label("user_id")).where(
+        and_(
+            PaymentTransaction.payment_type == "booster",
+            PaymentTransaction.processed == True
+        )
+    ).group_by(PaymentTransaction.user_id)
+
+    # Самая новая активная подписка пользователя
+    subscriptions = select(
+        UserSubscription.user_id,
+        UserSubscription.subscription_type,
+        UserSubscription.images_limit,
+        UserSubscription.images_used,
+        UserSubscription.voice_limit,
+        UserSubscription.voice_used,
+    ).where(
+        UserSubscription.status == SubscriptionStatus.ACTIVE
+    ).order_by(
+        UserSubscription.user_id, UserSubscription.activated_at.desc().nullslast()
+    ).ext(distinct_on(UserSubscription.user_id))
+
+    if user_ids is not None:
+        user_id_strs = [str(user_id) for user_id in user_ids]
+        photos = photos.where(ImageGenerationHistory.user_id.in_(user_ids))
+        history = history.where(ChatHistory.user_id.in_(user_ids))
+        chats = chats.where(session_user_key.in_(user_id_strs))
+        boosters = boosters.where(PaymentTransaction.user_id.in_(user_ids))
+        subscriptions = subscriptions.where(UserSubscription.user_id.in_(user_ids))
+
+    photos = photos.subquery("photos")
+    history = history.subquery("history")
+    chats = chats.subquery("chats")
+    boosters = boosters.subquery("boosters")
+    subscriptions = subscriptions.subquery("subscriptions")
+
+    photos_count = func.coalesce(photos.c.photos_count, 0)
+    last_login = func.coalesce(history.c.last_at, chats.c.last_at)
+    stmt = select(
+        Users.id,
+        Users.email,
+        Users.username,
+        Users.created_at,
+        Users.total_messages_sent,
+        photos_count.label("photos_count"),
+        last_login.label("last_login"),
+        boosters.c.user_id.isnot(None).label("purchased_booster"),
+        subscriptions.c.subscription_type,
+        subscriptions.c.images_limit,
+        subscriptions.c.images_used,
+        subscriptions.c.voice_limit,
+        subscriptions.c.voice_used,
+    ).select_from(Users).outerjoin(
+        photos, photos.c.user_id == Users.id
+    ).outerjoin(
+        history, history.c.user_id == Users.id
+    ).outerjoin(
+        chats, chats.c.user_key == cast(Users.id, String)
+    ).outerjoin(
+        boosters, boosters.c.user_id == Users.id
+    ).outerjoin(
+        subscriptions, subscriptions.c.user_id == Users.id
+    )
+
+    sort_keys = {sort: _users_table_sort_key(sort) for sort in USERS_TABLE_USER_SORTS}
+    sort_keys["photos_count"] = photos_count
+    sort_keys["last_login"] = func.coalesce(last_login, USERS_TABLE_MIN_DATETIME.replace(tzinfo=timezone.utc))
+    return stmt, sort_keys
+
+
+def _apply_keyset(stmt, sort_key, order: str, after):
+    """Сортирует по (ключ, id) и продолжает после строки курсора."""
+    if order == "asc":
+        stmt = stmt.order_by(sort_key.asc(), Users.id.asc())
+        if after is not None:
+            stmt = stmt.where(tuple_(sort_key, Users.id) > tuple_(*after))
+    else:
+        stmt = stmt.order_by(sort_key.desc(), Users.id.desc())
+        if after is not None:
+            stmt = stmt.where(tuple_(sort_key, Users.id) < tuple_(*after))
+    return stmt
+
+
+def _decode_users_table_cursor(cursor: str, sort: str):
+    try:
+        payload = decode_cursor(cursor)
+        if payload.get("sort") != sort:
+            raise ValueError("Cursor sort mismatch")
+        value = payload["k"]
+        if sort in ("created_at", "last_login"):
+            value = parse_cursor_datetime(value)
+        else:
+            value = int(value)
+        return value, int(payload["id"])
+    except (ValueError, KeyError, TypeError):
+        raise HTTPException(status_code=400, detail="Некорректный курсор")
+
+
+def _subscription_type_name(sub_type) -> str:
+    if not sub_type:
+        return "Нет подписки"
+    if hasattr(sub_type, 'value'):
+        return sub_type.value
+    return str(sub_type).lower()
+
+
 @admin_router.get("/users-table")
 @admin_router.get("/users-table/")
 async def get_users_table(
     current_user: Users = Depends(require_admin),
     db: AsyncSession = Depends(get_db),
     skip: int = 0,
-    limit: int = 100
+    limit: int = Query(100, ge=1, le=500),
+    sort: str = Query("created_at", description="Колонка сортировки: " + ", ".join(USERS_TABLE_SORTS)),
+    order: str = Query("desc", pattern="^(asc|desc)$"),
+    cursor: Optional[str] = Query(None, description="next_cursor из предыдущей страницы")
 ) -> Dict[str, Any]:
     """
     Получает таблицу пользователей с данными:
@@ -606,157 +568,83 @@ async def get_users_table(
     - тип подписки
     - количество сгенерированных фото
     - последний вход (последнее сообщение)
+    
+    Сортировка выполняется на сервере по любой колонке из USERS_TABLE_SORTS.
+    Для следующей страницы передайте next_cursor (keyset-пагинация);
+    skip поддерживается для совместимости и игнорируется при наличии cursor.
     """
+    if sort not in USERS_TABLE_SORTS:
+        raise HTTPException(status_code=400, detail=f"Неизвестная колонка сортировки: {sort}")
+    after = _decode_users_table_cursor(cursor, sort) if cursor else None
+
     try:
-        from sqlalchemy.orm import selectinload
-        from app.models.chat_history import ChatHistory
-        from app.models.image_generation_history import ImageGenerationHistory
-        from app.models.payment_transaction import PaymentTransaction
-        
-        # Получаем пользователей
-        query = select(Users).order_by(Users.created_at.desc())
-        
-        # Подсчет общего количества
         total_result = await db.execute(select(func.count(Users.id)))
         total = total_result.scalar() or 0
         
-        # Получаем пользователей с пагинацией
-        query = query.offset(skip).limit(limit)
-        result = await db.execute(query)
-        users = result.scalars().all()
+        if sort in USERS_TABLE_USER_SORTS:
+            # Страница выбирается по индексам Users, статистика группируется только для нее
+            sort_key = _users_table_sort_key(sort)
+            page_query = _apply_keyset(select(Users.id), sort_key, order, after)
+            if after is None:
+                page_query = page_query.offset(skip)
+            page_ids = (await db.execute(page_query.limit(limit + 1))).scalars().all()
+            has_more = len(page_ids) > limit
+            page_ids = list(page_ids[:limit])
+            
+            rows = []
+            if page_ids:
+                stmt, sort_keys = _users_table_stats_query(page_ids)
+                stmt = stmt.add_columns(sort_keys[sort].label("sort_value")).where(Users.id.in_(page_ids))
+                rows_by_id = {row.id: row for row in (await db.execute(stmt)).all()}
+                rows = [rows_by_id[user_id] for user_id in page_ids if user_id in rows_by_id]
+        else:
+            stmt, sort_keys = _users_table_stats_query()
+            stmt = _apply_keyset(stmt.add_columns(sort_keys[sort].label("sort_value")), sort_keys[sort], order, after)
+            if after is None:
+                stmt = stmt.offset(skip)
+            rows = (await db.execute(stmt.limit(limit + 1))).all()
+            has_more = len(rows) > limit
+            rows = rows[:limit]
         
         users_table = []
-        for user in users:
-            # Получаем самую новую активную подписку для пользователя
-            subscription_type = "Нет подписки"
-            try:
-                subscription_query = await db.execute(
-                    select(UserSubscription)
-                    .where(UserSubscription.user_id == user.id)
-                    .where(UserSubscription.status == SubscriptionStatus.ACTIVE)
-                    .order_by(UserSubscription.activated_at.desc())
-                    .limit(1)
-                )
-                subscription = subscription_query.scalars().first()
-                
-                if subscription:
-                    # Получаем тип подписки
-                    sub_type = subscription.subscription_type
-                    try:
-                        if isinstance(sub_type, SubscriptionType):
-                            subscription_type = sub_type.value
-                        elif hasattr(sub_type, 'value'):
-                            subscription_type = sub_type.value
-                        else:
-                            # Если это строка, нормализуем её
-                            subscription_type = str(sub_type).lower() if sub_type else "Нет подписки"
-                    except Exception as e:
-                        logger.warning(f"[ADMIN] Ошибка получения типа подписки для user_id={user.id}: {e}, sub_type={sub_type}, type={type(sub_type)}")
-                        subscription_type = str(sub_type).lower() if sub_type else "Нет подписки"
-            except Exception as e:
-                logger.warning(f"[ADMIN] Ошибка получения подписки для user_id={user.id}: {e}")
-                subscription_type = "Нет подписки"
-            
-            # Количество отправленных сообщений
-            messages_count = user.total_messages_sent or 0
-            
-            # Количество сгенерированных фото
-            try:
-                photos_result = await db.execute(
-                    select(func.count(ImageGenerationHistory.id)).where(
-                        ImageGenerationHistory.user_id == user.id
-                    )
-                )
-                photos_count = photos_result.scalar() or 0
-            except Exception:
-                photos_count = 0
-            
-            # Последний вход (последнее сообщение)
-            last_login = None
-            try:
-                last_message_result = await db.execute(
-                    select(ChatHistory.created_at)
-                    .where(ChatHistory.user_id == user.id)
-                    .order_by(ChatHistory.created_at.desc())
-                    .limit(1)
-                )
-                last_message_date = last_message_result.scalar_one_or_none()
-                if last_message_date:
-                    last_login = last_message_date.isoformat()
-            except Exception:
-                pass
-            
-            # Если нет сообщений в ChatHistory, пробуем ChatMessageDB
-            if not last_login:
-                try:
-                    from app.chat_bot.models.models import ChatSession, ChatMessageDB
-                    user_id_str = str(user.id)
-                    
-                    # Получаем последнее сообщение через ChatSession
-                    last_chat_result = await db.execute(
-                        select(func.max(ChatMessageDB.timestamp))
-                        .select_from(ChatMessageDB)
-                        .join(ChatSession, ChatMessageDB.session_id == ChatSession.id)
-                        .where(
-                            or_(
-                                ChatSession.user_id == user_id_str,
-                                func.trim(ChatSession.user_id) == user_id_str
-                            )
-                        )
-                    )
-                    last_chat_date = last_chat_result.scalar_one_or_none()
-                    if last_chat_date:
-                        last_login = last_chat_date.isoformat()
-                except Exception:
-                    pass
-            
-            # Проверяем, купил ли пользователь бустер за 69 рублей
-            purchased_booster = False
-            try:
-                booster_result = await db.execute(
-                    select(func.count(PaymentTransaction.id)).where(
-                        and_(
-                            PaymentTransaction.user_id == user.id,
-                            PaymentTransaction.payment_type == "booster",
-                            PaymentTransaction.processed == True
-                        )
-                    )
-                )
-                booster_count = booster_result.scalar() or 0
-                purchased_booster = booster_count > 0
-            except Exception as e:
-                logger.warning(f"[ADMIN] Ошибка проверки покупки бустера для user_id={user.id}: {e}")
-                purchased_booster = False
-            
-            # Собираем инфо о подписке для лимитов
+        for row in rows:
+            subscription_type = _subscription_type_name(row.subscription_type)
             sub_info = None
-            if subscription:
+            if row.subscription_type is not None:
                 sub_info = {
                     "type": subscription_type,
-                    "images_limit": subscription.images_limit,
-                    "images_used": subscription.images_used,
-                    "voice_limit": subscription.voice_limit,
-                    "voice_used": subscription.voice_used
+                    "images_limit": row.images_limit,
+                    "images_used": row.images_used,
+                    "voice_limit": row.voice_limit,
+                    "voice_used": row.voice_used
                 }
 
             users_table.append({
-                "id": user.id,
-                "user": user.email or user.username or f"User {user.id}",
-                "username": user.username,
-                "email": user.email,
-                "messages_count": messages_count,
+                "id": row.id,
+                "user": row.email or row.username or f"User {row.id}",
+                "username": row.username,
+                "email": row.email,
+                "messages_count": row.total_messages_sent or 0,
                 "subscription_type": subscription_type,
                 "subscription": sub_info,
-                "photos_count": photos_count,
-                "last_login": last_login,
-                "purchased_booster": purchased_booster
+                "photos_count": row.photos_count,
+                "last_login": row.last_login.isoformat() if row.last_login else None,
+                "purchased_booster": bool(row.purchased_booster)
             })
         
+        next_cursor = None
+        if has_more and rows:
+            last = rows[-1]
+            next_cursor = encode_cursor({"sort": sort, "k": last.sort_value, "id": last.id})
+        
         return {
             "users": users_table,
             "total": total,
             "skip": skip,
-            "limit": limit
+            "limit": limit,
+            "sort": sort,
+            "order": order,
+            "next_cursor": next_cursor
         }
         
     except Exception as e:
@@ -871,6 +759,13 @@ async def reset_stats(
         
         await db.commit()
         
+        # Снимок статистики устарел: пересчитываем сразу, не дожидаясь фоновой задачи
+        try:
+            from app.services.admin_stats import refresh_admin_stats
+            await refresh_admin_stats(db)
+        except Exception as e:
+            logger.warning(f"[ADMIN RESET] Не удалось пересчитать снимок статистики: {e}")
+        
         logger.info(
             f"[ADMIN RESET] Статистика сброшена: обновлено {results['users']} пользователей, "
             f"{results['messages']} сообщений, {results['images']} изображений, "
@@ -2,20 +2,31 @@
 API эндпоинты для работы с историей баланса пользователя.
 """
 
-from typing import List
-from fastapi import APIRouter, Depends, HTTPException
+from enum import Enum
+from typing import List, Optional, Tuple
+from fastapi import APIRouter, Depends, HTTPException, Query
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import select, desc
+from sqlalchemy import select, desc, func, tuple_
 
 from app.database.db_depends import get_db
 from app.auth.dependencies import get_current_user
 from app.models.user import Users
-from app.models.balance_history import BalanceHistory
+from app.models.balance_history import BalanceHistory, BalanceMonthlySummary
+from app.utils.pagination import encode_cursor, decode_cursor, parse_cursor_datetime
 from pydantic import BaseModel
-from datetime import datetime
+from datetime import date, datetime, timezone
 
 router = APIRouter(prefix="/api/v1/balance", tags=["Balance"])
 
+HISTORY_PAGE_SIZE = 50
+HISTORY_PAGE_MAX = 200
+
+
+class BalanceChangeType(str, Enum):
+    """Тип изменения баланса."""
+    CREDIT = "credit"  # Начисление (amount > 0)
+    DEBIT = "debit"  # Списание (amount < 0)
+
 
 class BalanceHistoryItem(BaseModel):
     """Элемент истории баланса."""
@@ -33,37 +44,94 @@ class BalanceHistoryItem(BaseModel):
 class BalanceHistoryResponse(BaseModel):
     """Ответ с историей баланса."""
     history: List[BalanceHistoryItem]
-    total: int
+    total: int  # Всего записей в истории пользователя (без учета фильтров)
+    next_cursor: Optional[str] = None
+
+
+class BalanceMonthSummaryItem(BaseModel):
+    """Итоги изменений баланса за месяц."""
+    month: date
+    credits: int
+    debits: int
+    operations: int
+    closing_balance: int
+
+    class Config:
+        from_attributes = True
+
+
+class BalanceSummaryResponse(BaseModel):
+    """Помесячные итоги, новые месяцы первыми."""
+    months: List[BalanceMonthSummaryItem]
+
+
+def _to_utc_naive(value: Optional[datetime]) -> Optional[datetime]:
+    # created_at хранится в UTC без часового пояса
+    if value is None or value.tzinfo is None:
+        return value
+    return value.astimezone(timezone.utc).replace(tzinfo=None)
+
+
+def _decode_history_cursor(cursor: str) -> Tuple[datetime, int]:
+    try:
+        payload = decode_cursor(cursor)
+        return parse_cursor_datetime(payload["t"]), int(payload["id"])
+    except (ValueError, KeyError, TypeError):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
 
 
 @router.get("/history", response_model=BalanceHistoryResponse)
 async def get_balance_history(
-    skip: int = 0,
-    limit: int = 1000,
+    limit: int = Query(HISTORY_PAGE_SIZE, ge=1, le=HISTORY_PAGE_MAX),
+    cursor: Optional[str] = Query(None, description="next_cursor из предыдущей страницы"),
+    date_from: Optional[datetime] = Query(None, description="Записи не раньше этого момента"),
+    date_to: Optional[datetime] = Query(None, description="Записи раньше этого момента"),
+    type: Optional[BalanceChangeType] = Query(None, description="credit или debit"),
     current_user: Users = Depends(get_current_user),
     db: AsyncSession = Depends(get_db)
 ):
     """
-    Получает историю изменений баланса пользователя.
+    Получает страницу истории изменений баланса пользователя, новые первыми.
+
+    Страницы идут по индексу (user_id, created_at, id): следующая страница
+    запрашивается с cursor=next_cursor. total берется из помесячных итогов,
+    без подсчета всей истории.
     """
+    before = _decode_history_cursor(cursor) if cursor else None
+    date_from = _to_utc_naive(date_from)
+    date_to = _to_utc_naive(date_to)
+
     try:
-        # Получаем историю баланса для текущего пользователя
-        result = await db.execute(
+        query = (
             select(BalanceHistory)
             .where(BalanceHistory.user_id == current_user.id)
-            .order_by(desc(BalanceHistory.created_at))
-            .offset(skip)
-            .limit(limit)
+            .order_by(desc(BalanceHistory.created_at), desc(BalanceHistory.id))
+            .limit(limit + 1)
         )
-        history_items = result.scalars().all()
+        if date_from is not None:
+            query = query.where(BalanceHistory.created_at >= date_from)
+        if date_to is not None:
+            query = query.where(BalanceHistory.created_at < date_to)
+        if type == BalanceChangeType.CREDIT:
+            query = query.where(BalanceHistory.amount > 0)
+        elif type == BalanceChangeType.DEBIT:
+            query = query.where(BalanceHistory.amount < 0)
+        if before is not None:
+            query = query.where(tuple_(BalanceHistory.created_at, BalanceHistory.id) < tuple_(*before))
 
-        # Получаем общее количество записей
-        from sqlalchemy import func
-        count_result = await db.execute(
-            select(func.count(BalanceHistory.id))
-            .where(BalanceHistory.user_id == current_user.id)
+        history_items = (await db.execute(query)).scalars().all()
+        next_cursor = None
+        if len(history_items) > limit:
+            history_items = history_items[:limit]
+            last_item = history_items[-1]
+            next_cursor = encode_cursor({"t": last_item.created_at, "id": last_item.id})
+
+        # Итоги поддерживаются триггерами на balance_history
+        total_result = await db.execute(
+            select(func.coalesce(func.sum(BalanceMonthlySummary.operations), 0))
+            .where(BalanceMonthlySummary.user_id == current_user.id)
         )
-        total = count_result.scalar_one() or 0
+        total = total_result.scalar_one() or 0
 
         return BalanceHistoryResponse(
             history=[BalanceHistoryItem(
@@ -74,11 +142,40 @@ async def get_balance_history(
                 reason=item.reason,
                 created_at=item.created_at
             ) for item in history_items],
-            total=total
+            total=total,
+            next_cursor=next_cursor
         )
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(
             status_code=500,
             detail=f"Ошибка получения истории баланса: {str(e)}"
         )
 
+
+@router.get("/summary", response_model=BalanceSummaryResponse)
+async def get_balance_summary(
+    months: int = Query(12, ge=1, le=120, description="Сколько последних месяцев вернуть"),
+    current_user: Users = Depends(get_current_user),
+    db: AsyncSession = Depends(get_db)
+):
+    """
+    Получает помесячные итоги изменений баланса (начисления, списания,
+    количество операций и баланс на конец месяца) без чтения всей истории.
+    """
+    try:
+        result = await db.execute(
+            select(BalanceMonthlySummary)
+            .where(BalanceMonthlySummary.user_id == current_user.id)
+            .order_by(desc(BalanceMonthlySummary.month))
+            .limit(months)
+        )
+        return BalanceSummaryResponse(
+            months=[BalanceMonthSummaryItem.model_validate(row) for row in result.scalars().all()]
+        )
+    except Exception as e:
+        raise HTTPException(
+            status_code=500,
+            detail=f"Ошибка получения итогов баланса: {str(e)}"
+        )
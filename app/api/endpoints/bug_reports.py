@@ -2,17 +2,20 @@
 API эндпоинты для работы с баг-репортами.
 """
 
-from fastapi import APIRouter, Depends, HTTPException
+from collections import defaultdict
+from fastapi import APIRouter, Depends, HTTPException, Query
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import select, desc
+from sqlalchemy import select, desc, func, tuple_
+from sqlalchemy.dialects.postgresql import distinct_on
 from pydantic import BaseModel
-from typing import List, Optional
+from typing import Dict, List, Optional
 from datetime import datetime
 
 from app.database.db_depends import get_db
 from app.auth.dependencies import get_current_user_optional, get_current_user
 from app.models.user import Users
 from app.models.bug_report import BugReport, BugComment, BugStatus
+from app.utils.pagination import encode_cursor, decode_cursor, parse_cursor_datetime
 
 router = APIRouter()
 
@@ -46,63 +49,176 @@ class BugReportResponse(BaseModel):
     author_username: Optional[str]
     created_at: str
     comments: List[BugCommentResponse]
+    comments_count: int = 0
+    latest_comment: Optional[BugCommentResponse] = None
+
+
+class BugReportPageResponse(BaseModel):
+    bug_reports: List[BugReportResponse]
+    next_cursor: Optional[str]
 
 
 class UpdateBugStatusRequest(BaseModel):
     new_status: str
 
 
+BUG_REPORTS_PAGE_MAX = 100
+
+
+def _comment_response(comment: BugComment, username: Optional[str]) -> BugCommentResponse:
+    return BugCommentResponse(
+        id=comment.id,
+        bug_report_id=comment.bug_report_id,
+        user_id=comment.user_id,
+        author_username=username,
+        content=comment.content,
+        created_at=comment.created_at.isoformat() if comment.created_at else ""
+    )
+
+
+def _report_response(
+    bug_report: BugReport,
+    username: Optional[str],
+    comments: List[BugCommentResponse],
+    comments_count: int,
+    latest_comment: Optional[BugCommentResponse],
+) -> BugReportResponse:
+    return BugReportResponse(
+        id=bug_report.id,
+        title=bug_report.title,
+        description=bug_report.description,
+        location=bug_report.location,
+        status=bug_report.status.value if bug_report.status else "На проверке",
+        user_id=bug_report.user_id,
+        author_username=username,
+        created_at=bug_report.created_at.isoformat() if bug_report.created_at else "",
+        comments=comments,
+        comments_count=comments_count,
+        latest_comment=latest_comment
+    )
+
+
+def _parse_status(value: str) -> BugStatus:
+    try:
+        return BugStatus(value)
+    except ValueError:
+        raise HTTPException(status_code=400, detail=f"Недопустимый статус. Допустимые значения: {', '.join([s.value for s in BugStatus])}")
+
+
+def _decode_reports_cursor(cursor: str):
+    try:
+        payload = decode_cursor(cursor)
+        return parse_cursor_datetime(payload["t"]), int(payload["id"])
+    except (ValueError, KeyError, TypeError):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+
+async def _build_report_responses(
+    db: AsyncSession,
+    rows: list,
+    include_comments: bool = True,
+) -> List[BugReportResponse]:
+    """
+    Собирает ответы для списка (BugReport, username) за постоянное число запросов:
+    счетчики комментариев одним GROUP BY и комментарии всех репортов одним запросом
+    (без include_comments - только последний комментарий каждого репорта).
+    """
+    report_ids = [bug_report.id for bug_report, _username in rows]
+    if not report_ids:
+        return []
+
+    counts_result = await db.execute(
+        select(BugComment.bug_report_id, func.count(BugComment.id))
+        .where(BugComment.bug_report_id.in_(report_ids))
+        .group_by(BugComment.bug_report_id)
+    )
+    counts = dict(counts_result.all())
+
+    comments_by_report: Dict[int, List[BugCommentResponse]] = defaultdict(list)
+    latest_by_report: Dict[int, BugCommentResponse] = {}
+    if include_comments:
+        comments_result = await db.execute(
+            select(BugComment, Users.username)
+            .outerjoin(Users, BugComment.user_id == Users.id)
+            .where(BugComment.bug_report_id.in_(report_ids))
+            .order_by(BugComment.bug_report_id, BugComment.created_at, BugComment.id)
+        )
+        for comment, comment_username in comments_result.all():
+            comments_by_report[comment.bug_report_id].append(_comment_response(comment, comment_username))
+        latest_by_report = {report_id: comments[-1] for report_id, comments in comments_by_report.items()}
+    elif counts:
+        # DISTINCT ON обратным проходом по индексу (bug_report_id, created_at, id)
+        latest_result = await db.execute(
+            select(BugComment, Users.username)
+            .outerjoin(Users, BugComment.user_id == Users.id)
+            .where(BugComment.bug_report_id.in_(report_ids))
+            .ext(distinct_on(BugComment.bug_report_id))
+            .order_by(desc(BugComment.bug_report_id), desc(BugComment.created_at), desc(BugComment.id))
+        )
+        for comment, comment_username in latest_result.all():
+            latest_by_report[comment.bug_report_id] = _comment_response(comment, comment_username)
+
+    return [
+        _report_response(
+            bug_report,
+            username,
+            comments_by_report.get(bug_report.id, []),
+            counts.get(bug_report.id, 0),
+            latest_by_report.get(bug_report.id),
+        )
+        for bug_report, username in rows
+    ]
+
+
 @router.get("/")
 async def get_bug_reports(
+    status: Optional[str] = Query(None, description="Фильтр по статусу"),
+    limit: Optional[int] = Query(None, ge=1, le=BUG_REPORTS_PAGE_MAX),
+    cursor: Optional[str] = Query(None, description="next_cursor из предыдущей страницы"),
+    include_comments: bool = Query(True, description="Возвращать все комментарии, а не только последний"),
     current_user: Optional[Users] = Depends(get_current_user_optional),
     db: AsyncSession = Depends(get_db)
 ):
-    """Получает список всех баг-репортов с комментариями."""
+    """
+    Получает список баг-репортов с комментариями, новые первыми.
+
+    Без limit и cursor возвращает полный список. Если указан limit или cursor,
+    возвращается страница {"bug_reports": [...], "next_cursor": ...};
+    next_cursor передается обратно в cursor.
+    """
+    status_enum = _parse_status(status) if status else None
+    before = _decode_reports_cursor(cursor) if cursor else None
+    paged = limit is not None or before is not None
+    page_size = limit or BUG_REPORTS_PAGE_MAX
+
     try:
-        # Получаем все баг-репорты с информацией о пользователях
-        result = await db.execute(
+        # Индексы (created_at, id) и (status, created_at, id)
+        query = (
             select(BugReport, Users.username)
             .outerjoin(Users, BugReport.user_id == Users.id)
-            .order_by(desc(BugReport.created_at))
+            .order_by(desc(BugReport.created_at), desc(BugReport.id))
         )
-        
-        bug_reports_data = result.all()
-        
-        bug_reports = []
-        for bug_report, username in bug_reports_data:
-            # Получаем комментарии для этого баг-репорта
-            comments_result = await db.execute(
-                select(BugComment, Users.username)
-                .outerjoin(Users, BugComment.user_id == Users.id)
-                .where(BugComment.bug_report_id == bug_report.id)
-                .order_by(BugComment.created_at)
-            )
-            
-            comments_data = comments_result.all()
-            comments = []
-            for comment, comment_username in comments_data:
-                comments.append(BugCommentResponse(
-                    id=comment.id,
-                    bug_report_id=comment.bug_report_id,
-                    user_id=comment.user_id,
-                    author_username=comment_username,
-                    content=comment.content,
-                    created_at=comment.created_at.isoformat() if comment.created_at else ""
-                ))
-            
-            bug_reports.append(BugReportResponse(
-                id=bug_report.id,
-                title=bug_report.title,
-                description=bug_report.description,
-                location=bug_report.location,
-                status=bug_report.status.value if bug_report.status else "На проверке",
-                user_id=bug_report.user_id,
-                author_username=username,
-                created_at=bug_report.created_at.isoformat() if bug_report.created_at else "",
-                comments=comments
-            ))
-        
+        if status_enum is not None:
+            query = query.where(BugReport.status == status_enum)
+        if before is not None:
+            query = query.where(tuple_(BugReport.created_at, BugReport.id) < tuple_(*before))
+        if paged:
+            query = query.limit(page_size + 1)
+
+        rows = (await db.execute(query)).all()
+        next_cursor = None
+        if paged and len(rows) > page_size:
+            rows = rows[:page_size]
+            last_report = rows[-1][0]
+            next_cursor = encode_cursor({"t": last_report.created_at, "id": last_report.id})
+
+        bug_reports = await _build_report_responses(db, rows, include_comments)
+
+        if paged:
+            return BugReportPageResponse(bug_reports=bug_reports, next_cursor=next_cursor)
         return bug_reports
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Ошибка получения баг-репортов: {str(e)}")
 
@@ -141,17 +257,7 @@ async def create_bug_report(
         # Получаем username для ответа
         username = current_user.username if current_user else None
         
-        return BugReportResponse(
-            id=bug_report.id,
-            title=bug_report.title,
-            description=bug_report.description,
-            location=bug_report.location,
-            status=bug_report.status.value if bug_report.status else "На проверке",
-            user_id=bug_report.user_id,
-            author_username=username,
-            created_at=bug_report.created_at.isoformat() if bug_report.created_at else "",
-            comments=[]
-        )
+        return _report_response(bug_report, username, [], 0, None)
     except Exception as e:
         await db.rollback()
         raise HTTPException(status_code=500, detail=f"Ошибка создания баг-репорта: {str(e)}")
@@ -194,14 +300,7 @@ async def create_bug_comment(
         # Получаем username для ответа
         username = current_user.username if current_user else None
         
-        return BugCommentResponse(
-            id=comment.id,
-            bug_report_id=comment.bug_report_id,
-            user_id=comment.user_id,
-            author_username=username,
-            content=comment.content,
-            created_at=comment.created_at.isoformat() if comment.created_at else ""
-        )
+        return _comment_response(comment, username)
     except HTTPException:
         raise
     except Exception as e:
@@ -222,10 +321,7 @@ async def update_bug_status(
         raise HTTPException(status_code=403, detail="Только администраторы могут изменять статус баг-репорта")
     
     # Валидация статуса
-    try:
-        status_enum = BugStatus(request.new_status)
-    except ValueError:
-        raise HTTPException(status_code=400, detail=f"Недопустимый статус. Допустимые значения: {', '.join([s.value for s in BugStatus])}")
+    status_enum = _parse_status(request.new_status)
     
     try:
         result = await db.execute(
@@ -241,44 +337,14 @@ async def update_bug_status(
         await db.commit()
         await db.refresh(bug_report)
         
-        # Получаем username для ответа
+        # Автор и комментарии - те же запросы, что и для списка
         username_result = await db.execute(
             select(Users.username)
             .where(Users.id == bug_report.user_id)
         )
         username = username_result.scalar_one_or_none()
         
-        # Загружаем комментарии
-        comments_result = await db.execute(
-            select(BugComment, Users.username)
-            .outerjoin(Users, BugComment.user_id == Users.id)
-            .where(BugComment.bug_report_id == bug_report.id)
-            .order_by(BugComment.created_at)
-        )
-        
-        comments_data = comments_result.all()
-        comments = []
-        for comment, comment_username in comments_data:
-            comments.append(BugCommentResponse(
-                id=comment.id,
-                bug_report_id=comment.bug_report_id,
-                user_id=comment.user_id,
-                author_username=comment_username,
-                content=comment.content,
-                created_at=comment.created_at.isoformat() if comment.created_at else ""
-            ))
-        
-        return BugReportResponse(
-            id=bug_report.id,
-            title=bug_report.title,
-            description=bug_report.description,
-            location=bug_report.location,
-            status=bug_report.status.value,
-            user_id=bug_report.user_id,
-            author_username=username,
-            created_at=bug_report.created_at.isoformat() if bug_report.created_at else "",
-            comments=comments
-        )
+        return (await _build_report_responses(db, [(bug_report, username)]))[0]
     except HTTPException:
         raise
     except Exception as e:
@@ -4,18 +4,24 @@ API эндпоинты для работы с комментариями к пе
 
 from fastapi import APIRouter, Depends, HTTPException, Query
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import select, desc, func
+from sqlalchemy import select, desc, tuple_
 from pydantic import BaseModel
-from typing import List, Optional
+from typing import List, Optional, Tuple
 from datetime import datetime, timezone
 
 from app.database.db_depends import get_db
 from app.auth.dependencies import get_current_user, get_current_user_optional
 from app.models.user import Users
-from app.models.character_comment import CharacterComment
+from app.models.character_comment import CharacterComment, CharacterCommentCount
+from app.utils.pagination import encode_cursor, decode_cursor, parse_cursor_datetime
+from app.utils.redis_cache import (
+    cache_delete, cache_get_json, cache_set_json, key_character_comments, TTL_CHARACTER_COMMENTS
+)
 
 router = APIRouter()
 
+COMMENTS_PAGE_MAX = 100
+
 
 class CreateCommentRequest(BaseModel):
     character_name: str
@@ -61,81 +67,131 @@ async def create_comment(
         db.add(comment)
         await db.commit()
         await db.refresh(comment)
+        await _invalidate_comments_cache(comment.character_name)
         
         return {
             "success": True,
             "message": "Комментарий успешно создан",
-            "comment": {
-                "id": comment.id,
-                "character_name": comment.character_name,
-                "user_id": comment.user_id,
-                "username": current_user.username,
-                "email": current_user.email,
-                "avatar_url": current_user.avatar_url,
-                "content": comment.content,
-                "is_edited": comment.is_edited,
-                "created_at": comment.created_at.isoformat() if comment.created_at else None,
-                "updated_at": comment.updated_at.isoformat() if comment.updated_at else None
-            }
+            "comment": _comment_item(comment, current_user.username, current_user.email, current_user.avatar_url)
         }
     except Exception as e:
         await db.rollback()
         raise HTTPException(status_code=500, detail=f"Ошибка создания комментария: {str(e)}")
 
 
+def _comment_item(comment: CharacterComment, username: Optional[str], email: Optional[str], avatar_url: Optional[str]) -> dict:
+    return {
+        "id": comment.id,
+        "character_name": comment.character_name,
+        "user_id": comment.user_id,
+        "username": username,
+        "email": email,
+        "avatar_url": avatar_url,
+        "content": comment.content,
+        "is_edited": comment.is_edited,
+        "created_at": comment.created_at.isoformat() if comment.created_at else None,
+        "updated_at": comment.updated_at.isoformat() if comment.updated_at else None
+    }
+
+
+def _comment_cursor(item: dict) -> str:
+    return encode_cursor({"t": item["created_at"], "id": item["id"]})
+
+
+def _decode_comments_cursor(cursor: str) -> Tuple[datetime, int]:
+    try:
+        payload = decode_cursor(cursor)
+        return parse_cursor_datetime(payload["t"]), int(payload["id"])
+    except (ValueError, KeyError, TypeError):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+
+async def _load_comment_items(
+    db: AsyncSession,
+    character_name: str,
+    limit: int,
+    before: Optional[Tuple[datetime, int]] = None,
+) -> List[dict]:
+    """Комментарии персонажа, новые первыми, по индексу (character_name, created_at, id)."""
+    query = (
+        select(CharacterComment, Users.username, Users.email, Users.avatar_url)
+        .join(Users, CharacterComment.user_id == Users.id)
+        .where(CharacterComment.character_name == character_name)
+        .order_by(desc(CharacterComment.created_at), desc(CharacterComment.id))
+        .limit(limit)
+    )
+    if before is not None:
+        query = query.where(tuple_(CharacterComment.created_at, CharacterComment.id) < tuple_(*before))
+    result = await db.execute(query)
+    return [_comment_item(*row) for row in result.all()]
+
+
+async def _invalidate_comments_cache(character_name: str) -> None:
+    await cache_delete(key_character_comments(character_name))
+
+
 @router.get("/{character_name}")
 async def get_comments(
     character_name: str,
-    skip: int = Query(0, ge=0),
-    limit: int = Query(50, ge=1, le=100),
+    limit: int = Query(50, ge=1, le=COMMENTS_PAGE_MAX),
+    cursor: Optional[str] = Query(None, description="next_cursor из предыдущей страницы"),
     current_user: Optional[Users] = Depends(get_current_user_optional),
     db: AsyncSession = Depends(get_db)
 ):
-    """Получает список комментариев для персонажа."""
+    """
+    Получает страницу комментариев для персонажа, новые первыми.
+
+    Следующая страница запрашивается с cursor=next_cursor. Первая страница
+    (до COMMENTS_PAGE_MAX комментариев) кэшируется на TTL_CHARACTER_COMMENTS
+    и сбрасывается при создании, изменении и удалении комментария.
+    """
+    before = _decode_comments_cursor(cursor) if cursor else None
+
     try:
-        # Получаем комментарии с информацией о пользователях
-        result = await db.execute(
-            select(CharacterComment, Users.username, Users.email, Users.avatar_url)
-            .join(Users, CharacterComment.user_id == Users.id)
-            .where(CharacterComment.character_name == character_name)
-            .order_by(desc(CharacterComment.created_at))
-            .offset(skip)
-            .limit(limit)
-        )
-        
-        comments_data = result.all()
-        
+        if before is None:
+            cache_key = key_character_comments(character_name)
+            cached = await cache_get_json(cache_key)
+            if isinstance(cached, dict) and isinstance(cached.get("comments"), list):
+                first_page = cached["comments"]
+                has_more = bool(cached.get("has_more"))
+            else:
+                first_page = await _load_comment_items(db, character_name, COMMENTS_PAGE_MAX + 1)
+                has_more = len(first_page) > COMMENTS_PAGE_MAX
+                first_page = first_page[:COMMENTS_PAGE_MAX]
+                await cache_set_json(
+                    cache_key, {"comments": first_page, "has_more": has_more}, ttl_seconds=TTL_CHARACTER_COMMENTS
+                )
+            items = first_page[:limit]
+            has_more = has_more or len(first_page) > limit
+        else:
+            items = await _load_comment_items(db, character_name, limit + 1, before)
+            has_more = len(items) > limit
+            items = items[:limit]
+
         comments = []
-        for comment, username, email, avatar_url in comments_data:
+        for item in items:
             comments.append({
-                "id": comment.id,
-                "character_name": comment.character_name,
-                "user_id": comment.user_id,
-                "username": username,
-                "email": email,
-                "avatar_url": avatar_url,
-                "content": comment.content,
-                "is_edited": comment.is_edited,
-                "created_at": comment.created_at.isoformat() if comment.created_at else None,
-                "updated_at": comment.updated_at.isoformat() if comment.updated_at else None,
-                "can_edit": current_user and current_user.id == comment.user_id,
-                "can_delete": current_user and (current_user.id == comment.user_id or current_user.is_admin)
+                **item,
+                "can_edit": current_user and current_user.id == item["user_id"],
+                "can_delete": current_user and (current_user.id == item["user_id"] or current_user.is_admin)
             })
-        
-        # Получаем общее количество комментариев
+
+        # Счетчик поддерживается триггером на character_comments
         count_result = await db.execute(
-            select(func.count(CharacterComment.id))
-            .where(CharacterComment.character_name == character_name)
+            select(CharacterCommentCount.comments_count)
+            .where(CharacterCommentCount.character_name == character_name)
         )
         total_count = count_result.scalar() or 0
-        
+
         return {
             "success": True,
             "comments": comments,
             "total": total_count,
-            "skip": skip,
-            "limit": limit
+            "limit": limit,
+            "next_cursor": _comment_cursor(items[-1]) if has_more and items else None
         }
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Ошибка получения комментариев: {str(e)}")
 
@@ -173,6 +229,7 @@ async def update_comment(
         
         await db.commit()
         await db.refresh(comment)
+        await _invalidate_comments_cache(comment.character_name)
         
         return {
             "success": True,
@@ -214,8 +271,10 @@ async def delete_comment(
         if comment.user_id != current_user.id and not current_user.is_admin:
             raise HTTPException(status_code=403, detail="Вы не можете удалить этот комментарий")
         
+        character_name = comment.character_name
         await db.delete(comment)
         await db.commit()
+        await _invalidate_comments_cache(character_name)
         
         return {
             "success": True,
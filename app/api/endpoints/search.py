@@ -1,20 +1,40 @@
-from fastapi import APIRouter, Depends, HTTPException, Query
+from fastapi import APIRouter, Depends, HTTPException, Query, Response
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import select, or_, func
-from typing import List, Optional, Union
+from sqlalchemy import select, or_, and_, func, literal, literal_column, Float
+from sqlalchemy.dialects.postgresql import distinct_on
+from typing import Dict, List, Optional, Tuple, Union
 from pydantic import BaseModel
 import json
 import logging
+import re
 
-from app.database.db_depends import get_db
+from app.database.db_depends import get_db, get_read_db
 from app.chat_bot.models.models import CharacterDB, CharacterMainPhoto
 from app.models.user import Users
+from app.utils.media_urls import media_url
+from app.utils.pagination import encode_cursor, decode_cursor
 
 # Configure logger
 logger = logging.getLogger(__name__)
 
 router = APIRouter()
 
+# Выражения должны совпадать с индексами из миграции b7c8d9e0f1a2,
+# иначе Postgres не сможет использовать GIN индексы.
+CHARACTER_NAMES_SQL = (
+    "coalesce(name, '') || ' ' || coalesce(display_name, '') || ' ' || "
+    "coalesce(name_ru, '') || ' ' || coalesce(name_en, '')"
+)
+CHARACTER_SEARCH_TEXT_SQL = f"lower({CHARACTER_NAMES_SQL})"
+CHARACTER_SEARCH_VECTOR_SQL = (
+    f"setweight(to_tsvector('simple'::regconfig, {CHARACTER_NAMES_SQL}), 'A') || "
+    "setweight(to_tsvector('simple'::regconfig, coalesce(description, '')), 'B')"
+)
+
+MAX_QUERY_LENGTH = 100
+MAX_QUERY_WORDS = 8
+DESCRIPTION_PREVIEW_LENGTH = 100
+
 class SearchResult(BaseModel):
     id: Union[int, str]
     type: str  # 'character' or 'user'
@@ -25,99 +45,181 @@ class SearchResult(BaseModel):
     name_ru: Optional[str] = None
     name_en: Optional[str] = None
 
+
+def _escape_like(value: str) -> str:
+    """Экранирует спецсимволы LIKE в пользовательском вводе."""
+    return value.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+
+
+def _build_tsquery(query: str) -> Optional[str]:
+    """
+    Строит tsquery с префиксным поиском по словам запроса: "анна кор" -> "анна:* & кор:*".
+    Оставляет только буквы и цифры, поэтому ввод не может сломать синтаксис tsquery.
+    """
+    words = re.findall(r"[^\W_]+", query)[:MAX_QUERY_WORDS]
+    if not words:
+        return None
+    return " & ".join(f"{word}:*" for word in words)
+
+
+def _encode_search_cursor(score: float, character_id: int) -> str:
+    return encode_cursor({"s": score, "id": character_id})
+
+
+def _decode_search_cursor(cursor: str) -> Tuple[float, int]:
+    try:
+        payload = decode_cursor(cursor)
+        return float(payload["s"]), int(payload["id"])
+    except (ValueError, KeyError, TypeError):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+
+def _avatar_from_main_photos(main_photos: Optional[str]) -> Optional[str]:
+    """Fallback: первое фото из JSON main_photos персонажа."""
+    if not main_photos:
+        return None
+    try:
+        photos_data = json.loads(main_photos)
+    except Exception:
+        return None
+    if not isinstance(photos_data, list) or not photos_data:
+        return None
+    photo_item = photos_data[0]
+    if isinstance(photo_item, dict) and 'url' in photo_item:
+        return media_url(photo_item['url'])
+    # Строка может быть ID или URL; ID пропускаем, чтобы не отдавать битые ссылки
+    if isinstance(photo_item, str) and (photo_item.startswith('http') or photo_item.startswith('/')):
+        return media_url(photo_item)
+    return None
+
+
+async def _fetch_avatars(db: AsyncSession, character_ids: List[int]) -> Dict[int, str]:
+    """Первое главное фото для каждого персонажа одним запросом (DISTINCT ON)."""
+    if not character_ids:
+        return {}
+    stmt = (
+        select(
+            CharacterMainPhoto.character_id,
+            CharacterMainPhoto.photo_url,
+            CharacterMainPhoto.media_key,
+            CharacterMainPhoto.media_variants,
+        )
+        .where(CharacterMainPhoto.character_id.in_(character_ids))
+        .order_by(CharacterMainPhoto.character_id, CharacterMainPhoto.id)
+        .ext(distinct_on(CharacterMainPhoto.character_id))
+    )
+    rows = (await db.execute(stmt)).all()
+    return {
+        row.character_id: media_url(row.photo_url, row.media_key, "thumb", row.media_variants)
+        for row in rows
+    }
+
+
 @router.get("/", response_model=List[SearchResult])
 async def search(
+    response: Response,
     q: str = Query(..., min_length=1, description="Search query"),
     limit: int = Query(10, le=50),
-    db: AsyncSession = Depends(get_db)
+    cursor: Optional[str] = Query(None, description="Cursor from X-Next-Cursor header of the previous page"),
+    db: AsyncSession = Depends(get_read_db)
 ):
     """
     Search for characters and users.
+
+    Characters are matched by full-text (prefix) search over names and description,
+    by substring and by trigram similarity of names (typo tolerance), ranked by relevance.
+    The next page cursor is returned in the X-Next-Cursor header; users are only
+    included on the first page.
     """
-    if not q:
+    query_norm = q.strip().lower()[:MAX_QUERY_LENGTH]
+    if not query_norm:
         return []
 
-    query_str = f"%{q}%"
+    after = _decode_search_cursor(cursor) if cursor else None
+    like_pattern = f"%{_escape_like(query_norm)}%"
     results = []
-    
+
     # 1. Search Characters
     try:
-        # We also want to fetch one photo URL for each character
-        # Using a subquery might be complex with async, let's just fetch characters first
+        search_text = literal_column(CHARACTER_SEARCH_TEXT_SQL)
+        search_vector = literal_column(CHARACTER_SEARCH_VECTOR_SQL)
+        query_literal = literal(query_norm)
+
+        conditions = [
+            search_text.like(like_pattern, escape="\\"),
+            query_literal.op("<%")(search_text),
+        ]
+        score = func.word_similarity(query_literal, search_text)
+
+        tsquery_str = _build_tsquery(query_norm)
+        if tsquery_str:
+            ts_query = func.to_tsquery(literal_column("'simple'::regconfig"), tsquery_str)
+            conditions.append(search_vector.op("@@")(ts_query))
+            score = func.greatest(func.ts_rank(search_vector, ts_query), score)
+
+        score = score.cast(Float).label("score")
         stmt_chars = (
-            select(CharacterDB)
-            .where(
-                or_(
-                    CharacterDB.name.ilike(query_str),
-                    CharacterDB.display_name.ilike(query_str),
-                    CharacterDB.name_en.ilike(query_str),
-                    CharacterDB.name_ru.ilike(query_str),
-                )
+            select(
+                CharacterDB.id,
+                CharacterDB.name,
+                CharacterDB.display_name,
+                CharacterDB.name_ru,
+                CharacterDB.name_en,
+                CharacterDB.main_photos,
+                func.left(CharacterDB.description, DESCRIPTION_PREVIEW_LENGTH).label("description_preview"),
+                score,
             )
-            .limit(limit)
+            .where(or_(*conditions))
+            .order_by(score.desc(), CharacterDB.id)
+            .limit(limit + 1)
         )
-        chars = (await db.execute(stmt_chars)).scalars().all()
-        
-        for char in chars:
-            avatar_url = None
-            
-            # Try to get photo from CharacterMainPhoto table
-            stmt_photo = (
-                select(CharacterMainPhoto.photo_url)
-                .where(CharacterMainPhoto.character_id == char.id)
-                .limit(1)
+        if after:
+            after_score, after_id = after
+            stmt_chars = stmt_chars.where(
+                or_(score < after_score, and_(score == after_score, CharacterDB.id > after_id))
             )
-            photo_result = (await db.execute(stmt_photo)).scalar_one_or_none()
-            
-            if photo_result:
-                avatar_url = photo_result
-            else:
-                # Fallback to parsing main_photos json
-                if char.main_photos:
-                    try:
-                        photos_data = json.loads(char.main_photos)
-                        if isinstance(photos_data, list) and len(photos_data) > 0:
-                            photo_item = photos_data[0]
-                            # Start with simple heuristic
-                            if isinstance(photo_item, dict) and 'url' in photo_item:
-                                avatar_url = photo_item['url']
-                            elif isinstance(photo_item, str):
-                                # It might be an ID or a URL
-                                if photo_item.startswith('http') or photo_item.startswith('/'):
-                                    avatar_url = photo_item
-                                else:
-                                    # Assuming convention if it's just an ID, but let's leave it null for now to avoid broken links
-                                    pass
-                    except Exception:
-                        pass
 
+        chars = (await db.execute(stmt_chars)).all()
+        has_more = len(chars) > limit
+        chars = chars[:limit]
+        if has_more:
+            response.headers["X-Next-Cursor"] = _encode_search_cursor(chars[-1].score, chars[-1].id)
+
+        avatars = await _fetch_avatars(db, [char.id for char in chars])
+
+        for char in chars:
             results.append(SearchResult(
                 id=char.id,
                 type='character',
                 name=char.name,
                 display_name=char.display_name or char.name,
-                avatar_url=avatar_url,
-                description=char.description[:100] + '...' if char.description else None,
+                avatar_url=avatars.get(char.id) or _avatar_from_main_photos(char.main_photos),
+                description=char.description_preview + '...' if char.description_preview else None,
                 name_ru=char.name_ru,
                 name_en=char.name_en,
             ))
-            
+
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"Error searching characters: {e}")
+        # Ошибка запроса прерывает транзакцию - без отката поиск пользователей тоже упадет
+        await db.rollback()
 
     # 2. Search Users
     # Calculate remaining limit
     remaining_limit = limit - len(results)
-    
-    if remaining_limit > 0:
+
+    if remaining_limit > 0 and not cursor:
         try:
             stmt_users = (
-                select(Users)
-                .where(Users.username.ilike(query_str))
+                select(Users.id, Users.username, Users.avatar_url)
+                .where(Users.username.ilike(like_pattern, escape="\\"))
+                .order_by(func.similarity(Users.username, query_norm).desc(), Users.id)
                 .limit(remaining_limit)
             )
-            users = (await db.execute(stmt_users)).scalars().all()
-            
+            users = (await db.execute(stmt_users)).all()
+
             for user in users:
                 results.append(SearchResult(
                     id=user.id,
@@ -34,10 +34,12 @@ async def google_login(
     """Инициация входа через Google."""
     client_ip = request.client.host
     
-    if not rate_limiter.is_allowed(client_ip):
+    rate_limit = await rate_limiter.check_async(client_ip)
+    if not rate_limit.allowed:
         raise HTTPException(
             status_code=429,
-            detail="Too many requests. Please try again later."
+            detail="Too many requests. Please try again later.",
+            headers=rate_limit.headers
         )
     
     # Считываем режим (popup или redirect)
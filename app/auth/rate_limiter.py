@@ -19,6 +19,7 @@ class RateLimiter:
         self.max_requests = max_requests
         self.window_seconds = window_seconds
         self.requests: Dict[str, list] = {}
+        self._redis_limiter = None
     
     def is_allowed(self, key: str) -> bool:
         """Проверяет, разрешен ли запрос (синхронный метод для совместимости)."""
@@ -41,23 +42,51 @@ class RateLimiter:
         self.requests[key].append(now)
         return True
     
+    def _memory_result(self, key: str):
+        """Результат in-memory проверки в формате RateLimitResult."""
+        from app.utils.redis_rate_limiter import RateLimitResult
+
+        allowed = self.is_allowed(key)
+        timestamps = self.requests.get(key) or []
+        retry_after = 0.0
+        if not allowed and timestamps:
+            retry_after = max(0.0, timestamps[0] + self.window_seconds - time.time())
+        return RateLimitResult(
+            allowed=allowed,
+            limit=self.max_requests,
+            remaining=max(0, self.max_requests - len(timestamps)),
+            retry_after=retry_after,
+            reset_after=retry_after,
+        )
+
+    def _get_redis_limiter(self):
+        if self._redis_limiter is None:
+            from app.utils.redis_rate_limiter import RedisRateLimiter
+            self._redis_limiter = RedisRateLimiter(
+                max_requests=self.max_requests,
+                window_seconds=self.window_seconds
+            )
+        return self._redis_limiter
+
+    async def check_async(self, key: str):
+        """
+        Атомарная проверка через Redis с остатком квоты и Retry-After.
+        Если Redis недоступен или вернул ошибку, лимит проверяется in-memory
+        (на процесс), но не отключается.
+        """
+        from app.utils.redis_rate_limiter import RateLimiterUnavailable
+
+        try:
+            return await self._get_redis_limiter().check(key)
+        except RateLimiterUnavailable:
+            return self._memory_result(key)
+
     async def is_allowed_async(self, key: str) -> bool:
         """
         Асинхронная проверка с использованием Redis если доступен.
         Fallback на in-memory если Redis недоступен.
         """
-        try:
-            from app.utils.redis_rate_limiter import RedisRateLimiter
-            
-            # Пытаемся использовать Redis-based rate limiter
-            redis_limiter = RedisRateLimiter(
-                max_requests=self.max_requests,
-                window_seconds=self.window_seconds
-            )
-            return await redis_limiter.is_allowed(key)
-        except Exception:
-            # Fallback на in-memory
-            return self.is_allowed(key)
+        return (await self.check_async(key)).allowed
 
 
 # Глобальный экземпляр rate limiter
@@ -458,10 +458,12 @@ async def login_user(
     logger.info(f"Login attempt for email: {user_credentials.email}")
     try:
         # Rate limiting
-        if not rate_limiter.is_allowed(user_credentials.email):
+        rate_limit = await rate_limiter.check_async(user_credentials.email)
+        if not rate_limit.allowed:
             raise HTTPException(
                 status_code=429,
-                detail="Too many requests. Please try again later."
+                detail="Too many requests. Please try again later.",
+                headers=rate_limit.headers
             )
     
         # Find user
@@ -1271,10 +1273,10 @@ async def upload_avatar(
             try:
                 from app.services.yandex_storage import get_yandex_storage_service
                 service = get_yandex_storage_service()
-                # Извлекаем object_key из URL
-                # Формат: https://bucket-name.storage.yandexcloud.net/path/to/file
-                if '.storage.yandexcloud.net/' in old_cloud_url:
-                    old_object_key = old_cloud_url.split('.storage.yandexcloud.net/')[-1]
+                from app.utils.media_urls import extract_media_key
+                # Извлекаем object_key из URL (CDN, /media/ или URL бакета)
+                old_object_key = extract_media_key(old_cloud_url)
+                if old_object_key:
                     logger.info(f"[AVATAR] Удаление старого аватара из облака: {old_object_key}")
                     deleted = await service.delete_file(old_object_key)
                     if deleted:
@@ -1299,6 +1301,8 @@ async def upload_avatar(
                     "uploaded_at": datetime.now(timezone.utc).isoformat(),
                     "source": "user_avatar_upload",
                 },
+                # Одинаковые аватары хранятся одним объектом (по хэшу содержимого)
+                deduplicate=True,
             )
             logger.info(f"[OK] Аватар успешно загружен в облако: {cloud_url}")
         except Exception as upload_error:
@@ -1886,10 +1890,12 @@ async def forgot_password(
     """
     try:
         # Rate limiting
-        if not rate_limiter.is_allowed(request.email):
+        rate_limit = await rate_limiter.check_async(request.email)
+        if not rate_limit.allowed:
             raise HTTPException(
                 status_code=429,
-                detail="Too many requests. Please try again later."
+                detail="Too many requests. Please try again later.",
+                headers=rate_limit.headers
             )
         
         # Находим пользователя по email
@@ -1964,10 +1970,12 @@ async def reset_password(
     """
     try:
         # Rate limiting
-        if not rate_limiter.is_allowed(request.email):
+        rate_limit = await rate_limiter.check_async(request.email)
+        if not rate_limit.allowed:
             raise HTTPException(
                 status_code=429,
-                detail="Too many requests. Please try again later."
+                detail="Too many requests. Please try again later.",
+                headers=rate_limit.headers
             )
         
         # Находим пользователя по email
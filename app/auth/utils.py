@@ -6,7 +6,6 @@ import hashlib
 import secrets
 import random
 import string
-import asyncio
 from datetime import datetime, timezone, timedelta
 
 
@@ -40,31 +39,40 @@ def generate_verification_code() -> str:
     return ''.join(random.choices(string.digits, k=6))
 
 
+def _submit_email(message, fallback: str) -> None:
+    """
+    Ставит письмо в очередь MailDispatcher и сразу возвращает управление.
+    Повторы с задержкой идут в фоне; если доставка не удалась, выводим fallback.
+    """
+    from app.mail_service.sender import get_mail_dispatcher
+
+    def _on_done(future) -> None:
+        if future.cancelled() or future.exception() is not None or not future.result():
+            print(fallback)
+
+    get_mail_dispatcher().submit(message).add_done_callback(_on_done)
+
+
 async def send_verification_email(email: str, code: str) -> None:
     """
     Отправляет код верификации на email.
-    Обёртка вокруг синхронного EmailSender, чтобы не блокировать event loop.
+    Письмо ставится в общую очередь MailDispatcher: отправка идет пачками по
+    пулу SMTP соединений в фоне, обработчик запроса не ждет доставки и повторов.
     """
     try:
-        from app.mail_service.sender import EmailSender
+        from app.mail_service.sender import build_verification_message, smtp_config_error
         
-        def _send_email_sync():
-            """Синхронная функция для отправки email в отдельном потоке"""
-            try:
-                email_sender = EmailSender()
-                return email_sender.send_verification_email(email, code)
-            except ValueError as init_error:
-                # Если EmailSender не может быть создан (нет конфигурации), просто возвращаем False
-                print(f"EmailSender initialization failed: {init_error}")
-                print(f"Verification code {code} for {email} (email sending disabled - no config)")
-                return False
+        config_error = smtp_config_error()
+        if config_error:
+            # Нет конфигурации SMTP - просто выводим код
+            print(f"Email sending disabled: {config_error}")
+            print(f"Verification code {code} for {email} (email sending disabled - no config)")
+            return
         
-        # Выполняем отправку email в отдельном потоке, чтобы не блокировать event loop
-        # SMTP операции могут занимать время и блокировать поток
-        success = await asyncio.to_thread(_send_email_sync)
-        
-        if not success:
-            print(f"Verification code {code} for {email} (real sending disabled)")
+        _submit_email(
+            build_verification_message(email, code),
+            f"Verification code {code} for {email} (real sending disabled)",
+        )
             
     except Exception as e:
         print(f"Error sending email: {type(e).__name__}: {e}")
@@ -74,28 +82,22 @@ async def send_verification_email(email: str, code: str) -> None:
 async def send_password_reset_email(email: str, code: str) -> None:
     """
     Отправляет код восстановления пароля на email.
-    Обёртка вокруг синхронного EmailSender, чтобы не блокировать event loop.
+    Письмо ставится в общую очередь MailDispatcher, как и код верификации.
     """
     try:
-        from app.mail_service.sender import EmailSender
-        
-        def _send_email_sync():
-            """Синхронная функция для отправки email в отдельном потоке"""
-            try:
-                email_sender = EmailSender()
-                return email_sender.send_password_reset_email(email, code)
-            except ValueError as init_error:
-                # Если EmailSender не может быть создан (нет конфигурации), просто возвращаем False
-                print(f"EmailSender initialization failed: {init_error}")
-                print(f"Password reset code {code} for {email} (email sending disabled - no config)")
-                return False
+        from app.mail_service.sender import build_password_reset_message, smtp_config_error
         
-        # Выполняем отправку email в отдельном потоке, чтобы не блокировать event loop
-        success = await asyncio.to_thread(_send_email_sync)
+        config_error = smtp_config_error()
+        if config_error:
+            print(f"Email sending disabled: {config_error}")
+            print(f"Password reset code {code} for {email} (email sending disabled - no config)")
+            return
         
-        if not success:
-            print(f"Password reset code {code} for {email} (real sending disabled)")
+        _submit_email(
+            build_password_reset_message(email, code),
+            f"Password reset code {code} for {email} (real sending disabled)",
+        )
             
     except Exception as e:
         print(f"Error sending password reset email: {type(e).__name__}: {e}")
-        print(f"Password reset code {code} for {email} (email sending disabled)")
\ No newline at end of file
+        print(f"Password reset code {code} for {email} (email sending disabled)")
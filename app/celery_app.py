@@ -176,6 +176,8 @@ celery_app.conf.update(
         "app.tasks.chat_tasks.save_chat_history_async_task": {"queue": "low_priority"},
         "app.tasks.cache_tasks.clear_cache_task": {"queue": "low_priority"},
         "app.tasks.cache_tasks.clear_characters_cache_task": {"queue": "low_priority"},
+        "app.tasks.cache_tasks.prewarm_characters_cache_task": {"queue": "low_priority"},
+        "app.tasks.cache_tasks.rebuild_sitemap_task": {"queue": "low_priority"},
         "app.tasks.translation_tasks.translate_character_names_task": {"queue": "low_priority"},
     },
     
@@ -211,6 +213,16 @@ celery_app.conf.update(
             'schedule': crontab(hour=0, minute=0),  # Каждый день в 00:00 UTC
             'options': {'queue': 'low_priority'}
         },
+        'rebuild-sitemap-daily': {
+            'task': 'app.tasks.cache_tasks.rebuild_sitemap_task',
+            'schedule': crontab(hour=1, minute=0),  # Каждый день в 01:00 UTC
+            'options': {'queue': 'low_priority'}
+        },
+        'refresh-admin-stats': {
+            'task': 'app.tasks.periodic_tasks.refresh_admin_stats_task',
+            'schedule': crontab(minute='*/15'),  # Каждые 15 минут (STATS_REFRESH_MINUTES)
+            'options': {'queue': 'low_priority'}
+        },
         'cleanup-old-data-daily': {
             'task': 'app.tasks.periodic_tasks.cleanup_old_data_task',
             'schedule': crontab(hour=2, minute=0),  # Каждый день в 02:00 UTC
@@ -8,15 +8,18 @@ from sqlalchemy import select, delete, text, func
 from app.chat_bot.schemas.chat import CharacterCreate, CharacterUpdate, CharacterInDB, UserCharacterCreate, CharacterWithCreator, CreatorInfo
 from app.chat_bot.models.models import CharacterMainPhoto, FavoriteCharacter, CharacterDB, CharacterRating, ChatSession, ChatMessageDB
 from app.chat_bot.utils.character_importer import character_importer
-from app.database.db_depends import get_db
+from app.database.db_depends import get_db, get_read_db
+from app.database.read_routing import is_replica_session
 from app.auth.dependencies import get_current_user, get_current_user_optional
 from app.models.user import Users
 from app.services.coins_service import CoinsService
 from app.services.profit_activate import ProfitActivateService, emit_profile_update
+from app.services.admin_stats import record_counter_delta_after_commit
 from app.utils.redis_cache import (
-    cache_get, cache_set, cache_delete, cache_delete_pattern,
+    cache_get, cache_set, cache_delete, cache_delete_pattern, cache_exists,
     key_characters_list, key_character, key_character_photos,
     key_available_voices, key_character_ratings, key_user_favorites,
+    key_chat_history_character_pattern,
     TTL_CHARACTERS_LIST, TTL_CHARACTER, TTL_AVAILABLE_VOICES, TTL_USER_FAVORITES
 )
 import logging
@@ -30,6 +33,8 @@ import httpx
 import json
 from fastapi import BackgroundTasks
 from app.services.translation_service import translate_character_fields, detect_language, auto_translate_and_save_character
+from app.utils.media_urls import media_url
+from app.utils.pagination import encode_cursor, decode_cursor, parse_cursor_datetime
 from app.database.db import async_session_maker
 
 logger = logging.getLogger(__name__)
@@ -273,13 +278,7 @@ def _normalize_main_photos(
             continue
             
         # Нормализуем в CDN формат для совместимости с ImageGenerationHistory и избежания дубликатов
-        try:
-            from app.services.yandex_storage import get_yandex_storage_service
-            storage_service = get_yandex_storage_service()
-            photo_url = storage_service.convert_yandex_url_to_cdn(photo_url)
-        except Exception as e:
-            import logging
-            logging.getLogger(__name__).error(f"[CDN] Ошибка при конвертации URL в CDN в _normalize_main_photos: {e}")
+        photo_url = media_url(photo_url)
 
         normalized_entry = {
             "id": photo_id,
@@ -1295,7 +1294,7 @@ async def read_characters(
     skip: int = 0, 
     limit: int = 1000, 
     force_refresh: bool = Query(False, description="Принудительно обновить кэш"),
-    db: AsyncSession = Depends(get_db)
+    db: AsyncSession = Depends(get_read_db)
 ):
     """Получает список персонажей из базы данных с кэшированием."""
     import logging
@@ -1431,6 +1430,14 @@ async def read_characters(
                 logger.warning(f"Error restoring characters from cache: {cache_error}, loading from DB")
                 # Если ошибка восстановления из кэша, загружаем из БД
         
+        # Список кэшируется на TTL_CHARACTERS_LIST: заполняем кэш только с основной БД,
+        # иначе отстающая реплика закрепит в кэше устаревший список
+        if is_replica_session(db):
+            async with async_session_maker() as primary_db:
+                return await read_characters(
+                    response, skip=skip, limit=limit, force_refresh=force_refresh, db=primary_db
+                )
+        
         from app.chat_bot.models.models import CharacterDB, CharacterMainPhoto, CharacterRating, ChatSession, ChatMessageDB
         from app.models.user import Users
         from sqlalchemy import select, func
@@ -1503,7 +1510,9 @@ async def read_characters(
                         if photo.character_id not in album_previews_map:
                             album_previews_map[photo.character_id] = []
                         if len(album_previews_map[photo.character_id]) < 3:
-                            album_previews_map[photo.character_id].append(photo.photo_url)
+                            album_previews_map[photo.character_id].append(
+                                media_url(photo.photo_url, photo.media_key, "card", photo.media_variants)
+                            )
                     
                     for cid in ids_with_albums:
                         logger.debug(f"Character {cid}: count={album_counts_map.get(cid)}, previews={len(album_previews_map.get(cid, []))}")
@@ -1518,14 +1527,6 @@ async def read_characters(
             logger.error(f"Ошибка загрузки персонажей из БД: {db_error}")
             return []  # Возвращаем пустой список вместо зависания
         
-        # Функция для обработки URL (используем сервис CDN)
-        def process_url(url):
-            if not url or not isinstance(url, str):
-                return url
-            from app.services.yandex_storage import get_yandex_storage_service
-            service = get_yandex_storage_service()
-            return service.convert_yandex_url_to_cdn(url)
-
         # Преобразуем объекты CharacterDB в словари для сериализации
         # Убеждаемся, что обязательные поля присутствуют и не None
         characters_data = []
@@ -1576,7 +1577,7 @@ async def read_characters(
                 "total_messages_count": getattr(char, 'total_messages_count', 0) or 0,
                 "creator_username": username_map.get(char.id),
                 "paid_album_photos_count": album_counts_map.get(char.id, 0),
-                "paid_album_preview_urls": [process_url(u) for u in album_previews_map.get(char.id, [])],
+                "paid_album_preview_urls": album_previews_map.get(char.id, []),
                 "situation_ru": char.situation_ru,
                 "situation_en": char.situation_en,
                 "personality_ru": char.personality_ru,
@@ -1661,6 +1662,56 @@ async def read_characters(
         logger.error(f"Error loading characters from DB: {e}", exc_info=True)
         return JSONResponse(content=[])
 
+async def prewarm_characters_cache(limits: tuple = (1000,)) -> bool:
+    """
+    Прогревает кэш списка персонажей в текущем пространстве версий.
+    
+    Выполняется один раз на версию кэша: блокировка SET NX не дает нескольким
+    воркерам (или повторным рестартам) строить один и тот же список.
+    Вызывается из lifespan (CACHE_PREWARM_ON_STARTUP) или из задачи деплоя
+    до переключения трафика.
+    
+    Если список не попал в кэш (ошибка БД или Redis), блокировка снимается,
+    чтобы следующий воркер или повтор задачи деплоя выполнил прогрев.
+    
+    Returns:
+        True, если прогрев выполнен этим процессом
+    """
+    from app.utils.redis_cache import get_redis_client, key_cache_prewarm
+    
+    client = await get_redis_client()
+    if not client:
+        return False
+    lock_key = key_cache_prewarm("characters_list")
+    try:
+        acquired = await client.set(lock_key, "1", nx=True, ex=TTL_CHARACTERS_LIST)
+    except Exception as e:
+        logger.warning(f"[CACHE PREWARM] Не удалось получить блокировку прогрева: {e}")
+        return False
+    if not acquired:
+        return False
+    
+    warmed = False
+    try:
+        for limit in limits:
+            async with async_session_maker() as db:
+                await read_characters(Response(), skip=0, limit=limit, force_refresh=False, db=db)
+        # read_characters не пробрасывает ошибки, поэтому результат проверяется по кэшу
+        warmed = all([await cache_exists(f"{key_characters_list()}:0:{limit}") for limit in limits])
+    except Exception as e:
+        logger.warning(f"[CACHE PREWARM] Ошибка прогрева кэша списка персонажей: {e}")
+    
+    if not warmed:
+        logger.warning("[CACHE PREWARM] Кэш списка персонажей не прогрет, блокировка снята")
+        try:
+            await client.delete(lock_key)
+        except Exception as e:
+            logger.warning(f"[CACHE PREWARM] Не удалось снять блокировку прогрева: {e}")
+        return False
+    logger.info(f"[CACHE PREWARM] Кэш списка персонажей прогрет для limit={list(limits)}")
+    return True
+
+
 # КРИТИЧНО: Статические роуты должны быть определены ПЕРЕД параметризованными
 # чтобы избежать конфликтов маршрутизации (например, /create/ не должен перехватываться /{character_name})
 
@@ -2655,15 +2706,9 @@ async def read_character_with_creator(
         )
         album_photos = photos_result.scalars().all()
         
-        def process_url(url):
-            if not url or not isinstance(url, str): return url
-            try:
-                from app.services.yandex_storage import get_yandex_storage_service
-                service = get_yandex_storage_service()
-                return service.convert_yandex_url_to_cdn(url)
-            except: return url
-            
-        paid_album_preview_urls = [process_url(p.photo_url) for p in album_photos]
+        paid_album_preview_urls = [
+            media_url(p.photo_url, p.media_key, "card", p.media_variants) for p in album_photos
+        ]
 
         # Получаем количество сообщений
         messages_result = await db.execute(
@@ -2765,6 +2810,7 @@ async def clear_character_chat_history(
                 )
             )
             deleted_history = result_history.rowcount
+            record_counter_delta_after_commit(db, 'total_messages', -deleted_history)
             logger.info(f"Deleted {deleted_history} records from ChatHistory for user {current_user.id} and character {character_name}")
             
             # И из ImageGenerationHistory
@@ -2776,6 +2822,7 @@ async def clear_character_chat_history(
                 )
             )
             deleted_images = result_images.rowcount
+            record_counter_delta_after_commit(db, 'total_images', -deleted_images)
             logger.info(f"Deleted {deleted_images} records from ImageGenerationHistory for user {current_user.id} and character {character_name}")
             
             # Инвалидация кэша списка персонажей
@@ -3825,6 +3872,10 @@ async def update_user_character(
         await cache_delete(key_characters_list())
         await cache_delete_pattern("characters:list:*")
         await cache_delete_pattern(f"character:*")  # Очищаем все кэши персонажей
+        if new_character_name != old_character_name:
+            # История переписана на новое имя UPDATE-ом мимо ORM, последние страницы под старым именем устарели
+            await cache_delete_pattern(key_chat_history_character_pattern(old_character_name))
+            await cache_delete_pattern(key_chat_history_character_pattern(new_character_name))
         
         logger.debug(f"[UPDATE CHARACTER] кэш очищен: old='{old_character_name}', new='{new_character_name}'")
         
@@ -4094,7 +4145,9 @@ async def upload_character_photo(
                     "uploaded_at": time.strftime("%Y-%m-%d %H:%M:%S"),
                     "source": "character_manual_upload",
                 },
-                convert_to_webp=True
+                convert_to_webp=True,
+                # Повторная загрузка того же фото не создает новый объект
+                deduplicate=True
             )
         except Exception as upload_error:
             logger.error("Cloud upload error: %s", upload_error)
@@ -4537,16 +4590,81 @@ async def generate_seo_lore(
 
 
 
+CHARACTER_PHOTOS_PAGE_SIZE = 50
+CHARACTER_PHOTOS_PAGE_MAX = 200
+
+
+def _decode_photos_cursor(cursor: str):
+    try:
+        payload = decode_cursor(cursor)
+        return parse_cursor_datetime(payload["t"]), int(payload["id"])
+    except (ValueError, KeyError, TypeError):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+
+async def _load_indexed_photos(
+    character_name: str,
+    user_id: int,
+    db: AsyncSession,
+    limit: Optional[int] = None,
+    before=None,
+) -> list:
+    """Фото персонажа из индекса character_photos, новые первыми."""
+    from app.models.character_photo import CharacterPhoto
+    from sqlalchemy import tuple_
+
+    query = (
+        select(CharacterPhoto)
+        .where(
+            CharacterPhoto.character_key == func.lower(func.trim(character_name)),
+            CharacterPhoto.user_id == user_id,
+        )
+        .order_by(CharacterPhoto.created_at.desc(), CharacterPhoto.id.desc())
+    )
+    if before is not None:
+        query = query.where(tuple_(CharacterPhoto.created_at, CharacterPhoto.id) < tuple_(*before))
+    if limit is not None:
+        query = query.limit(limit)
+    return (await db.execute(query)).scalars().all()
+
+
+def _indexed_photo_entry(row, main_ids: set, main_urls: set) -> dict:
+    # Конвертируем старые URL Яндекс.Бакета в новые через прокси
+    photo_url = YandexCloudStorageService.convert_yandex_url_to_proxy(row.image_url)
+    photo_id = _derive_photo_id(photo_url)
+    return {
+        "id": photo_id,
+        "url": photo_url,
+        "prompt": row.prompt,
+        "is_main": (photo_id in main_ids) or (photo_url in main_urls),
+        "created_at": row.created_at.isoformat() if row.created_at else None,
+        "generation_time": float(row.generation_time) if row.generation_time is not None else None,
+    }
+
+
 @router.get("/{character_name}/photos/")
 async def get_character_photos(
     character_name: str,
+    limit: Optional[int] = Query(None, ge=1, le=CHARACTER_PHOTOS_PAGE_MAX),
+    cursor: Optional[str] = Query(None, description="next_cursor из предыдущей страницы"),
     db: AsyncSession = Depends(get_db),
     current_user = Depends(get_current_user_optional)
 ):
-    """Получает все фото персонажа."""
+    """
+    Получает фото персонажа.
+
+    Без limit и cursor возвращает полный список: платный альбом, сгенерированные
+    создателем фото из индекса character_photos и главные фото.
+    Если указан limit или cursor, возвращается страница сгенерированных фото
+    {"photos": [...], "next_cursor": ...}; next_cursor передается обратно в cursor.
+    """
     from app.chat_bot.models.models import CharacterDB
     from sqlalchemy import select
-    
+
+    before = _decode_photos_cursor(cursor) if cursor else None
+    paged = limit is not None or before is not None
+    empty_result = {"photos": [], "next_cursor": None} if paged else []
+
     try:
         # Декодируем имя
         decoded_name = unquote(character_name)
@@ -4569,26 +4687,19 @@ async def get_character_photos(
         # Это предотвращает ошибки при переименовании персонажа, когда фронтенд еще использует старое имя
         if not character:
             logger.debug(f"Character '{decoded_name}' not found, returning empty photos array (no 404 error)")
-            return []
+            return empty_result
     except Exception as e:
         # В случае любой ошибки при поиске персонажа, возвращаем пустой массив вместо ошибки
         logger.debug(f"Error searching for character '{character_name}': {e}, returning empty photos array")
-        return []
+        return empty_result
     
     try:
-        
-        # Проверяем права доступа (только создатель или админ, или если пользователь не авторизован - показываем только публичные фото)
-        if current_user and not current_user.is_admin and character.user_id != current_user.id:
-            # Вместо 403, для чужих персонажей возвращаем только публичные фото
-            # (если такая логика предполагается) или пустой список
-            pass 
-        
         # BEST PRACTICE: Используем актуальное имя персонажа (character.name) вместо decoded_name (которое может быть старым)
         # и character.id для всех операций, так как ID не меняется при переименовании
         actual_character_name = character.name
-        
-        # Загружаем метаданные фотографий платного альбома по ID персонажа (более надежно)
-        metadata_entries = await _load_photo_metadata(actual_character_name, db)
+        # ВАЖНО: Показываем фотографии создателя персонажа, а не текущего пользователя
+        owner_user_id = character.user_id
+
         # Используем актуальное имя для парсинга главных фото
         main_entries = _parse_stored_main_photos(actual_character_name, character.main_photos)
 
@@ -4601,227 +4712,35 @@ async def get_character_photos(
                     main_entries.append(entry)
                     existing_pairs.add(pair)
 
-        # Загружаем фото из ChatHistory для этого персонажа
-        # ВАЖНО: Загружаем фотографии создателя персонажа, а не текущего пользователя
-        chat_history_photos: list[dict] = []
-        # Используем user_id создателя персонажа для загрузки фотографий
-        owner_user_id = character.user_id
-        try:
-            # Используем raw SQL чтобы избежать проблем с полем generation_time
-            from sqlalchemy import text
-            
-            # Загружаем фото где character_name точно совпадает и user_id = создатель персонажа
-            query = text("""
-                SELECT id, user_id, character_name, image_url, message_content, created_at, generation_time
-                    FROM chat_history
-                    WHERE character_name = :character_name 
-                      AND user_id = :user_id 
-                      AND image_url IS NOT NULL 
-                      AND image_url != ''
-                    ORDER BY created_at DESC
-                """)
-            result = await db.execute(query, {
-                "character_name": actual_character_name,
-                "user_id": owner_user_id
-            })
-            rows = result.fetchall()
-            logger.info(f"Found {len(rows)} photos in ChatHistory for character {actual_character_name}, owner user_id={owner_user_id}")
-            
-            # Также загружаем фото где character_name может быть NULL или пустым
-            try:
-                query_all = text("""
-                SELECT id, user_id, character_name, image_url, message_content, created_at, generation_time
-                    FROM chat_history
-                    WHERE user_id = :user_id 
-                      AND image_url IS NOT NULL 
-                      AND image_url != ''
-                      AND (character_name IS NULL OR character_name = '')
-                    ORDER BY created_at DESC
-                    LIMIT 100
-                """)
-                result_all = await db.execute(query_all, {"user_id": owner_user_id})
-                rows_all = result_all.fetchall()
-                logger.info(f"Found {len(rows_all)} photos in ChatHistory without character_name for owner user_id={owner_user_id}")
-                rows = list(rows) + list(rows_all)
-            except Exception as e2:
-                logger.warning(f"Error loading photos without character_name from ChatHistory: {e2}")
-            
-            for row in rows:
-                image_url = row.image_url if hasattr(row, 'image_url') else row[3]
-                message_content = row.message_content if hasattr(row, 'message_content') else (row[4] if len(row) > 4 else None)
-                created_at = row.created_at if hasattr(row, 'created_at') else (row[5] if len(row) > 5 else row[4])
-                generation_time = getattr(row, 'generation_time', None)
-                if generation_time is None and not hasattr(row, 'generation_time') and len(row) > 6:
-                    generation_time = row[6]
-                # Преобразуем в float, если это число
-                if generation_time is not None:
-                    try:
-                        generation_time = float(generation_time) if generation_time else None
-                    except (ValueError, TypeError):
-                        generation_time = None
-                
-                if image_url:
-                    # Конвертируем старые URL Яндекс.Бакета в новые через прокси
-                    image_url = YandexCloudStorageService.convert_yandex_url_to_proxy(image_url)
-                    photo_id = _derive_photo_id(image_url)
-                    # Проверяем, нет ли уже этого фото
-                    if not any(p["url"] == image_url for p in chat_history_photos):
-                        chat_history_photos.append({
-                            "id": photo_id,
-                            "url": image_url,
-                            "prompt": message_content if message_content and message_content != "Генерация изображения" else None,
-                            "generation_time": generation_time,
-                            "created_at": created_at.isoformat() + "Z" if created_at else None
-                        })
-            logger.info(f"Total unique photos from ChatHistory: {len(chat_history_photos)}")
-        except Exception as e:
-            logger.warning(f"Error loading photos from ChatHistory for character {character_name}: {e}")
-            import traceback
-            logger.warning(f"Traceback: {traceback.format_exc()}")
-            
-        # Также загружаем фото из UserGallery для этого персонажа (создателя)
-        # Используем raw SQL чтобы избежать проблем с транзакциями и async контекстом
-        try:
-            from sqlalchemy import text
-            
-            query_gallery = text("""
-            SELECT id, user_id, character_name, image_url, created_at
-            FROM user_gallery
-            WHERE user_id = :user_id 
-              AND LOWER(character_name) = LOWER(:character_name) 
-              AND image_url IS NOT NULL 
-              AND image_url != ''
-            ORDER BY created_at DESC
-            """)
-            result_gallery = await db.execute(query_gallery, {
-                "user_id": owner_user_id,
-                "character_name": actual_character_name
-            })
-            rows_gallery = result_gallery.fetchall()
-            logger.info(f"Found {len(rows_gallery)} photos in UserGallery for character {character_name}, owner user_id={owner_user_id}")
-            
-            for row in rows_gallery:
-                image_url = row.image_url if hasattr(row, 'image_url') else row[3]
-                created_at = row.created_at if hasattr(row, 'created_at') else row[4]
-                
-                if image_url:
-                    # Конвертируем старые URL Яндекс.Бакета в новые через прокси
-                    image_url = YandexCloudStorageService.convert_yandex_url_to_proxy(image_url)
-                    photo_id = _derive_photo_id(image_url)
-                    # Проверяем, нет ли уже этого фото в chat_history_photos
-                    if not any(p["url"] == image_url for p in chat_history_photos):
-                        chat_history_photos.append({
-                            "id": photo_id,
-                            "url": image_url,
-                            "created_at": created_at.isoformat() + "Z" if created_at else None,
-                            "generation_time": None  # UserGallery не хранит generation_time
-                            })
-        except Exception as e:
-            logger.warning(f"Error loading photos from UserGallery for character {character_name}: {e}")
-            import traceback
-            logger.warning(f"Traceback: {traceback.format_exc()}")
-        
-        # Также загружаем фото напрямую из ImageGenerationHistory для создателя персонажа
-        try:
-            from app.models.image_generation_history import ImageGenerationHistory
-            
-            image_history_query = select(ImageGenerationHistory).where(
-                ImageGenerationHistory.user_id == owner_user_id,
-                ImageGenerationHistory.character_name.ilike(actual_character_name),
-                ImageGenerationHistory.image_url.isnot(None),
-                ImageGenerationHistory.image_url != '',
-                ~ImageGenerationHistory.image_url.like('pending:%')
-            ).order_by(ImageGenerationHistory.created_at.desc())
-            
-            image_history_result = await db.execute(image_history_query)
-            image_history_rows = image_history_result.scalars().all()
-            logger.info(f"Found {len(image_history_rows)} photos in ImageGenerationHistory for character {character_name}, owner user_id={owner_user_id}")
-            
-            for row in image_history_rows:
-                if row.image_url:
-                    # Нормализуем URL
-                    normalized_url = row.image_url.split('?')[0].split('#')[0]
-                    # Конвертируем старые URL Яндекс.Бакета в новые через прокси
-                    normalized_url = YandexCloudStorageService.convert_yandex_url_to_proxy(normalized_url)
-                    photo_id = _derive_photo_id(normalized_url)
-                    
-                    # Проверяем, нет ли уже этого фото
-                    if not any(p["url"] == normalized_url or p["url"] == row.image_url for p in chat_history_photos):
-                        chat_history_photos.append({
-                            "id": photo_id,
-                            "url": normalized_url,
-                            "prompt": row.prompt if row.prompt and row.prompt != "Генерация изображения" else None,
-                            "generation_time": row.generation_time,
-                            "created_at": row.created_at.isoformat() + "Z" if row.created_at else None
-                        })
-            
-            logger.info(f"Total unique photos after adding ImageGenerationHistory: {len(chat_history_photos)}")
-        except Exception as e:
-            logger.warning(f"Error loading photos from ImageGenerationHistory for character {character_name}: {e}")
-            import traceback
-            logger.warning(f"Traceback: {traceback.format_exc()}")
+        main_ids = {entry["id"] for entry in main_entries}
+        main_urls = {entry["url"] for entry in main_entries}
 
-        # Загружаем промпты и время генерации из ImageGenerationHistory для ВСЕХ собранных фотографий
-        prompts_map = {}
-        try:
-            from app.models.image_generation_history import ImageGenerationHistory
-            
-            # Загружаем ВСЕ записи ImageGenerationHistory для создателя персонажа
-            # ВАЖНО: загружаем для ВСЕХ пользователей, которые создавали фото для этого персонажа
-            # Но сначала пробуем для owner_user_id
-            prompts_query = select(ImageGenerationHistory).where(
-                ImageGenerationHistory.character_name.ilike(actual_character_name)
+        if paged:
+            page_size = limit or CHARACTER_PHOTOS_PAGE_SIZE
+            rows = await _load_indexed_photos(
+                actual_character_name, owner_user_id, db, limit=page_size + 1, before=before
             )
-            prompts_result = await db.execute(prompts_query)
-            prompts_rows = prompts_result.scalars().all()
-            logger.info(f"Loaded {len(prompts_rows)} ImageGenerationHistory records for character {actual_character_name}")
-            
-            # Создаем словарь для быстрого поиска промптов и времени генерации по нормализованному URL
-            for row in prompts_rows:
-                if row.image_url:
-                    # КРИТИЧНО: Конвертируем в прокси формат для корректного сопоставления
-                    proxy_url = YandexCloudStorageService.convert_yandex_url_to_proxy(row.image_url)
-                    normalized_url = proxy_url.split('?')[0].split('#')[0]
-                    # Преобразуем generation_time в float, если оно есть
-                    gen_time = row.generation_time
-                    if gen_time is not None:
-                        try:
-                            gen_time = float(gen_time) if gen_time is not None else None
-                        except (ValueError, TypeError):
-                            gen_time = None
-                    prompts_map[normalized_url] = {
-                        "prompt": row.prompt,
-                        "generation_time": gen_time
-                    }
-            
-            if chat_history_photos:
-                # Обновляем промпты и время генерации в chat_history_photos
-                # ПРИОРИТЕТ: используем generation_time из ImageGenerationHistory, если оно есть
-                for photo in chat_history_photos:
-                    normalized_url = photo["url"].split('?')[0].split('#')[0]
-                    if normalized_url in prompts_map:
-                        if not photo.get("prompt"):
-                            photo["prompt"] = prompts_map[normalized_url]["prompt"]
-                        # Всегда используем generation_time из ImageGenerationHistory, если оно есть
-                        # Это гарантирует, что время с страницы создания будет отображаться на странице редактирования
-                        map_gen_time = prompts_map[normalized_url].get("generation_time")
-                        if map_gen_time is not None:
-                            # Преобразуем в float, если нужно
-                            try:
-                                photo["generation_time"] = float(map_gen_time) if map_gen_time is not None else None
-                                logger.debug(f"Updated photo generation_time from ImageGenerationHistory: {photo['url'][:50]}... -> {photo['generation_time']}")
-                            except (ValueError, TypeError):
-                                photo["generation_time"] = map_gen_time
-                        # Если в ImageGenerationHistory нет, оставляем то, что есть в chat_history
-                        elif photo.get("generation_time") is None:
-                            logger.debug(f"Photo {photo['url'][:50]}... has no generation_time in ImageGenerationHistory or chat_history")
-                            
-                logger.info(f"Enriched {len(chat_history_photos)} photos with data from ImageGenerationHistory")
-        except Exception as e:
-            logger.warning(f"Error enriching photos from ImageGenerationHistory: {e}")
+            has_more = len(rows) > page_size
+            rows = rows[:page_size]
+            return {
+                "photos": [_indexed_photo_entry(row, main_ids, main_urls) for row in rows],
+                "next_cursor": encode_cursor({"t": rows[-1].created_at, "id": rows[-1].id}) if has_more else None,
+            }
 
-        main_ids = {entry["id"] for entry in main_entries}
-        main_urls = {entry["url"] for entry in main_entries}
+        # Загружаем метаданные фотографий платного альбома по ID персонажа (более надежно)
+        metadata_entries = await _load_photo_metadata(actual_character_name, db)
+
+        # Сгенерированные фото (chat_history, user_gallery, image_generation_history) уже
+        # объединены и дедуплицированы по URL в индексе character_photos
+        indexed_photos = [
+            _indexed_photo_entry(row, main_ids, main_urls)
+            for row in await _load_indexed_photos(actual_character_name, owner_user_id, db)
+        ]
+        generation_times = {
+            photo["url"]: photo["generation_time"]
+            for photo in indexed_photos
+            if photo["generation_time"] is not None
+        }
 
         photos: list[dict] = []
         seen_urls = set()
@@ -4835,20 +4754,13 @@ async def get_character_photos(
             # Конвертируем старые URL Яндекс.Бакета в новые через прокси
             photo_url = YandexCloudStorageService.convert_yandex_url_to_proxy(photo_url)
             seen_urls.add(photo_url)
-            
-            # Пытаемся найти время генерации в prompts_map (ПРИОРИТЕТ: ImageGenerationHistory)
-            # Сначала проверяем prompts_map, так как там более актуальные данные
+
+            # ПРИОРИТЕТ: время генерации из индекса, затем из метаданных
             normalized_url = photo_url.split('?')[0].split('#')[0]
-            gen_time = None
-            if normalized_url in prompts_map:
-                gen_time = prompts_map[normalized_url].get("generation_time")
-            # Если в prompts_map нет, используем из entry
-            if gen_time is None:
-                gen_time = entry.get("generation_time")
-            # Преобразуем в float, если это число
+            gen_time = generation_times.get(normalized_url, entry.get("generation_time"))
             if gen_time is not None:
                 try:
-                    gen_time = float(gen_time) if gen_time is not None else None
+                    gen_time = float(gen_time)
                 except (ValueError, TypeError):
                     gen_time = None
             
@@ -4862,42 +4774,12 @@ async def get_character_photos(
                 }
             )
 
-        # Добавляем фото из ChatHistory
-        for entry in chat_history_photos:
-            photo_id = entry.get("id") or _derive_photo_id(entry.get("url", ""))
-            photo_url = entry.get("url")
-            if not photo_url or photo_url in seen_urls:
+        # Добавляем сгенерированные фото
+        for photo in indexed_photos:
+            if photo["url"] in seen_urls:
                 continue
-            # Конвертируем старые URL Яндекс.Бакета в новые через прокси
-            photo_url = YandexCloudStorageService.convert_yandex_url_to_proxy(photo_url)
-            seen_urls.add(photo_url)
-            
-            # Пытаемся найти время генерации в prompts_map (ПРИОРИТЕТ: ImageGenerationHistory)
-            # Сначала проверяем prompts_map, так как там более актуальные данные
-            normalized_url = photo_url.split('?')[0].split('#')[0]
-            gen_time = None
-            if normalized_url in prompts_map:
-                gen_time = prompts_map[normalized_url].get("generation_time")
-            # Если в prompts_map нет, используем из entry
-            if gen_time is None:
-                gen_time = entry.get("generation_time")
-            # Преобразуем в float, если это число
-            if gen_time is not None:
-                try:
-                    gen_time = float(gen_time) if gen_time is not None else None
-                except (ValueError, TypeError):
-                    gen_time = None
-            
-            photos.append(
-                {
-                    "id": photo_id,
-                    "url": photo_url,
-                    "prompt": entry.get("prompt"),
-                    "is_main": (photo_id in main_ids) or (photo_url in main_urls),
-                    "created_at": entry.get("created_at"),
-                    "generation_time": gen_time,
-                }
-            )
+            seen_urls.add(photo["url"])
+            photos.append(photo)
 
         # Добавляем главные фото, если их еще нет
         for entry in main_entries:
@@ -4907,20 +4789,13 @@ async def get_character_photos(
             # Конвертируем старые URL Яндекс.Бакета в новые через прокси
             entry_url = YandexCloudStorageService.convert_yandex_url_to_proxy(entry_url)
             seen_urls.add(entry_url)
-            
-            # Пытаемся найти время генерации в prompts_map (ПРИОРИТЕТ: ImageGenerationHistory)
-            # Сначала проверяем prompts_map, так как там более актуальные данные
+
+            # ПРИОРИТЕТ: время генерации из индекса, затем из записи главного фото
             normalized_url = entry_url.split('?')[0].split('#')[0]
-            gen_time = None
-            if normalized_url in prompts_map:
-                gen_time = prompts_map[normalized_url].get("generation_time")
-            # Если в prompts_map нет, используем из entry
-            if gen_time is None:
-                gen_time = entry.get("generation_time")
-            # Преобразуем в float, если это число
+            gen_time = generation_times.get(normalized_url, entry.get("generation_time"))
             if gen_time is not None:
                 try:
-                    gen_time = float(gen_time) if gen_time is not None else None
+                    gen_time = float(gen_time)
                 except (ValueError, TypeError):
                     gen_time = None
             
@@ -4935,30 +4810,18 @@ async def get_character_photos(
             )
 
         photos.sort(key=lambda item: item.get("created_at") or "", reverse=True)
-        
-        # Убеждаемся, что generation_time всегда присутствует в каждом фото (даже если None)
-        for photo in photos:
-            if "generation_time" not in photo:
-                photo["generation_time"] = None
-        
-        logger.info(f"Returning {len(photos)} photos for character {character_name}")
-        logger.info(f"Photos breakdown: {len(metadata_entries)} from metadata, {len(chat_history_photos)} from ChatHistory/UserGallery, {len(main_entries)} main photos")
-        logger.info(f"Total unique photos after deduplication: {len(photos)}")
-        if photos:
-            logger.info(f"First photo example: {photos[0]}")
-            logger.info(f"Last photo example: {photos[-1]}")
-            # Логируем generation_time для первых нескольких фото для отладки
-            for i, photo in enumerate(photos[:3]):
-                logger.info(f"Photo {i} generation_time: {photo.get('generation_time')}, URL: {photo.get('url', '')[:50]}...")
-        else:
-            logger.warning(f"No photos found for character {character_name}, user {current_user.id if current_user else 'anonymous'}")
+
+        logger.info(
+            f"Returning {len(photos)} photos for character {character_name}: "
+            f"{len(metadata_entries)} from metadata, {len(indexed_photos)} from index, {len(main_entries)} main photos"
+        )
         return photos
         
     except HTTPException as http_ex:
         # Если это 404 для персонажа, возвращаем пустой массив вместо ошибки
         if http_ex.status_code == 404 and "Character" in str(http_ex.detail):
             logger.debug(f"Character not found (404), returning empty photos array: {http_ex.detail}")
-            return []
+            return empty_result
         # Для других HTTPException пробрасываем как обычно
         raise
     except Exception as e:
@@ -4967,7 +4830,7 @@ async def get_character_photos(
         logger.warning(f"Error getting photos for character '{character_name}': {e}, returning empty array")
         import traceback
         logger.debug(f"Traceback: {traceback.format_exc()}")
-        return []
+        return empty_result
 
 
 @router.post("/set-main-photos/")
@@ -5234,7 +5097,9 @@ async def upload_image_file(
                 "character_name": character_name or "",
                 "is_paid_album": is_paid_album
             },
-            convert_to_webp=True
+            convert_to_webp=True,
+            # Одно и то же фото в нескольких альбомах хранится одним объектом
+            deduplicate=True
         )
         
         # Генерируем photo_id для ответа
@@ -1,10 +1,12 @@
 """
 SQLAlchemy models for chatbot.
 """
-from sqlalchemy import Column, Integer, String, JSON, DateTime, Text, TypeDecorator, ForeignKey, UniqueConstraint, Boolean, event
+from sqlalchemy import Column, Integer, String, JSON, DateTime, Text, TypeDecorator, ForeignKey, UniqueConstraint, Boolean, Index, event, text
 from sqlalchemy.sql import func
-from sqlalchemy.orm import relationship
+from sqlalchemy.orm import object_session, relationship
 from app.database.db import Base
+from app.database.commit_hooks import run_after_commit
+from app.utils.media_urls import fill_media_key, schedule_media_variants_fill
 from slugify import slugify
 import json
 from typing import Optional
@@ -128,6 +130,10 @@ class CharacterDB(Base):
         return None
 
 
+# Триггеры user_conversations ищут персонажа по lower(trim(name)) на каждую вставку сообщения
+Index("ix_characters_name_key", func.lower(func.trim(CharacterDB.name)))
+
+
 
 @event.listens_for(CharacterAvailableTag, 'before_insert')
 @event.listens_for(CharacterAvailableTag, 'before_update')
@@ -165,6 +171,8 @@ class CharacterMainPhoto(Base):
     character_id = Column(Integer, ForeignKey("characters.id", ondelete="CASCADE"), nullable=False, index=True)
     photo_id = Column(String(255), nullable=False)
     photo_url = Column(UTF8Text, nullable=False)
+    media_key = Column(String(500), nullable=True)  # Ключ объекта в бакете (см. app.utils.media_urls)
+    media_variants = Column(String(64), nullable=True)  # Доступные варианты: "card,full,thumb"
     created_at = Column(DateTime(timezone=True), server_default=func.now())
 
 
@@ -180,12 +188,102 @@ class PaidAlbumPhoto(Base):
     character_id = Column(Integer, ForeignKey("characters.id", ondelete="CASCADE"), nullable=False, index=True)
     photo_id = Column(String(255), nullable=False)
     photo_url = Column(UTF8Text, nullable=False)
+    media_key = Column(String(500), nullable=True)  # Ключ объекта в бакете (см. app.utils.media_urls)
+    media_variants = Column(String(64), nullable=True)  # Доступные варианты: "card,full,thumb"
     prompt = Column(UTF8Text, nullable=True)
     created_at = Column(DateTime(timezone=True), server_default=func.now())
 
+
+@event.listens_for(CharacterMainPhoto, 'before_insert')
+@event.listens_for(CharacterMainPhoto, 'before_update')
+@event.listens_for(PaidAlbumPhoto, 'before_insert')
+@event.listens_for(PaidAlbumPhoto, 'before_update')
+def receive_photo_before_insert_update(mapper, connection, target):
+    fill_media_key(target, 'photo_url')
+
+
+@event.listens_for(CharacterMainPhoto, 'after_insert')
+@event.listens_for(CharacterMainPhoto, 'after_update')
+@event.listens_for(PaidAlbumPhoto, 'after_insert')
+@event.listens_for(PaidAlbumPhoto, 'after_update')
+def receive_photo_after_insert_update(mapper, connection, target):
+    schedule_media_variants_fill(target)
+
+
+@event.listens_for(CharacterDB, 'after_insert')
+@event.listens_for(CharacterDB, 'after_delete')
+@event.listens_for(CharacterAvailableTag, 'after_insert')
+@event.listens_for(CharacterAvailableTag, 'after_delete')
+def receive_character_sitemap_change(mapper, connection, target):
+    # В sitemap попадают только ID персонажей и slug тегов, правки остальных полей его не меняют
+    from app.services.sitemap_service import request_sitemap_rebuild
+    run_after_commit(target, "sitemap_rebuild", request_sitemap_rebuild)
+
+
+@event.listens_for(CharacterDB, 'after_insert')
+def receive_character_stats_insert(mapper, connection, target):
+    from app.services.admin_stats import record_counter_delta_after_commit
+    record_counter_delta_after_commit(object_session(target), 'total_characters', 1)
+
+
+@event.listens_for(CharacterDB, 'after_delete')
+def receive_character_stats_delete(mapper, connection, target):
+    from app.services.admin_stats import record_counter_delta_after_commit
+    record_counter_delta_after_commit(object_session(target), 'total_characters', -1)
+
+
+# Поля, из которых собирается SEO-страница персонажа и словарь slug/имен
+SEO_PAGE_FIELDS = (
+    'slug', 'name', 'display_name', 'name_ru', 'name_en', 'description',
+    'seo_lore_ru', 'seo_lore_en', 'seo_lore_image_url',
+    'appearance_ru', 'appearance_en', 'location_ru', 'location_en',
+)
+
+
+def _invalidate_seo_page_after_commit(target):
+    # Сброс до коммита позволил бы параллельному запросу собрать страницу из старых данных
+    from functools import partial
+    from app.services.seo_pages import request_character_page_invalidation
+    run_after_commit(target, ("seo_page", target.id), partial(request_character_page_invalidation, target.id))
+
+
+@event.listens_for(CharacterDB, 'after_insert')
+@event.listens_for(CharacterDB, 'after_delete')
+def receive_character_seo_page_change(mapper, connection, target):
+    _invalidate_seo_page_after_commit(target)
+
+
+@event.listens_for(CharacterDB, 'after_update')
+def receive_character_seo_page_update(mapper, connection, target):
+    from sqlalchemy import inspect as sa_inspect
+    attrs = sa_inspect(target).attrs
+    if not any(attrs[field].history.has_changes() for field in SEO_PAGE_FIELDS):
+        return
+    _invalidate_seo_page_after_commit(target)
+
+
+@event.listens_for(CharacterAvailableTag, 'after_update')
+def receive_tag_slug_update(mapper, connection, target):
+    from sqlalchemy import inspect as sa_inspect
+    if not sa_inspect(target).attrs.slug.history.has_changes():
+        return
+    from app.services.sitemap_service import request_sitemap_rebuild
+    run_after_commit(target, "sitemap_rebuild", request_sitemap_rebuild)
+
+
 class ChatSession(Base):
     """Chat session: one user/character and series of messages."""
     __tablename__ = "chat_sessions"
+    __table_args__ = (
+        # Последняя сессия пользователя с персонажем (order_by started_at desc limit 1)
+        Index("ix_chat_sessions_user_character_started", "user_id", "character_id", "started_at"),
+        # То же для гостевых сессий (user_id IS NULL)
+        Index(
+            "ix_chat_sessions_guest_character_started",
+            "character_id", "started_at",
+            postgresql_where=text("user_id IS NULL"),
+        ),
+    )
 
     id = Column(Integer, primary_key=True, index=True)
     character_id = Column(Integer, ForeignKey("characters.id", ondelete="CASCADE"), nullable=False, index=True)
@@ -200,6 +298,10 @@ class ChatSession(Base):
 class ChatMessageDB(Base):
     """Сообщение чата, привязанное к сессии."""
     __tablename__ = "chat_messages"
+    __table_args__ = (
+        # Сообщения сессии по времени: история и контекст для модели
+        Index("ix_chat_messages_session_timestamp", "session_id", "timestamp", "id"),
+    )
 
     id = Column(Integer, primary_key=True, index=True)
     session_id = Column(Integer, ForeignKey("chat_sessions.id"), nullable=False, index=True)
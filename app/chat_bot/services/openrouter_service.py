@@ -6,6 +6,7 @@
 """
 
 import os
+import time
 import aiohttp
 import json
 from typing import Optional, Dict, List, AsyncGenerator, Tuple
@@ -14,6 +15,7 @@ from app.chat_bot.config.cydonia_config import get_cydonia_overrides
 from app.chat_bot.config.deepseek_config import get_deepseek_overrides
 from app.models.subscription import SubscriptionType
 from app.utils.logger import logger
+from app.utils.metrics import observe_openrouter_first_token, observe_openrouter_request
 from datetime import datetime
 
 
@@ -327,15 +329,11 @@ class OpenRouterService:
                 payload["stop"] = kwargs["stop"]
             
             logger.info(
-                f"\n{'='*80}\n"
-                f"[API ЗАПРОС] 🚀 Отправка в OpenRouter:\n"
-                f"  ├─ Модель: {model_to_use}\n"
-                f"  ├─ Сообщений: {len(formatted_messages)} шт.\n"
-                f"  ├─ Max tokens (ответ): {max_tokens}\n"
-                f"  └─ Подписка: {subscription_type.value if subscription_type else 'FREE'}\n"
-                f"{'='*80}"
+                f"[API ЗАПРОС] model={model_to_use} messages={len(formatted_messages)} "
+                f"max_tokens={max_tokens} subscription={subscription_type.value if subscription_type else 'FREE'}"
             )
             
+            request_started = time.perf_counter()
             async with session.post(
                 f"{self.base_url}/chat/completions",
                 headers=headers,
@@ -343,6 +341,7 @@ class OpenRouterService:
             ) as response:
                 if response.status == 200:
                     result = await response.json()
+                    observe_openrouter_request(model_to_use, "complete", "ok", time.perf_counter() - request_started)
                     
                     # Извлекаем данные из ответа
                     model_used = result.get("model", "unknown")
@@ -358,13 +357,8 @@ class OpenRouterService:
                         
                         if generated_text:
                             logger.info(
-                                f"\n{'='*80}\n"
-                                f"[API ОТВЕТ] ✅ Получен ответ от {model_used}:\n"
-                                f"  ├─ Длина ответа: {len(generated_text)} символов\n"
-                                f"  ├─ Input tokens: {input_tokens}\n"
-                                f"  ├─ Output tokens: {output_tokens}\n"
-                                f"  └─ ИТОГО: {total_tokens} токенов\n"
-                                f"{'='*80}"
+                                f"[API ОТВЕТ] model={model_used} chars={len(generated_text)} "
+                                f"input_tokens={input_tokens} output_tokens={output_tokens} total_tokens={total_tokens}"
                             )
                             return generated_text.strip()
                         else:
@@ -376,6 +370,7 @@ class OpenRouterService:
                 else:
                     error_text = await response.text()
                     logger.error(f"[OPENROUTER] HTTP error during generation: {response.status}, response: {error_text}")
+                    observe_openrouter_request(model_to_use, "complete", "http_error", time.perf_counter() - request_started)
                     
                     # Проверяем, является ли это ошибкой подключения
                     if response.status in [503, 502, 504]:
@@ -609,15 +604,11 @@ class OpenRouterService:
                 payload["stop"] = kwargs["stop"]
             
             logger.info(
-                f"\n{'='*80}\n"
-                f"[API STREAM] 🚀 Начало стриминга:\n"
-                f"  ├─ Модель: {model_to_use}\n"
-                f"  ├─ Сообщений: {len(formatted_messages)} шт.\n"
-                f"  ├─ Max tokens (ответ): {max_tokens}\n"
-                f"  └─ Подписка: {subscription_type.value if subscription_type else 'FREE'}\n"
-                f"{'='*80}"
+                f"[API STREAM] start model={model_to_use} messages={len(formatted_messages)} "
+                f"max_tokens={max_tokens} subscription={subscription_type.value if subscription_type else 'FREE'}"
             )
             
+            request_started = time.perf_counter()
             async with session.post(
                 f"{self.base_url}/chat/completions",
                 headers=headers,
@@ -626,6 +617,7 @@ class OpenRouterService:
                 if response.status != 200:
                     error_text = await response.text()
                     logger.error(f"[OPENROUTER STREAM] HTTP error: {response.status}, response: {error_text}")
+                    observe_openrouter_request(model_to_use, "stream", "http_error", time.perf_counter() - request_started)
                     yield json.dumps({"error": f"HTTP {response.status}: {error_text}"})
                     return
                 
@@ -669,13 +661,10 @@ class OpenRouterService:
                                     total_tokens = stream_total_chars // 4  # Fallback estimate
                                 
                                 logger.info(
-                                    f"\n{'='*80}\n"
-                                    f"[API STREAM] ✅ Стриминг завершен:\n"
-                                    f"  ├─ Чанков получено: {stream_chunk_count}\n"
-                                    f"  ├─ Токенов (estimate): {total_tokens}\n"
-                                    f"  └─ Символов в ответе: {stream_total_chars}\n"
-                                    f"{'='*80}"
+                                    f"[API STREAM] done chunks={stream_chunk_count} "
+                                    f"tokens_estimate={total_tokens} chars={stream_total_chars}"
                                 )
+                                observe_openrouter_request(model_to_use, "stream", "ok", time.perf_counter() - request_started)
                                 return
                             
                             try:
@@ -732,6 +721,10 @@ class OpenRouterService:
                                         yield json.dumps({"error": user_message})
                                     else:
                                         yield json.dumps({"error": error_text})
+                                    observe_openrouter_request(
+                                        model_to_use, "stream", "rate_limited" if is_rate_limit else "upstream_error",
+                                        time.perf_counter() - request_started,
+                                    )
                                     return
                                 
                                 # Извлекаем текст из choices[0].delta.content
@@ -741,6 +734,8 @@ class OpenRouterService:
                                     content = delta.get("content", "")
                                     
                                     if content:
+                                        if stream_chunk_count == 0:
+                                            observe_openrouter_first_token(model_to_use, time.perf_counter() - request_started)
                                         # Подсчитываем чанки и символы
                                         stream_chunk_count += 1
                                         stream_total_chars += len(content)
@@ -770,6 +765,9 @@ class OpenRouterService:
                             except json.JSONDecodeError:
                                 pass
                 
+                observe_openrouter_request(
+                    model_to_use, "stream", "ok" if content_received else "empty", time.perf_counter() - request_started
+                )
                 if not content_received:
                     logger.error("[OPENROUTER STREAM] ⚠️ Не получено данных от OpenRouter")
                     yield json.dumps({"error": "OpenRouter не вернул данные. Попробуйте повторить запрос."})
@@ -4,7 +4,7 @@ API эндпоинты для работы с историей чата.
 from fastapi import APIRouter, Depends, HTTPException, Query
 from sqlalchemy.ext.asyncio import AsyncSession
 from typing import List, Dict, Any, Optional
-from pydantic import BaseModel
+from pydantic import BaseModel, Field
 
 from app.database.db_depends import get_db
 from app.auth.dependencies import get_current_user, get_current_user_optional
@@ -12,6 +12,7 @@ from app.models.user import Users
 from app.utils.redis_cache import (
     cache_get, cache_set, key_image_metadata, TTL_IMAGE_METADATA
 )
+from app.utils.pagination import encode_cursor, decode_cursor
 
 
 router = APIRouter()
@@ -28,9 +29,27 @@ class ChatMessageRequest(BaseModel):
 
 
 class ChatHistoryRequest(BaseModel):
-    """Запрос для получения истории чата."""
+    """
+    Запрос для получения истории чата.
+    
+    Если указан limit или один из курсоров, возвращается страница сообщений:
+    before - более старые сообщения (before_cursor из ответа), after - более новые (after_cursor).
+    Без них возвращается вся история (для старых клиентов).
+    """
     character_name: str
     session_id: str
+    limit: Optional[int] = Field(None, ge=1, le=200)
+    before: Optional[str] = None
+    after: Optional[str] = None
+
+
+def _decode_history_cursor(cursor: Optional[str]) -> Optional[int]:
+    if not cursor:
+        return None
+    try:
+        return int(decode_cursor(cursor)["id"])
+    except (ValueError, KeyError, TypeError):
+        raise HTTPException(status_code=400, detail="Некорректный курсор истории")
 
 
 class ClearHistoryRequest(BaseModel):
@@ -109,18 +128,46 @@ async def get_chat_history(
         from app.chat_history.services.chat_history_service import ChatHistoryService
         history_service = ChatHistoryService(db)
         
-        history = await history_service.get_chat_history(
+        before = _decode_history_cursor(request.before)
+        after = _decode_history_cursor(request.after)
+        if request.limit is None and before is None and after is None:
+            history = await history_service.get_chat_history(
+                user_id=current_user.id,
+                character_name=request.character_name,
+                session_id=request.session_id
+            )
+            
+            return {
+                "success": True,
+                "history": history,
+                "can_save_history": await history_service.can_save_history(current_user.id)
+            }
+        
+        from app.chat_history.services.chat_history_service import CHAT_HISTORY_PAGE_SIZE
+        page = await history_service.get_chat_history_page(
             user_id=current_user.id,
             character_name=request.character_name,
-            session_id=request.session_id
+            session_id=request.session_id,
+            before=before,
+            after=after,
+            limit=request.limit or CHAT_HISTORY_PAGE_SIZE
         )
+        messages = page["messages"]
         
+        # after_cursor отдается всегда: по нему клиент догружает новые сообщения
+        last_id = messages[-1]["id"] if messages else after
         return {
             "success": True,
-            "history": history,
+            "history": messages,
+            "has_more_before": page["has_more_before"],
+            "has_more_after": page["has_more_after"],
+            "before_cursor": encode_cursor({"id": messages[0]["id"]}) if messages and page["has_more_before"] else None,
+            "after_cursor": encode_cursor({"id": last_id}) if last_id else None,
             "can_save_history": await history_service.can_save_history(current_user.id)
         }
         
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Ошибка получения истории: {str(e)}")
 
@@ -1,19 +1,111 @@
 """
 Сервис для работы с историей чата.
 """
+import json
 from typing import List, Optional, Dict, Any
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy import select, delete, func, or_, and_
+from sqlalchemy.dialects.postgresql import distinct_on
 from sqlalchemy.orm import selectinload
 from app.models.chat_history import ChatHistory
 from app.models.subscription import SubscriptionType
 from app.services.subscription_service import SubscriptionService
+from app.services.admin_stats import record_counter_delta_after_commit
 from app.utils.redis_cache import (
-    cache_get, cache_set, cache_delete,
-    key_chat_history, TTL_CHAT_HISTORY,
+    cache_get, cache_set, cache_delete, cache_delete_pattern, get_redis_client,
+    key_chat_history, key_chat_history_pattern, TTL_CHAT_HISTORY,
     key_user_characters, TTL_USER_CHARACTERS
 )
 
+# Размер страницы истории по умолчанию и максимальный
+CHAT_HISTORY_PAGE_SIZE = 50
+CHAT_HISTORY_MAX_PAGE_SIZE = 200
+# В кэше последней страницы храним на одно сообщение больше, чтобы знать, есть ли более старые
+CHAT_HISTORY_CACHED_MESSAGES = CHAT_HISTORY_PAGE_SIZE + 1
+
+
+def _history_message(msg) -> Dict[str, Any]:
+    """Сообщение истории в формате фронтенда."""
+    message_data = {
+        "id": msg.id,
+        "type": msg.message_type,
+        "content": msg.message_content,
+        "timestamp": msg.created_at.isoformat() if msg.created_at else None
+    }
+    # Добавляем изображение, если есть
+    if msg.image_url:
+        message_data["image_url"] = msg.image_url
+        message_data["image_filename"] = msg.image_filename
+    return message_data
+
+
+async def _read_latest_page(cache_key: str, limit: int) -> Optional[List[Dict[str, Any]]]:
+    """Последние limit + 1 сообщений из кэша или None, если кэша нет."""
+    try:
+        redis_client = await get_redis_client()
+        if not redis_client:
+            return None
+        import asyncio
+        items = await asyncio.wait_for(redis_client.lrange(cache_key, -(limit + 1), -1), timeout=0.3)
+        if not items:
+            return None
+        return [json.loads(item) for item in items]
+    except Exception:
+        return None
+
+
+async def _write_latest_page(cache_key: str, messages: List[Dict[str, Any]]) -> None:
+    """Заменяет кэш последней страницы (messages - от старых к новым)."""
+    try:
+        redis_client = await get_redis_client()
+        if not redis_client:
+            return
+        import asyncio
+        pipe = redis_client.pipeline(transaction=True)
+        pipe.delete(cache_key)
+        if messages:
+            pipe.rpush(cache_key, *[json.dumps(m, ensure_ascii=False) for m in messages])
+            pipe.expire(cache_key, TTL_CHAT_HISTORY)
+        await asyncio.wait_for(pipe.execute(), timeout=0.3)
+    except Exception:
+        pass
+
+
+async def append_to_latest_page(cache_key: str, message: Dict[str, Any]) -> None:
+    """
+    Дописывает сообщение в кэш последней страницы на месте (RPUSHX + LTRIM).
+    Если кэша нет, ничего не делает: он заполнится при следующем чтении.
+    """
+    try:
+        redis_client = await get_redis_client()
+        if not redis_client:
+            return
+        import asyncio
+        pipe = redis_client.pipeline(transaction=True)
+        pipe.rpushx(cache_key, json.dumps(message, ensure_ascii=False))
+        pipe.ltrim(cache_key, -CHAT_HISTORY_CACHED_MESSAGES, -1)
+        pipe.expire(cache_key, TTL_CHAT_HISTORY)
+        await asyncio.wait_for(pipe.execute(), timeout=0.3)
+    except Exception:
+        # Кэш мог остаться без нового сообщения - удаляем его, чтобы не отдать устаревшую страницу
+        await cache_delete(cache_key)
+
+
+def request_latest_page_invalidation(user_id: Optional[int], character_name: Optional[str],
+                                     session_id: Optional[str]) -> None:
+    """
+    Синхронная точка входа для обработчиков событий ORM: сбрасывает кэш последней страницы.
+    Записи мимо save_message (ORM и UPDATE) не дописываются в кэш, он перечитается из БД.
+    """
+    if user_id is None or not character_name or not session_id:
+        return
+    import asyncio
+    try:
+        loop = asyncio.get_running_loop()
+    except RuntimeError:
+        return
+    loop.create_task(cache_delete(key_chat_history(user_id, character_name, session_id)))
+
 
 class ChatHistoryService:
     """Сервис для работы с историей чата."""
@@ -67,8 +159,9 @@ class ChatHistoryService:
                 query = text("""
                     INSERT INTO chat_history (user_id, character_name, session_id, message_type, message_content, image_url, image_filename, generation_time, created_at)
                     VALUES (:user_id, :character_name, :session_id, :message_type, :message_content, :image_url, :image_filename, :generation_time, NOW())
+                    RETURNING id, created_at
                 """)
-                await self.db.execute(query, {
+                result = await self.db.execute(query, {
                     "user_id": user_id,
                     "character_name": character_name,
                     "session_id": session_id,
@@ -86,8 +179,9 @@ class ChatHistoryService:
                 query = text("""
                     INSERT INTO chat_history (user_id, character_name, session_id, message_type, message_content, image_url, image_filename, created_at)
                     VALUES (:user_id, :character_name, :session_id, :message_type, :message_content, :image_url, :image_filename, NOW())
+                    RETURNING id, created_at
                 """)
-                await self.db.execute(query, {
+                result = await self.db.execute(query, {
                     "user_id": user_id,
                     "character_name": character_name,
                     "session_id": session_id,
@@ -97,11 +191,24 @@ class ChatHistoryService:
                     "image_filename": image_filename
                 })
             
+            inserted = result.first()
+            # Raw SQL не вызывает обработчики ORM - счетчик сообщений обновляем сами
+            record_counter_delta_after_commit(self.db, 'total_messages', 1)
             await self.db.commit()
             
-            # Инвалидируем кэш истории чата
-            cache_key = key_chat_history(user_id, character_name, session_id)
-            await cache_delete(cache_key)
+            # Дописываем сообщение в кэш последней страницы истории
+            from types import SimpleNamespace
+            await append_to_latest_page(
+                key_chat_history(user_id, character_name, session_id),
+                _history_message(SimpleNamespace(
+                    id=inserted.id,
+                    message_type=message_type,
+                    message_content=message_content,
+                    created_at=inserted.created_at,
+                    image_url=image_url,
+                    image_filename=image_filename
+                ))
+            )
             
             # Инвалидируем кэш списка персонажей
             from app.utils.redis_cache import key_user_characters
@@ -115,62 +222,107 @@ class ChatHistoryService:
             await self.db.rollback()
             return False
     
+    def _conversation_query(self, user_id: int, character_name: str, session_id: str):
+        from sqlalchemy.orm import load_only
+        return (
+            select(ChatHistory)
+            .options(load_only(
+                ChatHistory.id,
+                ChatHistory.message_type,
+                ChatHistory.message_content,
+                ChatHistory.image_url,
+                ChatHistory.image_filename,
+                ChatHistory.created_at
+            ))
+            .where(
+                ChatHistory.user_id == user_id,
+                ChatHistory.character_name == character_name,
+                ChatHistory.session_id == session_id
+            )
+        )
+    
+    async def get_chat_history_page(
+        self,
+        user_id: int,
+        character_name: str,
+        session_id: str,
+        before: Optional[int] = None,
+        after: Optional[int] = None,
+        limit: int = CHAT_HISTORY_PAGE_SIZE
+    ) -> Dict[str, Any]:
+        """
+        Получает страницу истории чата (сообщения от старых к новым).
+        
+        Без курсоров возвращает последние limit сообщений, before - более старые
+        сообщения (id < before), after - более новые (id > after).
+        Кэшируется только последняя страница; новые сообщения дописываются в нее на месте.
+        
+        Returns:
+            messages, has_more_before и has_more_after
+        """
+        limit = max(1, min(limit, CHAT_HISTORY_MAX_PAGE_SIZE))
+        if not await self.can_save_history(user_id):
+            return {"messages": [], "has_more_before": False, "has_more_after": False}
+        
+        cache_key = key_chat_history(user_id, character_name, session_id)
+        latest = before is None and after is None
+        if latest and limit < CHAT_HISTORY_CACHED_MESSAGES:
+            cached = await _read_latest_page(cache_key, limit)
+            if cached is not None:
+                return {
+                    "messages": cached[-limit:],
+                    "has_more_before": len(cached) > limit,
+                    "has_more_after": False
+                }
+        
+        query = self._conversation_query(user_id, character_name, session_id)
+        if after is not None:
+            rows = (await self.db.execute(
+                query.where(ChatHistory.id > after).order_by(ChatHistory.id.asc()).limit(limit + 1)
+            )).scalars().all()
+            return {
+                "messages": [_history_message(msg) for msg in rows[:limit]],
+                "has_more_before": True,
+                "has_more_after": len(rows) > limit
+            }
+        
+        if before is not None:
+            rows = (await self.db.execute(
+                query.where(ChatHistory.id < before).order_by(ChatHistory.id.desc()).limit(limit + 1)
+            )).scalars().all()
+            return {
+                "messages": [_history_message(msg) for msg in reversed(rows[:limit])],
+                "has_more_before": len(rows) > limit,
+                "has_more_after": True
+            }
+        
+        # Последняя страница: выбираем не меньше, чем хранится в кэше, и обновляем его
+        fetch_limit = max(limit + 1, CHAT_HISTORY_CACHED_MESSAGES)
+        rows = (await self.db.execute(
+            query.order_by(ChatHistory.id.desc()).limit(fetch_limit)
+        )).scalars().all()
+        messages = [_history_message(msg) for msg in reversed(rows)]
+        await _write_latest_page(cache_key, messages[-CHAT_HISTORY_CACHED_MESSAGES:])
+        return {
+            "messages": messages[-limit:],
+            "has_more_before": len(messages) > limit,
+            "has_more_after": False
+        }
+    
     async def get_chat_history(self, user_id: int, character_name: str, session_id: str) -> List[Dict[str, Any]]:
-        """Получает историю чата для конкретного персонажа и сессии с кэшированием."""
+        """
+        Получает всю историю чата для конкретного персонажа и сессии.
+        Оставлено для старых клиентов и не кэшируется: для длинных чатов используйте get_chat_history_page.
+        """
         try:
             # Проверяем права на получение истории
             if not await self.can_save_history(user_id):
                 return []
             
-            cache_key = key_chat_history(user_id, character_name, session_id)
-            cached_history = await cache_get(cache_key)
-            if cached_history is not None:
-                return cached_history
-            
-            from sqlalchemy.orm import load_only
             result = await self.db.execute(
-                select(ChatHistory)
-                .options(load_only(
-                    ChatHistory.id,
-                    ChatHistory.user_id,
-                    ChatHistory.character_name,
-                    ChatHistory.session_id,
-                    ChatHistory.message_type,
-                    ChatHistory.message_content,
-                    ChatHistory.image_url,
-                    ChatHistory.image_filename,
-                    ChatHistory.created_at
-                ))
-                .where(
-                    ChatHistory.user_id == user_id,
-                    ChatHistory.character_name == character_name,
-                    ChatHistory.session_id == session_id
-                )
-                .order_by(ChatHistory.created_at.asc())
+                self._conversation_query(user_id, character_name, session_id).order_by(ChatHistory.id.asc())
             )
-            
-            messages = result.scalars().all()
-            
-            # Преобразуем в формат для фронтенда
-            history = []
-            for msg in messages:
-                message_data = {
-                    "type": msg.message_type,
-                    "content": msg.message_content,
-                    "timestamp": msg.created_at.isoformat() if msg.created_at else None
-                }
-                
-                # Добавляем изображение, если есть
-                if msg.image_url:
-                    message_data["image_url"] = msg.image_url
-                    message_data["image_filename"] = msg.image_filename
-                
-                history.append(message_data)
-            
-            # Сохраняем в кэш
-            await cache_set(cache_key, history, ttl_seconds=TTL_CHAT_HISTORY)
-            
-            return history
+            return [_history_message(msg) for msg in result.scalars().all()]
             
         except Exception as e:
             print(f"[ERROR] Ошибка получения истории чата: {e}")
@@ -220,268 +372,76 @@ class ChatHistoryService:
     async def get_user_characters_with_history(self, user_id: int, force_refresh: bool = False) -> List[Dict[str, Any]]:
         """
         Получает список персонажей, с которыми у пользователя была история переписки.
-        Агрегирует данные из нескольких источников:
-        1. Активные сессии (ChatSession + ChatMessageDB)
-        2. Архивная история (ChatHistory)
-        3. История генерации изображений (ImageGenerationHistory)
         
-        Гарантирует, что все персонажи, с которыми было взаимодействие, будут в списке.
+        Читает сводку user_conversations (один запрос по индексу user_id, last_message_at),
+        которую триггеры обновляют при сохранении сообщений (ChatHistory, ChatMessageDB)
+        и изображений (ImageGenerationHistory). Удаленные персонажи в список не попадают.
         """
         import logging
         logger = logging.getLogger(__name__)
         
-        # 1. Проверяем кэш (если не force_refresh)
         cache_key = key_user_characters(user_id)
         if not force_refresh:
             cached = await cache_get(cache_key)
             if cached:
                 return cached
         
-        logger.info(f"[HISTORY_AGGREGATION] Начало агрегации истории для user_id={user_id}")
-        
-        # Словарь для агрегации: key -> Character Data
-        # key: lowercase name (для уникальности)
-        aggregated_chars = {}
-        
-        # Импорты моделей
-        from app.chat_bot.models.models import ChatSession, ChatMessageDB, CharacterDB
-        from app.models.image_generation_history import ImageGenerationHistory
-        from sqlalchemy import func, desc, case
+        from app.chat_bot.models.models import CharacterDB, CharacterMainPhoto
+        from app.models.user_conversation import UserConversation
+        from app.utils.media_urls import media_url
         
         try:
-            # === ИСТОЧНИК 1: Активные сессии (ChatSession) ===
-            # Получаем id персонажа, время последнего сообщения, кол-во сообщений
-            # JOIN с ChatMessageDB гарантирует, что сессия не пустая
-            # JOIN с CharacterDB для получения данных персонажа
-            
-            stmt_sessions = (
+            result = await self.db.execute(
                 select(
-                    ChatSession.character_id, 
-                    func.max(ChatMessageDB.timestamp).label("last_message_at"),
-                    func.count(ChatMessageDB.id).label("message_count"),
+                    UserConversation.character_id,
+                    UserConversation.last_message_at,
+                    UserConversation.last_message_preview,
+                    UserConversation.message_count,
+                    UserConversation.last_image_url,
                     CharacterDB.name,
                     CharacterDB.display_name,
-                    CharacterDB.main_photos,
-                    CharacterDB.is_nsfw
-                )
-                .join(ChatMessageDB, ChatMessageDB.session_id == ChatSession.id)
-                .join(CharacterDB, CharacterDB.id == ChatSession.character_id)
-                .where(
-                    # Поддержка строкового user_id в ChatSession (legacy)
-                    or_(
-                        ChatSession.user_id == str(user_id),
-                        ChatSession.user_id == f"user_{user_id}",
-                    )
+                    CharacterDB.is_nsfw,
                 )
-                .group_by(ChatSession.character_id, CharacterDB.id) # Group by ID to be safe
+                .join(CharacterDB, CharacterDB.id == UserConversation.character_id)
+                .where(UserConversation.user_id == user_id)
+                .order_by(UserConversation.last_message_at.desc())
             )
+            rows = result.all()
             
-            result_sessions = await self.db.execute(stmt_sessions)
-            for row in result_sessions:
-                char_id = row[0]
-                last_msg = row[1]
-                msg_count = row[2]
-                name = row[3]
-                display_name = row[4]
-                photos_json = row[5]
-                is_nsfw = row[6]
-                
-                if not name: continue
-                
-                # Основной ключ - имя в нижнем регистре
-                key = name.lower().strip()
-                
-                # Парсим фото
-                last_image_url = None
-                if photos_json:
-                    try:
-                        import json
-                        parsed = json.loads(photos_json)
-                        if isinstance(parsed, list) and parsed:
-                            photos = parsed
-                        elif isinstance(parsed, str):
-                             if parsed.startswith('['):
-                                 photos = json.loads(parsed)
-                             else:
-                                 photos = [parsed]
-                        else:
-                            photos = []
-                        
-                        if photos:
-                             # Если это URL
-                             if isinstance(photos[0], str) and photos[0].startswith('http'):
-                                 last_image_url = photos[0]
-                             # Если это ID фото (static)
-                             elif isinstance(photos[0], str):
-                                 last_image_url = f"/static/photos/{key}/{photos[0]}.png"
-                    except:
-                        pass
-                
-                aggregated_chars[key] = {
-                    "id": char_id,
-                    "name": name,
-                    "display_name": display_name or name,
-                    "last_message_at": last_msg,
-                    "message_count": msg_count,
-                    "last_image_url": last_image_url,
-                    "is_nsfw": is_nsfw,
-                    "source": "session",
-                    "timestamp_obj": last_msg 
-                }
-            
-            logger.info(f"[HISTORY_AGGREGATION] Найдено {len(aggregated_chars)} персонажей в ChatSession")
-            
-            # === ИСТОЧНИК 2: ChatHistory (Архив/Free) ===
-            # КРИТИЧЕСКИ ВАЖНО: JOIN с CharacterDB, чтобы исключить удаленных персонажей ("призраков")
-            stmt_history = (
-                select(
-                    ChatHistory.character_name,
-                    func.max(ChatHistory.created_at).label("last_message_at"),
-                    func.count(ChatHistory.id).label("message_count"),
-                    func.max(ChatHistory.image_url).label("last_image_url")
-                )
-                .join(CharacterDB, func.lower(CharacterDB.name) == func.lower(ChatHistory.character_name))
-                .where(ChatHistory.user_id == user_id)
-                .where(ChatHistory.session_id != 'system')
-                .where(ChatHistory.session_id != 'photo_generation')
-                .group_by(ChatHistory.character_name)
-            )
-            
-            result_history = await self.db.execute(stmt_history)
-            for row in result_history:
-                name = row[0]
-                last_msg = row[1]
-                msg_count = row[2]
-                last_image_url = row[3]
-                
-                if not name: continue
-                
-                key = name.lower().strip()
-                
-                if key in aggregated_chars:
-                    existing = aggregated_chars[key]
-                    existing["message_count"] += msg_count
-                    if last_msg and (not existing["timestamp_obj"] or last_msg > existing["timestamp_obj"]):
-                         existing["last_message_at"] = last_msg
-                         existing["timestamp_obj"] = last_msg
-                         if last_image_url:
-                             existing["last_image_url"] = last_image_url
-                else:
-                    # Новый персонаж из истории. Пробуем найти его в CharacterDB
-                    stmt_char = select(CharacterDB).where(func.lower(CharacterDB.name) == key).limit(1)
-                    char_in_db = (await self.db.execute(stmt_char)).scalar_one_or_none()
-                    
-                    char_id = char_in_db.id if char_in_db else None
-                    display_name = char_in_db.display_name if char_in_db else name
-                    is_nsfw = char_in_db.is_nsfw if char_in_db else False
-                    
-                    if not last_image_url and char_in_db and char_in_db.main_photos:
-                         try:
-                             import json
-                             parsed = json.loads(char_in_db.main_photos)
-                             if parsed:
-                                 p = parsed if isinstance(parsed, list) else [parsed]
-                                 if p:
-                                     last_image_url = p[0] if p[0].startswith('http') else f"/static/photos/{key}/{p[0]}.png"
-                         except: pass
-
-                    aggregated_chars[key] = {
-                        "id": char_id if char_id else name, # Fallback ID to name if not found
-                        "name": name,
-                        "display_name": display_name,
-                        "last_message_at": last_msg,
-                        "message_count": msg_count,
-                        "last_image_url": last_image_url,
-                        "is_nsfw": is_nsfw,
-                        "source": "history",
-                        "timestamp_obj": last_msg
-                    }
-            
-            # === ИСТОЧНИК 3: ImageGenerationHistory ===
-            stmt_images = (
-                select(
-                    ImageGenerationHistory.character_name,
-                    func.max(ImageGenerationHistory.created_at).label("last_gen_at"),
-                    func.max(ImageGenerationHistory.image_url)
+            # Для переписок без изображений показываем главное фото персонажа
+            fallback_photos: Dict[int, str] = {}
+            without_image = [row.character_id for row in rows if not row.last_image_url]
+            if without_image:
+                photos_result = await self.db.execute(
+                    select(
+                        CharacterMainPhoto.character_id,
+                        CharacterMainPhoto.photo_url,
+                        CharacterMainPhoto.media_key,
+                        CharacterMainPhoto.media_variants,
+                    )
+                    .where(CharacterMainPhoto.character_id.in_(without_image))
+                    .order_by(CharacterMainPhoto.character_id, CharacterMainPhoto.id)
+                    .ext(distinct_on(CharacterMainPhoto.character_id))
                 )
-                .join(CharacterDB, func.lower(CharacterDB.name) == func.lower(ImageGenerationHistory.character_name))
-                .where(ImageGenerationHistory.user_id == user_id)
-                .where(ImageGenerationHistory.character_name.isnot(None))
-                .group_by(ImageGenerationHistory.character_name)
-            )
-            
-            result_images = await self.db.execute(stmt_images)
-            for row in result_images:
-                name = row[0]
-                last_gen = row[1]
-                image_url = row[2]
-                
-                if not name: continue
-                key = name.lower().strip()
-                
-                if key in aggregated_chars:
-                    existing = aggregated_chars[key]
-                    if last_gen and (not existing["timestamp_obj"] or last_gen > existing["timestamp_obj"]):
-                        existing["last_message_at"] = last_gen
-                        existing["timestamp_obj"] = last_gen
-                        if image_url:
-                            existing["last_image_url"] = image_url
-                else:
-                    # Новый персонаж из галереи
-                    # Также пробуем найти его данные
-                    stmt_char = select(CharacterDB).where(func.lower(CharacterDB.name) == key).limit(1)
-                    char_in_db = (await self.db.execute(stmt_char)).scalar_one_or_none()
-                    
-                    char_id = char_in_db.id if char_in_db else None
-                    display_name = char_in_db.display_name if char_in_db else name
-                    
-                    if not image_url and char_in_db and char_in_db.main_photos:
-                         try:
-                             import json
-                             parsed = json.loads(char_in_db.main_photos)
-                             if parsed:
-                                 p = parsed if isinstance(parsed, list) else [parsed]
-                                 if p:
-                                     image_url = p[0] if p[0].startswith('http') else f"/static/photos/{key}/{p[0]}.png"
-                         except: pass
-                    
-                    aggregated_chars[key] = {
-                        "id": char_id if char_id else name,
-                        "name": name,
-                        "display_name": display_name,
-                        "last_message_at": last_gen,
-                        "message_count": 0,
-                        "last_image_url": image_url,
-                        "is_nsfw": char_in_db.is_nsfw if char_in_db else False,
-                        "source": "gallery",
-                        "timestamp_obj": last_gen
-                    }
-
-            # === Формирование финала ===
-            final_list = []
-            
-            for key, data in aggregated_chars.items():
-                if not data["last_message_at"]:
-                    continue
-                    
-                ts = data["last_message_at"]
-                iso_time = ts.isoformat() if hasattr(ts, 'isoformat') else str(ts)
-                
-                final_item = {
-                    "id": data["id"], 
-                    "name": data["name"], # Frontend expects 'name'
-                    "display_name": data["display_name"],
-                    "last_message_at": iso_time,
-                    "message_count": data["message_count"],
-                    "last_image_url": data["last_image_url"],
-                    "is_nsfw": data["is_nsfw"],
-                    "photos": [data["last_image_url"]] if data["last_image_url"] else []
+                fallback_photos = {
+                    photo.character_id: media_url(photo.photo_url, photo.media_key, "thumb", photo.media_variants)
+                    for photo in photos_result.all()
                 }
-                final_list.append(final_item)
             
-            final_list.sort(key=lambda x: x["last_message_at"] or "", reverse=True)
-            
-            logger.info(f"[HISTORY_AGGREGATION] Итоговый список: {len(final_list)} персонажей")
+            final_list = []
+            for row in rows:
+                last_image_url = row.last_image_url or fallback_photos.get(row.character_id)
+                final_list.append({
+                    "id": row.character_id,
+                    "name": row.name,
+                    "display_name": row.display_name or row.name,
+                    "last_message_at": row.last_message_at.isoformat() if row.last_message_at else None,
+                    "last_message": row.last_message_preview,
+                    "message_count": row.message_count,
+                    "last_image_url": last_image_url,
+                    "is_nsfw": row.is_nsfw,
+                    "photos": [last_image_url] if last_image_url else []
+                })
             
             await cache_set(cache_key, final_list, ttl_seconds=TTL_USER_CHARACTERS)
             
@@ -1226,9 +1186,10 @@ class ChatHistoryService:
             )
             chat_history_count = chat_history_count_query.scalar_one_or_none() or 0
             
-            await self.db.execute(
+            chat_history_delete_result = await self.db.execute(
                 delete(ChatHistory).where(ChatHistory.user_id == user_id)
             )
+            record_counter_delta_after_commit(self.db, 'total_messages', -chat_history_delete_result.rowcount)
             
             await self.db.commit()
             
@@ -1254,6 +1215,7 @@ class ChatHistoryService:
                 delete(ChatHistory).where(ChatHistory.user_id == user_id)
             )
             deleted_chat_history_count = chat_history_delete_result.rowcount
+            record_counter_delta_after_commit(self.db, 'total_messages', -deleted_chat_history_count)
             
             # Удаляем из ChatSession и ChatMessageDB (новая система)
             user_id_str = str(user_id)
@@ -1328,18 +1290,19 @@ class ChatHistoryService:
             
             # Удаляем по character_name (как хранится в ChatHistory)
             # Удаляем для всех session_id, так как при очистке истории нужно удалить все сессии
-            await self.db.execute(
+            chat_history_delete_result = await self.db.execute(
                 delete(ChatHistory)
                 .where(
                     ChatHistory.user_id == user_id,
                     ChatHistory.character_name == character_name
                 )
             )
+            record_counter_delta_after_commit(self.db, 'total_messages', -chat_history_delete_result.rowcount)
             
             # Если нашли персонажа, также удаляем по его name и display_name
             # Удаляем для всех session_id
             if character:
-                await self.db.execute(
+                chat_history_delete_result = await self.db.execute(
                     delete(ChatHistory)
                     .where(
                         ChatHistory.user_id == user_id,
@@ -1349,6 +1312,7 @@ class ChatHistoryService:
                         )
                     )
                 )
+                record_counter_delta_after_commit(self.db, 'total_messages', -chat_history_delete_result.rowcount)
             
             # Удаляем из ChatSession и ChatMessageDB (новая система)
             # Используем уже найденного персонажа, если он есть
@@ -1483,6 +1447,7 @@ class ChatHistoryService:
                         )
                     )
                     deleted_image_history_count = image_history_delete_result.rowcount
+                    record_counter_delta_after_commit(self.db, 'total_images', -deleted_image_history_count)
                     if deleted_image_history_count > 0:
                         logger.info(f"[HISTORY] Удалено {deleted_image_history_count} записей из ImageGenerationHistory для персонажа {character_name}")
                 except Exception as image_history_error:
@@ -1498,10 +1463,8 @@ class ChatHistoryService:
             await cache_delete(user_characters_cache_key)
             logger.info(f"[HISTORY CLEAR] ✓ Кэш списка персонажей инвалидирован после очистки истории для user_id={user_id}, character={character_name}")
             
-            # Дополнительно инвалидируем кэш истории для этого персонажа (если есть)
-            from app.utils.redis_cache import key_chat_history
-            # Инвалидируем кэш для всех возможных session_id (так как мы удалили все сессии)
-            # Для простоты просто инвалидируем основной кэш списка персонажей
+            # Инвалидируем кэш последних страниц истории для всех сессий персонажа
+            await cache_delete_pattern(key_chat_history_pattern(user_id, character_name))
             logger.info(f"[HISTORY CLEAR] ✓ История полностью очищена для user_id={user_id}, character={character_name}")
             
             return True
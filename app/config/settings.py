@@ -90,10 +90,41 @@ class Settings(BaseSettings):
 
     # --- Fish Audio (TTS) ---
     FISH_AUDIO_API_KEY: str = Field(default_factory=lambda: os.getenv("FISH_AUDIO_API_KEY", ""), description="API ключ для Fish Audio")
-    
+    FISH_AUDIO_USE_VOICE_MODELS: bool = Field(default=False, description="Регистрировать образцы как голосовые модели Fish Audio и передавать reference_id вместо аудио")
+    TTS_EXECUTOR_WORKERS: int = Field(default=8, description="Размер пула потоков для вызовов Fish Audio SDK")
+    TTS_PER_VOICE_CONCURRENCY: int = Field(default=2, description="Максимум одновременных TTS запросов на один голос")
+    TTS_VOICE_CACHE_MAX_BYTES: int = Field(default=64 * 1024 * 1024, description="Максимальный размер кэша образцов голосов в памяти (байт)")
+
     # --- Performance ---
     MAX_WORKERS: int = Field(default=4, description="Максимальное количество воркеров")
     
+    # --- Image pipeline ---
+    IMAGE_PIPELINE_WORKERS: int = Field(default=2, description="Количество процессов для перекодирования изображений")
+    IMAGE_ENCODE_EFFORT: str = Field(default="balanced", description="Уровень усилия кодирования: fast, balanced, max")
+    IMAGE_ENCODE_QUALITY: int = Field(default=85, description="Качество кодирования WebP/AVIF")
+    IMAGE_VARIANT_FORMATS: str = Field(default="webp,avif", description="Форматы вариантов изображений через запятую")
+    IMAGE_VARIANTS_ENABLED: bool = Field(default=True, description="Создавать уменьшенные варианты (thumb, card) при загрузке изображений")
+    
+    # --- Object storage ---
+    STORAGE_DEDUPLICATE: bool = Field(default=False, description="Хранить загрузки под ключом по SHA-256 содержимого и пропускать повторные загрузки (ссылки считаются в Redis)")
+    STORAGE_UPLOAD_WORKERS: int = Field(default=8, description="Размер пула потоков для операций с бакетом")
+    STORAGE_UPLOAD_MANY_CONCURRENCY: int = Field(default=4, description="Максимум одновременных загрузок в upload_many")
+    STORAGE_MULTIPART_THRESHOLD_MB: int = Field(default=8, description="Размер файла (МБ), начиная с которого используется multipart загрузка")
+    STORAGE_MULTIPART_CHUNKSIZE_MB: int = Field(default=8, description="Размер части multipart загрузки (МБ)")
+    STORAGE_MULTIPART_CONCURRENCY: int = Field(default=4, description="Количество параллельных потоков для частей одного файла")
+    
+    # --- GeoIP ---
+    GEOIP_DB_PATH: Path = Field(
+        default_factory=lambda: Path(__file__).parent.parent / "data" / "geoip" / "ip_country.csv",
+        description="CSV (или .csv.gz) с диапазонами IP: начало,конец,код страны[,название страны]"
+    )
+    GEOIP_DOWNLOAD_URL: str = Field(
+        default="https://download.db-ip.com/free/dbip-country-lite-{month}.csv.gz",
+        description="Источник для app/scripts/update_geoip_database.py, {month} - YYYY-MM"
+    )
+    GEOIP_RELOAD_CHECK_SECONDS: int = Field(default=60, description="Как часто проверять, не обновился ли файл диапазонов IP")
+    GEOIP_CACHE_SIZE: int = Field(default=4096, description="Размер LRU кэша результатов по IP")
+    
     # --- Redis ---
     REDIS_URL: str = Field(
         default_factory=lambda: os.getenv("REDIS_URL", "redis://localhost:6379/0"), 
@@ -107,6 +138,8 @@ class Settings(BaseSettings):
         default_factory=lambda: os.getenv("REDIS_PASSWORD"), 
         description="Пароль для Redis (если требуется)"
     )
+    CACHE_SCHEMA_VERSION: str = Field(default="v3", description="Версия формата кэшируемых данных (повышать при изменении структуры)")
+    CACHE_PREWARM_ON_STARTUP: bool = Field(default=False, description="Прогревать кэш персонажей новой версии при старте (один воркер на версию)")
     
     # --- LLAMA API ---
     LLAMA_API_URL: str = Field(default="http://localhost:8000", description="URL для LLAMA API")
@@ -0,0 +1,96 @@
+"""
+Действия после коммита транзакции.
+
+Обработчики событий маппера (after_insert/after_update/after_delete) срабатывают
+при flush, до коммита. Инвалидация кэшей оттуда открывает окно, в котором
+параллельный запрос перечитывает старые данные и снова кладет их в кэш, а при
+откате транзакции инвалидация оказывается лишней. run_after_commit откладывает
+такие действия до коммита сессии объекта и отбрасывает их при откате.
+"""
+
+import logging
+from typing import Callable, Hashable
+
+from sqlalchemy import event
+from sqlalchemy.orm import Session, object_session
+from sqlalchemy.sql.elements import TextClause
+
+logger = logging.getLogger(__name__)
+
+PENDING_KEY = "after_commit_callbacks"
+# Отметка о записях текущей транзакции, еще не закоммиченных
+UNCOMMITTED_WRITES_KEY = "uncommitted_writes"
+WRITE_KEYWORDS = ("INSERT", "UPDATE", "DELETE")
+
+
+def run_after_commit(target, key: Hashable, callback: Callable[[], None]) -> None:
+    """
+    Выполняет callback после коммита сессии, в которой изменен target.
+
+    Повторные вызовы с тем же key в одной транзакции выполняются один раз.
+    Если объект не привязан к сессии, callback выполняется сразу.
+    """
+    run_after_session_commit(object_session(target), key, callback)
+
+
+def run_after_session_commit(session, key: Hashable, callback: Callable[[], None]) -> None:
+    """
+    То же, что run_after_commit, для изменений без ORM-объекта (raw SQL).
+
+    Принимает Session или AsyncSession; без сессии callback выполняется сразу.
+    """
+    session = getattr(session, "sync_session", session)
+    if session is None:
+        callback()
+        return
+    session.info.setdefault(PENDING_KEY, {})[key] = callback
+
+
+def has_uncommitted_writes(session) -> bool:
+    """Сессия изменила данные (flush ORM, DML или INSERT/UPDATE/DELETE через text) и еще не закоммитила их."""
+    session = getattr(session, "sync_session", session)
+    if session is None:
+        return False
+    return bool(session.info.get(UNCOMMITTED_WRITES_KEY) or session.new or session.dirty or session.deleted)
+
+
+def run_after_writes_commit(session, key: Hashable, callback: Callable[[], None]) -> None:
+    """
+    Выполняет callback после коммита изменений session, а если незакоммиченных
+    изменений нет (вызывающий код уже закоммитил) - сразу.
+    """
+    if has_uncommitted_writes(session):
+        run_after_session_commit(session, key, callback)
+    else:
+        callback()
+
+
+@event.listens_for(Session, "after_flush")
+def _mark_flush(session: Session, flush_context) -> None:
+    session.info[UNCOMMITTED_WRITES_KEY] = True
+
+
+@event.listens_for(Session, "do_orm_execute")
+def _mark_write_statement(orm_execute_state) -> None:
+    statement = orm_execute_state.statement
+    if orm_execute_state.is_insert or orm_execute_state.is_update or orm_execute_state.is_delete:
+        orm_execute_state.session.info[UNCOMMITTED_WRITES_KEY] = True
+    elif isinstance(statement, TextClause) and statement.text.lstrip()[:6].upper() in WRITE_KEYWORDS:
+        orm_execute_state.session.info[UNCOMMITTED_WRITES_KEY] = True
+
+
+@event.listens_for(Session, "after_commit")
+def _run_pending(session: Session) -> None:
+    session.info.pop(UNCOMMITTED_WRITES_KEY, None)
+    pending = session.info.pop(PENDING_KEY, None)
+    for key, callback in (pending or {}).items():
+        try:
+            callback()
+        except Exception as e:
+            logger.warning(f"[DB] Ошибка действия после коммита {key}: {e}")
+
+
+@event.listens_for(Session, "after_rollback")
+def _drop_pending(session: Session) -> None:
+    session.info.pop(UNCOMMITTED_WRITES_KEY, None)
+    session.info.pop(PENDING_KEY, None)
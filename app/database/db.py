@@ -4,6 +4,10 @@ from sqlalchemy.ext.asyncio import (AsyncSession, async_sessionmaker,
                                     create_async_engine)
 from sqlalchemy.orm import declarative_base
 
+from app.database.pool import (detect_process_role, is_pgbouncer_mode,
+                               pool_settings, postgres_connect_args,
+                               track_pool)
+
 load_dotenv(override=True)
 
 POSTGRES_USER = os.getenv("POSTGRES_USER")
@@ -39,36 +43,64 @@ DATABASE_URL = _build_database_url()
 is_sqlite = DATABASE_URL.startswith("sqlite")
 is_postgres = DATABASE_URL.startswith("postgresql")
 
+# Роль процесса определяет размер пула (см. app/database/pool.py)
+DB_PROCESS_ROLE = detect_process_role()
+DB_PGBOUNCER = is_pgbouncer_mode()
+
 # Настройки connect_args в зависимости от типа БД
 connect_args = {}
 if is_postgres:
     # Дополнительные настройки для asyncpg (PostgreSQL)
-    connect_args = {
-        "command_timeout": 30,  # Уменьшаем таймаут команды
-        "server_settings": {
-            "jit": "off"
-        }
-    }
+    connect_args = postgres_connect_args(DB_PGBOUNCER)
 # Для SQLite используем пустой словарь, так как он не поддерживает command_timeout
 
+if is_sqlite:
+    # SQLite не поддерживает пул
+    engine_pool_settings = {"pool_size": 1, "max_overflow": 0, "pool_timeout": 10, "pool_recycle": 1800}
+else:
+    engine_pool_settings = pool_settings(DB_PROCESS_ROLE)
+
 engine = create_async_engine(
     DATABASE_URL, 
     echo=False,  # Отключаем echo для производительности
-    # Оптимизированные настройки пула соединений для 100+ одновременных пользователей
-    pool_size=30 if not is_sqlite else 1,  # Увеличен базовый пул (SQLite не поддерживает пул)
-    max_overflow=70 if not is_sqlite else 0,  # Увеличен overflow (итого до 100 соединений)
-    pool_timeout=10,  # Увеличен таймаут ожидания соединения из пула
     pool_pre_ping=True,  # Проверяем соединения перед использованием
-    pool_recycle=1800,  # Переиспользуем соединения каждые 30 минут (было 5 минут)
     # Настройки для правильной работы с Unicode
     # Всегда передаем словарь (пустой для SQLite, с настройками для PostgreSQL)
-    connect_args=connect_args
+    connect_args=connect_args,
+    **engine_pool_settings
 )
+track_pool("primary", engine, engine_pool_settings)
 
 async_session_maker = async_sessionmaker(
     engine, expire_on_commit=False, class_=AsyncSession
 )
 
+# Реплика для эндпоинтов только на чтение (см. app/database/read_routing.py).
+# Без REPLICA_DATABASE_URL все запросы идут в основную БД.
+REPLICA_DATABASE_URL = os.getenv("REPLICA_DATABASE_URL")
+# Допустимое отставание реплики и как часто его замерять, в секундах
+REPLICA_MAX_LAG_SECONDS = float(os.getenv("REPLICA_MAX_LAG_SECONDS", "5"))
+REPLICA_LAG_CHECK_SECONDS = float(os.getenv("REPLICA_LAG_CHECK_SECONDS", "2"))
+# Сколько секунд после записи чтения клиента идут в основную БД
+READ_YOUR_WRITES_SECONDS = float(os.getenv("READ_YOUR_WRITES_SECONDS", "10"))
+
+replica_engine = None
+replica_session_maker = None
+if REPLICA_DATABASE_URL:
+    # Реплика обслуживает только часть чтений - пул вдвое меньше основного
+    replica_pool_settings = pool_settings(DB_PROCESS_ROLE, scale=0.5)
+    replica_engine = create_async_engine(
+        REPLICA_DATABASE_URL,
+        echo=False,
+        pool_pre_ping=True,
+        connect_args=connect_args,
+        **replica_pool_settings
+    )
+    track_pool("replica", replica_engine, replica_pool_settings)
+    replica_session_maker = async_sessionmaker(
+        replica_engine, expire_on_commit=False, class_=AsyncSession
+    )
+
 Base = declarative_base()
 
 # Dependency
@@ -2,17 +2,22 @@ from typing import AsyncGenerator
 import logging
 
 from app.database.db import async_session_maker
+from app.database.read_routing import WRITES_COMMITTED, get_replica_router, request_identity, track_writes
 from sqlalchemy.ext.asyncio import AsyncSession
 from fastapi import HTTPException
+from starlette.requests import HTTPConnection
 
 logger = logging.getLogger(__name__)
 
 
-async def get_db() -> AsyncGenerator[AsyncSession, None]:
+async def get_db(connection: HTTPConnection) -> AsyncGenerator[AsyncSession, None]:
     """Получает сессию БД с защитой от зависаний."""
     # Используем async_session_maker как context manager
     # pool_timeout уже настроен в db.py на 5 секунд
     async with async_session_maker() as session:
+        router = get_replica_router()
+        if router.has_replica:
+            track_writes(session)
         try:
             yield session
         except HTTPException as http_ex:
@@ -30,3 +35,30 @@ async def get_db() -> AsyncGenerator[AsyncSession, None]:
             await session.rollback()
             logger.warning(f"Ошибка в сессии БД: {e}")
             raise
+        # Read-your-writes: следующие чтения клиента пойдут в основную БД
+        if session.info.get(WRITES_COMMITTED):
+            await router.mark_write(request_identity(connection))
+
+
+async def get_read_db(connection: HTTPConnection) -> AsyncGenerator[AsyncSession, None]:
+    """
+    Сессия для эндпоинтов только на чтение: реплика, если она настроена,
+    не отстает и клиент недавно ничего не записывал, иначе основная БД.
+    """
+    router = get_replica_router()
+    session_maker = await router.session_maker_for_read(request_identity(connection))
+    async with session_maker() as session:
+        router.mark_read_session(session, session_maker)
+        try:
+            yield session
+        except HTTPException as http_ex:
+            await session.rollback()
+            if 400 <= http_ex.status_code < 500:
+                logger.debug(f"HTTPException в сессии БД (клиентская ошибка): {http_ex.status_code}: {http_ex.detail}")
+            else:
+                logger.error(f"HTTPException в сессии БД (серверная ошибка): {http_ex.status_code}: {http_ex.detail}")
+            raise
+        except Exception as e:
+            await session.rollback()
+            logger.warning(f"Ошибка в сессии БД (чтение): {e}")
+            raise
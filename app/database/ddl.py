@@ -0,0 +1,23 @@
+"""
+Условия для DDL, привязанного к metadata.create_all.
+
+Функции и триггеры Postgres создаются событием after_create у Base.metadata
+(тестовая БД строится через create_all, а не миграциями) и выполняются,
+только если в базе есть все таблицы, на которые они ссылаются.
+"""
+
+from typing import Callable
+
+from sqlalchemy import inspect
+
+
+def tables_created(*required: str) -> Callable[..., bool]:
+    """callable_ для DDL.execute_if: True, если созданы все таблицы required."""
+    def _check(ddl, target, bind, tables=None, **kw) -> bool:
+        if tables is not None:
+            names = {table.name for table in tables}
+        else:
+            # SQLAlchemy 2.1 не передает список созданных таблиц в execute_if
+            names = set(inspect(bind).get_table_names())
+        return set(required) <= names
+    return _check
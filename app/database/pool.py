@@ -0,0 +1,226 @@
+"""
+Профили пула соединений по роли процесса и метрики пула.
+
+Модуль app/database/db.py импортируется каждым воркером uvicorn/gunicorn,
+каждым дочерним процессом Celery, beat и скриптами, поэтому размер пула
+выбирается по роли процесса (DB_PROCESS_ROLE или определяется по командной
+строке):
+- api: постоянный пул на воркер;
+- celery, beat: NullPool - задачи запускают корутины в новом event loop
+  (asyncio.run), а соединения asyncpg привязаны к loop, так что держать их
+  в пуле между задачами нельзя;
+- script: маленький пул для миграций, скриптов и тестов.
+Любой параметр профиля можно переопределить через DB_POOL_SIZE,
+DB_MAX_OVERFLOW, DB_POOL_TIMEOUT, DB_POOL_RECYCLE.
+
+DB_PGBOUNCER=true - режим для pgbouncer в режиме transaction pooling:
+соединение сервера меняется между транзакциями, поэтому серверные
+prepared statements отключаются, а параметры сессии (jit) не передаются
+при подключении (их нужно задать для роли: ALTER ROLE ... SET jit = off).
+"""
+
+import os
+import sys
+import threading
+import time
+import uuid
+from typing import Any, Dict, List, Optional
+
+from sqlalchemy import event
+from sqlalchemy.pool import AsyncAdaptedQueuePool, NullPool
+
+from app.utils.metrics import observe_db_pool_wait
+
+ROLE_API = "api"
+ROLE_CELERY = "celery"
+ROLE_BEAT = "beat"
+ROLE_SCRIPT = "script"
+
+
+class TimedAsyncQueuePool(AsyncAdaptedQueuePool):
+    """Пул async движка, который замеряет ожидание соединения (в т.ч. открытие нового)."""
+
+    metrics: Optional["PoolMetrics"] = None
+
+    def _do_get(self):
+        started = time.perf_counter()
+        try:
+            return super()._do_get()
+        finally:
+            if self.metrics is not None:
+                self.metrics.observe_wait(time.perf_counter() - started)
+
+    def recreate(self):
+        # Пул пересоздается при dispose() - метрики переходят к новому
+        pool = super().recreate()
+        pool.metrics = self.metrics
+        return pool
+
+# poolclass=NullPool - соединение открывается на время сессии и сразу закрывается
+POOL_PROFILES: Dict[str, Dict[str, Any]] = {
+    ROLE_API: {"poolclass": TimedAsyncQueuePool, "pool_size": 10, "max_overflow": 15, "pool_timeout": 10, "pool_recycle": 1800},
+    ROLE_CELERY: {"poolclass": NullPool},
+    ROLE_BEAT: {"poolclass": NullPool},
+    ROLE_SCRIPT: {"poolclass": TimedAsyncQueuePool, "pool_size": 2, "max_overflow": 3, "pool_timeout": 30, "pool_recycle": 1800},
+}
+
+POOL_ENV_OVERRIDES = {
+    "pool_size": "DB_POOL_SIZE",
+    "max_overflow": "DB_MAX_OVERFLOW",
+    "pool_timeout": "DB_POOL_TIMEOUT",
+    "pool_recycle": "DB_POOL_RECYCLE",
+}
+
+
+def detect_process_role(argv: Optional[List[str]] = None) -> str:
+    """Роль процесса: DB_PROCESS_ROLE, иначе по командной строке."""
+    role = os.getenv("DB_PROCESS_ROLE", "").strip().lower()
+    if role in POOL_PROFILES:
+        return role
+
+    argv = sys.argv if argv is None else argv
+    if not argv:
+        return ROLE_SCRIPT
+    # "celery ..." или "python -m celery ..." (argv[0] = .../celery/__main__.py)
+    program = os.path.basename(argv[0])
+    if program == "__main__.py":
+        program = os.path.basename(os.path.dirname(argv[0]))
+    if program == "celery":
+        return ROLE_BEAT if "beat" in argv[1:] else ROLE_CELERY
+    if program in ("uvicorn", "gunicorn", "hypercorn"):
+        return ROLE_API
+    return ROLE_SCRIPT
+
+
+def is_pgbouncer_mode() -> bool:
+    return os.getenv("DB_PGBOUNCER", "").strip().lower() in ("1", "true", "yes", "on")
+
+
+def pool_settings(role: str, scale: float = 1.0) -> Dict[str, Any]:
+    """
+    Параметры пула для create_async_engine.
+    scale уменьшает постоянный пул и overflow (например, для реплики).
+    """
+    settings = dict(POOL_PROFILES[role])
+    if settings.get("poolclass") is NullPool:
+        return settings
+
+    for name, env_name in POOL_ENV_OVERRIDES.items():
+        value = os.getenv(env_name)
+        if value:
+            settings[name] = int(value)
+    if scale != 1.0:
+        settings["pool_size"] = max(1, int(settings["pool_size"] * scale))
+        settings["max_overflow"] = max(0, int(settings["max_overflow"] * scale))
+    return settings
+
+
+def _unique_statement_name() -> str:
+    return f"__asyncpg_{uuid.uuid4()}__"
+
+
+def postgres_connect_args(pgbouncer: bool) -> Dict[str, Any]:
+    """connect_args для asyncpg."""
+    connect_args: Dict[str, Any] = {
+        "command_timeout": 30,  # Уменьшаем таймаут команды
+    }
+    if pgbouncer:
+        # Кэш prepared statements asyncpg и SQLAlchemy выключен, а безымянные
+        # операторы получают уникальные имена: за pgbouncer следующий запрос
+        # может уйти на другое серверное соединение
+        connect_args.update({
+            "statement_cache_size": 0,
+            "prepared_statement_cache_size": 0,
+            "prepared_statement_name_func": _unique_statement_name,
+        })
+    else:
+        connect_args["server_settings"] = {"jit": "off"}
+    return connect_args
+
+
+class PoolMetrics:
+    """Счетчики использования пула одного движка (через события пула)."""
+
+    def __init__(self, name: str, pool_size: int, max_overflow: int):
+        self.name = name
+        self.capacity = pool_size + max_overflow
+        self.pool_size = pool_size
+        self.checked_out = 0
+        self.peak_checked_out = 0
+        self.checkouts = 0
+        self.saturated_checkouts = 0
+        self.connects = 0
+        self.invalidations = 0
+        self.waits = 0
+        self.wait_seconds_total = 0.0
+        self.wait_seconds_max = 0.0
+        self._lock = threading.Lock()
+
+    def attach(self, sync_engine) -> None:
+        event.listen(sync_engine, "connect", self._on_connect)
+        event.listen(sync_engine, "checkout", self._on_checkout)
+        event.listen(sync_engine, "checkin", self._on_checkin)
+        event.listen(sync_engine, "invalidate", self._on_invalidate)
+
+    def _on_connect(self, dbapi_connection, connection_record):
+        with self._lock:
+            self.connects += 1
+
+    def _on_checkout(self, dbapi_connection, connection_record, connection_proxy):
+        with self._lock:
+            self.checked_out += 1
+            self.checkouts += 1
+            self.peak_checked_out = max(self.peak_checked_out, self.checked_out)
+            # Заняты все соединения пула и overflow: следующий запрос будет ждать
+            if self.capacity and self.checked_out >= self.capacity:
+                self.saturated_checkouts += 1
+
+    def _on_checkin(self, dbapi_connection, connection_record):
+        with self._lock:
+            self.checked_out = max(0, self.checked_out - 1)
+
+    def _on_invalidate(self, dbapi_connection, connection_record, exception):
+        with self._lock:
+            self.invalidations += 1
+
+    def observe_wait(self, seconds: float) -> None:
+        with self._lock:
+            self.waits += 1
+            self.wait_seconds_total += seconds
+            self.wait_seconds_max = max(self.wait_seconds_max, seconds)
+        observe_db_pool_wait(self.name, seconds)
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "name": self.name,
+                "pool_size": self.pool_size,
+                "capacity": self.capacity,
+                "checked_out": self.checked_out,
+                "peak_checked_out": self.peak_checked_out,
+                "checkouts": self.checkouts,
+                "saturated_checkouts": self.saturated_checkouts,
+                "connects": self.connects,
+                "invalidations": self.invalidations,
+                "wait_seconds_avg": round(self.wait_seconds_total / self.waits, 6) if self.waits else 0.0,
+                "wait_seconds_max": round(self.wait_seconds_max, 6),
+            }
+
+
+_metrics: Dict[str, PoolMetrics] = {}
+
+
+def track_pool(name: str, async_engine, settings: Dict[str, Any]) -> PoolMetrics:
+    """Подключает метрики к движку; NullPool учитывается с нулевой емкостью."""
+    metrics = PoolMetrics(name, settings.get("pool_size", 0), settings.get("max_overflow", 0))
+    metrics.attach(async_engine.sync_engine)
+    pool = async_engine.sync_engine.pool
+    if isinstance(pool, TimedAsyncQueuePool):
+        pool.metrics = metrics
+    _metrics[name] = metrics
+    return metrics
+
+
+def pool_stats() -> List[Dict[str, Any]]:
+    """Снимок метрик всех отслеживаемых пулов процесса."""
+    return [metrics.snapshot() for metrics in _metrics.values()]
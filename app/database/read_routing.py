@@ -0,0 +1,206 @@
+"""
+Маршрутизация читающих запросов на реплику БД.
+
+Эндпоинты только на чтение получают сессию через get_read_db
+(app/database/db_depends.py). Сессия открывается на реплике, если:
+- реплика настроена (REPLICA_DATABASE_URL);
+- отставание реплики не больше REPLICA_MAX_LAG_SECONDS (замеряется не чаще
+  раза в REPLICA_LAG_CHECK_SECONDS, ошибка замера считается отставанием);
+- клиент ничего не записывал последние READ_YOUR_WRITES_SECONDS секунд:
+  после коммита с изменениями его чтения идут на основную БД, чтобы он
+  сразу видел свои изменения. Отметка хранится в Redis (общая для воркеров)
+  и в памяти процесса (если Redis недоступен).
+Иначе используется основная БД.
+"""
+
+import asyncio
+import hashlib
+import logging
+import time
+from contextlib import asynccontextmanager
+from typing import AsyncIterator, Dict, Optional
+
+from sqlalchemy import event, text
+from sqlalchemy.ext.asyncio import AsyncEngine, AsyncSession, async_sessionmaker
+
+logger = logging.getLogger(__name__)
+
+# Отставание в секундах; 0, если реплика проиграла весь полученный WAL
+# (на простаивающей основной БД pg_last_xact_replay_timestamp не растет)
+REPLICA_LAG_SQL = """
+SELECT CASE
+    WHEN NOT pg_is_in_recovery() THEN 0
+    WHEN pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0
+    ELSE coalesce(extract(epoch FROM now() - pg_last_xact_replay_timestamp()), 0)
+END
+"""
+
+WRITES_COMMITTED = "writes_committed"
+READ_FROM_REPLICA = "read_from_replica"
+
+# Не даем словарю отметок расти бесконечно
+LOCAL_MARKS_PRUNE_SIZE = 10000
+
+
+def request_identity(connection) -> str:
+    """Ключ клиента для read-your-writes: токен авторизации, иначе IP."""
+    authorization = connection.headers.get("authorization")
+    if authorization:
+        return "auth:" + hashlib.sha256(authorization.encode("utf-8")).hexdigest()[:32]
+    from app.utils.geo_utils import get_client_ip
+    return f"ip:{get_client_ip(connection) or 'unknown'}"
+
+
+def track_writes(session: AsyncSession) -> None:
+    """
+    Отмечает в session.info, что сессия закоммитила изменения.
+    Изменением считается flush ORM или любой выполненный не-SELECT оператор.
+    """
+    sync_session = session.sync_session
+
+    def _after_flush(sess, flush_context):
+        sess.info["pending_writes"] = True
+
+    def _do_orm_execute(orm_execute_state):
+        if not orm_execute_state.is_select:
+            orm_execute_state.session.info["pending_writes"] = True
+
+    def _after_commit(sess):
+        if sess.info.pop("pending_writes", False):
+            sess.info[WRITES_COMMITTED] = True
+
+    def _after_rollback(sess):
+        sess.info.pop("pending_writes", None)
+
+    event.listen(sync_session, "after_flush", _after_flush)
+    event.listen(sync_session, "do_orm_execute", _do_orm_execute)
+    event.listen(sync_session, "after_commit", _after_commit)
+    event.listen(sync_session, "after_soft_rollback", lambda sess, previous_transaction: _after_rollback(sess))
+
+
+def is_replica_session(session) -> bool:
+    """
+    Сессия открыта на реплике. Данные из нее могут отставать, поэтому
+    долгоживущие кэши заполняются только чтением с основной БД.
+    """
+    return bool(session.info.get(READ_FROM_REPLICA))
+
+
+class ReplicaRouter:
+    """Выбор между основной БД и репликой для читающих запросов."""
+
+    def __init__(
+        self,
+        primary_session_maker: async_sessionmaker,
+        replica_session_maker: Optional[async_sessionmaker] = None,
+        replica_engine: Optional[AsyncEngine] = None,
+        max_lag_seconds: float = 5.0,
+        lag_check_seconds: float = 2.0,
+        read_your_writes_seconds: float = 10.0,
+    ):
+        self.primary_session_maker = primary_session_maker
+        self.replica_session_maker = replica_session_maker
+        self.replica_engine = replica_engine
+        self.max_lag_seconds = max_lag_seconds
+        self.lag_check_seconds = lag_check_seconds
+        self.read_your_writes_seconds = read_your_writes_seconds
+        self._lag: Optional[float] = None
+        self._lag_checked_at = float("-inf")
+        self._lag_lock = asyncio.Lock()
+        self._replica_usable = True
+        self._local_marks: Dict[str, float] = {}
+
+    @property
+    def has_replica(self) -> bool:
+        return self.replica_session_maker is not None and self.replica_engine is not None
+
+    async def replica_lag(self) -> Optional[float]:
+        """Отставание реплики в секундах (кэшируется), None - реплика недоступна."""
+        if not self.has_replica:
+            return None
+        if time.monotonic() - self._lag_checked_at < self.lag_check_seconds:
+            return self._lag
+        async with self._lag_lock:
+            # Пока ждали блокировку, замер мог сделать другой запрос
+            if time.monotonic() - self._lag_checked_at < self.lag_check_seconds:
+                return self._lag
+            try:
+                async with self.replica_engine.connect() as conn:
+                    lag = float((await conn.execute(text(REPLICA_LAG_SQL))).scalar() or 0)
+            except Exception as e:
+                lag = None
+                reason = f"реплика недоступна: {e}"
+            else:
+                reason = f"отставание реплики {lag:.1f} с"
+            usable = lag is not None and lag <= self.max_lag_seconds
+            # Логируем только смену состояния, а не каждый замер
+            if usable != self._replica_usable:
+                if usable:
+                    logger.info("[DB REPLICA] Чтение снова идет с реплики")
+                else:
+                    logger.warning(f"[DB REPLICA] {reason}, чтение с основной БД")
+                self._replica_usable = usable
+            self._lag = lag
+            self._lag_checked_at = time.monotonic()
+            return lag
+
+    async def mark_write(self, identity: str) -> None:
+        """Направляет чтения клиента на основную БД на read_your_writes_seconds."""
+        now = time.monotonic()
+        if len(self._local_marks) > LOCAL_MARKS_PRUNE_SIZE:
+            self._local_marks = {key: until for key, until in self._local_marks.items() if until > now}
+        self._local_marks[identity] = now + self.read_your_writes_seconds
+        from app.utils.redis_cache import cache_set, key_db_read_your_writes
+        await cache_set(key_db_read_your_writes(identity), "1", ttl_seconds=max(1, int(self.read_your_writes_seconds)))
+
+    async def wrote_recently(self, identity: str) -> bool:
+        until = self._local_marks.get(identity)
+        if until is not None:
+            if until > time.monotonic():
+                return True
+            self._local_marks.pop(identity, None)
+        from app.utils.redis_cache import cache_exists, key_db_read_your_writes
+        return await cache_exists(key_db_read_your_writes(identity))
+
+    async def session_maker_for_read(self, identity: Optional[str] = None) -> async_sessionmaker:
+        """Фабрика сессий для чтения: реплика или основная БД."""
+        if not self.has_replica:
+            return self.primary_session_maker
+        if identity is not None and await self.wrote_recently(identity):
+            return self.primary_session_maker
+        lag = await self.replica_lag()
+        if lag is None or lag > self.max_lag_seconds:
+            return self.primary_session_maker
+        return self.replica_session_maker
+
+    def mark_read_session(self, session: AsyncSession, session_maker: async_sessionmaker) -> None:
+        """Помечает сессию, открытую на реплике (см. is_replica_session)."""
+        if self.has_replica and session_maker is self.replica_session_maker:
+            session.info[READ_FROM_REPLICA] = True
+
+    @asynccontextmanager
+    async def read_session(self, identity: Optional[str] = None) -> AsyncIterator[AsyncSession]:
+        """Сессия только для чтения вне HTTP запроса (фоновые сборки, задачи)."""
+        session_maker = await self.session_maker_for_read(identity)
+        async with session_maker() as session:
+            self.mark_read_session(session, session_maker)
+            yield session
+
+
+_router: Optional[ReplicaRouter] = None
+
+
+def get_replica_router() -> ReplicaRouter:
+    """Общий маршрутизатор процесса (движки из app.database.db)."""
+    global _router
+    if _router is None:
+        from app.database import db
+        _router = ReplicaRouter(
+            db.async_session_maker,
+            db.replica_session_maker,
+            db.replica_engine,
+            max_lag_seconds=db.REPLICA_MAX_LAG_SECONDS,
+            lag_check_seconds=db.REPLICA_LAG_CHECK_SECONDS,
+            read_your_writes_seconds=db.READ_YOUR_WRITES_SECONDS,
+        )
+    return _router
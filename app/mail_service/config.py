@@ -34,4 +34,13 @@ if os.getenv("DEBUG_EMAIL", "false").lower() == "true":
     print(f"  EMAIL_HOST_PASSWORD: {'***' if EMAIL_HOST_PASSWORD else 'NOT SET'}")
     print(f"  DEFAULT_FROM_EMAIL: {DEFAULT_FROM_EMAIL}")
 
-# Проверка уже выполнена выше
\ No newline at end of file
+# Проверка уже выполнена выше
+
+# Пул SMTP соединений и очередь отправки
+EMAIL_POOL_SIZE = int(os.getenv("EMAIL_POOL_SIZE", "3"))
+EMAIL_BATCH_SIZE = int(os.getenv("EMAIL_BATCH_SIZE", "20"))
+EMAIL_MAX_ATTEMPTS = int(os.getenv("EMAIL_MAX_ATTEMPTS", "4"))
+EMAIL_RETRY_BACKOFF = float(os.getenv("EMAIL_RETRY_BACKOFF", "2.0"))
+# Провайдеры закрывают простаивающие соединения, такие переоткрываем заранее
+EMAIL_CONNECTION_MAX_IDLE = float(os.getenv("EMAIL_CONNECTION_MAX_IDLE", "60"))
+EMAIL_TIMEOUT = float(os.getenv("EMAIL_TIMEOUT", "10"))
@@ -1,16 +1,34 @@
 """
 Email sender для отправки уведомлений.
+
+Письма уходят через пул авторизованных SMTP соединений (SMTPPool): STARTTLS и
+login выполняются один раз на соединение, а не на каждое письмо. Асинхронный
+код ставит письма в очередь MailDispatcher, которая отправляет накопившиеся
+письма пачками по соединениям пула и повторяет временные ошибки (4xx, обрыв
+соединения) с экспоненциальной задержкой.
 """
 
+import asyncio
+import logging
+import random
 import smtplib
-import socket
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from email.message import Message
 from email.mime.text import MIMEText
 from email.mime.multipart import MIMEMultipart
+from typing import List, Optional, Tuple
 from .config import (
     EMAIL_HOST, EMAIL_PORT, EMAIL_USE_TLS,
-    EMAIL_HOST_USER, EMAIL_HOST_PASSWORD, DEFAULT_FROM_EMAIL
+    EMAIL_HOST_USER, EMAIL_HOST_PASSWORD, DEFAULT_FROM_EMAIL,
+    EMAIL_POOL_SIZE, EMAIL_BATCH_SIZE, EMAIL_MAX_ATTEMPTS, EMAIL_RETRY_BACKOFF,
+    EMAIL_CONNECTION_MAX_IDLE, EMAIL_TIMEOUT
 )
 
+logger = logging.getLogger(__name__)
+
 
 def generate_verification_email_html(verification_code: str) -> str:
     """
@@ -196,60 +214,12 @@ def generate_password_reset_email_html(verification_code: str) -> str:
     return html_template
 
 
-class EmailSender:
-    """Class for sending email via SMTP"""
-    
-    def __init__(self):
-        # Проверяем переменные только при создании экземпляра, а не при импорте
-        if not EMAIL_HOST_USER:
-            raise ValueError("EMAIL_HOST_USER not set in environment variables")
-        if not EMAIL_HOST_PASSWORD:
-            raise ValueError("EMAIL_HOST_PASSWORD not set in environment variables")
-        
-        self.host = EMAIL_HOST
-        self.port = EMAIL_PORT
-        self.username = EMAIL_HOST_USER
-        self.password = EMAIL_HOST_PASSWORD
-        self.use_tls = EMAIL_USE_TLS
-        self.from_email = DEFAULT_FROM_EMAIL or self.username
-    
-    def send_verification_email(self, to_email: str, verification_code: str) -> bool:
-        """
-        Sends verification code to email
-        
-        Args:
-            to_email: Recipient email
-            verification_code: Verification code
-            
-        Returns:
-            bool: True if sending successful, False if error
-        """
-        # Check if password contains non-ASCII characters
-        try:
-            self.password.encode('ascii')
-        except UnicodeEncodeError:
-            print(f"Password contains non-ASCII characters. Cannot send email.")
-            print(f"Verification code {verification_code} for {to_email} (sending disabled due to non-ASCII password)")
-            return False
-            
-        # If password is not set, don't try to send
-        if not self.password:
-            print(f"Verification code {verification_code} for {to_email} (real sending disabled)")
-            return False
-            
-        try:
-            # Create message
-            msg = MIMEMultipart()
-            # Используем DEFAULT_FROM_EMAIL с красивым именем
-            msg['From'] = f"Candy Girls Chat Support <{self.from_email}>"
-            msg['To'] = to_email
-            msg['Subject'] = "Подтверждение email - Candy Girls Chat"
-            
-            # Создаем HTML-тело письма
-            html_body = generate_verification_email_html(verification_code)
-            
-            # Создаем текстовую версию для клиентов без поддержки HTML
-            text_body = f"""Подтверждение email - Candy Girls Chat
+VERIFICATION_SUBJECT = "Подтверждение email - Candy Girls Chat"
+PASSWORD_RESET_SUBJECT = "Восстановление пароля - Candy Girls Chat"
+
+
+def _verification_text(verification_code: str) -> str:
+    return f"""Подтверждение email - Candy Girls Chat
 
 Здравствуйте!
 
@@ -266,77 +236,10 @@ class EmailSender:
 Команда Candy Girls Chat
 
 Это автоматическое письмо, пожалуйста, не отвечайте на него"""
-            
-            # Добавляем HTML и текстовую версию
-            msg.attach(MIMEText(text_body, 'plain', 'utf-8'))
-            msg.attach(MIMEText(html_body, 'html', 'utf-8'))
-            
-            # Устанавливаем timeout для socket операций (10 секунд)
-            # Это предотвращает зависание, если SMTP сервер недоступен
-            old_timeout = socket.getdefaulttimeout()
-            socket.setdefaulttimeout(10)
-            try:
-                # Connect to SMTP server with timeout
-                with smtplib.SMTP(self.host, self.port) as server:
-                    if self.use_tls:
-                        server.starttls()
-                    
-                    # Authenticate
-                    server.login(self.username, self.password)
-                    
-                    # Send message
-                    server.send_message(msg)
-                
-                print(f"Verification code successfully sent to {to_email}")
-                return True
-            finally:
-                # Восстанавливаем предыдущий timeout
-                socket.setdefaulttimeout(old_timeout)
-            
-        except (smtplib.SMTPConnectError, smtplib.SMTPAuthenticationError, smtplib.SMTPServerDisconnected) as e:
-            print(f"SMTP error sending email to {to_email}: {type(e).__name__}: {e}")
-            return False
-        except Exception as e:
-            print(f"Error sending email to {to_email}: {type(e).__name__}: {e}")
-            return False
-    
-    def send_password_reset_email(self, to_email: str, verification_code: str) -> bool:
-        """
-        Отправляет код восстановления пароля на email.
-        
-        Args:
-            to_email: Email получателя
-            verification_code: Код восстановления пароля
-            
-        Returns:
-            bool: True если отправка успешна, False при ошибке
-        """
-        # Проверяем пароль на наличие не-ASCII символов
-        try:
-            self.password.encode('ascii')
-        except UnicodeEncodeError:
-            print(f"Password contains non-ASCII characters. Cannot send email.")
-            print(f"Password reset code {verification_code} for {to_email} (sending disabled due to non-ASCII password)")
-            return False
-            
-        # Если пароль не установлен, не пытаемся отправить
-        if not self.password:
-            print(f"Password reset code {verification_code} for {to_email} (real sending disabled)")
-            return False
-            
-        try:
-            # Создаем сообщение
-            msg = MIMEMultipart()
-            # Используем DEFAULT_FROM_EMAIL с красивым именем
-            msg['From'] = f"Candy Girls Chat Support <{self.from_email}>"
-            msg['To'] = to_email
-            msg['Subject'] = "Восстановление пароля - Candy Girls Chat"
-            
-            # Создаем HTML-тело письма
-            html_body = generate_password_reset_email_html(verification_code)
-            
-            # Создаем текстовую версию для клиентов без поддержки HTML
-            text_body = f"""Восстановление пароля - Candy Girls Chat
+
+
+def _password_reset_text(verification_code: str) -> str:
+    return f"""Восстановление пароля - Candy Girls Chat
 
 Здравствуйте!
 
@@ -353,35 +256,383 @@ class EmailSender:
 Команда Candy Girls Chat
 
 Это автоматическое письмо, пожалуйста, не отвечайте на него"""
-            
-            # Добавляем HTML и текстовую версию
-            msg.attach(MIMEText(text_body, 'plain', 'utf-8'))
-            msg.attach(MIMEText(html_body, 'html', 'utf-8'))
-            
-            # Устанавливаем timeout для socket операций (10 секунд)
-            old_timeout = socket.getdefaulttimeout()
-            socket.setdefaulttimeout(10)
+
+
+def _build_message(to_email: str, subject: str, text_body: str, html_body: str, from_email: Optional[str] = None) -> MIMEMultipart:
+    msg = MIMEMultipart()
+    # Используем DEFAULT_FROM_EMAIL с красивым именем
+    msg['From'] = f"Candy Girls Chat Support <{from_email or DEFAULT_FROM_EMAIL or EMAIL_HOST_USER}>"
+    msg['To'] = to_email
+    msg['Subject'] = subject
+    # Текстовая версия для клиентов без поддержки HTML
+    msg.attach(MIMEText(text_body, 'plain', 'utf-8'))
+    msg.attach(MIMEText(html_body, 'html', 'utf-8'))
+    return msg
+
+
+def build_verification_message(to_email: str, verification_code: str, from_email: Optional[str] = None) -> MIMEMultipart:
+    """Письмо с кодом подтверждения email."""
+    code_str = str(verification_code)
+    return _build_message(
+        to_email, VERIFICATION_SUBJECT,
+        _verification_text(code_str), generate_verification_email_html(code_str), from_email,
+    )
+
+
+def build_password_reset_message(to_email: str, verification_code: str, from_email: Optional[str] = None) -> MIMEMultipart:
+    """Письмо с кодом восстановления пароля."""
+    code_str = str(verification_code)
+    return _build_message(
+        to_email, PASSWORD_RESET_SUBJECT,
+        _password_reset_text(code_str), generate_password_reset_email_html(code_str), from_email,
+    )
+
+
+def smtp_config_error() -> Optional[str]:
+    """Причина, по которой письма отправлять нельзя, или None."""
+    if not EMAIL_HOST_USER:
+        return "EMAIL_HOST_USER not set in environment variables"
+    if not EMAIL_HOST_PASSWORD:
+        return "EMAIL_HOST_PASSWORD not set in environment variables"
+    try:
+        EMAIL_HOST_PASSWORD.encode('ascii')
+    except UnicodeEncodeError:
+        return "Password contains non-ASCII characters"
+    return None
+
+
+def is_transient_error(error: BaseException) -> bool:
+    """Временная ли ошибка отправки (имеет смысл повторить)."""
+    if isinstance(error, (smtplib.SMTPServerDisconnected, smtplib.SMTPConnectError)):
+        return True
+    if isinstance(error, smtplib.SMTPRecipientsRefused):
+        return bool(error.recipients) and all(400 <= code < 500 for code, _ in error.recipients.values())
+    if isinstance(error, smtplib.SMTPResponseException):
+        return 400 <= error.smtp_code < 500
+    if isinstance(error, smtplib.SMTPException):
+        return False
+    # Сетевые ошибки и таймауты
+    return isinstance(error, OSError)
+
+
+def _breaks_connection(error: BaseException) -> bool:
+    if isinstance(error, smtplib.SMTPServerDisconnected):
+        return True
+    if isinstance(error, smtplib.SMTPResponseException):
+        # 421 - сервер закрывает соединение
+        return error.smtp_code == 421
+    if isinstance(error, smtplib.SMTPException):
+        return False
+    return isinstance(error, OSError)
+
+
+def retry_delay(attempt: int, backoff: float = EMAIL_RETRY_BACKOFF) -> float:
+    """Задержка перед повтором: экспоненциальная, с джиттером до 25%."""
+    return backoff * (2 ** (attempt - 1)) * (1 + random.random() * 0.25)
+
+
+def _close_quietly(connection: smtplib.SMTP) -> None:
+    try:
+        connection.quit()
+    except Exception:
+        try:
+            connection.close()
+        except Exception:
+            pass
+
+
+class SMTPPool:
+    """
+    Пул авторизованных SMTP соединений (потокобезопасный).
+
+    Соединение открывается (STARTTLS + login) один раз и переиспользуется
+    для последующих писем. Одновременно открыто не больше size соединений,
+    простаивающие дольше max_idle секунд закрываются перед использованием.
+    """
+
+    def __init__(
+        self,
+        host: str = EMAIL_HOST,
+        port: int = EMAIL_PORT,
+        username: str = EMAIL_HOST_USER,
+        password: str = EMAIL_HOST_PASSWORD,
+        use_tls: bool = EMAIL_USE_TLS,
+        size: int = EMAIL_POOL_SIZE,
+        max_idle: float = EMAIL_CONNECTION_MAX_IDLE,
+        timeout: float = EMAIL_TIMEOUT,
+    ):
+        self.host = host
+        self.port = port
+        self.username = username
+        self.password = password
+        self.use_tls = use_tls
+        self.size = size
+        self.max_idle = max_idle
+        self.timeout = timeout
+        self.connections_opened = 0
+        self._idle: List[Tuple[smtplib.SMTP, float]] = []
+        self._lock = threading.Lock()
+        self._slots = threading.BoundedSemaphore(size)
+
+    def _connect(self) -> smtplib.SMTP:
+        connection = smtplib.SMTP(self.host, self.port, timeout=self.timeout)
+        try:
+            if self.use_tls:
+                connection.starttls()
+            if self.username:
+                connection.login(self.username, self.password)
+        except Exception:
+            _close_quietly(connection)
+            raise
+        with self._lock:
+            self.connections_opened += 1
+        logger.info(f"[EMAIL] Открыто SMTP соединение с {self.host}:{self.port}")
+        return connection
+
+    def _take_idle(self) -> Optional[smtplib.SMTP]:
+        now = time.monotonic()
+        while True:
+            with self._lock:
+                if not self._idle:
+                    return None
+                connection, last_used = self._idle.pop()
+            if now - last_used <= self.max_idle:
+                return connection
+            _close_quietly(connection)
+
+    def send_messages(self, messages: List[Message]) -> List[Optional[Exception]]:
+        """
+        Отправляет письма по одному соединению из пула (блокирующий вызов).
+
+        Returns:
+            Для каждого письма None при успехе или исключение. Если соединение
+            оборвалось, остальные письма пачки получают ту же ошибку.
+        """
+        results: List[Optional[Exception]] = []
+        self._slots.acquire()
+        connection = None
+        broken = False
+        try:
             try:
-                # Подключаемся к SMTP серверу с timeout
-                with smtplib.SMTP(self.host, self.port) as server:
-                    if self.use_tls:
-                        server.starttls()
-                    
-                    # Аутентификация
-                    server.login(self.username, self.password)
-                    
-                    # Отправка сообщения
-                    server.send_message(msg)
-                
-                print(f"Password reset code successfully sent to {to_email}")
+                connection = self._take_idle() or self._connect()
+            except Exception as exc:
+                return [exc] * len(messages)
+            for index, message in enumerate(messages):
+                try:
+                    connection.send_message(message)
+                    results.append(None)
+                except Exception as exc:
+                    results.append(exc)
+                    if _breaks_connection(exc):
+                        broken = True
+                        results.extend([exc] * (len(messages) - index - 1))
+                        break
+            return results
+        finally:
+            if connection is not None:
+                if broken:
+                    _close_quietly(connection)
+                else:
+                    with self._lock:
+                        self._idle.append((connection, time.monotonic()))
+            self._slots.release()
+
+    def send_with_retry(self, message: Message, max_attempts: int = EMAIL_MAX_ATTEMPTS) -> bool:
+        """Отправляет письмо, повторяя временные ошибки с экспоненциальной задержкой."""
+        for attempt in range(1, max_attempts + 1):
+            error = self.send_messages([message])[0]
+            if error is None:
                 return True
-            finally:
-                # Восстанавливаем предыдущий timeout
-                socket.setdefaulttimeout(old_timeout)
+            if not is_transient_error(error) or attempt == max_attempts:
+                logger.warning(f"[EMAIL] Не удалось отправить письмо {message['To']}: {type(error).__name__}: {error}")
+                return False
+            time.sleep(retry_delay(attempt))
+        return False
+
+    def close(self) -> None:
+        with self._lock:
+            idle, self._idle = self._idle, []
+        for connection, _last_used in idle:
+            _close_quietly(connection)
+
+
+@dataclass
+class _OutgoingMessage:
+    message: Message
+    future: asyncio.Future
+    attempts: int = 0
+
+
+class MailDispatcher:
+    """
+    Асинхронная очередь отправки поверх SMTPPool.
+
+    Каждый из size воркеров забирает из очереди накопившиеся письма (до
+    batch_size) и отправляет их подряд по одному соединению в своем потоке.
+    Письма с временными ошибками возвращаются в очередь с экспоненциальной
+    задержкой, пока не исчерпаны max_attempts попыток.
+    """
+
+    def __init__(
+        self,
+        pool: SMTPPool,
+        batch_size: int = EMAIL_BATCH_SIZE,
+        max_attempts: int = EMAIL_MAX_ATTEMPTS,
+        backoff: float = EMAIL_RETRY_BACKOFF,
+    ):
+        self.pool = pool
+        self.batch_size = batch_size
+        self.max_attempts = max_attempts
+        self.backoff = backoff
+        self._queue: Optional[asyncio.Queue] = None
+        self._workers: List[asyncio.Task] = []
+        self._executor = ThreadPoolExecutor(max_workers=pool.size, thread_name_prefix="smtp")
+
+    def _ensure_workers(self) -> None:
+        if self._workers:
+            return
+        loop = asyncio.get_running_loop()
+        self._queue = asyncio.Queue()
+        self._workers = [loop.create_task(self._worker()) for _ in range(self.pool.size)]
+
+    def submit(self, message: Message) -> asyncio.Future:
+        """
+        Ставит письмо в очередь, не дожидаясь отправки.
+
+        Возвращает future с результатом доставки (True/False); повторы с
+        задержкой идут в фоне воркерами очереди.
+        """
+        self._ensure_workers()
+        item = _OutgoingMessage(message, asyncio.get_running_loop().create_future())
+        self._queue.put_nowait(item)
+        return item.future
+
+    async def send(self, message: Message) -> bool:
+        """Ставит письмо в очередь и ждет результата доставки."""
+        return await self.submit(message)
+
+    async def _worker(self) -> None:
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = [await self._queue.get()]
+            while len(batch) < self.batch_size:
+                try:
+                    batch.append(self._queue.get_nowait())
+                except asyncio.QueueEmpty:
+                    break
+            try:
+                results = await loop.run_in_executor(
+                    self._executor, self.pool.send_messages, [item.message for item in batch]
+                )
+            except Exception as exc:
+                results = [exc] * len(batch)
+            for item, error in zip(batch, results):
+                self._settle(item, error)
+
+    def _settle(self, item: _OutgoingMessage, error: Optional[Exception]) -> None:
+        if item.future.done():
+            return
+        if error is None:
+            item.future.set_result(True)
+            return
+        item.attempts += 1
+        if is_transient_error(error) and item.attempts < self.max_attempts:
+            delay = retry_delay(item.attempts, self.backoff)
+            logger.info(f"[EMAIL] Повтор отправки {item.message['To']} через {delay:.1f} с: {error}")
+            asyncio.get_running_loop().call_later(delay, self._queue.put_nowait, item)
+            return
+        logger.warning(f"[EMAIL] Не удалось отправить письмо {item.message['To']}: {type(error).__name__}: {error}")
+        item.future.set_result(False)
+
+    async def close(self) -> None:
+        for worker in self._workers:
+            worker.cancel()
+        await asyncio.gather(*self._workers, return_exceptions=True)
+        self._workers = []
+        await asyncio.get_running_loop().run_in_executor(self._executor, self.pool.close)
+        self._executor.shutdown(wait=False)
+
+
+_pool: Optional[SMTPPool] = None
+_dispatcher: Optional[MailDispatcher] = None
+_pool_lock = threading.Lock()
+
+
+def get_smtp_pool() -> SMTPPool:
+    """Общий пул соединений процесса (настройки из mail_service.config)."""
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = SMTPPool()
+        return _pool
+
+
+def get_mail_dispatcher() -> MailDispatcher:
+    """Общая очередь отправки для event loop приложения."""
+    global _dispatcher
+    if _dispatcher is None:
+        _dispatcher = MailDispatcher(get_smtp_pool())
+    return _dispatcher
+
+
+async def close_mail_dispatcher() -> None:
+    """Останавливает очередь отправки и закрывает соединения пула (при остановке приложения)."""
+    global _dispatcher
+    dispatcher, _dispatcher = _dispatcher, None
+    if dispatcher is not None:
+        await dispatcher.close()
+
+
+class EmailSender:
+    """Class for sending email via SMTP (синхронно, через общий пул соединений)"""
+    
+    def __init__(self, pool: Optional[SMTPPool] = None):
+        # Проверяем переменные только при создании экземпляра, а не при импорте
+        if pool is None:
+            if not EMAIL_HOST_USER:
+                raise ValueError("EMAIL_HOST_USER not set in environment variables")
+            if not EMAIL_HOST_PASSWORD:
+                raise ValueError("EMAIL_HOST_PASSWORD not set in environment variables")
+        
+        self.pool = pool or get_smtp_pool()
+        self.from_email = DEFAULT_FROM_EMAIL or self.pool.username
+    
+    def _send(self, message: Message, kind: str, to_email: str, verification_code: str) -> bool:
+        if self.pool is _pool:
+            config_error = smtp_config_error()
+            if config_error:
+                print(f"{config_error}. Cannot send email.")
+                print(f"{kind} {verification_code} for {to_email} (real sending disabled)")
+                return False
+        if self.pool.send_with_retry(message):
+            print(f"{kind} successfully sent to {to_email}")
+            return True
+        return False
+    
+    def send_verification_email(self, to_email: str, verification_code: str) -> bool:
+        """
+        Sends verification code to email
+        
+        Args:
+            to_email: Recipient email
+            verification_code: Verification code
+            
+        Returns:
+            bool: True if sending successful, False if error
+        """
+        message = build_verification_message(to_email, verification_code, self.from_email)
+        return self._send(message, "Verification code", to_email, verification_code)
+    
+    def send_password_reset_email(self, to_email: str, verification_code: str) -> bool:
+        """
+        Отправляет код восстановления пароля на email.
+        
+        Args:
+            to_email: Email получателя
+            verification_code: Код восстановления пароля
             
-        except (smtplib.SMTPConnectError, smtplib.SMTPAuthenticationError, smtplib.SMTPServerDisconnected) as e:
-            print(f"SMTP error sending password reset email to {to_email}: {type(e).__name__}: {e}")
-            return False
-        except Exception as e:
-            print(f"Error sending password reset email to {to_email}: {type(e).__name__}: {e}")
-            return False
\ No newline at end of file
+        Returns:
+            bool: True если отправка успешна, False при ошибке
+        """
+        message = build_password_reset_message(to_email, verification_code, self.from_email)
+        return self._send(message, "Password reset code", to_email, verification_code)
@@ -58,8 +58,6 @@ import time
 import logging
 import traceback
 import json
-from slugify import slugify
-import markdown
 from urllib.parse import unquote
 from contextlib import asynccontextmanager
 import re
@@ -90,6 +88,8 @@ from fastapi import FastAPI, Request, HTTPException, WebSocket, WebSocketDisconn
 from fastapi.exceptions import RequestValidationError
 from fastapi.middleware.cors import CORSMiddleware
 from starlette.middleware.sessions import SessionMiddleware
+from app.middleware.request_pipeline import RequestPipelineMiddleware
+from app.utils.log_pipeline import log_event
 from fastapi.responses import JSONResponse, FileResponse, RedirectResponse, Response, StreamingResponse, HTMLResponse
 from typing import AsyncGenerator
 from sqlalchemy.ext.asyncio import AsyncSession
@@ -263,6 +263,11 @@ try:
 except Exception as e:
     logger.warning(f"[TELEGRAM LOGGER] ⚠️ Ошибка инициализации Telegram logger: {e}")
 
+# Запись логов (консоль, файл, Telegram) - в отдельном потоке через очередь,
+# с выборкой и ограничением частоты шумных сообщений (см. app/utils/log_pipeline.py)
+from app.utils.log_pipeline import install_log_pipeline
+install_log_pipeline()
+
 
 async def sync_characters_to_db():
     """Синхронизация персонажей теперь не нужна - используем character_importer."""
@@ -395,7 +400,15 @@ async def lifespan(app: FastAPI):
     # Инициализируем Redis кэш (не блокируем запуск приложения)
     # Redis будет подключен при первом использовании, если доступен
     # logger.info("[INFO] Redis кэш будет инициализирован при первом использовании")
-    
+
+    # Загружаем диапазоны IP для определения страны при регистрации (в фоновом потоке)
+    try:
+        from app.utils.geo_utils import load_geoip_database
+        # Ссылка на задачу нужна, иначе event loop может собрать ее сборщиком мусора до завершения
+        app.state.geoip_load_task = asyncio.create_task(load_geoip_database())
+    except Exception as e:
+        logger.warning(f"[WARNING] Ошибка запуска загрузки GeoIP: {e}")
+
     # Проверяем переменные окружения RunPod
     try:
         from app.services.runpod_client import RUNPOD_URL, RUNPOD_URL_2, RUNPOD_URL_3
@@ -450,15 +463,13 @@ async def lifespan(app: FastAPI):
     logger.info("🎉 Приложение готово к работе!")
     logger.info("[INFO] Сервер должен быть готов принимать соединения")
 
-    # Инвалидируем кэш персонажей при каждом деплое чтобы гарантировать свежие bilingual-поля
-    try:
-        from app.utils.redis_cache import cache_delete, key_characters_list, cache_delete_pattern
-        await cache_delete(key_characters_list())
-        await cache_delete_pattern("characters:list:*")
-        await cache_delete_pattern("characters:single:*")
-        logger.info("[STARTUP] ✅ Кэш персонажей инвалидирован для применения обновлений полей")
-    except Exception as _cache_inv_err:
-        logger.warning(f"[STARTUP] Не удалось инвалидировать кэш персонажей: {_cache_inv_err}")
+    # Кэш персонажей версионирован (CACHE_VERSION), поэтому при деплое не очищается:
+    # новый код читает новое пространство ключей, старые ключи истекают по TTL
+    from app.utils.redis_cache import CACHE_VERSION
+    logger.info(f"[STARTUP] Версия пространства кэша: {CACHE_VERSION}")
+    if settings.CACHE_PREWARM_ON_STARTUP:
+        from app.chat_bot.api.character_endpoints import prewarm_characters_cache
+        asyncio.create_task(prewarm_characters_cache())
 
     from app.utils.http_client import http_client
     # Инициализируем глобальный HTTP клиент
@@ -486,6 +497,27 @@ async def lifespan(app: FastAPI):
     #             f"[WARNING] Ошибка остановки Keep Alive скрипта: {e}"
     #         )
     
+    # Останавливаем пул перекодирования изображений
+    try:
+        from app.services.image_pipeline import shutdown_pool
+        shutdown_pool()
+    except Exception as e:
+        logger.warning(f"[WARNING] Ошибка остановки пула перекодирования: {e}")
+    
+    # Закрываем SMTP соединения очереди писем
+    try:
+        from app.mail_service.sender import close_mail_dispatcher
+        await close_mail_dispatcher()
+    except Exception as e:
+        logger.warning(f"[WARNING] Ошибка остановки очереди писем: {e}")
+    
+    # Останавливаем подписку на обновления профиля
+    try:
+        from app.services.profit_activate import stop_profile_fanout
+        await stop_profile_fanout()
+    except Exception as e:
+        logger.warning(f"[WARNING] Ошибка остановки рассылки профиля: {e}")
+    
     # Закрываем соединение с Redis
     try:
         from app.utils.redis_cache import close_redis_client
@@ -495,6 +527,10 @@ async def lifespan(app: FastAPI):
         logger.warning(f"[WARNING] Ошибка закрытия Redis: {e}")
     
     logger.info("[OK] Приложение остановлено")
+    
+    # Дописываем логи из очереди
+    from app.utils.log_pipeline import shutdown_log_pipeline
+    shutdown_log_pipeline()
 
 # Создаем приложение с lifespan
 app = FastAPI(
@@ -528,20 +564,6 @@ async def test_ping_simple():
     logger.info("[TEST] /test-ping-simple called")
     return {"status": "ok", "message": "Server is alive"}
 
-# Middleware для логирования запросов (только ошибки)
-@app.middleware("http")
-async def log_requests_middleware(request: Request, call_next):
-    """Логирует только ошибки запросов."""
-    try:
-        response = await call_next(request)
-        # Логируем только ошибки
-        if response.status_code >= 400:
-            logger.warning(f"[ERROR] {request.method} {request.url.path} -> {response.status_code}")
-        return response
-    except Exception as e:
-        logger.error(f"[ERROR] {request.method} {request.url.path} -> {e}")
-        raise
-
 # HTML-шаблон страницы 404 для прямого доступа к API
 _API_404_HTML = """<!DOCTYPE html>
 <html lang="en">
@@ -656,46 +678,6 @@ _API_404_HTML = """<!DOCTYPE html>
 </html>"""
 
 
-# Middleware для блокировки прямого доступа к API из браузера
-@app.middleware("http")
-async def block_direct_api_access(request: Request, call_next):
-    """Блокирует прямой доступ к API эндпоинтам из браузера."""
-    path = request.url.path
-
-    # Только для API роутов
-    if path.startswith("/api/"):
-        # Разрешенные роуты для браузеров (OAuth и другие редиректы)
-        allowed_prefixes = [
-            "/api/v1/auth/google/login",
-            "/api/v1/auth/google/callback",
-        ]
-
-        is_allowed = any(path.startswith(prefix) for prefix in allowed_prefixes)
-
-        if not is_allowed:
-            fetch_mode = request.headers.get("sec-fetch-mode", "")
-            fetch_dest = request.headers.get("sec-fetch-dest", "")
-            accept = request.headers.get("accept", "")
-            user_agent = request.headers.get("user-agent", "").lower()
-
-            is_browser = any(b in user_agent for b in ["mozilla", "chrome", "safari", "firefox", "edge", "opera"])
-
-            is_direct_navigation = False
-
-            # Современные браузеры: sec-fetch-mode=navigate (самый надёжный признак)
-            if fetch_mode == "navigate":
-                is_direct_navigation = True
-            # Fallback: браузер без Fetch Metadata заголовков (старые/нестандартные)
-            elif is_browser and not fetch_mode and "text/html" in accept and "application/json" not in accept:
-                is_direct_navigation = True
-
-            if is_direct_navigation:
-                logger.warning(f"[SECURITY] Заблокирован прямой доступ браузера к API: {path}")
-                return HTMLResponse(content=_API_404_HTML, status_code=404)
-
-    return await call_next(request)
-
-
 # Настройка сессий для OAuth (должен быть ПЕРВЫМ, до CORS)
 # Используем Lax для SameSite, чтобы куки передавались при редиректах от Google
 app.add_middleware(
@@ -762,75 +744,10 @@ app.add_middleware(
     expose_headers=["*"],
 )
 
-# Middleware для логирования запросов к голосовым файлам
-@app.middleware("http")
-async def log_voice_requests(request: Request, call_next):
-	"""Middleware для логирования запросов к голосовым файлам."""
-	# Логируем запросы к /voices/ (воспроизведение уже сгенерированных голосов)
-	if request.method == "GET" and "/voices/" in str(request.url.path):
-		import os
-		# Извлекаем имя файла из пути
-		file_name = os.path.basename(request.url.path)
-		# Извлекаем название голоса из имени файла (убираем UUID и расширение)
-		voice_name = "Неизвестный голос"
-		if file_name:
-			# Пытаемся найти информацию о голосе из заголовков или из пути
-			# В большинстве случаев имя файла - это UUID, но можем попробовать найти связанный голос
-			voice_name = f"Файл: {file_name}"
-		
-		# Получаем информацию о пользователе из токена, если есть
-		user_info = "Неавторизованный пользователь"
-		auth_header = request.headers.get("Authorization", "")
-		if auth_header.startswith("Bearer "):
-			try:
-				from app.auth.dependencies import get_current_user_optional
-				# Пытаемся получить пользователя из токена
-				token = auth_header.replace("Bearer ", "")
-				# Декодируем токен для получения user_id (упрощенная версия)
-				import jwt
-				from app.config.settings import settings
-				decoded = jwt.decode(token, settings.SECRET_KEY, algorithms=["HS256"])
-				user_id = decoded.get("sub") or decoded.get("user_id")
-				if user_id:
-					user_info = f"Пользователь ID: {user_id}"
-			except Exception:
-				pass
-		
-		logger.info("=" * 80)
-		logger.info(f"[VOICE PLAYBACK] Запрос на воспроизведение голоса")
-		logger.info(f"[VOICE PLAYBACK] Файл: {file_name}")
-		logger.info(f"[VOICE PLAYBACK] Путь: {request.url.path}")
-		logger.info(f"[VOICE PLAYBACK] {user_info}")
-		logger.info(f"[VOICE PLAYBACK] IP адрес: {request.client.host if request.client else 'Unknown'}")
-		logger.info("=" * 80)
-	
-	response = await call_next(request)
-	
-	# Логируем статус ответа для голосовых файлов
-	if request.method == "GET" and "/voices/" in str(request.url.path):
-		logger.info(f"[VOICE PLAYBACK] Статус ответа: {response.status_code}")
-	
-	return response
-
-# Middleware для логирования запросов к YooMoney
-@app.middleware("http")
-async def log_ratings_requests(request: Request, call_next):
-	"""Middleware для логирования POST-запросов к YooMoney."""
-	# Логирование ВСЕХ POST-запросов к YooMoney эндпоинтам
-	if request.method == "POST" and "/youmoney/" in str(request.url):
-		logger.info("=" * 80)
-		logger.info(f"[YOUMONEY MIDDLEWARE] POST-запрос к YooMoney: {request.method} {request.url}")
-		logger.info(f"[YOUMONEY MIDDLEWARE] Path: {request.url.path}")
-		logger.info(f"[YOUMONEY MIDDLEWARE] Headers: {dict(request.headers)}")
-		logger.info(f"[YOUMONEY MIDDLEWARE] Client: {request.client}")
-		logger.info("=" * 80)
-	
-	response = await call_next(request)
-	
-	if request.method == "POST" and "/youmoney/" in str(request.url):
-		logger.info(f"[YOUMONEY MIDDLEWARE] Ответ для YooMoney: {response.status_code}")
-	
-	return response
+# Блокировка прямого доступа к API из браузера и логирование запросов
+# (ошибки, голосовые файлы, YooMoney) - один pure ASGI middleware без
+# буферизации ответов (см. app/middleware/request_pipeline.py)
+app.add_middleware(RequestPipelineMiddleware, blocked_api_html=_API_404_HTML)
 
 # ============================================================================
 # КРИТИЧНО: Роуты для рейтингов регистрируются НАПРЯМУЮ в app, ПЕРЕД всеми остальными
@@ -1716,10 +1633,13 @@ async def assets(path: str):
 @app.get("/en")
 @app.get("/en/")
 @app.get("/en/{path:path}")
-async def frontend_index(request: Request, db: AsyncSession = Depends(get_db)):
+async def frontend_index(request: Request):
     """
     Сервирует index.html из папки frontend/dist с полной инъекцией лора (SEO SSR).
+    Шаблон и готовые страницы персонажей берутся из памяти (см. app.services.seo_pages).
     """
+    from app.services.seo_pages import get_template, resolve_character_id, get_character_page
+
     try:
         # Определяем язык страницы из пути
         path = request.url.path
@@ -1729,21 +1649,9 @@ async def frontend_index(request: Request, db: AsyncSession = Depends(get_db)):
         elif path.startswith('/ru'):
             lang = 'ru'
 
-        # Определяем путь к index.html
-        repo_root = Path(__file__).resolve().parents[1]
-        index_html_path = repo_root / "frontend" / "dist" / "index.html"
-        
-        if not index_html_path.exists():
-            # Если dist не найден (локальная разработка), пробуем frontend/index.html
-            alt_path = repo_root / "frontend" / "index.html"
-            if alt_path.exists():
-                index_html_path = alt_path
-            else:
-                raise HTTPException(status_code=404, detail="Index.html not found")
-
-        # Читаем содержимое index.html
-        with open(index_html_path, "r", encoding="utf-8") as f:
-            html_content = f.read()
+        template = get_template()
+        if template is None:
+            raise HTTPException(status_code=404, detail="Index.html not found")
 
         # Извлекаем идентификатор персонажа из пути или параметров
         character_id = None
@@ -1761,145 +1669,26 @@ async def frontend_index(request: Request, db: AsyncSession = Depends(get_db)):
         
         if character_id:
             try:
-                from app.chat_bot.models.models import CharacterDB
-                from sqlalchemy import select, func, or_
-                import re
-                
                 # Декодируем идентификатор
                 decoded_id = unquote(character_id).strip()
                 
                 # Поиск персонажа: ID, Slug или Имя (кириллица поддерживается)
-                if decoded_id.isdigit():
-                    stmt = select(CharacterDB).where(CharacterDB.id == int(decoded_id))
-                else:
-                    # Ищем по slug (приоритет), name или display_name. Регистронезависимо.
-                    stmt = select(CharacterDB).where(
-                        or_(
-                            func.lower(CharacterDB.slug) == func.lower(decoded_id),
-                            func.lower(CharacterDB.name) == func.lower(decoded_id),
-                            func.lower(CharacterDB.display_name) == func.lower(decoded_id),
-                            func.lower(CharacterDB.name_ru) == func.lower(decoded_id),
-                            func.lower(CharacterDB.name_en) == func.lower(decoded_id)
-                        )
-                    )
-                    
-                result = await db.execute(stmt)
-                character = result.scalars().first()
-                
-                if character:
-                    # Собираем данные на нужном языке (RU/EN)
-                    name = (character.name_ru if lang == 'ru' else character.name_en) or character.display_name or character.name
-                    lore = (character.seo_lore_ru if lang == 'ru' else character.seo_lore_en) or character.seo_lore_ru or character.description or ""
-                    
-                    # Подготавливаем метаданные
-                    if lang == 'en':
-                        title = f"{name} - AI Roleplay Story & Lore | Candy Girls Chat"
-                    else:
-                        title = f"{name} - ИИ ролевой чат и история персонажа | Candy Girls Chat"
-                        
-                    # Очистка лора от markdown для короткого описания
-                    meta_desc_raw = re.sub(r'[#*`\[\]]', '', lore)
-                    meta_desc = (meta_desc_raw[:160].strip() + "...") if len(meta_desc_raw) > 160 else meta_desc_raw
-
-                    # Заменяем Title
-                    html_content = re.sub(r"<title>.*?</title>", f"<title>{title}</title>", html_content, flags=re.IGNORECASE | re.S)
-                    
-                    # Функция для надежной замены мета-тегов (учитывает новые строки и разный порядок атрибутов)
-                    def replace_meta(target_html, meta_name_or_prop, replacement_value):
-                        # Ищем тег <meta ...> целиком, проверяя наличие нужного name или property
-                        meta_tag_pattern = r'<meta\s+[^>]*?(?:name|property)=["\']' + re.escape(meta_name_or_prop) + r'["\'][^>]*?>'
-                        
-                        def content_replacer(match):
-                            tag = match.group(0)
-                            # Внутри найденного тега заменяем значение в content="..."
-                            new_tag = re.sub(r'(content=(["\'])).*?(\2)', rf'\1{replacement_value}\3', tag, flags=re.IGNORECASE | re.S)
-                            return new_tag
-
-                        return re.sub(meta_tag_pattern, content_replacer, target_html, flags=re.IGNORECASE | re.S)
-
-                    # Массовая замена мета-тегов
-                    html_content = replace_meta(html_content, "description", meta_desc)
-                    html_content = replace_meta(html_content, "og:title", title)
-                    html_content = replace_meta(html_content, "og:description", meta_desc)
-                    html_content = replace_meta(html_content, "twitter:title", title)
-                    html_content = replace_meta(html_content, "twitter:description", meta_desc)
-
-                    # OG:IMAGE
-                    image_url = character.seo_lore_image_url or "https://candygirlschat.com/logo-cherry.jpg"
-                    html_content = replace_meta(html_content, "og:image", image_url)
-                    html_content = replace_meta(html_content, "twitter:image", image_url)
-
-                    # HREFLANG и Canonical
-                    base_url = "https://candygirlschat.com"
-                    char_slug = character.slug or slugify(character.name)
-                    hreflang_tags = f"""
-    <link rel="alternate" hreflang="ru" href="{base_url}/ru/character/{char_slug}" />
-    <link rel="alternate" hreflang="en" href="{base_url}/en/character/{char_slug}" />
-    <link rel="alternate" hreflang="x-default" href="{base_url}/ru/character/{char_slug}" />
-    <link rel="canonical" href="{base_url}/{lang}/character/{char_slug}" />
-                    """
-                    # Вставляем теги перед </head>
-                    if '</head>' in html_content:
-                        html_content = html_content.replace('</head>', f'{hreflang_tags}\n</head>')
-
-                    # ГЕНЕРАЦИЯ HTML ЛОРА ДЛЯ ИНЪЕКЦИИ В #ROOT
-                    rendered_lore_html = markdown.markdown(lore) if lore else ""
-                    
-                    appearance = (character.appearance_ru if lang == 'ru' else character.appearance_en) or ""
-                    location = (character.location_ru if lang == 'ru' else character.location_en) or ""
-                    
-                    # Подзаголовок в зависимости от языка
-                    subtitle = "AI Character Story & Lore" if lang == 'en' else "История и лор персонажа"
-                    
-                    seo_article = f"""
-    <div id="seo-ssr-content" style="max-width: 900px; margin: 0 auto; color: #fff; padding: 40px 20px; font-family: sans-serif; line-height: 1.6;">
-        <header style="margin-bottom: 30px; text-align: center;">
-            <h1 style="font-size: 2.5rem; margin-bottom: 10px;">{name}</h1>
-            <div style="font-style: italic; opacity: 0.8; margin-bottom: 20px;">{subtitle}</div>
-            {f'<img src="{character.seo_lore_image_url}" alt="{name}" style="width: 100%; max-width: 600px; border-radius: 15px; box-shadow: 0 10px 30px rgba(0,0,0,0.5); margin-bottom: 30px;" />' if character.seo_lore_image_url else ''}
-        </header>
-        
-        <article class="lore-body" style="font-size: 1.1rem;">
-            {rendered_lore_html}
-        </article>
-        
-        <footer style="margin-top: 50px; padding-top: 30px; border-top: 1px solid rgba(255,255,255,0.1);">
-            <div style="display: grid; grid-template-columns: repeat(auto-fit, minmax(200px, 1fr)); gap: 20px;">
-                {f'<div><strong>{"Внешность" if lang == "ru" else "Appearance"}:</strong><p>{appearance}</p></div>' if appearance else ''}
-                {f'<div><strong>{"Локация" if lang == "ru" else "Location"}:</strong><p>{location}</p></div>' if location else ''}
-            </div>
-            <div style="margin-top: 30px; text-align: center;">
-                <a href="/{lang}/chat?character={character.id}" style="display: inline-block; background: #8b5cf6; color: #fff; padding: 12px 30px; border-radius: 30px; text-decoration: none; font-weight: bold; transition: transform 0.2s;">
-                    { 'Начать чат' if lang == 'ru' else 'Start Chat' }
-                </a>
-            </div>
-        </footer>
-    </div>
-                    """
-                    
-                    # Вставляем статью в <div id="root">
-                    if '<div id="root"></div>' in html_content:
-                        html_content = html_content.replace('<div id="root"></div>', f'<div id="root">{seo_article}</div>')
-                    else:
-                        # Если там есть пробелы или переносы, используем regex
-                        html_content = re.sub(r'(<div\s+id="root">)\s*(</div>)', rf'\1{seo_article}\2', html_content, flags=re.S)
-                    
-                    logger.info(f"[SEO] SSR Injection successful for: {name} (ID: {character_id})")
-                else:
-                    logger.warning(f"[SEO] Character not found in DB for ID/Slug: {character_id}")
+                resolved_id = await resolve_character_id(decoded_id)
+                page = await get_character_page(template, resolved_id, lang) if resolved_id else None
+                if page is not None:
+                    return HTMLResponse(content=page, status_code=200)
+                logger.warning(f"[SEO] Character not found in DB for ID/Slug: {character_id}")
             except Exception as e:
                 logger.error(f"[SEO] Exception during SSR injection: {e}", exc_info=True)
         
-        return HTMLResponse(content=html_content, status_code=200)
+        return HTMLResponse(content=template.body, status_code=200)
 
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"Error in frontend_index: {e}")
         raise HTTPException(status_code=500, detail="Internal Server Error")
 
-    except Exception as e:
-        logger.error(f"Ошибка в frontend_index: {e}")
-        raise HTTPException(status_code=500, detail="Internal Server Error")
-
 
 # Legacy root() removed in favor of direct handler in frontend_index
 
@@ -1981,127 +1770,50 @@ async def proxy_media(object_key: str):
             )
         raise
 
+def _sitemap_response(request: Request, sitemap_file) -> Response:
+    """Отдает собранный файл sitemap с учетом If-None-Match/If-Modified-Since и Accept-Encoding."""
+    headers = {
+        "ETag": sitemap_file.etag,
+        "Last-Modified": sitemap_file.last_modified_http,
+        "Cache-Control": "public, max-age=3600",
+        "Vary": "Accept-Encoding",
+    }
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match:
+        if sitemap_file.etag in [tag.strip() for tag in if_none_match.split(",")] or if_none_match.strip() == "*":
+            return Response(status_code=304, headers=headers)
+    elif request.headers.get("if-modified-since") == sitemap_file.last_modified_http:
+        return Response(status_code=304, headers=headers)
+
+    if "gzip" in request.headers.get("accept-encoding", ""):
+        headers["Content-Encoding"] = "gzip"
+        body = sitemap_file.body
+    else:
+        import gzip
+        body = gzip.decompress(sitemap_file.body)
+    return Response(content=body, media_type="application/xml; charset=utf-8", headers=headers)
+
+
 @app.get("/sitemap.xml")
-async def sitemap_xml(db: AsyncSession = Depends(get_db)):
-    """Sitemap.xml файл для поисковых систем (динамический, мультиязычный)."""
-    from app.chat_bot.models.models import CharacterDB, CharacterAvailableTag
-    from sqlalchemy import select
-    from datetime import date
-    
-    today = date.today().isoformat()
-    domain = "https://candygirlschat.com"
-    languages = ["ru", "en"]
-    
-    # Базовые страницы
-    pages = [
-        {"path": "", "priority": "1.0", "changefreq": "daily"},
-        {"path": "shop", "priority": "0.8", "changefreq": "weekly"},
-        {"path": "tariffs", "priority": "0.8", "changefreq": "weekly"},
-        {"path": "about", "priority": "0.6", "changefreq": "monthly"},
-        {"path": "how-it-works", "priority": "0.7", "changefreq": "monthly"},
-        {"path": "legal", "priority": "0.5", "changefreq": "monthly"},
-    ]
-    
-    sitemap_content = f"""<?xml version="1.0" encoding="UTF-8"?>
-<urlset xmlns="http://www.sitemaps.org/schemas/sitemap/0.9"
-        xmlns:xhtml="http://www.w3.org/1999/xhtml"
-        xmlns:image="http://www.google.com/schemas/sitemap-image/1.1">"""
-    
-    # 1. Добавляем базовые страницы для каждого языка
-    for lang in languages:
-        for page in pages:
-            path = page["path"]
-            loc = f"{domain}/{lang}/{path}" if path else f"{domain}/{lang}/"
-            
-            sitemap_content += f"""
-    <url>
-        <loc>{loc}</loc>
-        <lastmod>{today}</lastmod>
-        <changefreq>{page['changefreq']}</changefreq>
-        <priority>{page['priority']}</priority>"""
-            
-            # Добавляем альтернативные версии (hreflang)
-            for alt_lang in languages:
-                alt_loc = f"{domain}/{alt_lang}/{path}" if path else f"{domain}/{alt_lang}/"
-                sitemap_content += f"""
-        <xhtml:link rel="alternate" hreflang="{alt_lang}" href="{alt_loc}" />"""
-            
-            # Специальная обработка для главной страницы (добавляем x-default)
-            if not path:
-                sitemap_content += f"""
-        <xhtml:link rel="alternate" hreflang="x-default" href="{domain}/ru/" />"""
-            
-            # Изображение для главной
-            if not path and lang == "ru":
-                sitemap_content += f"""
-        <image:image>
-            <image:loc>{domain}/site-avatar-og.jpg</image:loc>
-            <image:title>Candy Girls Chat - AI Чат 18+</image:title>
-            <image:caption>Главная страница Candy Girls Chat</image:caption>
-        </image:image>"""
-                
-            sitemap_content += """
-    </url>"""
+async def sitemap_xml(request: Request):
+    """Sitemap.xml файл для поисковых систем (мультиязычный, собирается в фоне, см. app.services.sitemap_service)."""
+    from app.services.sitemap_service import get_sitemap_file, INDEX_NAME
 
-    try:
-        # 2. Добавляем персонажей
-        res_chars = await db.execute(select(CharacterDB.id, CharacterDB.name).order_by(CharacterDB.id))
-        chars_data = res_chars.all()
-        
-        for char_id, char_name in chars_data:
-            for lang in languages:
-                char_loc = f"{domain}/{lang}/chat?character={char_id}"
-                sitemap_content += f"""
-    <url>
-        <loc>{char_loc}</loc>
-        <lastmod>{today}</lastmod>
-        <changefreq>weekly</changefreq>
-        <priority>0.7</priority>"""
-                
-                # Альтернативные версии персонажа
-                for alt_lang in languages:
-                    alt_char_loc = f"{domain}/{alt_lang}/chat?character={char_id}"
-                    sitemap_content += f"""
-        <xhtml:link rel="alternate" hreflang="{alt_lang}" href="{alt_char_loc}" />"""
-                
-                sitemap_content += f"""
-        <xhtml:link rel="alternate" hreflang="x-default" href="{domain}/ru/chat?character={char_id}" />"""
-                
-                sitemap_content += """
-    </url>"""
-
-        # 3. Добавляем теги
-        res_tags = await db.execute(select(CharacterAvailableTag.slug).order_by(CharacterAvailableTag.id))
-        tags_slugs = res_tags.scalars().all()
-        
-        for tag_slug in tags_slugs:
-            if not tag_slug: continue
-            for lang in languages:
-                tag_loc = f"{domain}/{lang}/tags/{tag_slug}"
-                sitemap_content += f"""
-    <url>
-        <loc>{tag_loc}</loc>
-        <lastmod>{today}</lastmod>
-        <changefreq>weekly</changefreq>
-        <priority>0.6</priority>"""
-                
-                # Альтернативные версии тега
-                for alt_lang in languages:
-                    alt_tag_loc = f"{domain}/{alt_lang}/tags/{tag_slug}"
-                    sitemap_content += f"""
-        <xhtml:link rel="alternate" hreflang="{alt_lang}" href="{alt_tag_loc}" />"""
-                
-                sitemap_content += f"""
-        <xhtml:link rel="alternate" hreflang="x-default" href="{domain}/ru/tags/{tag_slug}" />"""
-                
-                sitemap_content += """
-    </url>"""
-                
-    except Exception as e:
-        logger.error(f"Error generating dynamic sitemap: {e}")
+    sitemap_file = await get_sitemap_file(INDEX_NAME)
+    if sitemap_file is None:
+        raise HTTPException(status_code=503, detail="Sitemap is not ready")
+    return _sitemap_response(request, sitemap_file)
 
-    sitemap_content += "\n</urlset>"
-    return Response(content=sitemap_content, media_type="application/xml; charset=utf-8")
+
+@app.get("/sitemap-{page}.xml")
+async def sitemap_page_xml(page: int, request: Request):
+    """Страница sitemap (используется, когда sitemap.xml является индексом)."""
+    from app.services.sitemap_service import get_sitemap_file
+
+    sitemap_file = await get_sitemap_file(f"sitemap-{page}.xml")
+    if sitemap_file is None:
+        raise HTTPException(status_code=404, detail="Sitemap page not found")
+    return _sitemap_response(request, sitemap_file)
 
 @app.get("/favicon.ico")
 async def favicon():
@@ -2113,10 +1825,34 @@ async def chat_page():
     """Страница чата - перенаправление на фронтенд."""
     return RedirectResponse(url="/frontend/")
 
+@app.get("/metrics", include_in_schema=False)
+def metrics(request: Request):
+    """
+    Метрики Prometheus (app/utils/metrics.py). Синхронный обработчик: в режиме
+    PROMETHEUS_MULTIPROC_DIR сборка читает файлы всех воркеров, FastAPI
+    выполняет ее в пуле потоков. При заданном METRICS_TOKEN нужен Bearer токен.
+    """
+    import hmac
+    from app.utils.metrics import METRICS_ENABLED, render_metrics
+
+    if not METRICS_ENABLED:
+        return JSONResponse(status_code=503, content={"detail": "Metrics disabled"})
+    token = os.getenv("METRICS_TOKEN")
+    if token:
+        auth_header = request.headers.get("authorization", "")
+        if not hmac.compare_digest(auth_header, f"Bearer {token}"):
+            return JSONResponse(status_code=401, content={"detail": "Unauthorized"})
+    content, content_type = render_metrics()
+    return Response(content=content, media_type=content_type)
+
+
 @app.get("/health")
 async def health():
     """Проверка здоровья основного приложения."""
     try:
+        from app.database.pool import pool_stats
+        from app.utils.log_pipeline import log_pipeline_stats
+
         # Получаем информацию о модели
         try:
             import sys
@@ -2151,7 +1887,11 @@ async def health():
                 "available": model_available,
                 "vae": model_info["vae_name"] if model_info and model_info["vae_name"] else "Built-in"
             },
-            "services": {}
+            "services": {},
+            # Загрузка пулов соединений с БД этого воркера
+            "database_pools": pool_stats(),
+            # Очередь логов: отброшенные, отсеянные выборкой и лимитом записи
+            "logging": log_pipeline_stats()
         }
         
         # Логируем информацию о модели
@@ -2747,6 +2487,9 @@ async def _write_chat_history(
                             "image_filename": image_filename
                         }
                     )
+                    # Raw SQL не вызывает обработчики ORM - счетчик сообщений обновляем сами
+                    from app.services.admin_stats import record_counter_delta_after_commit
+                    record_counter_delta_after_commit(db, 'total_messages', 1)
                     # Сохраняем сообщение ассистента
                     try:
                         if generation_time is not None and generation_time > 0:
@@ -2768,6 +2511,7 @@ async def _write_chat_history(
                                         "generation_time": int(round(generation_time))
                                     }
                                 )
+                                record_counter_delta_after_commit(db, 'total_messages', 1)
                             except Exception as e:
                                 # Ошибка (вероятно, нет колонки), пробуем без неё
                                 logger.warning(f"[HISTORY] Ошибка вставки ассистента с generation_time: {e}")
@@ -2787,6 +2531,7 @@ async def _write_chat_history(
                                         "image_filename": image_filename
                                     }
                                 )
+                                record_counter_delta_after_commit(db, 'total_messages', 1)
                         else:
                             # Вставляем без generation_time
                             await db.execute(
@@ -2804,6 +2549,7 @@ async def _write_chat_history(
                                     "image_filename": image_filename
                                 }
                             )
+                            record_counter_delta_after_commit(db, 'total_messages', 1)
                     except Exception as assistant_save_error:
                         logger.error(f"[HISTORY] Критическая ошибка сохранения ассистента: {assistant_save_error}")
                         await db.rollback()
@@ -2820,9 +2566,11 @@ async def _write_chat_history(
                     )
                     
                     # Инвалидируем кэш списка персонажей, чтобы новый персонаж появился на странице /history
-                    from app.utils.redis_cache import cache_delete, key_user_characters
+                    from app.utils.redis_cache import cache_delete, key_user_characters, key_chat_history
                     user_characters_cache_key = key_user_characters(user_id_int)
                     await cache_delete(user_characters_cache_key)
+                    # Последняя страница истории перечитается из БД при следующем запросе
+                    await cache_delete(key_chat_history(user_id_int, character_name, str(chat_session.id)))
                     logger.info(f"[HISTORY] Кэш списка персонажей инвалидирован для user_id={user_id_int}")
                 except Exception as chat_history_error:
                     await db.rollback()
@@ -3103,21 +2851,19 @@ async def chat_endpoint(
     Простой эндпоинт для чата - прямой ответ от модели без пост-обработки.
     Поддерживает стриминг через параметр stream=true.
     """
-    # КРИТИЧЕСКИ ВАЖНО: Логируем ВСЕ параметры запроса для диагностики
-    logger.info(f"[ENDPOINT CHAT] ========================================")
-    logger.info(f"[ENDPOINT CHAT] POST /chat")
-    logger.info(f"[ENDPOINT CHAT] User: {current_user.email if current_user else 'Anonymous'} (ID: {current_user.id if current_user else 'N/A'})")
-    logger.info(f"[ENDPOINT CHAT] Character: {request.get('character', 'N/A')}")
-    logger.info(f"[ENDPOINT CHAT] Generate image: {request.get('generate_image', False)}")
-    logger.info(f"[ENDPOINT CHAT] Message (первые 100 символов): {request.get('message', '')[:100]}...")
-    logger.info(f"[ENDPOINT CHAT] Model: {request.get('model', 'N/A')}")
-    
-    # КРИТИЧЕСКИ ВАЖНО: Проверяем параметр stream
+    # Одна структурированная запись вместо дампа запроса (промпты и история в лог не идут)
     stream_param_raw = request.get('stream')
-    logger.info(f"[ENDPOINT CHAT] Stream parameter RAW: {stream_param_raw} (type: {type(stream_param_raw).__name__ if stream_param_raw is not None else 'None'})")
-    logger.info(f"[ENDPOINT CHAT] Все ключи запроса: {list(request.keys())}")
-    logger.info(f"[ENDPOINT CHAT] Полный request dict: {request}")
-    logger.info(f"[ENDPOINT CHAT] ========================================")
+    log_event(
+        logger, "[ENDPOINT CHAT] POST /chat",
+        user_id=current_user.id if current_user else None,
+        character=request.get('character'),
+        model=request.get('model'),
+        generate_image=bool(request.get('generate_image', False)),
+        stream=stream_param_raw,
+        message_chars=len(request.get('message') or ''),
+        history_len=len(request.get('history') or []),
+        keys=",".join(request.keys()),
+    )
     
     try:
         logger.info("[NOTE] /chat: Простой режим - прямой ответ от модели")
@@ -3156,7 +2902,6 @@ async def chat_endpoint(
         
         # Проверяем, нужен ли стриминг
         stream_param = request.get("stream", False)
-        logger.info(f"[STREAM DEBUG] stream_param из request.get('stream'): {stream_param} (type: {type(stream_param).__name__})")
         
         # Обрабатываем разные форматы: bool, строка "true"/"false", число 1/0
         if isinstance(stream_param, bool):
@@ -3168,7 +2913,7 @@ async def chat_endpoint(
         else:
             use_streaming = False
         
-        logger.info(f"[STREAM] Параметр stream из запроса: {stream_param} (тип: {type(stream_param).__name__}), use_streaming={use_streaming}")
+        logger.debug(f"[STREAM] Параметр stream из запроса: {stream_param} (тип: {type(stream_param).__name__}), use_streaming={use_streaming}")
         
         # === КРИТИЧЕСКИ ВАЖНО: Обрабатываем пустое сообщение ДО формирования контекста для LLM ===
         # Если сообщение пустое, но запрашивается генерация фото, устанавливаем message
@@ -3193,13 +2938,13 @@ async def chat_endpoint(
         
         # Логируем историю из запроса для диагностики
         if history:
-            logger.info(f"[CONTEXT] История из запроса: {len(history)} сообщений")
+            logger.debug(f"[CONTEXT] История из запроса: {len(history)} сообщений")
             for i, msg in enumerate(history[-5:]):  # Показываем последние 5
                 role = msg.get('role', 'unknown')
                 content = msg.get('content', '')[:100]
                 logger.debug(f"[CONTEXT]   history[{i}]: {role}: {content}...")
         else:
-            logger.info(f"[CONTEXT] История из запроса отсутствует")
+            logger.debug(f"[CONTEXT] История из запроса отсутствует")
         
         # ОПТИМИЗИРОВАНО: Объединяем все запросы к БД в один блок
         token_user_id = str(current_user.id) if current_user else None
@@ -3207,7 +2952,7 @@ async def chat_endpoint(
         user_id = str(body_user_id) if body_user_id is not None else None
         if token_user_id is not None:
             user_id = token_user_id
-        logger.info(f"[DEBUG] /chat: effective user_id for history = {user_id}, current_user={current_user.email if current_user else 'None'}, current_user.id={current_user.id if current_user else 'None'}")
+        logger.debug(f"[DEBUG] /chat: effective user_id for history = {user_id}, current_user={current_user.email if current_user else 'None'}, current_user.id={current_user.id if current_user else 'None'}")
 
         def parse_int_user_id(value: Optional[str]) -> Optional[int]:
             if value is None:
@@ -4694,8 +4439,11 @@ async def generate_image(
         
         # Получаем настройки по умолчанию
         default_params = get_generation_params("default")
-        logger.info(f"🚨 MAIN.PY: request.steps = {request.steps}")
-        logger.info(f"🚨 MAIN.PY: default_params.get('steps') = {default_params.get('steps')}")
+        log_event(
+            logger, "[GENERATE] Параметры генерации", level=logging.DEBUG,
+            character=character_name, model=request.model,
+            steps=request.steps, default_steps=default_params.get('steps'),
+        )
         
         # Создаем настройки генерации с использованием значений по умолчанию
         # ВАЖНО: Если seed не указан или равен -1, передаем None для рандомизации
@@ -4800,7 +4548,7 @@ async def generate_image(
                 except (ImportError, Exception) as translate_error:
                     logger.error(f"[TRANSLATE] Ошибка перевода внешности: {translate_error}")
                 
-                logger.info(f"👤 Добавляем внешность персонажа: {clean_appearance[:100]}...")
+                logger.debug(f"👤 Добавляем внешность персонажа: {clean_appearance[:100]}...")
                 prompt_parts.append(clean_appearance)
                 full_settings_for_logging["character_appearance"] = clean_appearance
             
@@ -4823,7 +4571,7 @@ async def generate_image(
                 except (ImportError, Exception) as translate_error:
                     logger.error(f"[TRANSLATE] Ошибка перевода локации: {translate_error}")
                 
-                logger.info(f"🏠 Добавляем локацию персонажа: {clean_location[:100]}...")
+                logger.debug(f"🏠 Добавляем локацию персонажа: {clean_location[:100]}...")
                 prompt_parts.append(clean_location)
                 full_settings_for_logging["character_location"] = clean_location
         
@@ -4869,7 +4617,7 @@ async def generate_image(
                 # Но всё равно очищаем от \n
                 generation_settings.prompt = generation_settings.prompt.replace('\n', ', ')
                 generation_settings.prompt = ', '.join([p.strip() for p in generation_settings.prompt.split(',') if p.strip()])
-                logger.info(f"[TEST] Финальный промпт (чистый): {generation_settings.prompt}")
+                logger.debug(f"[TEST] Финальный промпт (чистый): {generation_settings.prompt}")
                 enhanced_prompt = generation_settings.prompt  # Для логирования
         
         # ВАЖНО: Переводим промпт с русского на английский перед генерацией
@@ -5119,7 +4867,12 @@ async def generate_image(
                                 "image_filename": None
                             }
                         )
+                        # Raw SQL не вызывает обработчики ORM - счетчик сообщений обновляем сами
+                        from app.services.admin_stats import record_counter_delta_after_commit
+                        record_counter_delta_after_commit(history_db, 'total_messages', 2)
                         await history_db.commit()
+                        from app.utils.redis_cache import cache_delete, key_chat_history
+                        await cache_delete(key_chat_history(user_id, request.character or "неизвестный", f"task_{task.id}"))
                 except Exception as e:
                     logger.warning(f"[PROMPT] Не удалось создать начальную запись в ChatHistory: {e}")
             else:
@@ -5723,12 +5476,8 @@ async def get_generation_status(
                         normalized_url = image_url.split('?')[0].split('#')[0]
                         
                         # КРИТИЧНО: Конвертируем URL в CDN формат
-                        try:
-                            from app.services.yandex_storage import get_yandex_storage_service
-                            storage_service = get_yandex_storage_service()
-                            normalized_url = storage_service.convert_yandex_url_to_cdn(normalized_url)
-                        except Exception as cdn_err:
-                            logger.error(f"[CDN] Ошибка при конвертации URL в CDN: {cdn_err}")
+                        from app.utils.media_urls import media_url
+                        normalized_url = media_url(normalized_url)
                         
                         # Извлекаем имя файла из URL
                         filename = None
@@ -5760,9 +5509,14 @@ async def get_generation_status(
                                         image_filename=filename,
                                         generation_time=generation_time
                                     )
+                                    .returning(ChatHistory.user_id, ChatHistory.character_name, ChatHistory.session_id)
                                 )
-                                await db.execute(stmt)
+                                updated_rows = (await db.execute(stmt)).all()
                                 await db.commit()
+                                # UPDATE мимо ORM: сбрасываем кэш последней страницы, чтобы заглушка не осталась в нем
+                                from app.utils.redis_cache import cache_delete, key_chat_history
+                                for row in {tuple(row) for row in updated_rows}:
+                                    await cache_delete(key_chat_history(*row))
                             else:
                                 logger.info(f"[CHAT_HISTORY] Пропуск обновления ChatHistory для task_{task_id} (skip_chat_history=True)")
                         
@@ -0,0 +1,161 @@
+"""
+Единый ASGI middleware для сквозной обработки HTTP запросов.
+
+Заменяет цепочку @app.middleware("http") (BaseHTTPMiddleware): каждый такой
+обработчик запускал приложение в отдельной задаче и пересобирал ответ, что
+добавляло накладные расходы на каждый запрос и ломало обратное давление у
+потоковых ответов (SSE, медиа). Здесь запрос передается приложению как есть,
+а send оборачивается только для чтения статуса ответа - тело не буферизуется.
+
+Обработка выбирается по пути:
+- /api/*: блокировка прямого открытия API в браузере (404 страница);
+- GET */voices/*: логирование воспроизведения голосов;
+- POST */youmoney/*: логирование запросов YooMoney;
+- все запросы: логирование ответов со статусом >= 400 и исключений и
+  гистограмма времени ответа по шаблону роута (app/utils/metrics.py).
+"""
+import logging
+import os
+import time
+from typing import Optional
+
+from starlette.datastructures import Headers
+from starlette.responses import HTMLResponse
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from app.utils.metrics import observe_http_request
+
+logger = logging.getLogger(__name__)
+
+# Разрешенные роуты для браузеров (OAuth и другие редиректы)
+BROWSER_ALLOWED_API_PREFIXES = (
+    "/api/v1/auth/google/login",
+    "/api/v1/auth/google/callback",
+)
+
+BROWSER_USER_AGENTS = ("mozilla", "chrome", "safari", "firefox", "edge", "opera")
+
+
+def is_direct_browser_navigation(headers: Headers) -> bool:
+    """Открыт ли URL браузером напрямую (адресная строка, ссылка), а не через fetch."""
+    fetch_mode = headers.get("sec-fetch-mode", "")
+    # Современные браузеры: sec-fetch-mode=navigate (самый надёжный признак)
+    if fetch_mode == "navigate":
+        return True
+    if fetch_mode:
+        return False
+    # Fallback: браузер без Fetch Metadata заголовков (старые/нестандартные)
+    accept = headers.get("accept", "")
+    user_agent = headers.get("user-agent", "").lower()
+    is_browser = any(b in user_agent for b in BROWSER_USER_AGENTS)
+    return is_browser and "text/html" in accept and "application/json" not in accept
+
+
+def _voice_user_info(headers: Headers) -> str:
+    """Пользователь из Bearer токена для логов воспроизведения голосов."""
+    auth_header = headers.get("authorization", "")
+    if auth_header.startswith("Bearer "):
+        try:
+            import jwt
+            from app.config.settings import settings
+            token = auth_header.replace("Bearer ", "")
+            decoded = jwt.decode(token, settings.SECRET_KEY, algorithms=["HS256"])
+            user_id = decoded.get("sub") or decoded.get("user_id")
+            if user_id:
+                return f"Пользователь ID: {user_id}"
+        except Exception:
+            pass
+    return "Неавторизованный пользователь"
+
+
+def _client_host(scope: Scope) -> str:
+    client = scope.get("client")
+    return client[0] if client else "Unknown"
+
+
+def _route_template(scope: Scope) -> Optional[str]:
+    """Шаблон пути сработавшего роута (роутер FastAPI кладет его в scope)."""
+    route = scope.get("route")
+    return getattr(route, "path", None)
+
+
+class RequestPipelineMiddleware:
+    """
+    Pure ASGI middleware: блокировка прямого доступа к API и логирование.
+    Подключается один раз: app.add_middleware(RequestPipelineMiddleware, ...).
+    """
+
+    def __init__(self, app: ASGIApp, blocked_api_html: str = "404, page not found."):
+        self.app = app
+        self.blocked_api_html = blocked_api_html
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        path = scope["path"]
+        method = scope["method"]
+        headers = None
+        started = time.perf_counter()
+
+        if path.startswith("/api/") and not path.startswith(BROWSER_ALLOWED_API_PREFIXES):
+            headers = Headers(scope=scope)
+            if is_direct_browser_navigation(headers):
+                logger.warning(f"[SECURITY] Заблокирован прямой доступ браузера к API: {path}")
+                response = HTMLResponse(content=self.blocked_api_html, status_code=404)
+                await response(scope, receive, send)
+                return
+
+        is_voice = method == "GET" and "/voices/" in path
+        is_youmoney = method == "POST" and "/youmoney/" in path
+        if is_voice:
+            self._log_voice_request(scope, headers or Headers(scope=scope))
+        elif is_youmoney:
+            self._log_youmoney_request(scope, headers or Headers(scope=scope))
+
+        status_code: Optional[int] = None
+
+        async def send_wrapper(message: Message) -> None:
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        except Exception as e:
+            logger.error(f"[ERROR] {method} {path} -> {e}")
+            observe_http_request(method, _route_template(scope), status_code or 500, time.perf_counter() - started)
+            raise
+        observe_http_request(method, _route_template(scope), status_code, time.perf_counter() - started)
+
+        # Логируем только ошибки
+        if status_code is not None and status_code >= 400:
+            logger.warning(f"[ERROR] {method} {path} -> {status_code}")
+        if is_voice:
+            logger.info(f"[VOICE PLAYBACK] Статус ответа: {status_code}")
+        elif is_youmoney:
+            logger.info(f"[YOUMONEY MIDDLEWARE] Ответ для YooMoney: {status_code}")
+
+    @staticmethod
+    def _log_voice_request(scope: Scope, headers: Headers) -> None:
+        path = scope["path"]
+        file_name = os.path.basename(path)
+        logger.info("=" * 80)
+        logger.info("[VOICE PLAYBACK] Запрос на воспроизведение голоса")
+        logger.info(f"[VOICE PLAYBACK] Файл: {file_name}")
+        logger.info(f"[VOICE PLAYBACK] Путь: {path}")
+        logger.info(f"[VOICE PLAYBACK] {_voice_user_info(headers)}")
+        logger.info(f"[VOICE PLAYBACK] IP адрес: {_client_host(scope)}")
+        logger.info("=" * 80)
+
+    @staticmethod
+    def _log_youmoney_request(scope: Scope, headers: Headers) -> None:
+        path = scope["path"]
+        logger.info("=" * 80)
+        logger.info(f"[YOUMONEY MIDDLEWARE] POST-запрос к YooMoney: {scope['method']} {path}")
+        logger.info(f"[YOUMONEY MIDDLEWARE] Path: {path}")
+        logger.info(f"[YOUMONEY MIDDLEWARE] Headers: {dict(headers)}")
+        logger.info(f"[YOUMONEY MIDDLEWARE] Client: {scope.get('client')}")
+        logger.info("=" * 80)
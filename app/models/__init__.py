@@ -3,18 +3,21 @@ from .subscription import UserSubscription, SubscriptionType, SubscriptionStatus
 from .user_gallery_unlock import UserGalleryUnlock
 from .payment_transaction import PaymentTransaction
 from .image_generation_history import ImageGenerationHistory
-from .balance_history import BalanceHistory
-from .character_comment import CharacterComment
+from .balance_history import BalanceHistory, BalanceMonthlySummary
+from .character_comment import CharacterComment, CharacterCommentCount
 from .bug_report import BugReport, BugComment
 from .user_voice import UserVoice
 from .promo_slider import PromoSliderItem
+from .user_conversation import UserConversation
+from .character_photo import CharacterPhoto
 
 __all__ = [
     "Users", "RefreshToken", "EmailVerificationCode",
     "UserSubscription", "SubscriptionType", "SubscriptionStatus",
     "UserGalleryUnlock", "PaymentTransaction",
-    "ImageGenerationHistory", "BalanceHistory",
-    "CharacterComment",
+    "ImageGenerationHistory", "BalanceHistory", "BalanceMonthlySummary",
+    "CharacterComment", "CharacterCommentCount",
     "BugReport", "BugComment",
-    "UserVoice", "PromoSliderItem"
+    "UserVoice", "PromoSliderItem",
+    "UserConversation", "CharacterPhoto"
 ]
\ No newline at end of file
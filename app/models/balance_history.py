@@ -1,23 +1,136 @@
 """
 Модель истории баланса пользователя.
+
+Помесячные итоги (balance_monthly_summaries) поддерживаются триггерами Postgres
+на balance_history: вставка прибавляет запись к итогам месяца, удаление и
+изменение пересчитывают затронутые месяцы по истории.
 """
 
 from datetime import datetime, timezone
-from sqlalchemy import Column, ForeignKey, String, Integer, DateTime, Text
+from sqlalchemy import (
+    Column, ForeignKey, Index, String, Integer, Date, DateTime, Text, PrimaryKeyConstraint, DDL, event
+)
 from sqlalchemy.orm import relationship
 from app.database.db import Base
+from app.database.ddl import tables_created
+
+# Месяц записи: created_at хранится в UTC без часового пояса
+BALANCE_MONTH_SQL = "date_trunc('month', {at})::date"
+
+# Каждый элемент - отдельный оператор (asyncpg не выполняет несколько команд за раз)
+BALANCE_SUMMARY_FUNCTIONS_SQL = (
+    f"""
+CREATE OR REPLACE FUNCTION balance_monthly_add(
+    p_user_id integer, p_at timestamp, p_amount integer, p_balance_after integer
+) RETURNS void AS $$
+BEGIN
+    INSERT INTO balance_monthly_summaries AS s (
+        user_id, month, credits, debits, operations, closing_balance, last_entry_at
+    )
+    VALUES (
+        p_user_id, {BALANCE_MONTH_SQL.format(at='p_at')}, greatest(p_amount, 0), greatest(-p_amount, 0),
+        1, p_balance_after, p_at
+    )
+    ON CONFLICT (user_id, month) DO UPDATE SET
+        credits = s.credits + EXCLUDED.credits,
+        debits = s.debits + EXCLUDED.debits,
+        operations = s.operations + 1,
+        closing_balance = CASE WHEN EXCLUDED.last_entry_at >= s.last_entry_at
+                               THEN EXCLUDED.closing_balance ELSE s.closing_balance END,
+        last_entry_at = greatest(s.last_entry_at, EXCLUDED.last_entry_at);
+END;
+$$ LANGUAGE plpgsql
+""",
+    f"""
+CREATE OR REPLACE FUNCTION balance_monthly_refresh(p_user_id integer, p_month date) RETURNS void AS $$
+BEGIN
+    DELETE FROM balance_monthly_summaries WHERE user_id = p_user_id AND month = p_month;
+    INSERT INTO balance_monthly_summaries (
+        user_id, month, credits, debits, operations, closing_balance, last_entry_at
+    )
+    SELECT p_user_id, p_month,
+           sum(greatest(amount, 0)), sum(greatest(-amount, 0)), count(*),
+           (array_agg(balance_after ORDER BY created_at DESC, id DESC))[1], max(created_at)
+      FROM balance_history
+     WHERE user_id = p_user_id
+       AND created_at >= p_month AND created_at < p_month + interval '1 month'
+    HAVING count(*) > 0;
+END;
+$$ LANGUAGE plpgsql
+""",
+    """
+CREATE OR REPLACE FUNCTION balance_monthly_on_insert() RETURNS trigger AS $$
+BEGIN
+    PERFORM balance_monthly_add(NEW.user_id, NEW.created_at, NEW.amount, NEW.balance_after);
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql
+""",
+    f"""
+CREATE OR REPLACE FUNCTION balance_monthly_on_delete() RETURNS trigger AS $$
+BEGIN
+    PERFORM balance_monthly_refresh(d.user_id, d.month)
+       FROM (SELECT DISTINCT user_id, {BALANCE_MONTH_SQL.format(at='created_at')} AS month FROM old_rows) d;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql
+""",
+    f"""
+CREATE OR REPLACE FUNCTION balance_monthly_on_update() RETURNS trigger AS $$
+BEGIN
+    PERFORM balance_monthly_refresh(d.user_id, d.month)
+       FROM (SELECT user_id, {BALANCE_MONTH_SQL.format(at='created_at')} AS month FROM old_rows
+             UNION
+             SELECT user_id, {BALANCE_MONTH_SQL.format(at='created_at')} AS month FROM new_rows) d;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql
+""",
+)
+
+# (имя триггера, таблица, определение)
+BALANCE_SUMMARY_TRIGGERS = (
+    ("trg_balance_monthly_insert", "balance_history",
+     "AFTER INSERT ON balance_history FOR EACH ROW EXECUTE FUNCTION balance_monthly_on_insert()"),
+    ("trg_balance_monthly_delete", "balance_history",
+     "AFTER DELETE ON balance_history REFERENCING OLD TABLE AS old_rows "
+     "FOR EACH STATEMENT EXECUTE FUNCTION balance_monthly_on_delete()"),
+    ("trg_balance_monthly_update", "balance_history",
+     "AFTER UPDATE ON balance_history REFERENCING OLD TABLE AS old_rows NEW TABLE AS new_rows "
+     "FOR EACH STATEMENT EXECUTE FUNCTION balance_monthly_on_update()"),
+)
+
+BALANCE_SUMMARY_FUNCTION_NAMES = (
+    "balance_monthly_on_update()",
+    "balance_monthly_on_delete()",
+    "balance_monthly_on_insert()",
+    "balance_monthly_refresh(integer, date)",
+    "balance_monthly_add(integer, timestamp, integer, integer)",
+)
+
+
+def balance_summary_ddl_statements():
+    """Операторы создания функций и триггеров (для миграции и metadata.create_all)."""
+    statements = list(BALANCE_SUMMARY_FUNCTIONS_SQL)
+    for name, table, definition in BALANCE_SUMMARY_TRIGGERS:
+        statements.append(f"DROP TRIGGER IF EXISTS {name} ON {table}")
+        statements.append(f"CREATE TRIGGER {name} {definition}")
+    return statements
 
 
 class BalanceHistory(Base):
     """Модель истории изменений баланса пользователя."""
     __tablename__ = "balance_history"
+    __table_args__ = (
+        # Keyset-пагинация истории пользователя с фильтром по датам: новые первыми
+        Index("ix_balance_history_user_created", "user_id", "created_at", "id"),
+    )
 
     id = Column(Integer, primary_key=True, autoincrement=True, nullable=False)
     user_id = Column(
         Integer,
         ForeignKey("users.id", ondelete="CASCADE"),
-        nullable=False,
-        index=True
+        nullable=False
     )
     amount = Column(Integer, nullable=False)  # Сумма изменения (может быть отрицательной для списаний)
     balance_before = Column(Integer, nullable=False)  # Баланс до изменения
@@ -35,3 +148,30 @@ class BalanceHistory(Base):
     def __repr__(self):
         return f"<BalanceHistory(id={self.id}, user_id={self.user_id}, amount={self.amount}, reason='{self.reason}')>"
 
+
+class BalanceMonthlySummary(Base):
+    """Итоги изменений баланса пользователя за месяц (только для чтения из приложения)."""
+    __tablename__ = "balance_monthly_summaries"
+    __table_args__ = (
+        PrimaryKeyConstraint("user_id", "month", name="pk_balance_monthly_summaries"),
+    )
+
+    user_id = Column(Integer, ForeignKey("users.id", ondelete="CASCADE"), nullable=False)
+    month = Column(Date, nullable=False)  # Первое число месяца (UTC)
+    credits = Column(Integer, nullable=False, default=0)  # Сумма начислений
+    debits = Column(Integer, nullable=False, default=0)  # Сумма списаний (положительное число)
+    operations = Column(Integer, nullable=False, default=0)  # Количество записей истории
+    closing_balance = Column(Integer, nullable=False)  # Баланс после последней записи месяца
+    last_entry_at = Column(DateTime, nullable=False)
+
+
+_has_balance_tables = tables_created("balance_history", "balance_monthly_summaries")
+
+
+# Тестовая БД создается через metadata.create_all, а не миграциями
+for _statement in balance_summary_ddl_statements():
+    event.listen(
+        Base.metadata,
+        "after_create",
+        DDL(_statement).execute_if(dialect="postgresql", callable_=_has_balance_tables),
+    )
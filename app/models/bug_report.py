@@ -3,7 +3,7 @@
 """
 
 from datetime import datetime, timezone
-from sqlalchemy import Column, ForeignKey, String, Integer, DateTime, Text, Enum as SQLEnum
+from sqlalchemy import Column, ForeignKey, Index, String, Integer, DateTime, Text, Enum as SQLEnum
 from sqlalchemy.orm import relationship
 from app.database.db import Base
 import enum
@@ -19,6 +19,11 @@ class BugStatus(str, enum.Enum):
 class BugReport(Base):
     """Модель баг-репорта."""
     __tablename__ = "bug_reports"
+    __table_args__ = (
+        # Keyset-пагинация списка: новые первыми, с фильтром по статусу и без
+        Index("ix_bug_reports_created", "created_at", "id"),
+        Index("ix_bug_reports_status_created", "status", "created_at", "id"),
+    )
 
     id = Column(Integer, primary_key=True, autoincrement=True, nullable=False)
     title = Column(String(500), nullable=False)  # Название проблемы
@@ -41,9 +46,13 @@ class BugReport(Base):
 class BugComment(Base):
     """Модель комментария к баг-репорту."""
     __tablename__ = "bug_comments"
+    __table_args__ = (
+        # Комментарии страницы репортов по порядку и последний комментарий (DISTINCT ON)
+        Index("ix_bug_comments_report_created", "bug_report_id", "created_at", "id"),
+    )
 
     id = Column(Integer, primary_key=True, autoincrement=True, nullable=False)
-    bug_report_id = Column(Integer, ForeignKey("bug_reports.id", ondelete="CASCADE"), nullable=False, index=True)
+    bug_report_id = Column(Integer, ForeignKey("bug_reports.id", ondelete="CASCADE"), nullable=False)
     user_id = Column(Integer, ForeignKey("users.id", ondelete="SET NULL"), nullable=True, index=True)
     content = Column(Text, nullable=False)  # Текст комментария
     created_at = Column(
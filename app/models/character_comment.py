@@ -1,19 +1,81 @@
 """
 Модель комментариев к персонажам.
+
+Количество комментариев персонажа хранится в character_comment_counts и
+поддерживается триггером Postgres на character_comments: так учитываются и
+каскадные удаления вместе с пользователем, которые не проходят через API.
 """
 
 from datetime import datetime, timezone
-from sqlalchemy import Column, ForeignKey, String, Integer, DateTime, Text, Boolean
+from sqlalchemy import Column, ForeignKey, Index, String, Integer, DateTime, Text, Boolean, DDL, event
 from sqlalchemy.orm import relationship
 from app.database.db import Base
+from app.database.ddl import tables_created
+
+# Каждый элемент - отдельный оператор (asyncpg не выполняет несколько команд за раз)
+COMMENT_COUNT_FUNCTIONS_SQL = (
+    """
+CREATE OR REPLACE FUNCTION character_comment_counts_add(p_character_name text, p_delta integer)
+RETURNS void AS $$
+BEGIN
+    INSERT INTO character_comment_counts AS c (character_name, comments_count)
+    VALUES (p_character_name, greatest(p_delta, 0))
+    ON CONFLICT (character_name) DO UPDATE SET
+        comments_count = greatest(c.comments_count + p_delta, 0);
+END;
+$$ LANGUAGE plpgsql
+""",
+    """
+CREATE OR REPLACE FUNCTION character_comment_counts_on_change() RETURNS trigger AS $$
+BEGIN
+    IF TG_OP IN ('DELETE', 'UPDATE') THEN
+        PERFORM character_comment_counts_add(OLD.character_name, -1);
+    END IF;
+    IF TG_OP IN ('INSERT', 'UPDATE') THEN
+        PERFORM character_comment_counts_add(NEW.character_name, 1);
+    END IF;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql
+""",
+)
+
+# (имя триггера, таблица, определение)
+COMMENT_COUNT_TRIGGERS = (
+    ("trg_character_comment_counts", "character_comments",
+     "AFTER INSERT OR DELETE ON character_comments FOR EACH ROW "
+     "EXECUTE FUNCTION character_comment_counts_on_change()"),
+    ("trg_character_comment_counts_rename", "character_comments",
+     "AFTER UPDATE OF character_name ON character_comments FOR EACH ROW "
+     "WHEN (OLD.character_name IS DISTINCT FROM NEW.character_name) "
+     "EXECUTE FUNCTION character_comment_counts_on_change()"),
+)
+
+COMMENT_COUNT_FUNCTION_NAMES = (
+    "character_comment_counts_on_change()",
+    "character_comment_counts_add(text, integer)",
+)
+
+
+def comment_count_ddl_statements():
+    """Операторы создания функций и триггеров (для миграции и metadata.create_all)."""
+    statements = list(COMMENT_COUNT_FUNCTIONS_SQL)
+    for name, table, definition in COMMENT_COUNT_TRIGGERS:
+        statements.append(f"DROP TRIGGER IF EXISTS {name} ON {table}")
+        statements.append(f"CREATE TRIGGER {name} {definition}")
+    return statements
 
 
 class CharacterComment(Base):
     """Модель комментария к персонажу."""
     __tablename__ = "character_comments"
+    __table_args__ = (
+        # Keyset-пагинация комментариев персонажа: новые первыми
+        Index("ix_character_comments_character_created", "character_name", "created_at", "id"),
+    )
 
     id = Column(Integer, primary_key=True, autoincrement=True, nullable=False)
-    character_name = Column(String, nullable=False, index=True)  # Имя персонажа
+    character_name = Column(String, nullable=False)  # Имя персонажа
     user_id = Column(Integer, ForeignKey("users.id", ondelete="CASCADE"), nullable=False, index=True)
     content = Column(Text, nullable=False)  # Текст комментария
     is_edited = Column(Boolean, default=False, nullable=False)  # Был ли комментарий отредактирован
@@ -32,3 +94,22 @@ class CharacterComment(Base):
     # Связь с пользователем
     user = relationship("Users", backref="character_comments")
 
+
+class CharacterCommentCount(Base):
+    """Количество комментариев персонажа (только для чтения из приложения)."""
+    __tablename__ = "character_comment_counts"
+
+    character_name = Column(String, primary_key=True)
+    comments_count = Column(Integer, nullable=False, default=0, server_default="0")
+
+
+_has_comment_tables = tables_created("character_comments", "character_comment_counts")
+
+
+# Тестовая БД создается через metadata.create_all, а не миграциями
+for _statement in comment_count_ddl_statements():
+    event.listen(
+        Base.metadata,
+        "after_create",
+        DDL(_statement).execute_if(dialect="postgresql", callable_=_has_comment_tables),
+    )
@@ -0,0 +1,206 @@
+"""
+Индекс фотографий персонажа для галереи на странице персонажа.
+
+Одна строка на фото (персонаж, пользователь, URL без query/fragment) вместо
+объединения chat_history, user_gallery и image_generation_history на каждый
+запрос. Строки поддерживаются триггерами Postgres на этих таблицах (вставки в
+них идут и через ORM, и через raw SQL), запись image_generation_history
+попадает в индекс, когда pending:-маркер заменяется реальным URL.
+Для существующих данных таблица заполняется скриптом
+app/scripts/backfill_character_photos.py.
+"""
+from sqlalchemy import (
+    Column, DateTime, ForeignKey, Index, Integer, String, Text, UniqueConstraint, DDL, event
+)
+from app.database.db import Base
+from app.database.ddl import tables_created
+from app.models.user_conversation import CHARACTER_KEY_SQL
+
+# URL сравниваются без query string и fragment, как в ImageGenerationHistoryService
+PHOTO_URL_SQL = "split_part(split_part({url}, '?', 1), '#', 1)"
+
+# Служебный текст сообщения с фото, промптом он не является
+GENERATION_PLACEHOLDER = "Генерация изображения"
+
+# Каждый элемент - отдельный оператор (asyncpg не выполняет несколько команд за раз)
+PHOTO_FUNCTIONS_SQL = (
+    f"""
+CREATE OR REPLACE FUNCTION character_photo_upsert(
+    p_user_id integer, p_character_name text, p_image_url text, p_prompt text,
+    p_generation_time integer, p_source text, p_at timestamptz
+) RETURNS void AS $$
+DECLARE
+    v_key text := {CHARACTER_KEY_SQL.format(name='p_character_name')};
+    v_url text := {PHOTO_URL_SQL.format(url='p_image_url')};
+BEGIN
+    IF p_user_id IS NULL OR v_key IS NULL OR v_key = ''
+       OR v_url IS NULL OR v_url = '' OR left(v_url, 8) = 'pending:' THEN
+        RETURN;
+    END IF;
+    INSERT INTO character_photos AS cp (
+        character_key, user_id, image_url, prompt, generation_time, source, created_at
+    )
+    VALUES (
+        v_key, p_user_id, v_url, nullif(p_prompt, '{GENERATION_PLACEHOLDER}'),
+        p_generation_time, p_source, coalesce(p_at, now())
+    )
+    ON CONFLICT (character_key, user_id, image_url) DO UPDATE SET
+        prompt = coalesce(cp.prompt, EXCLUDED.prompt),
+        -- Время генерации из image_generation_history точнее, чем из сообщения чата
+        generation_time = CASE
+            WHEN EXCLUDED.source = 'image_generation'
+            THEN coalesce(EXCLUDED.generation_time, cp.generation_time)
+            ELSE coalesce(cp.generation_time, EXCLUDED.generation_time) END,
+        created_at = least(cp.created_at, EXCLUDED.created_at);
+END;
+$$ LANGUAGE plpgsql
+""",
+    """
+CREATE OR REPLACE FUNCTION character_photos_on_chat_history() RETURNS trigger AS $$
+BEGIN
+    PERFORM character_photo_upsert(
+        NEW.user_id, NEW.character_name, NEW.image_url, NEW.message_content,
+        NEW.generation_time, 'chat_history', NEW.created_at
+    );
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql
+""",
+    """
+CREATE OR REPLACE FUNCTION character_photos_on_image() RETURNS trigger AS $$
+BEGIN
+    PERFORM character_photo_upsert(
+        NEW.user_id, NEW.character_name, NEW.image_url, NEW.prompt,
+        NEW.generation_time, 'image_generation', NEW.created_at
+    );
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql
+""",
+    """
+CREATE OR REPLACE FUNCTION character_photos_on_gallery() RETURNS trigger AS $$
+BEGIN
+    PERFORM character_photo_upsert(
+        NEW.user_id, NEW.character_name, NEW.image_url, NULL, NULL, 'gallery', NEW.created_at
+    );
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql
+""",
+    # Фото убирается из индекса, только когда у пользователя не осталось ни одного источника с этим URL
+    f"""
+CREATE OR REPLACE FUNCTION character_photos_on_source_delete() RETURNS trigger AS $$
+BEGIN
+    DELETE FROM character_photos cp
+     USING (SELECT DISTINCT user_id,
+                   {CHARACTER_KEY_SQL.format(name='character_name')} AS character_key,
+                   {PHOTO_URL_SQL.format(url='image_url')} AS image_url
+              FROM old_rows
+             WHERE image_url IS NOT NULL AND image_url <> '') d
+     WHERE cp.user_id = d.user_id
+       AND cp.character_key = d.character_key
+       AND cp.image_url = d.image_url
+       AND NOT EXISTS (SELECT 1 FROM chat_history h
+                        WHERE h.user_id = d.user_id AND {PHOTO_URL_SQL.format(url='h.image_url')} = d.image_url)
+       AND NOT EXISTS (SELECT 1 FROM image_generation_history g
+                        WHERE g.user_id = d.user_id AND {PHOTO_URL_SQL.format(url='g.image_url')} = d.image_url)
+       AND NOT EXISTS (SELECT 1 FROM user_gallery ug
+                        WHERE ug.user_id = d.user_id AND {PHOTO_URL_SQL.format(url='ug.image_url')} = d.image_url);
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql
+""",
+    # История переписывается на новое имя персонажа, индекс следует за ней
+    f"""
+CREATE OR REPLACE FUNCTION character_photos_on_character_rename() RETURNS trigger AS $$
+DECLARE
+    v_old_key text := {CHARACTER_KEY_SQL.format(name='OLD.name')};
+    v_new_key text := {CHARACTER_KEY_SQL.format(name='NEW.name')};
+BEGIN
+    UPDATE character_photos cp SET character_key = v_new_key
+     WHERE cp.character_key = v_old_key
+       AND NOT EXISTS (
+           SELECT 1 FROM character_photos x
+            WHERE x.character_key = v_new_key AND x.user_id = cp.user_id AND x.image_url = cp.image_url
+       );
+    DELETE FROM character_photos WHERE character_key = v_old_key;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql
+""",
+)
+
+# (имя триггера, таблица, определение)
+PHOTO_TRIGGERS = (
+    ("trg_character_photos_chat_history", "chat_history",
+     "AFTER INSERT ON chat_history FOR EACH ROW "
+     "WHEN (NEW.image_url IS NOT NULL AND NEW.image_url <> '') "
+     "EXECUTE FUNCTION character_photos_on_chat_history()"),
+    ("trg_character_photos_chat_history_delete", "chat_history",
+     "AFTER DELETE ON chat_history REFERENCING OLD TABLE AS old_rows "
+     "FOR EACH STATEMENT EXECUTE FUNCTION character_photos_on_source_delete()"),
+    ("trg_character_photos_image", "image_generation_history",
+     "AFTER INSERT OR UPDATE OF image_url ON image_generation_history FOR EACH ROW "
+     "EXECUTE FUNCTION character_photos_on_image()"),
+    ("trg_character_photos_image_delete", "image_generation_history",
+     "AFTER DELETE ON image_generation_history REFERENCING OLD TABLE AS old_rows "
+     "FOR EACH STATEMENT EXECUTE FUNCTION character_photos_on_source_delete()"),
+    ("trg_character_photos_gallery", "user_gallery",
+     "AFTER INSERT ON user_gallery FOR EACH ROW EXECUTE FUNCTION character_photos_on_gallery()"),
+    ("trg_character_photos_gallery_delete", "user_gallery",
+     "AFTER DELETE ON user_gallery REFERENCING OLD TABLE AS old_rows "
+     "FOR EACH STATEMENT EXECUTE FUNCTION character_photos_on_source_delete()"),
+    ("trg_character_photos_character_rename", "characters",
+     "AFTER UPDATE OF name ON characters FOR EACH ROW WHEN (OLD.name IS DISTINCT FROM NEW.name) "
+     "EXECUTE FUNCTION character_photos_on_character_rename()"),
+)
+
+PHOTO_FUNCTION_NAMES = (
+    "character_photos_on_character_rename()",
+    "character_photos_on_source_delete()",
+    "character_photos_on_gallery()",
+    "character_photos_on_image()",
+    "character_photos_on_chat_history()",
+    "character_photo_upsert(integer, text, text, text, integer, text, timestamptz)",
+)
+
+
+def photo_ddl_statements():
+    """Операторы создания функций и триггеров (для миграции и metadata.create_all)."""
+    statements = list(PHOTO_FUNCTIONS_SQL)
+    for name, table, definition in PHOTO_TRIGGERS:
+        statements.append(f"DROP TRIGGER IF EXISTS {name} ON {table}")
+        statements.append(f"CREATE TRIGGER {name} {definition}")
+    return statements
+
+
+class CharacterPhoto(Base):
+    """Фото персонажа, сгенерированное пользователем (только для чтения из приложения)."""
+    __tablename__ = "character_photos"
+    __table_args__ = (
+        UniqueConstraint("character_key", "user_id", "image_url", name="uq_character_photos_character_user_url"),
+        # Keyset-пагинация галереи: новые фото первыми
+        Index("ix_character_photos_character_user_created", "character_key", "user_id", "created_at", "id"),
+    )
+
+    id = Column(Integer, primary_key=True)
+    character_key = Column(String(100), nullable=False)
+    user_id = Column(Integer, ForeignKey("users.id", ondelete="CASCADE"), nullable=False)
+    image_url = Column(String(1000), nullable=False)
+    prompt = Column(Text, nullable=True)
+    generation_time = Column(Integer, nullable=True)
+    source = Column(String(20), nullable=False)  # chat_history, image_generation или gallery
+    created_at = Column(DateTime(timezone=True), nullable=False)
+
+
+_has_photo_source_tables = tables_created(
+    "character_photos", "characters", "chat_history", "image_generation_history", "user_gallery"
+)
+
+# Тестовая БД создается через metadata.create_all, а не миграциями
+for _statement in photo_ddl_statements():
+    event.listen(
+        Base.metadata,
+        "after_create",
+        DDL(_statement).execute_if(dialect="postgresql", callable_=_has_photo_source_tables),
+    )
@@ -1,13 +1,24 @@
-from sqlalchemy import Column, Integer, String, Text, DateTime, ForeignKey
-from sqlalchemy.orm import relationship
+from sqlalchemy import Column, Integer, String, Text, DateTime, ForeignKey, Index, event, text
+from sqlalchemy.orm import object_session, relationship
 from sqlalchemy.sql import func
 from app.database.db import Base
+from app.database.commit_hooks import run_after_commit
 
 
 class ChatHistory(Base):
     """Модель для сохранения истории чата по персонажам."""
     __tablename__ = "chat_history"
-    __table_args__ = {'extend_existing': True}
+    __table_args__ = (
+        # Keyset-пагинация истории переписки (ChatHistoryService.get_chat_history_page)
+        Index('ix_chat_history_conversation', 'user_id', 'character_name', 'session_id', 'id'),
+        # Последние фото пользователя с персонажем (только строки с картинкой)
+        Index(
+            'ix_chat_history_user_character_images',
+            'user_id', 'character_name', 'created_at',
+            postgresql_where=text('image_url IS NOT NULL'),
+        ),
+        {'extend_existing': True},
+    )
     
     id = Column(Integer, primary_key=True, index=True)
     user_id = Column(Integer, ForeignKey("users.id"), nullable=False, index=True)
@@ -22,3 +33,47 @@ class ChatHistory(Base):
     
     # Связь с пользователем
     user = relationship("Users")
+
+
+@event.listens_for(ChatHistory, 'after_insert')
+def receive_chat_history_insert(mapper, connection, target):
+    from app.services.admin_stats import record_counter_delta_after_commit
+    record_counter_delta_after_commit(object_session(target), 'total_messages', 1)
+
+
+@event.listens_for(ChatHistory, 'after_delete')
+def receive_chat_history_delete(mapper, connection, target):
+    from app.services.admin_stats import record_counter_delta_after_commit
+    record_counter_delta_after_commit(object_session(target), 'total_messages', -1)
+
+
+def _conversation_keys(target):
+    """Пары (user_id, character_name, session_id) до и после изменения строки."""
+    from sqlalchemy import inspect as sa_inspect
+    attrs = sa_inspect(target).attrs
+    values = {}
+    for field in ('user_id', 'character_name', 'session_id'):
+        history = attrs[field].history
+        current = getattr(target, field)
+        values[field] = [current] + [value for value in history.deleted if value != current]
+    return {
+        (user_id, character_name, session_id)
+        for user_id in values['user_id']
+        for character_name in values['character_name']
+        for session_id in values['session_id']
+    }
+
+
+@event.listens_for(ChatHistory, 'after_insert')
+@event.listens_for(ChatHistory, 'after_update')
+@event.listens_for(ChatHistory, 'after_delete')
+def receive_chat_history_page_change(mapper, connection, target):
+    # save_message дописывает кэш последней страницы сам (raw SQL), остальные записи через ORM его сбрасывают
+    from functools import partial
+    from app.chat_history.services.chat_history_service import request_latest_page_invalidation
+    for user_id, character_name, session_id in _conversation_keys(target):
+        run_after_commit(
+            target,
+            ("chat_history_page", user_id, (character_name or "").lower(), session_id),
+            partial(request_latest_page_invalidation, user_id, character_name, session_id),
+        )
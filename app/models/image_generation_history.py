@@ -2,7 +2,8 @@
 Модель для истории генераций изображений в чате.
 Простая таблица для надежного сохранения всех сгенерированных изображений.
 """
-from sqlalchemy import Column, Integer, String, Text, DateTime, Index
+from sqlalchemy import Column, Integer, String, Text, DateTime, Index, event
+from sqlalchemy.orm import object_session
 from sqlalchemy.sql import func
 from app.database.db import Base
 
@@ -42,3 +43,15 @@ class ImageGenerationHistory(Base):
             f"<ImageGenerationHistory(id={self.id}, user_id={self.user_id}, "
             f"character={self.character_name}, image_url={self.image_url[:50]}...)>"
         )
+
+
+@event.listens_for(ImageGenerationHistory, 'after_insert')
+def receive_image_generation_insert(mapper, connection, target):
+    from app.services.admin_stats import record_counter_delta_after_commit
+    record_counter_delta_after_commit(object_session(target), 'total_images', 1)
+
+
+@event.listens_for(ImageGenerationHistory, 'after_delete')
+def receive_image_generation_delete(mapper, connection, target):
+    from app.services.admin_stats import record_counter_delta_after_commit
+    record_counter_delta_after_commit(object_session(target), 'total_images', -1)
@@ -4,9 +4,9 @@
 
 from datetime import datetime, timezone
 from sqlalchemy import (
-    Column, ForeignKey, String, Boolean, DateTime, Integer, text, JSON
+    Column, ForeignKey, String, Boolean, DateTime, Integer, text, JSON, event
 )
-from sqlalchemy.orm import relationship
+from sqlalchemy.orm import object_session, relationship
 from app.database.db import Base
 
 
@@ -100,3 +100,15 @@ class EmailVerificationCode(Base):
     extra_data = Column(JSON, nullable=True)  # Для хранения дополнительных данных (например, new_email)
 
     user = relationship("Users", back_populates="verification_codes")
+
+
+@event.listens_for(Users, 'after_insert')
+def receive_user_insert(mapper, connection, target):
+    from app.services.admin_stats import record_counter_delta_after_commit
+    record_counter_delta_after_commit(object_session(target), 'total_users', 1)
+
+
+@event.listens_for(Users, 'after_delete')
+def receive_user_delete(mapper, connection, target):
+    from app.services.admin_stats import record_counter_delta_after_commit
+    record_counter_delta_after_commit(object_session(target), 'total_users', -1)
@@ -0,0 +1,300 @@
+"""
+Сводка переписки пользователя с персонажем для списка чатов.
+
+Строки поддерживаются триггерами Postgres на chat_history, chat_messages и
+image_generation_history (вставки в эти таблицы идут и через ORM, и через
+raw SQL, поэтому обработчики событий ORM не увидели бы часть записей).
+URL с pending:-маркером в сводку не попадает, картинка появляется, когда
+маркер заменяется реальным URL.
+Для существующих данных таблица заполняется скриптом
+app/scripts/backfill_user_conversations.py.
+"""
+from sqlalchemy import (
+    Column, DateTime, ForeignKey, Index, Integer, String, Text, UniqueConstraint, DDL, event
+)
+from sqlalchemy.sql import func
+from app.database.db import Base
+from app.database.ddl import tables_created
+
+PREVIEW_LENGTH = 200
+
+# Ключ персонажа - имя в нижнем регистре без пробелов по краям, как в истории чата
+CHARACTER_KEY_SQL = "lower(trim({name}))"
+
+# pending:-маркер генерации, которая еще не завершилась, картинкой не считается
+IMAGE_URL_SQL = "CASE WHEN left({url}, 8) = 'pending:' THEN NULL ELSE nullif({url}, '') END"
+
+# user_id в chat_sessions хранится строкой: "123" или "user_123"
+SESSION_USER_ID_SQL = (
+    "CASE WHEN {user_id} ~ '^(user_)?[0-9]+$' "
+    "THEN regexp_replace({user_id}, '^user_', '')::integer END"
+)
+
+# Каждый элемент - отдельный оператор (asyncpg не выполняет несколько команд за раз)
+CONVERSATION_FUNCTIONS_SQL = (
+    f"""
+CREATE OR REPLACE FUNCTION user_conversation_touch(
+    p_user_id integer, p_character_id integer, p_character_key text,
+    p_at timestamptz, p_preview text, p_count_delta integer, p_image_url text
+) RETURNS void AS $$
+DECLARE
+    v_image_url text := {IMAGE_URL_SQL.format(url='p_image_url')};
+BEGIN
+    IF p_user_id IS NULL OR p_character_key IS NULL OR p_character_key = '' THEN
+        RETURN;
+    END IF;
+    INSERT INTO user_conversations AS uc (
+        user_id, character_key, character_id, last_message_at,
+        last_message_preview, message_count, last_image_url, updated_at
+    )
+    VALUES (
+        p_user_id, p_character_key, p_character_id, coalesce(p_at, now()),
+        left(p_preview, {PREVIEW_LENGTH}), p_count_delta, v_image_url, now()
+    )
+    ON CONFLICT (user_id, character_key) DO UPDATE SET
+        character_id = coalesce(EXCLUDED.character_id, uc.character_id),
+        message_count = uc.message_count + EXCLUDED.message_count,
+        last_message_preview = CASE
+            WHEN EXCLUDED.last_message_preview IS NOT NULL
+                 AND (uc.last_message_preview IS NULL OR EXCLUDED.last_message_at >= uc.last_message_at)
+            THEN EXCLUDED.last_message_preview ELSE uc.last_message_preview END,
+        last_image_url = CASE
+            WHEN EXCLUDED.last_image_url IS NOT NULL
+                 AND (uc.last_image_url IS NULL OR EXCLUDED.last_message_at >= uc.last_message_at)
+            THEN EXCLUDED.last_image_url ELSE uc.last_image_url END,
+        last_message_at = greatest(uc.last_message_at, EXCLUDED.last_message_at),
+        updated_at = now();
+END;
+$$ LANGUAGE plpgsql
+""",
+    f"""
+CREATE OR REPLACE FUNCTION user_conversation_refresh(p_user_id integer, p_character_key text)
+RETURNS void AS $$
+BEGIN
+    DELETE FROM user_conversations WHERE user_id = p_user_id AND character_key = p_character_key;
+    INSERT INTO user_conversations (
+        user_id, character_key, character_id, last_message_at,
+        last_message_preview, message_count, last_image_url, updated_at
+    )
+    SELECT
+        p_user_id,
+        p_character_key,
+        (SELECT c.id FROM characters c
+          WHERE {CHARACTER_KEY_SQL.format(name='c.name')} = p_character_key ORDER BY c.id LIMIT 1),
+        max(src.at),
+        (array_agg(left(src.preview, {PREVIEW_LENGTH}) ORDER BY src.at DESC NULLS LAST)
+            FILTER (WHERE src.preview IS NOT NULL))[1],
+        sum(src.cnt),
+        (array_agg(src.image ORDER BY src.at DESC NULLS LAST)
+            FILTER (WHERE src.image IS NOT NULL))[1],
+        now()
+    FROM (
+        SELECT h.created_at AS at, h.message_content AS preview, 1 AS cnt,
+               {IMAGE_URL_SQL.format(url='h.image_url')} AS image
+          FROM chat_history h
+         WHERE h.user_id = p_user_id
+           AND {CHARACTER_KEY_SQL.format(name='h.character_name')} = p_character_key
+           AND h.session_id NOT IN ('system', 'photo_generation')
+        UNION ALL
+        SELECT m."timestamp", m.content, 1, NULL
+          FROM chat_messages m
+          JOIN chat_sessions s ON s.id = m.session_id
+          JOIN characters c ON c.id = s.character_id
+         WHERE s.user_id IN (p_user_id::text, 'user_' || p_user_id::text)
+           AND {CHARACTER_KEY_SQL.format(name='c.name')} = p_character_key
+        UNION ALL
+        SELECT g.created_at, NULL, 0, {IMAGE_URL_SQL.format(url='g.image_url')}
+          FROM image_generation_history g
+         WHERE g.user_id = p_user_id
+           AND {CHARACTER_KEY_SQL.format(name='g.character_name')} = p_character_key
+    ) src
+    HAVING max(src.at) IS NOT NULL;
+END;
+$$ LANGUAGE plpgsql
+""",
+    f"""
+CREATE OR REPLACE FUNCTION user_conversations_on_chat_history() RETURNS trigger AS $$
+DECLARE
+    v_key text := {CHARACTER_KEY_SQL.format(name='NEW.character_name')};
+    v_character_id integer;
+BEGIN
+    IF NEW.session_id IN ('system', 'photo_generation') THEN
+        RETURN NULL;
+    END IF;
+    SELECT c.id INTO v_character_id FROM characters c
+     WHERE {CHARACTER_KEY_SQL.format(name='c.name')} = v_key ORDER BY c.id LIMIT 1;
+    PERFORM user_conversation_touch(
+        NEW.user_id, v_character_id, v_key, NEW.created_at, NEW.message_content, 1, NEW.image_url
+    );
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql
+""",
+    f"""
+CREATE OR REPLACE FUNCTION user_conversations_on_image() RETURNS trigger AS $$
+DECLARE
+    v_key text := {CHARACTER_KEY_SQL.format(name='NEW.character_name')};
+    v_character_id integer;
+BEGIN
+    SELECT c.id INTO v_character_id FROM characters c
+     WHERE {CHARACTER_KEY_SQL.format(name='c.name')} = v_key ORDER BY c.id LIMIT 1;
+    PERFORM user_conversation_touch(
+        NEW.user_id, v_character_id, v_key, NEW.created_at, NULL, 0, NEW.image_url
+    );
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql
+""",
+    f"""
+CREATE OR REPLACE FUNCTION user_conversations_on_chat_message() RETURNS trigger AS $$
+DECLARE
+    v_user_id integer;
+    v_character_id integer;
+    v_key text;
+BEGIN
+    SELECT {SESSION_USER_ID_SQL.format(user_id='s.user_id')}, c.id, {CHARACTER_KEY_SQL.format(name='c.name')}
+      INTO v_user_id, v_character_id, v_key
+      FROM chat_sessions s
+      JOIN characters c ON c.id = s.character_id
+     WHERE s.id = NEW.session_id;
+    PERFORM user_conversation_touch(
+        v_user_id, v_character_id, v_key, NEW."timestamp", NEW.content, 1, NULL
+    );
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql
+""",
+    # Удаления пересчитывают затронутые сводки целиком (одним вызовом на пару пользователь/персонаж)
+    f"""
+CREATE OR REPLACE FUNCTION user_conversations_on_history_delete() RETURNS trigger AS $$
+BEGIN
+    PERFORM user_conversation_refresh(d.user_id, d.character_key)
+       FROM (SELECT DISTINCT user_id, {CHARACTER_KEY_SQL.format(name='character_name')} AS character_key
+               FROM old_rows WHERE character_name IS NOT NULL) d;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql
+""",
+    # Замена pending:-маркера (или любого URL) пересчитывает сводку, как удаление
+    f"""
+CREATE OR REPLACE FUNCTION user_conversations_on_image_url_update() RETURNS trigger AS $$
+BEGIN
+    PERFORM user_conversation_refresh(NEW.user_id, {CHARACTER_KEY_SQL.format(name='NEW.character_name')});
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql
+""",
+    # При переименовании персонажа история переписывается на новое имя, ключ сводки следует за ним
+    f"""
+CREATE OR REPLACE FUNCTION user_conversations_on_character_rename() RETURNS trigger AS $$
+DECLARE
+    v_key text := {CHARACTER_KEY_SQL.format(name='NEW.name')};
+BEGIN
+    UPDATE user_conversations uc SET character_key = v_key
+     WHERE uc.character_id = NEW.id
+       AND NOT EXISTS (
+           SELECT 1 FROM user_conversations x WHERE x.user_id = uc.user_id AND x.character_key = v_key
+       );
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql
+""",
+    f"""
+CREATE OR REPLACE FUNCTION user_conversations_on_chat_message_delete() RETURNS trigger AS $$
+BEGIN
+    PERFORM user_conversation_refresh(d.user_id, d.character_key)
+       FROM (SELECT DISTINCT {SESSION_USER_ID_SQL.format(user_id='s.user_id')} AS user_id,
+                    {CHARACTER_KEY_SQL.format(name='c.name')} AS character_key
+               FROM old_rows o
+               JOIN chat_sessions s ON s.id = o.session_id
+               JOIN characters c ON c.id = s.character_id) d
+      WHERE d.user_id IS NOT NULL;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql
+""",
+)
+
+# (имя триггера, таблица, определение)
+CONVERSATION_TRIGGERS = (
+    ("trg_user_conversations_chat_history", "chat_history",
+     "AFTER INSERT ON chat_history FOR EACH ROW EXECUTE FUNCTION user_conversations_on_chat_history()"),
+    ("trg_user_conversations_chat_history_delete", "chat_history",
+     "AFTER DELETE ON chat_history REFERENCING OLD TABLE AS old_rows "
+     "FOR EACH STATEMENT EXECUTE FUNCTION user_conversations_on_history_delete()"),
+    ("trg_user_conversations_chat_history_image_url", "chat_history",
+     "AFTER UPDATE OF image_url ON chat_history FOR EACH ROW "
+     "WHEN (OLD.image_url IS DISTINCT FROM NEW.image_url "
+     "AND NEW.session_id NOT IN ('system', 'photo_generation')) "
+     "EXECUTE FUNCTION user_conversations_on_image_url_update()"),
+    ("trg_user_conversations_image", "image_generation_history",
+     "AFTER INSERT ON image_generation_history FOR EACH ROW EXECUTE FUNCTION user_conversations_on_image()"),
+    ("trg_user_conversations_image_delete", "image_generation_history",
+     "AFTER DELETE ON image_generation_history REFERENCING OLD TABLE AS old_rows "
+     "FOR EACH STATEMENT EXECUTE FUNCTION user_conversations_on_history_delete()"),
+    ("trg_user_conversations_image_url", "image_generation_history",
+     "AFTER UPDATE OF image_url ON image_generation_history FOR EACH ROW "
+     "WHEN (OLD.image_url IS DISTINCT FROM NEW.image_url) "
+     "EXECUTE FUNCTION user_conversations_on_image_url_update()"),
+    ("trg_user_conversations_chat_message", "chat_messages",
+     "AFTER INSERT ON chat_messages FOR EACH ROW EXECUTE FUNCTION user_conversations_on_chat_message()"),
+    ("trg_user_conversations_chat_message_delete", "chat_messages",
+     "AFTER DELETE ON chat_messages REFERENCING OLD TABLE AS old_rows "
+     "FOR EACH STATEMENT EXECUTE FUNCTION user_conversations_on_chat_message_delete()"),
+    ("trg_user_conversations_character_rename", "characters",
+     "AFTER UPDATE OF name ON characters FOR EACH ROW WHEN (OLD.name IS DISTINCT FROM NEW.name) "
+     "EXECUTE FUNCTION user_conversations_on_character_rename()"),
+)
+
+CONVERSATION_FUNCTION_NAMES = (
+    "user_conversations_on_character_rename()",
+    "user_conversations_on_chat_message_delete()",
+    "user_conversations_on_image_url_update()",
+    "user_conversations_on_history_delete()",
+    "user_conversations_on_chat_message()",
+    "user_conversations_on_image()",
+    "user_conversations_on_chat_history()",
+    "user_conversation_refresh(integer, text)",
+    "user_conversation_touch(integer, integer, text, timestamptz, text, integer, text)",
+)
+
+
+def conversation_ddl_statements():
+    """Операторы создания функций и триггеров (для миграции и metadata.create_all)."""
+    statements = list(CONVERSATION_FUNCTIONS_SQL)
+    for name, table, definition in CONVERSATION_TRIGGERS:
+        statements.append(f"DROP TRIGGER IF EXISTS {name} ON {table}")
+        statements.append(f"CREATE TRIGGER {name} {definition}")
+    return statements
+
+
+class UserConversation(Base):
+    """Сводка переписки пользователя с персонажем (только для чтения из приложения)."""
+    __tablename__ = "user_conversations"
+    __table_args__ = (
+        UniqueConstraint("user_id", "character_key", name="uq_user_conversations_user_character"),
+        Index("ix_user_conversations_user_last_message", "user_id", "last_message_at"),
+    )
+
+    id = Column(Integer, primary_key=True)
+    user_id = Column(Integer, ForeignKey("users.id", ondelete="CASCADE"), nullable=False)
+    character_key = Column(String(100), nullable=False)
+    character_id = Column(Integer, ForeignKey("characters.id", ondelete="CASCADE"), nullable=True)
+    last_message_at = Column(DateTime(timezone=True), nullable=False)
+    last_message_preview = Column(Text, nullable=True)
+    message_count = Column(Integer, nullable=False, default=0)
+    last_image_url = Column(String(1000), nullable=True)
+    updated_at = Column(DateTime(timezone=True), server_default=func.now(), nullable=False)
+
+
+_has_conversation_source_tables = tables_created(
+    "user_conversations", "characters", "chat_history", "chat_messages", "image_generation_history"
+)
+
+# Тестовая БД создается через metadata.create_all, а не миграциями
+for _statement in conversation_ddl_statements():
+    event.listen(
+        Base.metadata,
+        "after_create",
+        DDL(_statement).execute_if(dialect="postgresql", callable_=_has_conversation_source_tables),
+    )
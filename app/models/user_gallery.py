@@ -3,19 +3,26 @@
 """
 
 from datetime import datetime, timezone
-from sqlalchemy import Column, ForeignKey, String, DateTime, Integer, Text, text
+from sqlalchemy import Column, ForeignKey, String, DateTime, Index, Integer, Text, text, event
 from sqlalchemy.orm import relationship
 from app.database.db import Base
+from app.utils.media_urls import fill_media_key, schedule_media_variants_fill
 
 
 class UserGallery(Base):
     """Модель для хранения фото в галерее пользователя."""
     __tablename__ = "user_gallery"
-    __table_args__ = {'extend_existing': True}
+    __table_args__ = (
+        # Галерея пользователя, новые фото первыми
+        Index('ix_user_gallery_user_created', 'user_id', 'created_at'),
+        {'extend_existing': True},
+    )
 
     id = Column(Integer, primary_key=True, index=True)
     user_id = Column(Integer, ForeignKey("users.id"), nullable=False, index=True)
     image_url = Column(String(500), nullable=False)  # URL изображения
+    media_key = Column(String(500), nullable=True)  # Ключ объекта в бакете (см. app.utils.media_urls)
+    media_variants = Column(String(64), nullable=True)  # Доступные варианты: "card,full,thumb"
     image_filename = Column(String(200), nullable=True)  # Имя файла изображения
     character_name = Column(String(100), nullable=True)  # Имя персонажа, с которым было сгенерировано фото
     description = Column(Text, nullable=True)  # Описание фото (опционально)
@@ -28,3 +35,14 @@ class UserGallery(Base):
     # Связь с пользователем
     user = relationship("Users", backref="gallery_photos")
 
+
+@event.listens_for(UserGallery, 'before_insert')
+@event.listens_for(UserGallery, 'before_update')
+def receive_before_insert_update(mapper, connection, target):
+    fill_media_key(target, 'image_url')
+
+
+@event.listens_for(UserGallery, 'after_insert')
+@event.listens_for(UserGallery, 'after_update')
+def receive_after_insert_update(mapper, connection, target):
+    schedule_media_variants_fill(target)
@@ -16,7 +16,7 @@ from app.chat_bot.api.character_endpoints import (
     _normalize_main_photos,
 )
 from app.chat_bot.models.models import CharacterDB, PaidAlbumUnlock
-from app.database.db_depends import get_db
+from app.database.db_depends import get_db, get_read_db
 from app.models.user import Users
 from app.services.coins_service import CoinsService
 
@@ -494,7 +494,7 @@ async def set_paid_gallery_prompt(
 @router.get("/paid-gallery/{character}")
 async def list_paid_gallery(
     character: str,
-    db: AsyncSession = Depends(get_db),
+    db: AsyncSession = Depends(get_read_db),
     current_user: Users = Depends(get_current_user),
 ) -> dict:
     """Возвращает список URL изображений платного альбома (доступен только после разблокировки)."""
@@ -0,0 +1,89 @@
+"""
+Скрипт для заполнения character_photos по существующей истории.
+
+Обрабатывает пользователей пачками по возрастанию id и прогоняет их фото из
+chat_history, user_gallery и image_generation_history через character_photo_upsert
+(та же функция, что вызывают триггеры). Повторный запуск не создает дублей,
+поэтому скрипт можно прервать и запустить снова.
+
+Использование:
+    python app/scripts/backfill_character_photos.py [--batch-size 200] [--start-user-id 0]
+"""
+import argparse
+import asyncio
+import sys
+from pathlib import Path
+
+# Добавляем корневую директорию проекта в путь
+project_root = Path(__file__).resolve().parents[2]
+sys.path.insert(0, str(project_root))
+
+from sqlalchemy import select, text
+
+from app.database.db import async_session_maker
+from app.models.user import Users
+
+# image_generation_history последним: ее время генерации приоритетнее
+SOURCE_SQL = (
+    text("""
+        SELECT count(*) FROM (
+            SELECT character_photo_upsert(
+                user_id, character_name, image_url, message_content, generation_time, 'chat_history', created_at
+            )
+              FROM chat_history
+             WHERE user_id = ANY(:user_ids) AND image_url IS NOT NULL AND image_url <> ''
+        ) upserted
+    """),
+    text("""
+        SELECT count(*) FROM (
+            SELECT character_photo_upsert(user_id, character_name, image_url, NULL, NULL, 'gallery', created_at)
+              FROM user_gallery
+             WHERE user_id = ANY(:user_ids)
+        ) upserted
+    """),
+    text("""
+        SELECT count(*) FROM (
+            SELECT character_photo_upsert(
+                user_id, character_name, image_url, prompt, generation_time, 'image_generation', created_at
+            )
+              FROM image_generation_history
+             WHERE user_id = ANY(:user_ids)
+        ) upserted
+    """),
+)
+
+
+async def backfill(batch_size: int, start_user_id: int) -> int:
+    """Индексирует фото всех пользователей с id > start_user_id."""
+    last_id = start_user_id
+    total = 0
+    while True:
+        async with async_session_maker() as db:
+            user_ids = (await db.execute(
+                select(Users.id)
+                .where(Users.id > last_id)
+                .order_by(Users.id)
+                .limit(batch_size)
+            )).scalars().all()
+            if not user_ids:
+                break
+            for statement in SOURCE_SQL:
+                total += (await db.execute(statement, {"user_ids": list(user_ids)})).scalar() or 0
+            await db.commit()
+            last_id = user_ids[-1]
+            print(f"[BACKFILL] character_photos: обработано {total} записей (последний user_id={last_id})")
+    return total
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Заполнение character_photos")
+    parser.add_argument("--batch-size", type=int, default=200)
+    parser.add_argument("--start-user-id", type=int, default=0)
+    args = parser.parse_args()
+
+    total = asyncio.run(backfill(args.batch_size, args.start_user_id))
+    print(f"[BACKFILL] Готово: {total} записей")
+
+
+if __name__ == "__main__":
+    main()
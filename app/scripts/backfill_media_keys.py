@@ -0,0 +1,122 @@
+"""
+Скрипт для заполнения media_key/media_variants в таблицах фото.
+
+Обрабатывает строки пачками по возрастанию id, поэтому его можно прервать
+и запустить снова: уже заполненные строки повторно не выбираются.
+
+Использование:
+    python app/scripts/backfill_media_keys.py [--batch-size 500] [--probe-variants]
+
+--probe-variants дополнительно проверяет в бакете манифест вариантов
+(см. app.services.image_pipeline) и записывает доступные варианты.
+"""
+import argparse
+import asyncio
+import sys
+from pathlib import Path
+
+# Добавляем корневую директорию проекта в путь
+project_root = Path(__file__).resolve().parents[2]
+sys.path.insert(0, str(project_root))
+
+from sqlalchemy import select, update
+
+from app.database.db import async_session_maker
+from app.chat_bot.models.models import CharacterMainPhoto, PaidAlbumPhoto
+from app.models.user_gallery import UserGallery
+from app.utils.media_urls import extract_media_key
+
+# (модель, колонка с URL)
+PHOTO_MODELS = (
+    (CharacterMainPhoto, "photo_url"),
+    (PaidAlbumPhoto, "photo_url"),
+    (UserGallery, "image_url"),
+)
+
+
+async def backfill_keys(model, url_attr: str, batch_size: int) -> int:
+    """Заполняет media_key для строк, где он еще NULL."""
+    url_column = getattr(model, url_attr)
+    last_id = 0
+    total = 0
+    while True:
+        async with async_session_maker() as db:
+            result = await db.execute(
+                select(model.id, url_column)
+                .where(model.media_key.is_(None), model.id > last_id)
+                .order_by(model.id)
+                .limit(batch_size)
+            )
+            rows = result.all()
+            if not rows:
+                break
+            # Пустая строка - URL не из нашего бакета, строка считается обработанной
+            await db.execute(
+                update(model),
+                [{"id": row_id, "media_key": extract_media_key(url) or ""} for row_id, url in rows]
+            )
+            await db.commit()
+            last_id = rows[-1][0]
+            total += len(rows)
+            print(f"[BACKFILL] {model.__tablename__}: обработано {total} (последний id={last_id})")
+    return total
+
+
+async def probe_variants(model, batch_size: int) -> int:
+    """Заполняет media_variants по манифестам вариантов в бакете."""
+    from app.services.yandex_storage import get_yandex_storage_service
+    from app.services.media_variants import read_manifest, variants_from_manifest
+
+    service = get_yandex_storage_service()
+    loop = asyncio.get_event_loop()
+
+    last_id = 0
+    total = 0
+    while True:
+        async with async_session_maker() as db:
+            result = await db.execute(
+                select(model.id, model.media_key)
+                .where(
+                    model.media_variants.is_(None),
+                    model.media_key.isnot(None),
+                    model.media_key != "",
+                    model.id > last_id,
+                )
+                .order_by(model.id)
+                .limit(batch_size)
+            )
+            rows = result.all()
+            if not rows:
+                break
+            manifests = await asyncio.gather(
+                *(loop.run_in_executor(service.executor, read_manifest, service, key) for _, key in rows)
+            )
+            await db.execute(
+                update(model),
+                [
+                    {"id": row_id, "media_variants": variants_from_manifest(manifest)}
+                    for (row_id, _), manifest in zip(rows, manifests)
+                ]
+            )
+            await db.commit()
+            last_id = rows[-1][0]
+            total += len(rows)
+            print(f"[BACKFILL] {model.__tablename__}: варианты проверены для {total} (последний id={last_id})")
+    return total
+
+
+async def main(batch_size: int, with_variants: bool):
+    for model, url_attr in PHOTO_MODELS:
+        count = await backfill_keys(model, url_attr, batch_size)
+        print(f"✓ {model.__tablename__}: media_key заполнен для {count} строк")
+        if with_variants:
+            count = await probe_variants(model, batch_size)
+            print(f"✓ {model.__tablename__}: media_variants заполнен для {count} строк")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Заполнение media_key/media_variants в таблицах фото")
+    parser.add_argument("--batch-size", type=int, default=500)
+    parser.add_argument("--probe-variants", action="store_true")
+    args = parser.parse_args()
+    asyncio.run(main(args.batch_size, args.probe_variants))
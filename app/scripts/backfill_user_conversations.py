@@ -0,0 +1,87 @@
+"""
+Скрипт для заполнения user_conversations по существующей истории.
+
+Обрабатывает пользователей пачками по возрастанию id и для каждой пары
+пользователь/персонаж пересчитывает сводку функцией user_conversation_refresh,
+поэтому его можно прервать и запустить снова.
+
+Использование:
+    python app/scripts/backfill_user_conversations.py [--batch-size 200] [--start-user-id 0]
+"""
+import argparse
+import asyncio
+import sys
+from pathlib import Path
+
+# Добавляем корневую директорию проекта в путь
+project_root = Path(__file__).resolve().parents[2]
+sys.path.insert(0, str(project_root))
+
+from sqlalchemy import select, text
+
+from app.database.db import async_session_maker
+from app.models.user import Users
+
+PAIRS_SQL = text("""
+    SELECT DISTINCT user_id, character_key FROM (
+        SELECT user_id, lower(trim(character_name)) AS character_key
+          FROM chat_history
+         WHERE user_id = ANY(:user_ids)
+           AND session_id NOT IN ('system', 'photo_generation')
+        UNION
+        SELECT user_id, lower(trim(character_name))
+          FROM image_generation_history
+         WHERE user_id = ANY(:user_ids)
+        UNION
+        SELECT regexp_replace(s.user_id, '^user_', '')::integer, lower(trim(c.name))
+          FROM chat_sessions s
+          JOIN characters c ON c.id = s.character_id
+         WHERE s.user_id = ANY(:session_user_ids)
+           AND EXISTS (SELECT 1 FROM chat_messages m WHERE m.session_id = s.id)
+    ) pairs
+    WHERE character_key IS NOT NULL AND character_key <> ''
+""")
+
+REFRESH_SQL = text("SELECT user_conversation_refresh(:user_id, :character_key)")
+
+
+async def backfill(batch_size: int, start_user_id: int) -> int:
+    """Пересчитывает сводки для всех пользователей с id > start_user_id."""
+    last_id = start_user_id
+    total = 0
+    while True:
+        async with async_session_maker() as db:
+            user_ids = (await db.execute(
+                select(Users.id)
+                .where(Users.id > last_id)
+                .order_by(Users.id)
+                .limit(batch_size)
+            )).scalars().all()
+            if not user_ids:
+                break
+            session_user_ids = [str(user_id) for user_id in user_ids]
+            session_user_ids += [f"user_{user_id}" for user_id in user_ids]
+            pairs = (await db.execute(
+                PAIRS_SQL, {"user_ids": list(user_ids), "session_user_ids": session_user_ids}
+            )).all()
+            for user_id, character_key in pairs:
+                await db.execute(REFRESH_SQL, {"user_id": user_id, "character_key": character_key})
+            await db.commit()
+            last_id = user_ids[-1]
+            total += len(pairs)
+            print(f"[BACKFILL] user_conversations: {total} сводок (последний user_id={last_id})")
+    return total
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Заполнение user_conversations")
+    parser.add_argument("--batch-size", type=int, default=200)
+    parser.add_argument("--start-user-id", type=int, default=0)
+    args = parser.parse_args()
+
+    total = asyncio.run(backfill(args.batch_size, args.start_user_id))
+    print(f"[BACKFILL] Готово: {total} сводок")
+
+
+if __name__ == "__main__":
+    main()
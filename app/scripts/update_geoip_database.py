@@ -0,0 +1,119 @@
+"""
+Скрипт для скачивания и обновления файла диапазонов IP (settings.GEOIP_DB_PATH).
+
+По умолчанию берет ежемесячный DB-IP IP to Country Lite (CC BY 4.0, без
+ключа): https://db-ip.com/db/download/ip-to-country-lite. Если файл за
+текущий месяц еще не опубликован, берется файл за прошлый месяц.
+
+Файл скачивается рядом с целевым, проверяется загрузкой через
+IpCountryDatabase и подменяется атомарно (os.replace), поэтому запущенные
+воркеры перечитают его сами (см. app.utils.geo_utils) и никогда не увидят
+недописанный файл.
+
+Использование:
+    python -m app.scripts.update_geoip_database [--max-age-days 30] [--url URL] [--path PATH]
+
+--max-age-days пропускает скачивание, если файл моложе указанного числа дней
+(так скрипт вызывается из Docker_all/startup.sh при каждом старте).
+"""
+import argparse
+import gzip
+import logging
+import os
+import shutil
+import sys
+import tempfile
+import time
+from datetime import date
+from pathlib import Path
+from typing import List, Optional
+
+# Добавляем корневую директорию проекта в путь
+project_root = Path(__file__).resolve().parents[2]
+sys.path.insert(0, str(project_root))
+
+import httpx
+
+from app.config.settings import settings
+from app.utils.geo_utils import IpCountryDatabase
+
+logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s")
+logger = logging.getLogger(__name__)
+
+DOWNLOAD_TIMEOUT = 120.0
+# В DB-IP Lite сотни тысяч диапазонов, меньшее число - признак битого файла
+MIN_RANGES = 10000
+
+
+def candidate_urls(template: str, today: Optional[date] = None) -> List[str]:
+    """URL за текущий и прошлый месяц ({month} в шаблоне - YYYY-MM)."""
+    today = today or date.today()
+    previous = date(today.year - 1, 12, 1) if today.month == 1 else date(today.year, today.month - 1, 1)
+    urls = [template.format(month=f"{month:%Y-%m}") for month in (today, previous)]
+    return list(dict.fromkeys(urls))
+
+
+def is_fresh(path: Path, max_age_days: Optional[float]) -> bool:
+    if max_age_days is None:
+        return False
+    try:
+        age = time.time() - path.stat().st_mtime
+    except OSError:
+        return False
+    return age < max_age_days * 86400
+
+
+def download(url: str, destination: Path) -> None:
+    """Скачивает url в destination, распаковывая .gz, если целевой файл не .gz."""
+    unpack = url.endswith(".gz") and destination.suffix != ".gz"
+    with httpx.stream("GET", url, timeout=DOWNLOAD_TIMEOUT, follow_redirects=True) as response:
+        response.raise_for_status()
+        with tempfile.TemporaryFile() as raw:
+            for chunk in response.iter_bytes():
+                raw.write(chunk)
+            raw.seek(0)
+            source = gzip.GzipFile(fileobj=raw) if unpack else raw
+            with open(destination, "wb") as file:
+                shutil.copyfileobj(source, file)
+
+
+def update_database(path: Path, urls: List[str]) -> bool:
+    """Скачивает первый доступный url, проверяет и атомарно подменяет path."""
+    path.parent.mkdir(parents=True, exist_ok=True)
+    # Временный файл в той же директории (os.replace атомарен в пределах файловой системы),
+    # расширение сохраняется: по нему IpCountryDatabase.load выбирает gzip
+    tmp_path = path.with_name(f".{path.name}.{os.getpid()}{path.suffix}")
+    for url in urls:
+        try:
+            logger.info(f"[GEO] Скачиваем {url}")
+            download(url, tmp_path)
+            ranges = len(IpCountryDatabase.load(tmp_path, cache_size=1))
+            if ranges < MIN_RANGES:
+                raise ValueError(f"в файле только {ranges} диапазонов")
+            os.replace(tmp_path, path)
+            logger.info(f"[GEO] {path} обновлен: {ranges} диапазонов")
+            return True
+        except Exception as e:
+            logger.warning(f"[GEO] Не удалось обновить из {url}: {e}")
+        finally:
+            tmp_path.unlink(missing_ok=True)
+    return False
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Обновление файла диапазонов IP для определения страны")
+    parser.add_argument("--path", type=Path, default=Path(settings.GEOIP_DB_PATH))
+    parser.add_argument("--url", default=settings.GEOIP_DOWNLOAD_URL,
+                        help="URL или шаблон с {month} (YYYY-MM)")
+    parser.add_argument("--max-age-days", type=float, default=None,
+                        help="Не скачивать, если файл моложе указанного числа дней")
+    args = parser.parse_args()
+
+    if is_fresh(args.path, args.max_age_days):
+        logger.info(f"[GEO] {args.path} моложе {args.max_age_days} дней, обновление не требуется")
+        return 0
+    return 0 if update_database(args.path, candidate_urls(args.url)) else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,278 @@
+"""
+Статистика админ-панели.
+
+Полный снимок статистики считается двумя запросами (агрегаты одной строкой и
+регистрации по странам) фоновой задачей раз в STATS_REFRESH_MINUTES и хранится
+в Redis вместе с моментом расчета. Итоговые счетчики (пользователи, сообщения,
+изображения, персонажи) поддерживаются инкрементально обработчиками событий ORM
+и местами вставки через raw SQL (record_counter_delta_after_commit), поэтому
+между пересчетами они не отстают от базы.
+"""
+
+import asyncio
+import itertools
+import logging
+from datetime import datetime, timedelta, timezone
+from functools import partial
+from typing import Any, Dict, Optional
+
+from sqlalchemy import and_, func, select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.database.commit_hooks import run_after_session_commit
+from app.utils.redis_cache import (
+    cache_get_json,
+    cache_set_json,
+    get_redis_client,
+    key_admin_stats_counters,
+    key_admin_stats_snapshot,
+    TTL_ADMIN_STATS,
+)
+
+logger = logging.getLogger(__name__)
+
+STATS_REFRESH_MINUTES = 15
+COUNTER_FLUSH_DELAY = 1.0
+
+# Уникальные ключи действий после коммита: каждое приращение применяется отдельно
+_counter_delta_ids = itertools.count()
+
+# Поля hash со счетчиками и пути к ним в ответе /admin/stats
+COUNTER_FIELDS = ("total_users", "total_messages", "total_images", "total_characters")
+
+# Увеличивает поля hash только если он уже заполнен пересчетом,
+# иначе частичные приращения выдавались бы за итоги
+INCREMENT_IF_EXISTS_SCRIPT = """
+if redis.call('EXISTS', KEYS[1]) == 0 then
+    return 0
+end
+for i = 1, #ARGV, 2 do
+    redis.call('HINCRBY', KEYS[1], ARGV[i], ARGV[i + 1])
+end
+return 1
+"""
+
+_pending_deltas: Dict[str, int] = {}
+_flush_scheduled = False
+
+
+async def compute_admin_stats(db: AsyncSession) -> Dict[str, Any]:
+    """Считает полный снимок статистики в формате ответа /admin/stats."""
+    from app.models.user import Users
+    from app.models.subscription import UserSubscription, SubscriptionType, SubscriptionStatus
+    from app.models.chat_history import ChatHistory
+    from app.models.image_generation_history import ImageGenerationHistory
+    from app.chat_bot.models.models import CharacterDB
+
+    now = datetime.utcnow()
+    last_24h = now - timedelta(hours=24)
+    last_7d = now - timedelta(days=7)
+
+    users_agg = select(
+        func.count(Users.id).label("total_users"),
+        func.count(Users.id).filter(Users.created_at >= last_24h).label("new_users_24h"),
+        func.count(Users.id).filter(Users.created_at >= last_7d).label("new_users_7d"),
+        func.coalesce(func.sum(Users.coins), 0).label("total_coins"),
+    ).subquery()
+
+    is_active = UserSubscription.status == SubscriptionStatus.ACTIVE
+    is_standard = UserSubscription.subscription_type == SubscriptionType.STANDARD
+    is_premium = UserSubscription.subscription_type == SubscriptionType.PREMIUM
+    subs_agg = select(
+        func.count(UserSubscription.id).filter(
+            and_(UserSubscription.subscription_type == SubscriptionType.FREE, is_active)
+        ).label("free"),
+        func.count(UserSubscription.id).filter(and_(is_standard, is_active)).label("standard"),
+        func.count(UserSubscription.id).filter(and_(is_premium, is_active)).label("premium"),
+        func.count(func.distinct(UserSubscription.user_id)).filter(
+            UserSubscription.subscription_type.in_([SubscriptionType.STANDARD, SubscriptionType.PREMIUM])
+        ).label("paid_all_time"),
+        func.count(func.distinct(UserSubscription.user_id)).filter(is_standard).label("standard_all_time"),
+        func.count(func.distinct(UserSubscription.user_id)).filter(is_premium).label("premium_all_time"),
+    ).subquery()
+
+    content_agg = select(
+        select(func.count(CharacterDB.id)).scalar_subquery().label("total_characters"),
+        select(func.count(ImageGenerationHistory.id)).scalar_subquery().label("total_images"),
+        select(func.count(ChatHistory.id)).scalar_subquery().label("total_messages"),
+        select(func.count(func.distinct(ChatHistory.user_id)))
+        .where(ChatHistory.created_at >= last_24h)
+        .scalar_subquery()
+        .label("active_users_24h"),
+    ).subquery()
+
+    row = (await db.execute(select(users_agg, subs_agg, content_agg))).one()
+
+    country_rows = await db.execute(
+        select(Users.country, func.count(Users.id).label("count"))
+        .where(Users.country.isnot(None))
+        .group_by(Users.country)
+        .order_by(func.count(Users.id).desc())
+    )
+    registrations_by_country = [{"country": r.country, "count": r.count} for r in country_rows]
+
+    paid_subscriptions = row.standard + row.premium
+    return {
+        "total_visits": row.total_users,
+        "new_registrations": row.total_users,
+        "new_users_24h": row.new_users_24h,
+        "new_users_7d": row.new_users_7d,
+        "subscriptions_purchased": paid_subscriptions,
+        "subscriptions": {
+            "free": row.free,
+            "standard": row.standard,
+            "premium": row.premium,
+            "total_paid": paid_subscriptions
+        },
+        "subscriptions_all_time": {
+            "total_paid": row.paid_all_time,
+            "standard": row.standard_all_time,
+            "premium": row.premium_all_time,
+            "pro": 0
+        },
+        "registrations_by_country": registrations_by_country,
+        "content": {
+            "total_characters": row.total_characters,
+            "total_images": row.total_images,
+            "total_messages": row.total_messages
+        },
+        "activity": {
+            "active_users_24h": row.active_users_24h
+        },
+        "economy": {
+            "total_coins": int(row.total_coins or 0)
+        },
+        "computed_at": datetime.now(timezone.utc).isoformat(),
+    }
+
+
+def _counters_from_stats(stats: Dict[str, Any]) -> Dict[str, int]:
+    content = stats["content"]
+    return {
+        "total_users": stats["total_visits"],
+        "total_messages": content["total_messages"],
+        "total_images": content["total_images"],
+        "total_characters": content["total_characters"],
+    }
+
+
+def _apply_counters(stats: Dict[str, Any], counters: Dict[str, int]) -> None:
+    if "total_users" in counters:
+        stats["total_visits"] = counters["total_users"]
+        stats["new_registrations"] = counters["total_users"]
+    for field in ("total_messages", "total_images", "total_characters"):
+        if field in counters:
+            stats["content"][field] = counters[field]
+
+
+async def refresh_admin_stats(db: Optional[AsyncSession] = None) -> Dict[str, Any]:
+    """
+    Пересчитывает снимок и сверяет счетчики с базой.
+    Приращения, пришедшие между подсчетом и записью, теряются до следующей сверки.
+    """
+    if db is None:
+        from app.database.db import async_session_maker
+        async with async_session_maker() as session:
+            return await refresh_admin_stats(session)
+
+    stats = await compute_admin_stats(db)
+    await cache_set_json(key_admin_stats_snapshot(), stats, ttl_seconds=TTL_ADMIN_STATS, timeout=1.0)
+    try:
+        redis_client = await get_redis_client()
+        if redis_client:
+            await asyncio.wait_for(
+                redis_client.hset(key_admin_stats_counters(), mapping=_counters_from_stats(stats)),
+                timeout=1.0,
+            )
+    except Exception as e:
+        logger.warning(f"[ADMIN STATS] Не удалось обновить счетчики: {e}")
+    return stats
+
+
+async def _read_counters() -> Dict[str, int]:
+    try:
+        redis_client = await get_redis_client()
+        if not redis_client:
+            return {}
+        raw = await asyncio.wait_for(redis_client.hgetall(key_admin_stats_counters()), timeout=0.3)
+        return {field: int(value) for field, value in raw.items() if field in COUNTER_FIELDS}
+    except Exception as e:
+        logger.warning(f"[ADMIN STATS] Не удалось прочитать счетчики: {e}")
+        return {}
+
+
+async def get_admin_stats(db: AsyncSession) -> Dict[str, Any]:
+    """
+    Возвращает статистику для админ-панели: снимок из Redis с живыми счетчиками.
+    Если снимка нет (первый запрос, Redis недоступен), он считается на месте.
+    Поле freshness сообщает момент расчета снимка и актуальны ли итоги.
+    """
+    stats = await cache_get_json(key_admin_stats_snapshot())
+    if not stats:
+        stats = await refresh_admin_stats(db)
+    counters = await _read_counters()
+    _apply_counters(stats, counters)
+
+    computed_at = stats.pop("computed_at", None)
+    age_seconds = None
+    if computed_at:
+        age_seconds = int((datetime.now(timezone.utc) - datetime.fromisoformat(computed_at)).total_seconds())
+    stats["freshness"] = {
+        "computed_at": computed_at,
+        "age_seconds": age_seconds,
+        "counters_live": bool(counters),
+    }
+    return stats
+
+
+async def _flush_counters() -> None:
+    global _flush_scheduled
+    deltas = {field: delta for field, delta in _pending_deltas.items() if delta}
+    _pending_deltas.clear()
+    _flush_scheduled = False
+    if not deltas:
+        return
+    try:
+        redis_client = await get_redis_client()
+        if not redis_client:
+            return
+        args = []
+        for field, delta in deltas.items():
+            args.extend((field, delta))
+        await asyncio.wait_for(
+            redis_client.eval(INCREMENT_IF_EXISTS_SCRIPT, 1, key_admin_stats_counters(), *args),
+            timeout=0.3,
+        )
+    except Exception as e:
+        # Потерянные приращения исправит ближайшая сверка
+        logger.warning(f"[ADMIN STATS] Не удалось применить приращения счетчиков: {e}")
+
+
+def record_counter_delta(field: str, delta: int) -> None:
+    """
+    Синхронная точка входа для обработчиков событий ORM: копит приращение
+    и раз в COUNTER_FLUSH_DELAY секунд отправляет накопленное одним вызовом.
+    Вне event loop приращение пропускается, его учтет сверка.
+    """
+    global _flush_scheduled
+    try:
+        loop = asyncio.get_running_loop()
+    except RuntimeError:
+        return
+    _pending_deltas[field] = _pending_deltas.get(field, 0) + delta
+    if not _flush_scheduled:
+        _flush_scheduled = True
+        loop.call_later(COUNTER_FLUSH_DELAY, lambda: loop.create_task(_flush_counters()))
+
+
+def record_counter_delta_after_commit(session, field: str, delta: int) -> None:
+    """
+    Учитывает приращение счетчика после коммита session; при откате оно отбрасывается.
+    Вызывается из обработчиков событий ORM (flush идет до коммита) и после
+    вставок через raw SQL, которые эти обработчики не видят.
+    """
+    run_after_session_commit(
+        session,
+        ("admin_stats_counter", next(_counter_delta_ids)),
+        partial(record_counter_delta, field, delta),
+    )
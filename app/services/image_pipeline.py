@@ -0,0 +1,255 @@
+"""
+Конвейер перекодирования изображений.
+
+Декодирует исходное изображение один раз и выпускает набор вариантов
+(thumb, card, full) в нескольких форматах (WebP, AVIF). Кодирование
+выполняется в пуле процессов, чтобы Pillow не держал GIL event loop'а.
+"""
+
+import asyncio
+import json
+import logging
+import multiprocessing
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from dataclasses import dataclass, field
+from io import BytesIO
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from PIL import Image, features
+
+from app.config.settings import settings
+
+logger = logging.getLogger(__name__)
+
+
+# Максимальная сторона варианта в пикселях (None - исходный размер)
+VARIANT_SIZES: Dict[str, Optional[int]] = {
+    "thumb": 320,
+    "card": 768,
+    "full": None,
+}
+
+# Уровни усилия кодирования: параметры WebP (method) и AVIF (speed, меньше - медленнее)
+EFFORT_LEVELS: Dict[str, Dict[str, int]] = {
+    "fast": {"webp_method": 2, "avif_speed": 8},
+    "balanced": {"webp_method": 4, "avif_speed": 6},
+    "max": {"webp_method": 6, "avif_speed": 4},
+}
+
+FORMAT_EXTENSIONS = {"webp": "webp", "avif": "avif"}
+FORMAT_CONTENT_TYPES = {"webp": "image/webp", "avif": "image/avif"}
+
+MANIFEST_SUFFIX = ".manifest.json"
+
+
+@dataclass
+class ImageVariant:
+    """Один закодированный вариант изображения."""
+    name: str
+    format: str
+    width: int
+    height: int
+    data: bytes = field(repr=False)
+
+    @property
+    def content_type(self) -> str:
+        return FORMAT_CONTENT_TYPES[self.format]
+
+
+def is_format_supported(fmt: str) -> bool:
+    """Проверяет, умеет ли установленный Pillow кодировать формат."""
+    if fmt == "webp":
+        return features.check("webp")
+    if fmt == "avif":
+        return bool(features.check("avif"))
+    return False
+
+
+def get_configured_formats() -> List[str]:
+    """Возвращает форматы из настроек, которые поддерживает текущая сборка Pillow."""
+    formats = [f.strip().lower() for f in settings.IMAGE_VARIANT_FORMATS.split(",") if f.strip()]
+    supported = [f for f in formats if f in FORMAT_EXTENSIONS and is_format_supported(f)]
+    if "webp" not in supported:
+        supported.insert(0, "webp")
+    return supported
+
+
+def _to_rgb(image: Image.Image) -> Image.Image:
+    """Приводит изображение к RGB, подкладывая белый фон под прозрачность."""
+    if image.mode in ("RGBA", "LA", "P"):
+        if image.mode == "P":
+            image = image.convert("RGBA")
+        rgb_image = Image.new("RGB", image.size, (255, 255, 255))
+        rgb_image.paste(image, mask=image.split()[-1] if image.mode in ("RGBA", "LA") else None)
+        return rgb_image
+    if image.mode != "RGB":
+        return image.convert("RGB")
+    return image
+
+
+def _encode(image: Image.Image, fmt: str, quality: int, effort: Dict[str, int]) -> bytes:
+    buffer = BytesIO()
+    if fmt == "avif":
+        image.save(buffer, format="AVIF", quality=quality, speed=effort["avif_speed"])
+    else:
+        image.save(buffer, format="WEBP", quality=quality, method=effort["webp_method"])
+    return buffer.getvalue()
+
+
+def encode_variants(
+    image_data: bytes,
+    variants: Tuple[str, ...] = tuple(VARIANT_SIZES),
+    formats: Tuple[str, ...] = ("webp",),
+    effort: str = "balanced",
+    quality: int = 85,
+) -> List[ImageVariant]:
+    """
+    Декодирует изображение один раз и кодирует все запрошенные варианты.
+
+    Выполняется в дочернем процессе, поэтому функция модульная и принимает
+    только сериализуемые аргументы. Варианты уменьшаются последовательно от
+    большего к меньшему, чтобы каждый resize работал с уже уменьшенной копией.
+    """
+    effort_params = EFFORT_LEVELS.get(effort, EFFORT_LEVELS["balanced"])
+    source = _to_rgb(Image.open(BytesIO(image_data)))
+
+    ordered = sorted(
+        variants,
+        key=lambda name: VARIANT_SIZES.get(name) or max(source.size),
+        reverse=True,
+    )
+
+    results: List[ImageVariant] = []
+    current = source
+    for name in ordered:
+        max_side = VARIANT_SIZES.get(name)
+        if max_side and max(current.size) > max_side:
+            current = current.copy()
+            current.thumbnail((max_side, max_side), Image.LANCZOS, reducing_gap=2.0)
+        for fmt in formats:
+            results.append(ImageVariant(
+                name=name,
+                format=fmt,
+                width=current.width,
+                height=current.height,
+                data=_encode(current, fmt, quality, effort_params),
+            ))
+    return results
+
+
+_pool: Optional[Executor] = None
+
+
+def _get_pool() -> Executor:
+    """
+    Ленивая инициализация пула процессов для кодирования.
+
+    Дочерние процессы Celery (prefork) являются демонами и не могут порождать
+    собственные процессы, поэтому там используется пул потоков.
+    """
+    global _pool
+    if _pool is None:
+        workers = max(1, settings.IMAGE_PIPELINE_WORKERS)
+        if multiprocessing.current_process().daemon:
+            _pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="image-pipeline")
+        else:
+            _pool = ProcessPoolExecutor(
+                max_workers=workers,
+                mp_context=multiprocessing.get_context("spawn"),
+            )
+        logger.info(f"[IMAGE PIPELINE] Пул кодирования создан: {type(_pool).__name__}, workers={workers}")
+    return _pool
+
+
+def shutdown_pool() -> None:
+    """Останавливает пул кодирования (вызывается при остановке приложения)."""
+    global _pool
+    if _pool is not None:
+        _pool.shutdown(wait=False, cancel_futures=True)
+        _pool = None
+
+
+async def transcode_image(
+    image_data: bytes,
+    variants: Optional[Iterable[str]] = None,
+    formats: Optional[Iterable[str]] = None,
+    effort: Optional[str] = None,
+    quality: Optional[int] = None,
+) -> List[ImageVariant]:
+    """
+    Асинхронно выпускает варианты изображения в пуле процессов.
+
+    Args:
+        image_data: Исходные байты изображения в любом формате
+        variants: Имена вариантов из VARIANT_SIZES (по умолчанию все)
+        formats: Форматы кодирования (по умолчанию из настроек)
+        effort: Уровень усилия кодирования: fast, balanced, max
+        quality: Качество кодирования 1-100
+
+    Returns:
+        List[ImageVariant]: Закодированные варианты
+    """
+    variants_tuple = tuple(variants) if variants else tuple(VARIANT_SIZES)
+    formats_tuple = tuple(formats) if formats else tuple(get_configured_formats())
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(
+        _get_pool(),
+        encode_variants,
+        image_data,
+        variants_tuple,
+        formats_tuple,
+        effort or settings.IMAGE_ENCODE_EFFORT,
+        quality or settings.IMAGE_ENCODE_QUALITY,
+    )
+
+
+def variant_object_key(object_key: str, variant: str, fmt: str) -> str:
+    """
+    Формирует ключ объекта для варианта.
+
+    Вариант full в WebP хранится под исходным ключом, остальные - рядом:
+    generated/abc.webp -> generated/abc_thumb.avif
+    """
+    base = object_key.rsplit(".", 1)[0] if "." in object_key.rsplit("/", 1)[-1] else object_key
+    ext = FORMAT_EXTENSIONS[fmt]
+    if variant == "full" and fmt == "webp":
+        return f"{base}.{ext}"
+    return f"{base}_{variant}.{ext}"
+
+
+def manifest_object_key(object_key: str) -> str:
+    """Ключ манифеста вариантов для объекта."""
+    base = object_key.rsplit(".", 1)[0] if "." in object_key.rsplit("/", 1)[-1] else object_key
+    return f"{base}{MANIFEST_SUFFIX}"
+
+
+def derived_object_keys(object_key: str) -> List[str]:
+    """
+    Ключи всех объектов, которые могут быть созданы вместе с изображением:
+    варианты во всех размерах и форматах (кроме full/webp - это сам объект) и манифест.
+    """
+    keys = [
+        variant_object_key(object_key, variant, fmt)
+        for variant in VARIANT_SIZES
+        for fmt in FORMAT_EXTENSIONS
+        if not (variant == "full" and fmt == "webp")
+    ]
+    keys.append(manifest_object_key(object_key))
+    return keys
+
+
+def build_manifest(object_key: str, variants: List[ImageVariant]) -> bytes:
+    """
+    Собирает JSON манифест вариантов объекта.
+
+    Формат: {"key": ..., "variants": {"thumb": {"webp": {"key", "width", "height", "bytes"}}}}
+    """
+    manifest: Dict[str, Dict] = {"key": object_key, "variants": {}}
+    for variant in variants:
+        manifest["variants"].setdefault(variant.name, {})[variant.format] = {
+            "key": variant_object_key(object_key, variant.name, variant.format),
+            "width": variant.width,
+            "height": variant.height,
+            "bytes": len(variant.data),
+        }
+    return json.dumps(manifest, ensure_ascii=False).encode("utf-8")
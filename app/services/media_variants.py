@@ -0,0 +1,86 @@
+"""
+Заполнение media_variants у новых строк фото.
+
+Загрузка изображения (YandexCloudStorageService) и запись фото в БД разнесены:
+URL сначала попадает в историю или галерею, а в CharacterMainPhoto, PaidAlbumPhoto
+и UserGallery - позже и часто в другом процессе. Поэтому при загрузке список
+вариантов запоминается в Redis (remember_variants), а после коммита строки
+фото (обработчики в моделях) фоновая задача записывает его в media_variants.
+Если в Redis записи нет (истек TTL, загрузка до этого механизма), варианты
+читаются из манифеста в бакете, как в app/scripts/backfill_media_keys.py.
+"""
+
+import asyncio
+import json
+import logging
+from typing import Optional
+
+from sqlalchemy import update
+
+from app.utils.media_urls import DEFAULT_VARIANT, format_variants
+from app.utils.redis_cache import TTL_MEDIA_VARIANTS, cache_get, cache_set, key_media_variants
+
+logger = logging.getLogger(__name__)
+
+
+async def remember_variants(object_key: str, variants: str) -> None:
+    """Запоминает варианты загруженного изображения до записи фото в БД."""
+    await cache_set(key_media_variants(object_key), variants, ttl_seconds=TTL_MEDIA_VARIANTS)
+
+
+def read_manifest(service, object_key: str) -> Optional[dict]:
+    """Читает манифест вариантов объекта из бакета (синхронно); None, если его нет."""
+    from app.services.image_pipeline import manifest_object_key
+
+    try:
+        response = service.s3_client.get_object(Bucket=service.bucket_name, Key=manifest_object_key(object_key))
+        return json.loads(response["Body"].read())
+    except Exception:
+        return None
+
+
+def variants_from_manifest(manifest: Optional[dict]) -> str:
+    """Значение media_variants по манифесту; без манифеста доступен только исходный объект."""
+    return format_variants(((manifest or {}).get("variants") or {DEFAULT_VARIANT: {}}).keys())
+
+
+async def resolve_variants(media_key: str) -> str:
+    """Варианты объекта: из Redis, иначе из манифеста в бакете."""
+    variants = await cache_get(key_media_variants(media_key))
+    if isinstance(variants, str) and variants:
+        return variants
+    from app.services.yandex_storage import get_yandex_storage_service
+
+    service = get_yandex_storage_service()
+    loop = asyncio.get_running_loop()
+    manifest = await loop.run_in_executor(service.executor, read_manifest, service, media_key)
+    return variants_from_manifest(manifest)
+
+
+async def fill_media_variants(model, row_id: int, media_key: str) -> None:
+    """Записывает media_variants строки фото, если он еще не заполнен."""
+    from app.database.db import async_session_maker
+
+    try:
+        variants = await resolve_variants(media_key)
+        async with async_session_maker() as db:
+            await db.execute(
+                update(model)
+                .where(model.id == row_id, model.media_key == media_key, model.media_variants.is_(None))
+                .values(media_variants=variants)
+            )
+            await db.commit()
+    except Exception as e:
+        logger.warning(f"[MEDIA] Не удалось заполнить media_variants {model.__tablename__}#{row_id}: {e}")
+
+
+def request_media_variants_fill(model, row_id: int, media_key: str) -> None:
+    """
+    Синхронная точка входа для обработчиков событий ORM: ставит заполнение
+    media_variants в текущий event loop (если он есть).
+    """
+    try:
+        loop = asyncio.get_running_loop()
+    except RuntimeError:
+        return
+    loop.create_task(fill_media_variants(model, row_id, media_key))
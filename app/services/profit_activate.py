@@ -6,12 +6,14 @@ import asyncio
 import logging
 from collections import defaultdict
 from datetime import datetime, timedelta
+from functools import partial
 from typing import Optional, Dict, Any, DefaultDict, Set
 
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy import select, update
 from sqlalchemy.orm import selectinload
 
+from app.database.commit_hooks import has_uncommitted_writes, run_after_session_commit
 from app.models.subscription import UserSubscription, SubscriptionType, SubscriptionStatus
 from app.models.user import Users
 from app.schemas.subscription import SubscriptionStatsResponse, SubscriptionInfoResponse
@@ -42,6 +44,16 @@ _subscribers_lock = asyncio.Lock()
 _profile_subscribers: DefaultDict[int, Set[ProfileUpdateQueue]] = defaultdict(set)
 logger = logging.getLogger(__name__)
 
+# Канал Redis pub/sub, через который все воркеры узнают об изменении профиля
+PROFILE_UPDATES_CHANNEL = "profile:updates"
+# Окно схлопывания событий одного пользователя в один снимок (секунды)
+PROFILE_DEBOUNCE_SECONDS = 0.3
+# Размер очереди сокета: снимок содержит полное состояние, старые можно отбрасывать
+PROFILE_QUEUE_MAXSIZE = 2
+
+_pending_snapshots: Dict[int, asyncio.Task] = {}
+_fanout_task: Optional[asyncio.Task] = None
+
 
 def _serialize_datetime(value: Optional[datetime]) -> Optional[str]:
     """Преобразует datetime в ISO-строку."""
@@ -55,9 +67,10 @@ def _serialize_datetime(value: Optional[datetime]) -> Optional[str]:
 
 async def register_profile_listener(user_id: int) -> ProfileUpdateQueue:
     """Регистрирует очередь обновлений профиля для пользователя."""
-    queue: ProfileUpdateQueue = asyncio.Queue()
+    queue: ProfileUpdateQueue = asyncio.Queue(maxsize=PROFILE_QUEUE_MAXSIZE)
     async with _subscribers_lock:
         _profile_subscribers[user_id].add(queue)
+    _ensure_fanout_listener()
     return queue
 
 
@@ -72,19 +85,116 @@ async def unregister_profile_listener(user_id: int, queue: ProfileUpdateQueue) -
             _profile_subscribers.pop(user_id, None)
 
 
+def _offer_latest(queue: ProfileUpdateQueue, payload: ProfileUpdatePayload) -> None:
+    """Кладет снимок в очередь, вытесняя самый старый, если сокет не успевает читать."""
+    while True:
+        try:
+            queue.put_nowait(payload)
+            return
+        except asyncio.QueueFull:
+            try:
+                queue.get_nowait()
+            except asyncio.QueueEmpty:
+                pass
+
+
 async def _publish_profile_update(user_id: int, payload: ProfileUpdatePayload) -> None:
-    """Рассылает обновление профиля всем подписчикам пользователя."""
+    """Рассылает обновление профиля всем подписчикам пользователя в этом процессе."""
     async with _subscribers_lock:
         queues = list(_profile_subscribers.get(user_id, set()))
     if not queues:
         return
     for queue in queues:
         try:
-            await queue.put(payload)
+            _offer_latest(queue, payload)
         except Exception as exc:
             logger.warning("Не удалось отправить обновление профиля: %s", exc)
 
 
+async def _deliver_snapshot_later(user_id: int) -> None:
+    """Ждет окно debounce, собирает один снимок и рассылает его локальным сокетам."""
+    try:
+        await asyncio.sleep(PROFILE_DEBOUNCE_SECONDS)
+    finally:
+        # События, пришедшие во время сборки снимка, запланируют следующий
+        _pending_snapshots.pop(user_id, None)
+    if user_id not in _profile_subscribers:
+        return
+    from app.database.db import async_session_maker
+    try:
+        async with async_session_maker() as db:
+            payload = await collect_profile_snapshot(user_id, db)
+    except Exception as exc:
+        logger.error("Не удалось собрать данные профиля для пользователя %s: %s", user_id, exc)
+        return
+    await _publish_profile_update(user_id, payload)
+
+
+def _schedule_local_snapshot(user_id: int) -> None:
+    """Планирует снимок профиля, если у пользователя есть сокеты в этом процессе."""
+    if user_id not in _profile_subscribers or user_id in _pending_snapshots:
+        return
+    _pending_snapshots[user_id] = asyncio.create_task(_deliver_snapshot_later(user_id))
+
+
+async def _fanout_listener() -> None:
+    """Слушает канал обновлений профиля и планирует снимки для локальных сокетов."""
+    from app.utils.redis_cache import get_redis_client
+
+    backoff = 1.0
+    while True:
+        pubsub = None
+        try:
+            redis_client = await get_redis_client()
+            if not redis_client:
+                await asyncio.sleep(backoff)
+                backoff = min(backoff * 2, 30.0)
+                continue
+            pubsub = redis_client.pubsub(ignore_subscribe_messages=True)
+            await pubsub.subscribe(PROFILE_UPDATES_CHANNEL)
+            backoff = 1.0
+            while True:
+                message = await pubsub.get_message(timeout=1.0)
+                if message and message.get("type") == "message":
+                    try:
+                        _schedule_local_snapshot(int(message["data"]))
+                    except (TypeError, ValueError):
+                        continue
+        except asyncio.CancelledError:
+            raise
+        except Exception as exc:
+            logger.warning("[PROFILE WS] Подписка на обновления профиля прервана: %s", exc)
+            await asyncio.sleep(backoff)
+            backoff = min(backoff * 2, 30.0)
+        finally:
+            if pubsub is not None:
+                try:
+                    await pubsub.aclose()
+                except Exception:
+                    pass
+
+
+def _ensure_fanout_listener() -> None:
+    """Запускает слушателя канала в процессе, где есть хотя бы один сокет профиля."""
+    global _fanout_task
+    if _fanout_task is None or _fanout_task.done():
+        _fanout_task = asyncio.create_task(_fanout_listener())
+
+
+async def stop_profile_fanout() -> None:
+    """Останавливает слушателя канала и отложенные снимки (при остановке приложения)."""
+    global _fanout_task
+    tasks = list(_pending_snapshots.values())
+    if _fanout_task is not None:
+        tasks.append(_fanout_task)
+        _fanout_task = None
+    _pending_snapshots.clear()
+    for task in tasks:
+        task.cancel()
+    if tasks:
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+
 async def collect_profile_snapshot(user_id: int, db: AsyncSession) -> ProfileUpdatePayload:
     """Формирует актуальные данные профиля пользователя."""
     # Загружаем пользователя без eager loading подписки, чтобы избежать проблем с множественными подписками
@@ -137,14 +247,44 @@ async def collect_profile_snapshot(user_id: int, db: AsyncSession) -> ProfileUpd
     }
 
 
-async def emit_profile_update(user_id: int, db: AsyncSession) -> None:
-    """Отправляет обновление профиля конкретного пользователя подписчикам."""
+async def emit_profile_update(user_id: int, db: Optional[AsyncSession] = None) -> None:
+    """
+    Сообщает об изменении профиля пользователя.
+
+    Событие публикуется в Redis, поэтому доходит до сокетов в любом воркере,
+    в том числе из Celery задач. Снимок собирается не здесь, а в воркерах,
+    где у пользователя открыт сокет, один раз на окно PROFILE_DEBOUNCE_SECONDS.
+    Снимок читается новой сессией, поэтому если в db есть незакоммиченные
+    изменения, событие публикуется после коммита (при откате - не публикуется).
+    """
+    if db is not None and has_uncommitted_writes(db):
+        run_after_session_commit(db, ("profile_update", user_id), partial(_request_profile_update, user_id))
+        return
+    await _publish_profile_event(user_id)
+
+
+def _request_profile_update(user_id: int) -> None:
+    """Синхронная точка входа для действий после коммита: публикует событие в текущем event loop."""
     try:
-        payload = await collect_profile_snapshot(user_id, db)
-    except Exception as exc:
-        logger.error("Не удалось собрать данные профиля для пользователя %s: %s", user_id, exc)
+        loop = asyncio.get_running_loop()
+    except RuntimeError:
         return
-    await _publish_profile_update(user_id, payload)
+    loop.create_task(_publish_profile_event(user_id))
+
+
+async def _publish_profile_event(user_id: int) -> None:
+    """Публикует событие об изменении профиля; без Redis планирует снимок для локальных сокетов."""
+    from app.utils.redis_cache import get_redis_client
+
+    try:
+        redis_client = await get_redis_client()
+        if redis_client:
+            await redis_client.publish(PROFILE_UPDATES_CHANNEL, str(user_id))
+            return
+    except Exception as exc:
+        logger.warning("Не удалось опубликовать обновление профиля пользователя %s: %s", user_id, exc)
+    # Без Redis доставляем только сокетам этого процесса
+    _schedule_local_snapshot(user_id)
 
 
 class ProfitActivateService:
@@ -58,6 +58,7 @@ from app.config.default_prompts import (
     get_enhanced_prompts
 )
 from app.config.generation_defaults import DEFAULT_GENERATION_PARAMS
+from app.utils.metrics import observe_runpod_job
 
 # Загружаем переменные окружения
 load_dotenv()
@@ -535,6 +536,9 @@ async def generate_image_async(
             # ==========================================
             
             # Обрабатываем различные статусы
+            if status in ("COMPLETED", "FAILED"):
+                observe_runpod_job("image", status_response)
+
             if status == "COMPLETED":
                 # Извлекаем результат
                 output = status_response.get("output", {})
@@ -725,6 +729,7 @@ async def generate_video_async(
                         except: pass
 
                 elif status == "COMPLETED":
+                    observe_runpod_job("video", status_response)
                     output = status_response.get("output", {})
                     video_url = output.get("video_url")
                     if video_url:
@@ -740,6 +745,7 @@ async def generate_video_async(
                     raise RuntimeError(f"Wan worker completed but no video found: {output}")
 
                 elif status == "FAILED":
+                    observe_runpod_job("video", status_response)
                     error = status_response.get("error", "Unknown error")
                     logger.error(f"[RUNPOD WAN] Ошибка задачи {job_id}: {error}")
                     raise RuntimeError(f"Wan video generation failed: {error}")
@@ -0,0 +1,374 @@
+"""
+SPA shell и пререндер SEO-страниц персонажей.
+
+index.html держится в памяти и перечитывается только при изменении mtime.
+Идентификатор из URL (ID, slug или имя) разрешается по словарю в памяти,
+а готовый HTML страницы персонажа кэшируется до его редактирования.
+
+Инвалидация между процессами: при изменении персонажа увеличивается счетчик
+версии в Redis и ID записывается в журнал изменений (sorted set). Процессы
+раз в VERSION_CHECK_INTERVAL сверяют счетчик и сбрасывают только измененные страницы.
+"""
+
+import asyncio
+import logging
+import re
+import time
+from collections import OrderedDict
+from pathlib import Path
+from typing import Dict, Optional, Tuple
+
+import markdown
+from slugify import slugify
+
+from app.utils.redis_cache import get_redis_client
+
+logger = logging.getLogger(__name__)
+
+
+BASE_URL = "https://candygirlschat.com"
+DEFAULT_OG_IMAGE = f"{BASE_URL}/logo-cherry.jpg"
+
+# Как часто проверять mtime index.html (секунды)
+TEMPLATE_CHECK_INTERVAL = 2.0
+# Как часто сверять версию персонажей с Redis (секунды)
+VERSION_CHECK_INTERVAL = 5.0
+# Максимальный возраст страницы: страховка от массовых UPDATE в обход ORM событий
+PAGE_MAX_AGE = 3600.0
+# Максимальный возраст словаря персонажей (на случай недоступного Redis)
+LOOKUP_MAX_AGE = 300.0
+# Максимум страниц в памяти процесса (персонаж x язык)
+PAGE_CACHE_MAX_ENTRIES = 4096
+# Длина журнала изменений в Redis
+CHANGES_LOG_MAX = 1000
+
+REDIS_VERSION_KEY = "seo:pages:version"
+REDIS_CHANGES_KEY = "seo:pages:changes"
+
+_TITLE_RE = re.compile(r"<title>.*?</title>", flags=re.IGNORECASE | re.S)
+_MARKDOWN_CHARS_RE = re.compile(r'[#*`\[\]]')
+_ROOT_RE = re.compile(r'(<div\s+id="root">)\s*(</div>)', flags=re.S)
+_CONTENT_RE = re.compile(r'(content=(["\'])).*?(\2)', flags=re.IGNORECASE | re.S)
+_META_RE_CACHE: Dict[str, "re.Pattern"] = {}
+
+
+def _meta_pattern(meta_name_or_prop: str) -> "re.Pattern":
+    pattern = _META_RE_CACHE.get(meta_name_or_prop)
+    if pattern is None:
+        # Ищем тег <meta ...> целиком, проверяя наличие нужного name или property
+        pattern = re.compile(
+            r'<meta\s+[^>]*?(?:name|property)=["\']' + re.escape(meta_name_or_prop) + r'["\'][^>]*?>',
+            flags=re.IGNORECASE | re.S,
+        )
+        _META_RE_CACHE[meta_name_or_prop] = pattern
+    return pattern
+
+
+def replace_meta(target_html: str, meta_name_or_prop: str, replacement_value: str) -> str:
+    """Заменяет content мета-тега (учитывает переносы строк и разный порядок атрибутов)."""
+    def content_replacer(match):
+        return _CONTENT_RE.sub(lambda m: f"{m.group(1)}{replacement_value}{m.group(3)}", match.group(0))
+
+    return _meta_pattern(meta_name_or_prop).sub(content_replacer, target_html)
+
+
+# --- Шаблон ---
+
+class _Template:
+    path: Optional[Path] = None
+    mtime: float = 0.0
+    html: str = ""
+    body: bytes = b""
+    checked_at: float = 0.0
+
+
+_template = _Template()
+
+
+def _resolve_index_path() -> Optional[Path]:
+    repo_root = Path(__file__).resolve().parents[2]
+    index_html_path = repo_root / "frontend" / "dist" / "index.html"
+    if index_html_path.exists():
+        return index_html_path
+    # Если dist не найден (локальная разработка), пробуем frontend/index.html
+    alt_path = repo_root / "frontend" / "index.html"
+    if alt_path.exists():
+        return alt_path
+    return None
+
+
+def get_template() -> Optional[_Template]:
+    """
+    Возвращает шаблон index.html из памяти.
+    Раз в TEMPLATE_CHECK_INTERVAL проверяет mtime и перечитывает файл после деплоя фронтенда.
+    """
+    now = time.monotonic()
+    if _template.html and now - _template.checked_at < TEMPLATE_CHECK_INTERVAL:
+        return _template
+
+    _template.checked_at = now
+    path = _resolve_index_path()
+    if path is None:
+        return _template if _template.html else None
+
+    try:
+        mtime = path.stat().st_mtime
+        if path != _template.path or mtime != _template.mtime:
+            html = path.read_text(encoding="utf-8")
+            _template.path = path
+            _template.mtime = mtime
+            _template.html = html
+            _template.body = html.encode("utf-8")
+            # Страницы собраны из старого шаблона
+            _pages.clear()
+            logger.info(f"[SEO] Шаблон {path} загружен (mtime={mtime})")
+    except OSError as e:
+        logger.error(f"[SEO] Не удалось прочитать {path}: {e}")
+        if not _template.html:
+            return None
+    return _template
+
+
+# --- Поиск персонажа по идентификатору из URL ---
+
+_lookup: Dict[str, int] = {}
+_lookup_ids: set = set()
+_lookup_loaded = False
+_lookup_loaded_at = 0.0
+_lookup_lock = asyncio.Lock()
+
+
+async def _load_lookup() -> None:
+    global _lookup, _lookup_ids, _lookup_loaded, _lookup_loaded_at
+    from sqlalchemy import select
+    from app.database.db import async_session_maker
+    from app.chat_bot.models.models import CharacterDB
+
+    async with async_session_maker() as db:
+        rows = (await db.execute(
+            select(
+                CharacterDB.id,
+                CharacterDB.slug,
+                CharacterDB.name,
+                CharacterDB.display_name,
+                CharacterDB.name_ru,
+                CharacterDB.name_en,
+            ).order_by(CharacterDB.id)
+        )).all()
+
+    lookup: Dict[str, int] = {}
+    # Приоритет совпадений: slug, name, display_name, name_ru, name_en
+    for column in range(1, 6):
+        for row in rows:
+            value = row[column]
+            if value:
+                lookup.setdefault(value.strip().lower(), row[0])
+
+    _lookup = lookup
+    _lookup_ids = {row[0] for row in rows}
+    _lookup_loaded = True
+    _lookup_loaded_at = time.monotonic()
+    logger.info(f"[SEO] Словарь персонажей построен: {len(rows)} персонажей, {len(lookup)} ключей")
+
+
+async def resolve_character_id(identifier: str) -> Optional[int]:
+    """Разрешает ID, slug или имя персонажа (регистронезависимо) без запроса к БД."""
+    await _sync_version()
+    if not _lookup_loaded or time.monotonic() - _lookup_loaded_at > LOOKUP_MAX_AGE:
+        async with _lookup_lock:
+            if not _lookup_loaded or time.monotonic() - _lookup_loaded_at > LOOKUP_MAX_AGE:
+                await _load_lookup()
+
+    if identifier.isdigit():
+        character_id = int(identifier)
+        return character_id if character_id in _lookup_ids else None
+    return _lookup.get(identifier.lower())
+
+
+# --- Кэш готовых страниц ---
+
+# (character_id, lang) -> (template_mtime, rendered_at, body)
+_pages: "OrderedDict[Tuple[int, str], Tuple[float, float, bytes]]" = OrderedDict()
+_local_version: Optional[int] = None
+_version_checked_at = 0.0
+
+
+def _evict_character(character_id: int) -> None:
+    for lang in ("ru", "en"):
+        _pages.pop((character_id, lang), None)
+
+
+async def _sync_version() -> None:
+    """Сверяет версию персонажей с Redis и сбрасывает измененные страницы."""
+    global _local_version, _version_checked_at, _lookup_loaded
+    now = time.monotonic()
+    if now - _version_checked_at < VERSION_CHECK_INTERVAL:
+        return
+    _version_checked_at = now
+
+    try:
+        redis_client = await get_redis_client()
+        if not redis_client:
+            return
+        version = int(await redis_client.get(REDIS_VERSION_KEY) or 0)
+        if _local_version is None:
+            _local_version = version
+            return
+        if version == _local_version:
+            return
+
+        changes = await redis_client.zrangebyscore(REDIS_CHANGES_KEY, f"({_local_version}", "+inf", withscores=True)
+        oldest_logged = changes[0][1] if changes else None
+        if not changes or oldest_logged > _local_version + 1:
+            # Журнал обрезан или пуст - изменений больше, чем известно, сбрасываем все
+            _pages.clear()
+        else:
+            for member, _score in changes:
+                character_id = int(str(member).split(":", 1)[0])
+                _evict_character(character_id)
+        _lookup_loaded = False
+        _local_version = version
+    except Exception as e:
+        logger.warning(f"[SEO] Не удалось сверить версию персонажей: {e}")
+
+
+def _render_character_page(html_content: str, character, lang: str) -> str:
+    """Инъекция мета-тегов, hreflang и SSR-статьи с лором персонажа в шаблон."""
+    # Собираем данные на нужном языке (RU/EN)
+    name = (character.name_ru if lang == 'ru' else character.name_en) or character.display_name or character.name
+    lore = (character.seo_lore_ru if lang == 'ru' else character.seo_lore_en) or character.seo_lore_ru or character.description or ""
+
+    # Подготавливаем метаданные
+    if lang == 'en':
+        title = f"{name} - AI Roleplay Story & Lore | Candy Girls Chat"
+    else:
+        title = f"{name} - ИИ ролевой чат и история персонажа | Candy Girls Chat"
+
+    # Очистка лора от markdown для короткого описания
+    meta_desc_raw = _MARKDOWN_CHARS_RE.sub('', lore)
+    meta_desc = (meta_desc_raw[:160].strip() + "...") if len(meta_desc_raw) > 160 else meta_desc_raw
+
+    # Заменяем Title
+    html_content = _TITLE_RE.sub(lambda _m: f"<title>{title}</title>", html_content)
+
+    # Массовая замена мета-тегов
+    html_content = replace_meta(html_content, "description", meta_desc)
+    html_content = replace_meta(html_content, "og:title", title)
+    html_content = replace_meta(html_content, "og:description", meta_desc)
+    html_content = replace_meta(html_content, "twitter:title", title)
+    html_content = replace_meta(html_content, "twitter:description", meta_desc)
+
+    # OG:IMAGE
+    image_url = character.seo_lore_image_url or DEFAULT_OG_IMAGE
+    html_content = replace_meta(html_content, "og:image", image_url)
+    html_content = replace_meta(html_content, "twitter:image", image_url)
+
+    # HREFLANG и Canonical
+    char_slug = character.slug or slugify(character.name)
+    hreflang_tags = f"""
+    <link rel="alternate" hreflang="ru" href="{BASE_URL}/ru/character/{char_slug}" />
+    <link rel="alternate" hreflang="en" href="{BASE_URL}/en/character/{char_slug}" />
+    <link rel="alternate" hreflang="x-default" href="{BASE_URL}/ru/character/{char_slug}" />
+    <link rel="canonical" href="{BASE_URL}/{lang}/character/{char_slug}" />
+                    """
+    # Вставляем теги перед </head>
+    if '</head>' in html_content:
+        html_content = html_content.replace('</head>', f'{hreflang_tags}\n</head>')
+
+    # ГЕНЕРАЦИЯ HTML ЛОРА ДЛЯ ИНЪЕКЦИИ В #ROOT
+    rendered_lore_html = markdown.markdown(lore) if lore else ""
+
+    appearance = (character.appearance_ru if lang == 'ru' else character.appearance_en) or ""
+    location = (character.location_ru if lang == 'ru' else character.location_en) or ""
+
+    # Подзаголовок в зависимости от языка
+    subtitle = "AI Character Story & Lore" if lang == 'en' else "История и лор персонажа"
+
+    seo_article = f"""
+    <div id="seo-ssr-content" style="max-width: 900px; margin: 0 auto; color: #fff; padding: 40px 20px; font-family: sans-serif; line-height: 1.6;">
+        <header style="margin-bottom: 30px; text-align: center;">
+            <h1 style="font-size: 2.5rem; margin-bottom: 10px;">{name}</h1>
+            <div style="font-style: italic; opacity: 0.8; margin-bottom: 20px;">{subtitle}</div>
+            {f'<img src="{character.seo_lore_image_url}" alt="{name}" style="width: 100%; max-width: 600px; border-radius: 15px; box-shadow: 0 10px 30px rgba(0,0,0,0.5); margin-bottom: 30px;" />' if character.seo_lore_image_url else ''}
+        </header>
+
+        <article class="lore-body" style="font-size: 1.1rem;">
+            {rendered_lore_html}
+        </article>
+
+        <footer style="margin-top: 50px; padding-top: 30px; border-top: 1px solid rgba(255,255,255,0.1);">
+            <div style="display: grid; grid-template-columns: repeat(auto-fit, minmax(200px, 1fr)); gap: 20px;">
+                {f'<div><strong>{"Внешность" if lang == "ru" else "Appearance"}:</strong><p>{appearance}</p></div>' if appearance else ''}
+                {f'<div><strong>{"Локация" if lang == "ru" else "Location"}:</strong><p>{location}</p></div>' if location else ''}
+            </div>
+            <div style="margin-top: 30px; text-align: center;">
+                <a href="/{lang}/chat?character={character.id}" style="display: inline-block; background: #8b5cf6; color: #fff; padding: 12px 30px; border-radius: 30px; text-decoration: none; font-weight: bold; transition: transform 0.2s;">
+                    { 'Начать чат' if lang == 'ru' else 'Start Chat' }
+                </a>
+            </div>
+        </footer>
+    </div>
+                    """
+
+    # Вставляем статью в <div id="root">
+    if '<div id="root"></div>' in html_content:
+        return html_content.replace('<div id="root"></div>', f'<div id="root">{seo_article}</div>')
+    # Если там есть пробелы или переносы, используем regex
+    return _ROOT_RE.sub(lambda m: f"{m.group(1)}{seo_article}{m.group(2)}", html_content)
+
+
+async def get_character_page(template: _Template, character_id: int, lang: str) -> Optional[bytes]:
+    """Возвращает готовый HTML страницы персонажа (из кэша или после рендера)."""
+    key = (character_id, lang)
+    cached = _pages.get(key)
+    now = time.monotonic()
+    if cached and cached[0] == template.mtime and now - cached[1] < PAGE_MAX_AGE:
+        _pages.move_to_end(key)
+        return cached[2]
+
+    from app.database.db import async_session_maker
+    from app.chat_bot.models.models import CharacterDB
+
+    async with async_session_maker() as db:
+        character = await db.get(CharacterDB, character_id)
+    if character is None:
+        return None
+
+    body = _render_character_page(template.html, character, lang).encode("utf-8")
+    _pages[key] = (template.mtime, now, body)
+    _pages.move_to_end(key)
+    while len(_pages) > PAGE_CACHE_MAX_ENTRIES:
+        _pages.popitem(last=False)
+    logger.info(f"[SEO] SSR страница собрана: {character.name} (ID: {character_id}, {lang})")
+    return body
+
+
+# --- Инвалидация ---
+
+async def invalidate_character_page(character_id: int) -> None:
+    """Сбрасывает страницы персонажа в этом процессе и публикует изменение для остальных."""
+    global _lookup_loaded
+    _evict_character(character_id)
+    _lookup_loaded = False
+    try:
+        redis_client = await get_redis_client()
+        if not redis_client:
+            return
+        version = await redis_client.incr(REDIS_VERSION_KEY)
+        # Член уникален для версии, чтобы повторные правки одного персонажа не схлопывались
+        await redis_client.zadd(REDIS_CHANGES_KEY, {f"{character_id}:{version}": version})
+        await redis_client.zremrangebyrank(REDIS_CHANGES_KEY, 0, -CHANGES_LOG_MAX - 1)
+    except Exception as e:
+        logger.warning(f"[SEO] Не удалось опубликовать изменение персонажа {character_id}: {e}")
+
+
+def request_character_page_invalidation(character_id: Optional[int]) -> None:
+    """Синхронная точка входа для обработчиков событий ORM."""
+    if character_id is None:
+        return
+    _evict_character(character_id)
+    try:
+        loop = asyncio.get_running_loop()
+    except RuntimeError:
+        return
+    loop.create_task(invalidate_character_page(character_id))
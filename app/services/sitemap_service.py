@@ -0,0 +1,336 @@
+"""
+Предварительно собранный sitemap.
+
+Sitemap собирается в фоне при изменении персонажей или тегов (и раз в сутки),
+хранится в Redis в gzip и кэшируется в памяти процесса. Запрос краулера
+обслуживается из памяти с ETag/Last-Modified, повторные условные запросы
+получают 304 без тела. При превышении 50 000 URL sitemap.xml становится
+индексом, а URL разбиваются на страницы sitemap-N.xml.
+"""
+
+import asyncio
+import base64
+import gzip
+import hashlib
+import logging
+import time
+from dataclasses import dataclass, field
+from datetime import datetime, timezone
+from typing import Dict, Iterable, List, Optional
+from xml.sax.saxutils import escape
+
+from app.utils.redis_cache import (
+    cache_get_json,
+    cache_set_json,
+    get_redis_client,
+    key_sitemap_build,
+    key_sitemap_meta,
+    key_sitemap_rebuild_pending,
+    TTL_SITEMAP,
+)
+
+logger = logging.getLogger(__name__)
+
+
+DOMAIN = "https://candygirlschat.com"
+LANGUAGES = ["ru", "en"]
+
+# Лимит протокола sitemaps.org на один файл
+MAX_URLS_PER_SITEMAP = 50000
+# Как часто процесс сверяет свою копию с текущей сборкой в Redis (секунды)
+LOCAL_CHECK_INTERVAL = 60
+# Задержка пересборки после изменения: серия правок дает одну пересборку
+REBUILD_DELAY_SECONDS = 60
+# Сборка весит сотни КБ, стандартного таймаута кэша (0.3 с) для нее мало
+REDIS_PAYLOAD_TIMEOUT = 5.0
+
+INDEX_NAME = "sitemap.xml"
+
+# Базовые страницы
+PAGES = [
+    {"path": "", "priority": "1.0", "changefreq": "daily"},
+    {"path": "shop", "priority": "0.8", "changefreq": "weekly"},
+    {"path": "tariffs", "priority": "0.8", "changefreq": "weekly"},
+    {"path": "about", "priority": "0.6", "changefreq": "monthly"},
+    {"path": "how-it-works", "priority": "0.7", "changefreq": "monthly"},
+    {"path": "legal", "priority": "0.5", "changefreq": "monthly"},
+]
+
+_URLSET_OPEN = """<?xml version="1.0" encoding="UTF-8"?>
+<urlset xmlns="http://www.sitemaps.org/schemas/sitemap/0.9"
+        xmlns:xhtml="http://www.w3.org/1999/xhtml"
+        xmlns:image="http://www.google.com/schemas/sitemap-image/1.1">"""
+
+_HOME_IMAGE = f"""
+        <image:image>
+            <image:loc>{DOMAIN}/site-avatar-og.jpg</image:loc>
+            <image:title>Candy Girls Chat - AI Чат 18+</image:title>
+            <image:caption>Главная страница Candy Girls Chat</image:caption>
+        </image:image>"""
+
+
+@dataclass
+class SitemapFile:
+    """Один файл sitemap, готовый к отдаче."""
+    name: str
+    body: bytes = field(repr=False)  # gzip
+    etag: str
+    last_modified: datetime
+
+    @property
+    def last_modified_http(self) -> str:
+        return self.last_modified.strftime("%a, %d %b %Y %H:%M:%S GMT")
+
+
+def _url_block(path_by_lang: Dict[str, str], lastmod: str, changefreq: str, priority: str,
+               lang: str, x_default: bool = True, extra: str = "") -> str:
+    parts = [f"""
+    <url>
+        <loc>{path_by_lang[lang]}</loc>
+        <lastmod>{lastmod}</lastmod>
+        <changefreq>{changefreq}</changefreq>
+        <priority>{priority}</priority>"""]
+    # Альтернативные версии (hreflang)
+    for alt_lang in LANGUAGES:
+        parts.append(f"""
+        <xhtml:link rel="alternate" hreflang="{alt_lang}" href="{path_by_lang[alt_lang]}" />""")
+    if x_default:
+        parts.append(f"""
+        <xhtml:link rel="alternate" hreflang="x-default" href="{path_by_lang['ru']}" />""")
+    parts.append(extra)
+    parts.append("""
+    </url>""")
+    return "".join(parts)
+
+
+def render_url_blocks(character_ids: Iterable[int], tag_slugs: Iterable[str], lastmod: str) -> List[str]:
+    """Формирует блоки <url> для базовых страниц, персонажей и тегов."""
+    blocks: List[str] = []
+
+    # 1. Базовые страницы для каждого языка
+    for page in PAGES:
+        path = page["path"]
+        locs = {lang: f"{DOMAIN}/{lang}/{path}" if path else f"{DOMAIN}/{lang}/" for lang in LANGUAGES}
+        for lang in LANGUAGES:
+            blocks.append(_url_block(
+                locs, lastmod, page["changefreq"], page["priority"], lang,
+                # x-default только для главной страницы
+                x_default=not path,
+                extra=_HOME_IMAGE if not path and lang == "ru" else "",
+            ))
+
+    # 2. Персонажи
+    for char_id in character_ids:
+        locs = {lang: f"{DOMAIN}/{lang}/chat?character={char_id}" for lang in LANGUAGES}
+        for lang in LANGUAGES:
+            blocks.append(_url_block(locs, lastmod, "weekly", "0.7", lang))
+
+    # 3. Теги
+    for tag_slug in tag_slugs:
+        if not tag_slug:
+            continue
+        slug = escape(tag_slug)
+        locs = {lang: f"{DOMAIN}/{lang}/tags/{slug}" for lang in LANGUAGES}
+        for lang in LANGUAGES:
+            blocks.append(_url_block(locs, lastmod, "weekly", "0.6", lang))
+
+    return blocks
+
+
+def render_sitemap_files(blocks: List[str], lastmod: str) -> Dict[str, str]:
+    """
+    Раскладывает URL по файлам. До MAX_URLS_PER_SITEMAP URL - один sitemap.xml,
+    иначе sitemap.xml - индекс со ссылками на sitemap-1.xml, sitemap-2.xml, ...
+    """
+    if len(blocks) <= MAX_URLS_PER_SITEMAP:
+        return {INDEX_NAME: _URLSET_OPEN + "".join(blocks) + "\n</urlset>"}
+
+    files: Dict[str, str] = {}
+    index_entries: List[str] = []
+    for page, start in enumerate(range(0, len(blocks), MAX_URLS_PER_SITEMAP), start=1):
+        name = f"sitemap-{page}.xml"
+        files[name] = _URLSET_OPEN + "".join(blocks[start:start + MAX_URLS_PER_SITEMAP]) + "\n</urlset>"
+        index_entries.append(f"""
+    <sitemap>
+        <loc>{DOMAIN}/{name}</loc>
+        <lastmod>{lastmod}</lastmod>
+    </sitemap>""")
+    files[INDEX_NAME] = (
+        '<?xml version="1.0" encoding="UTF-8"?>\n'
+        '<sitemapindex xmlns="http://www.sitemaps.org/schemas/sitemap/0.9">'
+        + "".join(index_entries)
+        + "\n</sitemapindex>"
+    )
+    return files
+
+
+async def _load_sources():
+    """Загружает ID персонажей и slug тегов (только нужные колонки)."""
+    from sqlalchemy import select
+    from app.database.read_routing import get_replica_router
+    from app.chat_bot.models.models import CharacterDB, CharacterAvailableTag
+
+    async with get_replica_router().read_session() as db:
+        character_ids = (await db.execute(select(CharacterDB.id).order_by(CharacterDB.id))).scalars().all()
+        tag_slugs = (await db.execute(
+            select(CharacterAvailableTag.slug).order_by(CharacterAvailableTag.id)
+        )).scalars().all()
+    return character_ids, tag_slugs
+
+
+_local_files: Dict[str, SitemapFile] = {}
+_local_build_id: Optional[str] = None
+_local_checked_at: float = 0.0
+_build_lock = asyncio.Lock()
+
+
+def _decode_build(meta: dict, payload: Dict[str, str]) -> Dict[str, SitemapFile]:
+    last_modified = datetime.fromisoformat(meta["last_modified"])
+    return {
+        name: SitemapFile(
+            name=name,
+            body=base64.b64decode(encoded),
+            etag=meta["etags"][name],
+            last_modified=last_modified,
+        )
+        for name, encoded in payload.items()
+    }
+
+
+def _set_local(build_id: str, files: Dict[str, SitemapFile]) -> None:
+    global _local_files, _local_build_id, _local_checked_at
+    _local_files = files
+    _local_build_id = build_id
+    _local_checked_at = time.monotonic()
+
+
+async def rebuild_sitemap() -> Dict[str, SitemapFile]:
+    """
+    Собирает sitemap из БД и публикует сборку в Redis.
+
+    build_id - хэш списка URL без дат, поэтому пересборка без изменений
+    сохраняет прежние ETag и Last-Modified.
+    """
+    character_ids, tag_slugs = await _load_sources()
+
+    build_hash = hashlib.sha1()
+    build_hash.update(",".join(map(str, character_ids)).encode())
+    build_hash.update(b"|")
+    build_hash.update(",".join(slug or "" for slug in tag_slugs).encode())
+    build_id = build_hash.hexdigest()[:16]
+
+    meta = await cache_get_json(key_sitemap_meta())
+    if isinstance(meta, dict) and meta.get("build_id") == build_id:
+        payload = await cache_get_json(key_sitemap_build(build_id), timeout=REDIS_PAYLOAD_TIMEOUT)
+        if isinstance(payload, dict) and payload:
+            # Продлеваем TTL текущей сборки
+            await cache_set_json(key_sitemap_build(build_id), payload, ttl_seconds=TTL_SITEMAP, timeout=REDIS_PAYLOAD_TIMEOUT)
+            await cache_set_json(key_sitemap_meta(), meta, ttl_seconds=TTL_SITEMAP)
+            files = _decode_build(meta, payload)
+            _set_local(build_id, files)
+            return files
+
+    now = datetime.now(timezone.utc).replace(microsecond=0)
+    lastmod = now.date().isoformat()
+    rendered = render_sitemap_files(render_url_blocks(character_ids, tag_slugs, lastmod), lastmod)
+
+    files: Dict[str, SitemapFile] = {}
+    for name, xml in rendered.items():
+        # mtime=0: одинаковое содержимое дает одинаковые байты
+        body = gzip.compress(xml.encode("utf-8"), compresslevel=9, mtime=0)
+        files[name] = SitemapFile(
+            name=name,
+            body=body,
+            etag=f'"{build_id}-{hashlib.md5(body).hexdigest()[:8]}"',
+            last_modified=now,
+        )
+
+    new_meta = {
+        "build_id": build_id,
+        "last_modified": now.isoformat(),
+        "etags": {name: f.etag for name, f in files.items()},
+    }
+    payload = {name: base64.b64encode(f.body).decode("ascii") for name, f in files.items()}
+    # Сначала файлы, потом мета: читатели никогда не видят мету без файлов
+    await cache_set_json(key_sitemap_build(build_id), payload, ttl_seconds=TTL_SITEMAP, timeout=REDIS_PAYLOAD_TIMEOUT)
+    await cache_set_json(key_sitemap_meta(), new_meta, ttl_seconds=TTL_SITEMAP)
+    if isinstance(meta, dict) and meta.get("build_id") and meta["build_id"] != build_id:
+        # Процессы держат копию в памяти, старую сборку можно удалить с запасом
+        redis_client = await get_redis_client()
+        if redis_client:
+            await redis_client.expire(key_sitemap_build(meta["build_id"]), 600)
+
+    _set_local(build_id, files)
+    total_urls = sum(xml.count("<url>") for xml in rendered.values())
+    logger.info(f"[SITEMAP] Собран sitemap {build_id}: {len(files)} файл(ов), {total_urls} URL")
+    return files
+
+
+async def get_sitemap_file(name: str) -> Optional[SitemapFile]:
+    """
+    Возвращает файл sitemap из памяти процесса.
+
+    Раз в LOCAL_CHECK_INTERVAL сверяет build_id с Redis и подгружает новую
+    сборку. Если сборки нет (первый запуск, Redis очищен), собирает на месте.
+    """
+    global _local_checked_at
+    if _local_files and time.monotonic() - _local_checked_at < LOCAL_CHECK_INTERVAL:
+        return _local_files.get(name)
+
+    async with _build_lock:
+        if _local_files and time.monotonic() - _local_checked_at < LOCAL_CHECK_INTERVAL:
+            return _local_files.get(name)
+
+        meta = await cache_get_json(key_sitemap_meta())
+        if isinstance(meta, dict) and meta.get("build_id"):
+            if meta["build_id"] == _local_build_id:
+                _local_checked_at = time.monotonic()
+                return _local_files.get(name)
+            payload = await cache_get_json(key_sitemap_build(meta["build_id"]), timeout=REDIS_PAYLOAD_TIMEOUT)
+            if isinstance(payload, dict) and payload:
+                _set_local(meta["build_id"], _decode_build(meta, payload))
+                return _local_files.get(name)
+
+        try:
+            files = await rebuild_sitemap()
+        except Exception as e:
+            logger.error(f"[SITEMAP] Ошибка сборки sitemap: {e}")
+            if _local_files:
+                # Отдаем прежнюю копию и не пытаемся пересобрать на каждом запросе
+                _local_checked_at = time.monotonic()
+                return _local_files.get(name)
+            raise
+        return files.get(name)
+
+
+async def schedule_sitemap_rebuild() -> bool:
+    """
+    Планирует фоновую пересборку sitemap с задержкой REBUILD_DELAY_SECONDS.
+    Пока пересборка запланирована, повторные вызовы ничего не делают.
+    """
+    try:
+        redis_client = await get_redis_client()
+        if redis_client:
+            scheduled = await redis_client.set(
+                key_sitemap_rebuild_pending(), "1", nx=True, ex=REBUILD_DELAY_SECONDS * 5
+            )
+            if not scheduled:
+                return False
+        from app.tasks.cache_tasks import rebuild_sitemap_task
+        rebuild_sitemap_task.apply_async(countdown=REBUILD_DELAY_SECONDS)
+        return True
+    except Exception as e:
+        logger.warning(f"[SITEMAP] Не удалось запланировать пересборку sitemap: {e}")
+        return False
+
+
+def request_sitemap_rebuild() -> None:
+    """
+    Синхронная точка входа для обработчиков событий ORM: ставит планирование
+    пересборки в текущий event loop (если он есть).
+    """
+    try:
+        loop = asyncio.get_running_loop()
+    except RuntimeError:
+        return
+    loop.create_task(schedule_sitemap_rebuild())
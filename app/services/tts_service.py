@@ -4,10 +4,15 @@
 
 import os
 import uuid
+import time
 import asyncio
 import hashlib
+import threading
+import weakref
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
-from typing import Optional
+from typing import Any, Callable, Dict, Optional, Tuple
 from fishaudio import FishAudio
 from fishaudio.types import ReferenceAudio
 from app.config.paths import VOICES_DIR, DEFAULT_CHARACTER_VOICES_DIR, USER_VOICES_DIR, EN_CHARACTER_VOICES_DIR
@@ -34,29 +39,171 @@ def calculate_voice_cost(text: str) -> int:
 
 
 
+# --- Пул клиентов и потоков Fish Audio ---
+# Клиент и пул потоков создаются один раз на процесс и переиспользуются всеми запросами
+_fish_client: Optional[FishAudio] = None
+_fish_client_lock = threading.Lock()
+_tts_executor: Optional[ThreadPoolExecutor] = None
+_tts_executor_lock = threading.Lock()
+
+# Ограничение одновременных запросов на один голос (ключ - voice_id).
+# Слабые ссылки: семафор живет, пока его удерживают ожидающие запросы,
+# поэтому уникальные имена загруженных голосов не накапливаются в словаре
+_voice_semaphores: "weakref.WeakValueDictionary[str, asyncio.Semaphore]" = weakref.WeakValueDictionary()
+
+# Кэш образцов голосов: voice_path -> (mtime, bytes), вытеснение по LRU при превышении лимита
+_voice_audio_cache: "OrderedDict[str, Tuple[float, bytes]]" = OrderedDict()
+_voice_audio_cache_size: int = 0
+_voice_audio_cache_lock = threading.Lock()
+
+# Зарегистрированные голосовые модели Fish Audio хранятся в Redis (общие для воркеров и рестартов):
+# voices:model:<sha256 образца> -> reference_id
+VOICE_MODEL_LOCK_TTL = 120  # секунд - блокировка регистрации модели одним воркером
+
+# Метрики очереди TTS (время ожидания семафора и пула потоков)
+_tts_metrics: Dict[str, float] = {
+    "calls": 0,
+    "in_flight": 0,
+    "queue_time_total": 0.0,
+    "queue_time_max": 0.0,
+    "execution_time_total": 0.0,
+    "voice_cache_hits": 0,
+    "voice_cache_misses": 0,
+    "voice_model_hits": 0,
+}
+
+EN_VOICES = {"Anne.mp3", "Catherine.mp3", "EVA.mp3", "Eleanor.mp3", "Kogami.mp3", "Victoria.mp3"}
+
+
 def _get_fish_client() -> Optional[FishAudio]:
     """
-    Создает и возвращает клиент Fish Audio.
+    Возвращает общий для процесса клиент Fish Audio.
+    
+    Клиент создается один раз и переиспользует HTTP соединения между запросами.
     
     Returns:
         Экземпляр FishAudio клиента или None если API ключ не установлен.
     """
+    global _fish_client
+    
     if not settings.FISH_AUDIO_API_KEY:
         logger.error("FISH_AUDIO_API_KEY не установлен в настройках")
         return None
     
-    try:
-        client = FishAudio(api_key=settings.FISH_AUDIO_API_KEY)
-        return client
-    except Exception as e:
-        logger.error(f"Ошибка при создании Fish Audio клиента: {e}")
-        return None
+    if _fish_client is not None:
+        return _fish_client
+    
+    with _fish_client_lock:
+        if _fish_client is None:
+            try:
+                _fish_client = FishAudio(api_key=settings.FISH_AUDIO_API_KEY)
+            except Exception as e:
+                logger.error(f"Ошибка при создании Fish Audio клиента: {e}")
+                return None
+    return _fish_client
+
+
+def _get_tts_executor() -> ThreadPoolExecutor:
+    """Возвращает выделенный пул потоков для блокирующих вызовов Fish Audio SDK."""
+    global _tts_executor
+    if _tts_executor is None:
+        with _tts_executor_lock:
+            if _tts_executor is None:
+                _tts_executor = ThreadPoolExecutor(
+                    max_workers=max(1, settings.TTS_EXECUTOR_WORKERS),
+                    thread_name_prefix="fish-tts",
+                )
+    return _tts_executor
+
+
+def _get_voice_semaphore(voice_key: str) -> asyncio.Semaphore:
+    """Возвращает семафор, ограничивающий параллельные запросы для одного голоса."""
+    semaphore = _voice_semaphores.get(voice_key)
+    if semaphore is None:
+        semaphore = asyncio.Semaphore(max(1, settings.TTS_PER_VOICE_CONCURRENCY))
+        _voice_semaphores[voice_key] = semaphore
+    return semaphore
+
+
+async def _run_fish_call(voice_key: str, func: Callable[[], Any]) -> Any:
+    """
+    Выполняет блокирующий вызов Fish Audio SDK в выделенном пуле потоков.
+    
+    Учитывает лимит параллельных запросов на голос и собирает метрики
+    времени ожидания в очереди и времени выполнения.
+    """
+    queued_at = time.monotonic()
+    async with _get_voice_semaphore(voice_key):
+        loop = asyncio.get_running_loop()
+        
+        def timed_call():
+            started_at = time.monotonic()
+            queue_time = started_at - queued_at
+            _tts_metrics["queue_time_total"] += queue_time
+            _tts_metrics["queue_time_max"] = max(_tts_metrics["queue_time_max"], queue_time)
+            try:
+                return func()
+            finally:
+                _tts_metrics["execution_time_total"] += time.monotonic() - started_at
+        
+        _tts_metrics["calls"] += 1
+        _tts_metrics["in_flight"] += 1
+        try:
+            return await loop.run_in_executor(_get_tts_executor(), timed_call)
+        finally:
+            _tts_metrics["in_flight"] -= 1
+
+
+def get_tts_metrics() -> Dict[str, float]:
+    """
+    Возвращает снимок метрик TTS: число вызовов, время ожидания в очереди,
+    время выполнения и статистику кэша образцов голосов.
+    """
+    metrics = dict(_tts_metrics)
+    calls = metrics["calls"] or 1
+    metrics["queue_time_avg"] = metrics["queue_time_total"] / calls
+    metrics["execution_time_avg"] = metrics["execution_time_total"] / calls
+    metrics["voice_cache_bytes"] = _voice_audio_cache_size
+    metrics["voice_cache_entries"] = len(_voice_audio_cache)
+    return metrics
+
+
+def _resolve_voice_path(voice_id: str, is_user_voice: bool = False) -> Path:
+    """Возвращает путь к файлу образца голоса."""
+    if is_user_voice:
+        return USER_VOICES_DIR / voice_id
+    if voice_id in EN_VOICES:
+        return EN_CHARACTER_VOICES_DIR / voice_id
+    return DEFAULT_CHARACTER_VOICES_DIR / voice_id
+
+
+def _cache_voice_audio(cache_key: str, mtime: float, audio_data: bytes) -> None:
+    """Кладет образец голоса в LRU кэш с ограничением по суммарному размеру."""
+    global _voice_audio_cache_size
+    
+    max_bytes = settings.TTS_VOICE_CACHE_MAX_BYTES
+    if len(audio_data) > max_bytes:
+        return
+    
+    with _voice_audio_cache_lock:
+        previous = _voice_audio_cache.pop(cache_key, None)
+        if previous is not None:
+            _voice_audio_cache_size -= len(previous[1])
+        _voice_audio_cache[cache_key] = (mtime, audio_data)
+        _voice_audio_cache_size += len(audio_data)
+        
+        while _voice_audio_cache_size > max_bytes and _voice_audio_cache:
+            _, (_, evicted) = _voice_audio_cache.popitem(last=False)
+            _voice_audio_cache_size -= len(evicted)
 
 
 def _load_voice_audio(voice_id: str, is_user_voice: bool = False) -> Optional[bytes]:
     """
     Загружает аудио файл голоса как bytes.
     
+    Образцы кэшируются в памяти по пути и времени модификации файла,
+    поэтому повторные запросы не читают диск, а измененный файл перечитывается.
+    
     Args:
         voice_id: ID голоса (имя файла)
         is_user_voice: Искать в пользовательских голосах
@@ -65,21 +212,27 @@ def _load_voice_audio(voice_id: str, is_user_voice: bool = False) -> Optional[by
         Аудио данные в формате bytes или None в случае ошибки
     """
     try:
-        en_voices = {"Anne.mp3", "Catherine.mp3", "EVA.mp3", "Eleanor.mp3", "Kogami.mp3", "Victoria.mp3"}
-        if is_user_voice:
-            voice_path = USER_VOICES_DIR / voice_id
-        elif voice_id in en_voices:
-            voice_path = EN_CHARACTER_VOICES_DIR / voice_id
-        else:
-            voice_path = DEFAULT_CHARACTER_VOICES_DIR / voice_id
+        voice_path = _resolve_voice_path(voice_id, is_user_voice)
         
-        if not voice_path.exists():
+        try:
+            mtime = voice_path.stat().st_mtime
+        except FileNotFoundError:
             logger.error(f"Файл голоса не найден: {voice_path}")
             return None
         
+        cache_key = str(voice_path)
+        with _voice_audio_cache_lock:
+            cached = _voice_audio_cache.get(cache_key)
+            if cached is not None and cached[0] == mtime:
+                _voice_audio_cache.move_to_end(cache_key)
+                _tts_metrics["voice_cache_hits"] += 1
+                return cached[1]
+        
+        _tts_metrics["voice_cache_misses"] += 1
         with open(voice_path, 'rb') as f:
             audio_data = f.read()
         
+        _cache_voice_audio(cache_key, mtime, audio_data)
         logger.info(f"Загружен аудио файл голоса {voice_id}, размер: {len(audio_data)} байт")
         return audio_data
         
@@ -88,11 +241,111 @@ def _load_voice_audio(voice_id: str, is_user_voice: bool = False) -> Optional[by
         return None
 
 
+def _register_voice_model(client: FishAudio, voice_id: str, voice_audio: bytes) -> Optional[str]:
+    """
+    Загружает образец в Fish Audio как приватную голосовую модель.
+    Вызывается из потока пула TTS. Возвращает reference_id или None при ошибке.
+    """
+    try:
+        voice = client.voices.create(
+            title=f"art_generate_{Path(voice_id).stem}"[:64],
+            voices=[voice_audio],
+            texts=[DEFAULT_PREVIEW_TEXT],
+            visibility="private",
+        )
+        return getattr(voice, "id", None)
+    except Exception as e:
+        logger.warning(f"Не удалось зарегистрировать голосовую модель {voice_id}, используем instant cloning: {e}")
+        return None
+
+
+async def _get_voice_model_id(client: FishAudio, voice_id: str, voice_audio: bytes) -> Optional[str]:
+    """
+    Возвращает reference_id зарегистрированной голосовой модели Fish Audio.
+    
+    Модель ищется в Redis по хэшу содержимого образца, поэтому все воркеры
+    и перезапуски используют одну модель на образец. Регистрирует модель
+    только воркер, взявший блокировку в Redis; остальные до ее появления
+    используют instant voice cloning. Возвращает None, если модели отключены,
+    Redis недоступен или регистрация не удалась.
+    """
+    if not settings.FISH_AUDIO_USE_VOICE_MODELS:
+        return None
+    
+    from app.utils.redis_cache import get_redis_client, key_voice_model
+    
+    redis_client = await get_redis_client()
+    if redis_client is None:
+        return None
+    
+    model_key = key_voice_model(hashlib.sha256(voice_audio).hexdigest())
+    lock_key = f"{model_key}:lock"
+    try:
+        model_id = await redis_client.get(model_key)
+        if model_id:
+            _tts_metrics["voice_model_hits"] += 1
+            return model_id
+        if not await redis_client.set(lock_key, "1", nx=True, ex=VOICE_MODEL_LOCK_TTL):
+            return None
+    except Exception as e:
+        logger.warning(f"Не удалось получить голосовую модель {voice_id} из Redis: {e}")
+        return None
+    
+    try:
+        model_id = await _run_fish_call(
+            voice_id, lambda: _register_voice_model(client, voice_id, voice_audio)
+        )
+        if model_id:
+            # Без TTL: модель в Fish Audio постоянная, повторная регистрация не нужна
+            await redis_client.set(model_key, model_id)
+            logger.info(f"Голос {voice_id} зарегистрирован в Fish Audio как модель {model_id}")
+        return model_id
+    except Exception as e:
+        logger.warning(f"Не удалось сохранить голосовую модель {voice_id} в Redis: {e}")
+        return None
+    finally:
+        try:
+            await redis_client.delete(lock_key)
+        except Exception:
+            pass
+
+
+def _convert_tts(client: FishAudio, text: str, voice_audio: bytes, reference_id: Optional[str] = None) -> Any:
+    """
+    Вызывает Fish Audio TTS с зарегистрированной моделью или образцом голоса.
+    
+    latency="normal" - максимальное качество (лучшие ударения и паузы для русского)
+    model="fishaudio-s1" - указываем модель явно для максимального качества
+    format="wav" - несжатый формат для максимального качества звука
+    """
+    if reference_id:
+        return client.tts.convert(
+            text=text,
+            reference_id=reference_id,
+            format="wav",
+            latency="normal",
+            model="fishaudio-s1"
+        )
+    return client.tts.convert(
+        text=text,
+        references=[
+            ReferenceAudio(
+                audio=voice_audio,
+                text=DEFAULT_PREVIEW_TEXT  # Текст из образца
+            )
+        ],
+        format="wav",
+        latency="normal",
+        model="fishaudio-s1"
+    )
+
+
 async def generate_tts_audio(text: str, voice_url: str) -> Optional[str]:
     """
     Генерирует аудио из текста с использованием Fish Audio API.
     
-    Использует instant voice cloning - передает образец голоса в каждом запросе.
+    Использует зарегистрированную голосовую модель (FISH_AUDIO_USE_VOICE_MODELS),
+    иначе instant voice cloning - передает кэшированный образец голоса в запросе.
     Поддерживает только локальные голоса из default_character_voices.
     
     Примечание: Внешние URL (например, от старых персонажей с fal.ai) не поддерживаются,
@@ -150,35 +403,20 @@ async def generate_tts_audio(text: str, voice_url: str) -> Optional[str]:
         if not client:
             return None
         
-        logger.info(f"Fish Audio клиент создан успешно")
         logger.info(f"Начинаем генерацию TTS для текста: '{text[:50]}...' с голосом {voice_id}")
         
-        # Генерация аудио в отдельном потоке (SDK может быть блокирующим)
+        # Зарегистрированная модель голоса, иначе instant voice cloning с образцом
+        reference_id = await _get_voice_model_id(client, voice_id, voice_audio)
+        
+        # Генерация аудио в пуле потоков TTS (SDK блокирующий)
         def generate_audio():
             logger.info(f"[TTS GENERATION] Вызов Fish Audio API...")
-            # Используем instant voice cloning
-            # Передаем образец голоса и текст, который в нем произносится
-            # latency="normal" - максимальное качество (лучшие ударения и паузы для русского)
-            # model="fishaudio-s1" - указываем модель явно для максимального качества
-            # format="wav" - несжатый формат для максимального качества звука
-            result = client.tts.convert(
-                text=text,
-                references=[
-                    ReferenceAudio(
-                        audio=voice_audio,
-                        text=DEFAULT_PREVIEW_TEXT  # Примерный текст из образца
-                    )
-                ],
-                format="wav",
-                latency="normal",
-                model="fishaudio-s1"
-            )
+            result = _convert_tts(client, text, voice_audio, reference_id=reference_id)
             logger.info(f"[TTS GENERATION] Fish Audio API вернул результат типа: {type(result)}")
             return result
         
-        loop = asyncio.get_event_loop()
         logger.info(f"Запуск генерации в executor...")
-        audio_data = await loop.run_in_executor(None, generate_audio)
+        audio_data = await _run_fish_call(voice_id, generate_audio)
         logger.info(f"Генерация завершена, получены данные размером: {len(audio_data) if isinstance(audio_data, bytes) else 'unknown'}")
         
         # Создание директории если не существует
@@ -221,9 +459,7 @@ def get_voice_url_by_id(voice_id: str) -> Optional[str]:
         Полный URL к файлу голоса или None если файл не найден
     """
     try:
-        en_voices = {"Anne.mp3", "Catherine.mp3", "EVA.mp3", "Eleanor.mp3", "Kogami.mp3", "Victoria.mp3"}
-        
-        if voice_id in en_voices:
+        if voice_id in EN_VOICES:
             voice_path = EN_CHARACTER_VOICES_DIR / voice_id
             url_prefix = "/en_voices"
         else:
@@ -292,26 +528,13 @@ async def generate_voice_preview(voice_id: str, text: Optional[str] = None) -> O
         if not client:
             return None
         
-        # Генерация аудио в отдельном потоке
+        reference_id = await _get_voice_model_id(client, voice_id, voice_audio)
+        
+        # Генерация аудио в пуле потоков TTS
         def generate_audio():
-            # latency="normal" - максимальное качество (лучшие ударения и паузы для русского)
-            # model="fishaudio-s1" - указываем модель явно для максимального качества
-            # format="wav" - несжатый формат для максимального качества звука
-            return client.tts.convert(
-                text=preview_text,
-                references=[
-                    ReferenceAudio(
-                        audio=voice_audio,
-                        text=DEFAULT_PREVIEW_TEXT  # Текст из образца
-                    )
-                ],
-                format="wav",
-                latency="normal",
-                model="fishaudio-s1"
-            )
+            return _convert_tts(client, preview_text, voice_audio, reference_id=reference_id)
         
-        loop = asyncio.get_event_loop()
-        audio_data = await loop.run_in_executor(None, generate_audio)
+        audio_data = await _run_fish_call(voice_id, generate_audio)
         
         # Сохранение в кэш
         if isinstance(audio_data, bytes):
@@ -380,33 +603,17 @@ async def generate_preview_from_uploaded_voice(voice_audio: bytes, voice_filenam
         if not client:
             return None
         
-        logger.info(f"Fish Audio клиент создан успешно")
         logger.info(f"Начинаем генерацию превью TTS для текста: '{preview_text[:50]}...'")
         
-        # Генерация аудио в отдельном потоке
+        # Генерация аудио в пуле потоков TTS
         def generate_audio():
             logger.info(f"[TTS PREVIEW] Вызов Fish Audio API...")
-            # latency="normal" - максимальное качество (лучшие ударения и паузы для русского)
-            # model="fishaudio-s1" - указываем модель явно для максимального качества
-            # format="wav" - несжатый формат для максимального качества звука
-            result = client.tts.convert(
-                text=preview_text,
-                references=[
-                    ReferenceAudio(
-                        audio=voice_audio,
-                        text=DEFAULT_PREVIEW_TEXT  # Текст из образца
-                    )
-                ],
-                format="wav",
-                latency="normal",
-                model="fishaudio-s1"
-            )
+            result = _convert_tts(client, preview_text, voice_audio)
             logger.info(f"[TTS PREVIEW] Fish Audio API вернул результат типа: {type(result)}")
             return result
         
-        loop = asyncio.get_event_loop()
         logger.info(f"Запуск генерации превью в executor...")
-        audio_data = await loop.run_in_executor(None, generate_audio)
+        audio_data = await _run_fish_call(saved_voice_filename, generate_audio)
         logger.info(f"Генерация превью завершена, получены данные")
         
         # Сохраняем превью
@@ -5,9 +5,12 @@
 
 import os
 import logging
-from typing import Optional, Union, BinaryIO
+import hashlib
+from collections import OrderedDict
+from typing import Optional, Union, BinaryIO, List
 from pathlib import Path
 import boto3
+from boto3.s3.transfer import TransferConfig
 from botocore.exceptions import ClientError
 from botocore.config import Config
 import asyncio
@@ -20,6 +23,12 @@ from PIL import Image
 
 logger = logging.getLogger(__name__)
 
+# Префикс (внутри папки объекта) для объектов, адресуемых по хэшу содержимого
+CONTENT_ADDRESSED_DIR = "h"
+# Блокировка счетчика ссылок на такой объект: время жизни и ожидание (секунды)
+CONTENT_REF_LOCK_TIMEOUT = 120
+CONTENT_REF_LOCK_WAIT = 10
+
 
 def transliterate_cyrillic_to_ascii(text: str) -> str:
     """
@@ -237,14 +246,36 @@ class YandexCloudStorageService:
                         f"endpoint_url={self.endpoint_url}")
             raise
         
+        from app.config.settings import settings
+        
         # Пул потоков для асинхронных операций
-        self.executor = ThreadPoolExecutor(max_workers=4)
+        self.executor = ThreadPoolExecutor(
+            max_workers=max(1, settings.STORAGE_UPLOAD_WORKERS),
+            thread_name_prefix="yandex-storage"
+        )
+        
+        # Multipart загрузка больших файлов
+        self.transfer_config = TransferConfig(
+            multipart_threshold=settings.STORAGE_MULTIPART_THRESHOLD_MB * 1024 * 1024,
+            multipart_chunksize=settings.STORAGE_MULTIPART_CHUNKSIZE_MB * 1024 * 1024,
+            max_concurrency=max(1, settings.STORAGE_MULTIPART_CONCURRENCY),
+            use_threads=True
+        )
+        self.deduplicate_uploads = settings.STORAGE_DEDUPLICATE
+        self.upload_many_concurrency = max(1, settings.STORAGE_UPLOAD_MANY_CONCURRENCY)
+        
+        # Ключи объектов, существование которых уже подтверждено (LRU)
+        self._known_objects: "OrderedDict[str, None]" = OrderedDict()
+        self._known_objects_limit = 10000
         
         logger.info(f"YandexCloudStorageService инициализирован для бакета: {self.bucket_name}")
     
     def _convert_to_webp(self, image_data: bytes) -> bytes:
         """
-        Конвертирует изображение в формат WebP.
+        Конвертирует изображение в формат WebP (синхронно, в текущем потоке).
+        
+        Для загрузок используется конвейер image_pipeline в пуле процессов,
+        этот метод оставлен для синхронных вызовов.
         
         Args:
             image_data: Байты изображения в любом формате
@@ -253,24 +284,17 @@ class YandexCloudStorageService:
             bytes: Байты изображения в формате WebP
         """
         try:
-            # Открываем изображение из bytes
-            image = Image.open(BytesIO(image_data))
-            
-            # Конвертируем RGBA в RGB, если нужно (WebP поддерживает RGBA, но для лучшей совместимости)
-            if image.mode in ('RGBA', 'LA', 'P'):
-                # Создаем белый фон для изображений с прозрачностью
-                rgb_image = Image.new('RGB', image.size, (255, 255, 255))
-                if image.mode == 'P':
-                    image = image.convert('RGBA')
-                rgb_image.paste(image, mask=image.split()[-1] if image.mode == 'RGBA' else None)
-                image = rgb_image
-            elif image.mode != 'RGB':
-                image = image.convert('RGB')
-            
-            # Сохраняем в WebP формат с хорошим качеством
-            webp_buffer = BytesIO()
-            image.save(webp_buffer, format='WEBP', quality=85, method=6)
-            webp_bytes = webp_buffer.getvalue()
+            from app.config.settings import settings
+            from app.services.image_pipeline import encode_variants
+            
+            variants = encode_variants(
+                image_data,
+                variants=("full",),
+                formats=("webp",),
+                effort=settings.IMAGE_ENCODE_EFFORT,
+                quality=settings.IMAGE_ENCODE_QUALITY,
+            )
+            webp_bytes = variants[0].data
             
             logger.debug(f"Изображение конвертировано в WebP: {len(image_data)} -> {len(webp_bytes)} байт")
             return webp_bytes
@@ -280,13 +304,141 @@ class YandexCloudStorageService:
             # Если конвертация не удалась, возвращаем оригинал
             return image_data
     
+    async def _transcode_image(self, image_bytes: bytes) -> list:
+        """
+        Перекодирует изображение в пуле процессов за одно декодирование.
+        
+        Возвращает список ImageVariant: всегда full/webp, а при включенном
+        IMAGE_VARIANTS_ENABLED - также thumb и card во всех настроенных форматах.
+        Пустой список, если изображение не удалось декодировать.
+        """
+        from app.config.settings import settings
+        from app.services.image_pipeline import transcode_image
+        
+        try:
+            if settings.IMAGE_VARIANTS_ENABLED:
+                return await transcode_image(image_bytes)
+            return await transcode_image(image_bytes, variants=("full",), formats=("webp",))
+        except Exception as e:
+            logger.error(f"Ошибка перекодирования изображения: {e}")
+            return []
+    
+    async def _upload_variants(self, object_key: str, variants: list, extra_args: dict) -> bool:
+        """
+        Загружает дополнительные варианты изображения и манифест вариантов.
+        
+        Основной вариант (full/webp) загружается в upload_file под исходным ключом.
+        Ошибки здесь не прерывают загрузку - клиенты откатываются на full.
+        
+        Returns:
+            True, если все варианты и манифест загружены
+        """
+        from app.services.image_pipeline import build_manifest, manifest_object_key, variant_object_key
+        
+        extra_variants = [v for v in variants if not (v.name == "full" and v.format == "webp")]
+        if not extra_variants:
+            return True
+        
+        loop = asyncio.get_event_loop()
+        uploads = []
+        for variant in extra_variants:
+            variant_args = {**extra_args, 'ContentType': variant.content_type}
+            uploads.append(loop.run_in_executor(
+                self.executor,
+                self._upload_file_sync,
+                variant.data,
+                variant_object_key(object_key, variant.name, variant.format),
+                variant_args
+            ))
+        manifest_args = {
+            'ContentType': 'application/json',
+            'CacheControl': extra_args.get('CacheControl', 'max-age=31536000')
+        }
+        uploads.append(loop.run_in_executor(
+            self.executor,
+            self._upload_file_sync,
+            build_manifest(object_key, variants),
+            manifest_object_key(object_key),
+            manifest_args
+        ))
+        
+        results = await asyncio.gather(*uploads, return_exceptions=True)
+        failed = [r for r in results if isinstance(r, Exception)]
+        if failed:
+            logger.warning(f"Не удалось загрузить {len(failed)} вариантов для {object_key}: {failed[0]}")
+        return not failed
+    
+    @staticmethod
+    def _compute_content_hash(file_data: Union[bytes, BinaryIO, str]) -> str:
+        """
+        Вычисляет SHA-256 содержимого (bytes, файловый объект или путь к файлу).
+        Файлы читаются блоками, файловый объект возвращается в начало.
+        """
+        digest = hashlib.sha256()
+        if isinstance(file_data, (bytes, bytearray)):
+            digest.update(file_data)
+        elif isinstance(file_data, str):
+            with open(file_data, 'rb') as f:
+                for chunk in iter(lambda: f.read(1024 * 1024), b''):
+                    digest.update(chunk)
+        else:
+            for chunk in iter(lambda: file_data.read(1024 * 1024), b''):
+                digest.update(chunk)
+            if hasattr(file_data, 'seek'):
+                file_data.seek(0)
+        return digest.hexdigest()
+    
+    @staticmethod
+    def content_addressed_key(object_key: str, content_hash: str, extension: Optional[str] = None) -> str:
+        """
+        Формирует ключ объекта по хэшу содержимого в той же папке.
+        
+        Пример: user_avatars/1_abc.jpg -> user_avatars/h/3f/3fa9...e1.jpg
+        """
+        folder, _, filename = object_key.rpartition('/')
+        if extension is None:
+            extension = filename.rsplit('.', 1)[1] if '.' in filename else ''
+        name = f"{content_hash}.{extension}" if extension else content_hash
+        key = f"{CONTENT_ADDRESSED_DIR}/{content_hash[:2]}/{name}"
+        return f"{folder}/{key}" if folder else key
+    
+    @staticmethod
+    def is_content_addressed_key(object_key: str) -> bool:
+        """Проверяет, что ключ адресуется по хэшу содержимого (объект может быть общим)."""
+        return f"/{CONTENT_ADDRESSED_DIR}/" in f"/{object_key.lstrip('/')}"
+    
+    def _remember_object(self, object_key: str) -> None:
+        self._known_objects[object_key] = None
+        self._known_objects.move_to_end(object_key)
+        while len(self._known_objects) > self._known_objects_limit:
+            self._known_objects.popitem(last=False)
+    
+    async def _content_object_exists(self, object_key: str) -> bool:
+        """
+        Проверяет наличие объекта, адресуемого по хэшу.
+        Сначала смотрит локальный LRU, затем делает HEAD запрос.
+        Ошибки проверки считаются отсутствием объекта (загрузка выполнится повторно).
+        """
+        if object_key in self._known_objects:
+            self._known_objects.move_to_end(object_key)
+            return True
+        try:
+            exists = await self.file_exists(object_key)
+        except Exception as e:
+            logger.warning(f"Не удалось проверить наличие {object_key}: {e}")
+            return False
+        if exists:
+            self._remember_object(object_key)
+        return exists
+    
     async def upload_file(
         self,
         file_data: Union[bytes, BinaryIO, str],
         object_key: str,
         content_type: Optional[str] = None,
         metadata: Optional[dict] = None,
-        convert_to_webp: bool = True
+        convert_to_webp: bool = True,
+        deduplicate: Optional[bool] = None
     ) -> str:
         """
         Загружает файл в бакет Yandex Cloud Storage.
@@ -297,6 +449,12 @@ class YandexCloudStorageService:
             content_type: MIME-тип файла
             metadata: Дополнительные метаданные
             convert_to_webp: Если True, конвертирует изображения в WebP формат
+                и загружает варианты thumb/card с манифестом (см. image_pipeline)
+            deduplicate: Если True, объект хранится под ключом по SHA-256 содержимого
+                в папке object_key, и повторная загрузка того же содержимого пропускается.
+                Ссылки на общий объект считаются в Redis, delete_file удаляет объект
+                вместе с последней ссылкой. Общий объект хранится без metadata.
+                По умолчанию берется из настройки STORAGE_DEDUPLICATE (выключено)
             
         Returns:
             str: Публичный URL загруженного файла
@@ -305,7 +463,90 @@ class YandexCloudStorageService:
             ClientError: Ошибка при загрузке файла
             NoCredentialsError: Ошибка аутентификации
         """
+        if deduplicate is None:
+            deduplicate = self.deduplicate_uploads
+        if deduplicate:
+            return await self._upload_deduplicated(file_data, object_key, content_type, metadata, convert_to_webp)
+        return await self._upload_object(file_data, object_key, content_type, metadata, convert_to_webp)
+    
+    async def _upload_deduplicated(
+        self,
+        file_data: Union[bytes, BinaryIO, str],
+        object_key: str,
+        content_type: Optional[str],
+        metadata: Optional[dict],
+        convert_to_webp: bool
+    ) -> str:
+        """
+        Загружает файл под ключом по хэшу содержимого и учитывает ссылку на него.
+        
+        Счетчик ссылок и проверка наличия объекта выполняются под блокировкой
+        ключа в Redis, чтобы загрузка не пересекалась с удалением последней ссылки.
+        Если Redis недоступен, файл загружается под обычным ключом: неучтенная
+        ссылка на общий объект могла бы привести к его преждевременному удалению.
+        """
+        from app.utils.redis_cache import get_redis_client, key_storage_ref_lock, key_storage_refs
+        
+        loop = asyncio.get_event_loop()
+        is_image = bool(convert_to_webp and content_type and content_type.startswith('image/'))
+        content_hash = await loop.run_in_executor(self.executor, self._compute_content_hash, file_data)
+        content_key = self.content_addressed_key(object_key, content_hash, 'webp' if is_image else None)
+        
+        redis_client = await get_redis_client()
+        lock = None
+        if redis_client is not None:
+            lock = redis_client.lock(
+                key_storage_ref_lock(content_key),
+                timeout=CONTENT_REF_LOCK_TIMEOUT,
+                blocking_timeout=CONTENT_REF_LOCK_WAIT
+            )
+            try:
+                if not await lock.acquire():
+                    lock = None
+            except Exception as e:
+                logger.warning(f"Не удалось взять блокировку {content_key}: {e}")
+                lock = None
+        if lock is None:
+            logger.warning(f"Счетчик ссылок недоступен, загрузка без дедупликации: {object_key}")
+            return await self._upload_object(file_data, object_key, content_type, metadata, convert_to_webp)
+        
+        try:
+            try:
+                refs = await redis_client.incr(key_storage_refs(content_key))
+            except Exception as e:
+                logger.warning(f"Не удалось учесть ссылку на {content_key}, загрузка без дедупликации: {e}")
+                return await self._upload_object(file_data, object_key, content_type, metadata, convert_to_webp)
+            
+            try:
+                if refs > 1 and await self._content_object_exists(content_key):
+                    logger.info(f"Файл уже существует в бакете, загрузка пропущена: {content_key}")
+                    return self.get_best_url(content_key)
+                # Общий объект не несет метаданных загрузившего (user_id, email и т.п.)
+                url = await self._upload_object(file_data, content_key, content_type, None, convert_to_webp)
+                self._remember_object(content_key)
+                return url
+            except Exception:
+                await redis_client.decr(key_storage_refs(content_key))
+                raise
+        finally:
+            try:
+                await lock.release()
+            except Exception:
+                pass
+    
+    async def _upload_object(
+        self,
+        file_data: Union[bytes, BinaryIO, str],
+        object_key: str,
+        content_type: Optional[str],
+        metadata: Optional[dict],
+        convert_to_webp: bool
+    ) -> str:
+        """Загружает файл под заданным ключом (с перекодированием изображений в WebP)."""
+        image_variants = []
         try:
+            loop = asyncio.get_event_loop()
+            
             # Если указано конвертировать в WebP и это изображение
             if convert_to_webp and content_type and content_type.startswith('image/'):
                 # Читаем данные файла в bytes если нужно
@@ -324,11 +565,14 @@ class YandexCloudStorageService:
                 else:
                     image_bytes = file_data
                 
-                # Конвертируем в WebP
-                # Конвертация тоже может быть тяжелой, стоит вынести
-                loop = asyncio.get_event_loop()
-                webp_bytes = await loop.run_in_executor(None, self._convert_to_webp, image_bytes)
-                file_data = webp_bytes
+                # Перекодируем в пуле процессов: full WebP + варианты thumb/card
+                image_variants = await self._transcode_image(image_bytes)
+                full_variant = next(
+                    (v for v in image_variants if v.name == "full" and v.format == "webp"),
+                    None
+                )
+                # Если конвертация не удалась, загружаем оригинал
+                file_data = full_variant.data if full_variant else image_bytes
                 
                 # Обновляем content_type и object_key
                 content_type = 'image/webp'
@@ -376,7 +620,6 @@ class YandexCloudStorageService:
                     extra_args['Metadata'] = ascii_metadata
             
             # Выполняем загрузку в отдельном потоке
-            loop = asyncio.get_event_loop()
             await loop.run_in_executor(
                 self.executor,
                 self._upload_file_sync,
@@ -385,6 +628,15 @@ class YandexCloudStorageService:
                 extra_args
             )
             
+            # Дополнительные размеры/форматы и манифест вариантов
+            if len(image_variants) > 1 and not await self._upload_variants(object_key, image_variants, extra_args):
+                image_variants = [v for v in image_variants if v.name == "full" and v.format == "webp"]
+            if image_variants:
+                # Строка фото в БД появится позже - media_variants заполнится из этой записи
+                from app.services.media_variants import remember_variants
+                from app.utils.media_urls import format_variants
+                await remember_variants(object_key, format_variants(v.name for v in image_variants))
+            
             # Используем подписанный URL для надежного доступа
             best_url = self.get_best_url(object_key)
             
@@ -413,14 +665,20 @@ class YandexCloudStorageService:
             # Если передан путь к файлу, открываем его
             if isinstance(file_data, str):
                 with open(file_data, 'rb') as f:
-                    self.s3_client.upload_fileobj(f, self.bucket_name, object_key, ExtraArgs=extra_args)
+                    self.s3_client.upload_fileobj(
+                        f, self.bucket_name, object_key,
+                        ExtraArgs=extra_args, Config=self.transfer_config
+                    )
             else:
                 # Если передан файловый объект или bytes
                 if isinstance(file_data, bytes):
                     from io import BytesIO
                     file_data = BytesIO(file_data)
                 
-                self.s3_client.upload_fileobj(file_data, self.bucket_name, object_key, ExtraArgs=extra_args)
+                self.s3_client.upload_fileobj(
+                    file_data, self.bucket_name, object_key,
+                    ExtraArgs=extra_args, Config=self.transfer_config
+                )
                 
         except ClientError as e:
             # Детальное логирование ошибки от boto3
@@ -434,6 +692,40 @@ class YandexCloudStorageService:
             logger.error(f"Тип ошибки: {type(e).__name__}")
             raise
     
+    async def upload_many(
+        self,
+        uploads: List[dict],
+        max_concurrency: Optional[int] = None
+    ) -> List[Union[str, Exception]]:
+        """
+        Загружает набор файлов с ограниченным параллелизмом.
+        
+        Используется для альбомов и пакетных операций.
+        
+        Args:
+            uploads: Список словарей с аргументами upload_file
+                (file_data, object_key, content_type, metadata, convert_to_webp, deduplicate)
+            max_concurrency: Максимум одновременных загрузок
+                (по умолчанию STORAGE_UPLOAD_MANY_CONCURRENCY)
+            
+        Returns:
+            List[Union[str, Exception]]: URL или исключение для каждого элемента, в исходном порядке
+        """
+        semaphore = asyncio.Semaphore(max_concurrency or self.upload_many_concurrency)
+        
+        async def upload_one(kwargs: dict) -> str:
+            async with semaphore:
+                return await self.upload_file(**kwargs)
+        
+        results = await asyncio.gather(
+            *(upload_one(item) for item in uploads),
+            return_exceptions=True
+        )
+        failed = sum(1 for r in results if isinstance(r, Exception))
+        if failed:
+            logger.warning(f"Пакетная загрузка: {failed} из {len(uploads)} файлов не загружены")
+        return list(results)
+    
     async def upload_image_from_base64(
         self,
         base64_data: str,
@@ -557,8 +849,63 @@ class YandexCloudStorageService:
             object_key: Ключ объекта для удаления
             
         Returns:
-            bool: True если файл удален успешно
+            bool: True если файл удален успешно (для общего объекта по хэшу
+                содержимого - если освобождена ссылка на него)
+        """
+        if self.is_content_addressed_key(object_key):
+            return await self._release_content_object(object_key)
+        return await self._delete_object(object_key)
+    
+    async def _release_content_object(self, object_key: str) -> bool:
+        """
+        Освобождает ссылку на объект по хэшу содержимого и удаляет объект с последней ссылкой.
+        
+        Без счетчика (Redis недоступен или объект загружен до учета ссылок)
+        объект не удаляется: неизвестно, используют ли его другие записи.
         """
+        from app.utils.redis_cache import get_redis_client, key_storage_ref_lock, key_storage_refs
+        
+        redis_client = await get_redis_client()
+        if redis_client is None:
+            logger.warning(f"Счетчик ссылок недоступен, общий объект не удален: {object_key}")
+            return False
+        
+        refs_key = key_storage_refs(object_key)
+        lock = redis_client.lock(
+            key_storage_ref_lock(object_key),
+            timeout=CONTENT_REF_LOCK_TIMEOUT,
+            blocking_timeout=CONTENT_REF_LOCK_WAIT
+        )
+        try:
+            if not await lock.acquire():
+                logger.warning(f"Не удалось взять блокировку, общий объект не удален: {object_key}")
+                return False
+        except Exception as e:
+            logger.warning(f"Не удалось взять блокировку {object_key}: {e}")
+            return False
+        
+        try:
+            if not await redis_client.exists(refs_key):
+                logger.info(f"Нет счетчика ссылок, общий объект не удален: {object_key}")
+                return False
+            refs = await redis_client.decr(refs_key)
+            if refs > 0:
+                logger.info(f"Ссылка на общий объект освобождена, осталось {refs}: {object_key}")
+                return True
+            await redis_client.delete(refs_key)
+            self._known_objects.pop(object_key, None)
+            return await self._delete_object(object_key)
+        except Exception as e:
+            logger.error(f"Ошибка при освобождении общего объекта {object_key}: {str(e)}")
+            return False
+        finally:
+            try:
+                await lock.release()
+            except Exception:
+                pass
+    
+    async def _delete_object(self, object_key: str) -> bool:
+        """Удаляет объект из бакета вместе с вариантами изображения и манифестом."""
         try:
             loop = asyncio.get_event_loop()
             await loop.run_in_executor(
@@ -570,11 +917,36 @@ class YandexCloudStorageService:
             )
             
             logger.info(f"Файл удален из бакета: {object_key}")
-            return True
-            
         except Exception as e:
             logger.error(f"Ошибка при удалении файла {object_key}: {str(e)}")
             return False
+        
+        # Изображения хранятся в WebP, рядом лежат варианты thumb/card/AVIF и манифест
+        if object_key.endswith('.webp'):
+            await self._delete_derived_objects(object_key)
+        return True
+    
+    async def _delete_derived_objects(self, object_key: str) -> None:
+        """
+        Удаляет варианты изображения и манифест одним запросом.
+        
+        Удаляются все возможные ключи: удаление отсутствующего объекта в S3 не ошибка,
+        поэтому манифест читать не нужно. Ошибки только логируются.
+        """
+        from app.services.image_pipeline import derived_object_keys
+        
+        keys = derived_object_keys(object_key)
+        try:
+            loop = asyncio.get_event_loop()
+            await loop.run_in_executor(
+                self.executor,
+                lambda: self.s3_client.delete_objects(
+                    Bucket=self.bucket_name,
+                    Delete={'Objects': [{'Key': key} for key in keys], 'Quiet': True}
+                )
+            )
+        except Exception as e:
+            logger.warning(f"Не удалось удалить варианты изображения {object_key}: {str(e)}")
     
     async def file_exists(self, object_key: str) -> bool:
         """
@@ -629,39 +1001,13 @@ class YandexCloudStorageService:
         if not url:
             return url
         
-        # Если URL уже использует CDN домен, возвращаем как есть
-        cdn_host = self.cdn_domain.replace('https://', '').replace('http://', '')
-        if cdn_host in url:
+        # Ключ объекта извлекается общим кэшированным парсером (app.utils.media_urls)
+        from app.utils.media_urls import extract_media_key
+        object_key = extract_media_key(url)
+        if object_key is None:
+            # Если не удалось распарсить, возвращаем как есть
             return url
-        
-        # Конвертируем старые домены с /media/ → CDN
-        for old_domain in ['candygirlschat.com/media/', 'cherrylust.art/media/']:
-            if old_domain in url:
-                object_key = url.split(old_domain)[-1]
-                return f"{self.cdn_domain}/{object_key}"
-        
-        # Конвертируем старый домен cherrylust.art без /media/ → CDN
-        if 'cherrylust.art/' in url:
-            object_key = url.split('cherrylust.art/')[-1]
-            return f"{self.cdn_domain}/{object_key}"
-        
-        # Извлекаем object_key из Yandex Storage URL
-        # Форматы: 
-        # https://bucket-name.storage.yandexcloud.net/path/to/file
-        # https://storage.yandexcloud.net/bucket-name/path/to/file
-        if '.storage.yandexcloud.net/' in url:
-            object_key = url.split('.storage.yandexcloud.net/')[-1]
-            return f"{self.cdn_domain}/{object_key}"
-        elif 'storage.yandexcloud.net/' in url:
-            parts = url.split('storage.yandexcloud.net/')
-            if len(parts) > 1:
-                path_parts = parts[1].split('/', 1)
-                if len(path_parts) > 1:
-                    object_key = path_parts[1]
-                    return f"{self.cdn_domain}/{object_key}"
-        
-        # Если не удалось распарсить, возвращаем как есть
-        return url
+        return f"{self.cdn_domain}/{object_key}"
     
     @staticmethod
     def convert_yandex_url_to_proxy(url: str) -> str:
@@ -131,3 +131,70 @@ def clear_characters_cache_task(self):
         logger.error(f"[CACHE] Ошибка очистки кэша персонажей: {exc}")
         raise self.retry(exc=exc, countdown=60)
 
+
+
+@celery_app.task(
+    base=CallbackTask,
+    bind=True,
+    name="app.tasks.cache_tasks.prewarm_characters_cache_task",
+    max_retries=3,
+    default_retry_delay=30
+)
+def prewarm_characters_cache_task(self):
+    """
+    Прогревает кэш списка персонажей для текущей версии кэша (CACHE_VERSION).
+    Запускается шагом деплоя до переключения трафика на новые воркеры.
+    """
+    try:
+        import asyncio
+        from app.chat_bot.api.character_endpoints import prewarm_characters_cache
+        from app.utils.redis_cache import CACHE_VERSION
+        
+        warmed = asyncio.run(prewarm_characters_cache())
+        logger.info(f"[CACHE] Прогрев кэша персонажей версии {CACHE_VERSION}: {'выполнен' if warmed else 'уже выполнен, не удался или Redis недоступен'}")
+        
+        return {
+            "success": True,
+            "warmed": warmed,
+            "cache_version": CACHE_VERSION
+        }
+        
+    except Exception as exc:
+        logger.error(f"[CACHE] Ошибка прогрева кэша персонажей: {exc}")
+        raise self.retry(exc=exc, countdown=30)
+
+
+@celery_app.task(
+    base=CallbackTask,
+    bind=True,
+    name="app.tasks.cache_tasks.rebuild_sitemap_task",
+    max_retries=3,
+    default_retry_delay=60
+)
+def rebuild_sitemap_task(self):
+    """
+    Пересобирает sitemap и публикует сборку в Redis.
+    Планируется при изменении персонажей/тегов (с задержкой) и раз в сутки.
+    """
+    try:
+        import asyncio
+        from app.services.sitemap_service import rebuild_sitemap
+        from app.utils.redis_cache import key_sitemap_rebuild_pending
+        
+        # Снимаем флаг до сборки: изменения во время сборки запланируют новую
+        try:
+            r = _redis_client_from_url(_get_redis_url_for_celery())
+            r.delete(key_sitemap_rebuild_pending())
+        except Exception as redis_error:
+            logger.warning(f"[SITEMAP] Не удалось снять флаг пересборки: {redis_error}")
+        
+        files = asyncio.run(rebuild_sitemap())
+        
+        return {
+            "success": True,
+            "files": sorted(files)
+        }
+        
+    except Exception as exc:
+        logger.error(f"[SITEMAP] Ошибка пересборки sitemap: {exc}")
+        raise self.retry(exc=exc, countdown=60)
@@ -469,39 +469,47 @@ def save_images_to_cloud_task(
             folder = f"generated_images/{character_name_ascii}"
         
         async def run_cloud_saves():
-            cloud_urls = []
+            uploads = []
+            decode_errors = {}
             for i, image_base64 in enumerate(images_base64):
                 try:
                     # Декодируем base64
                     image_bytes = base64.b64decode(image_base64)
-                    
-                    # Формируем имя файла с расширением .webp
-                    timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-                    filename = f"gen_{seed}_{i}_{timestamp}.webp"
-                    object_key = f"{folder}/{filename}"
-                    
-                    # Загружаем в облако асинхронно (автоматически конвертируется в WebP)
-                    cloud_url = await service.upload_file(
-                        file_data=image_bytes,
-                        object_key=object_key,
-                        content_type='image/webp',
-                        metadata={
-                            "character_name": character_name_ascii if character_name else "unknown",
-                            "character_original": character_name or "unknown",
-                            "seed": str(seed),
-                            "index": str(i),
-                            "generated_at": datetime.now().isoformat(),
-                            "source": "background_save"
-                        },
-                        convert_to_webp=True
-                    )
-                    
-                    cloud_urls.append(cloud_url)
-                    logger.info(f"[CLOUD SAVE] Изображение {i} сохранено: {cloud_url}")
-                    
-                except Exception as img_error:
-                    logger.error(f"[CLOUD SAVE] Ошибка сохранения изображения {i}: {img_error}")
+                except Exception as decode_error:
+                    decode_errors[i] = decode_error
+                    continue
+                
+                # Формируем имя файла с расширением .webp
+                timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+                filename = f"gen_{seed}_{i}_{timestamp}.webp"
+                uploads.append((i, {
+                    "file_data": image_bytes,
+                    "object_key": f"{folder}/{filename}",
+                    "content_type": 'image/webp',
+                    "metadata": {
+                        "character_name": character_name_ascii if character_name else "unknown",
+                        "character_original": character_name or "unknown",
+                        "seed": str(seed),
+                        "index": str(i),
+                        "generated_at": datetime.now().isoformat(),
+                        "source": "background_save"
+                    },
+                    "convert_to_webp": True
+                }))
+            
+            # Загружаем параллельно с ограничением (автоматически конвертируется в WebP)
+            results = dict(decode_errors)
+            uploaded = await service.upload_many([kwargs for _, kwargs in uploads])
+            results.update(zip([i for i, _ in uploads], uploaded))
+            
+            cloud_urls = []
+            for i in range(len(images_base64)):
+                if isinstance(results[i], Exception):
+                    logger.error(f"[CLOUD SAVE] Ошибка сохранения изображения {i}: {results[i]}")
                     cloud_urls.append(None)
+                else:
+                    logger.info(f"[CLOUD SAVE] Изображение {i} сохранено: {results[i]}")
+                    cloud_urls.append(results[i])
             return cloud_urls
 
         cloud_urls = asyncio.run(run_cloud_saves())
@@ -470,3 +470,34 @@ def check_subscription_limits_reset_task(self) -> Dict[str, Any]:
             "success": False,
             "error": str(exc)
         }
+
+
+@celery_app.task(
+    bind=True,
+    base=CallbackTask,
+    name="app.tasks.periodic_tasks.refresh_admin_stats_task"
+)
+def refresh_admin_stats_task(self) -> Dict[str, Any]:
+    """
+    Пересчитывает снимок статистики админ-панели и сверяет
+    инкрементальные счетчики с базой.
+    
+    Returns:
+        Dict с моментом расчета снимка
+    """
+    try:
+        import asyncio
+        from app.services.admin_stats import refresh_admin_stats
+        
+        stats = asyncio.run(refresh_admin_stats())
+        return {
+            "success": True,
+            "computed_at": stats.get("computed_at")
+        }
+        
+    except Exception as exc:
+        logger.error(f"[ADMIN STATS] Ошибка пересчета статистики: {exc}")
+        return {
+            "success": False,
+            "error": str(exc)
+        }
@@ -0,0 +1,150 @@
+"""
+Экспортер метрик Celery для Prometheus.
+
+Отдельный процесс (один на брокер), а не часть воркера: prefork воркеры
+не делят память, а глубину очереди видно только со стороны брокера.
+- celery_queue_length{queue} - сообщений в очереди брокера на момент запроса;
+- celery_task_runtime_seconds{task} - время выполнения (событие task-succeeded);
+- celery_task_queue_wait_seconds{task} - от получения воркером до старта;
+- celery_tasks_total{task,state} - завершения задач по исходу.
+
+События включены в app/celery_app.py (worker_send_task_events).
+Запуск: python -m app.utils.celery_exporter
+Переменные: CELERY_EXPORTER_PORT (9808), CELERY_EXPORTER_QUEUES.
+"""
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict
+
+from app.utils.metrics import PROMETHEUS_AVAILABLE, BoundedLabel
+
+if PROMETHEUS_AVAILABLE:
+    from prometheus_client import CollectorRegistry, Counter, Histogram, start_http_server
+    from prometheus_client.core import GaugeMetricFamily
+
+logger = logging.getLogger(__name__)
+
+EXPORTER_PORT = int(os.getenv("CELERY_EXPORTER_PORT", "9808"))
+EXPORTER_QUEUES = tuple(
+    q.strip()
+    for q in os.getenv("CELERY_EXPORTER_QUEUES", "high_priority,normal_priority,low_priority").split(",")
+    if q.strip()
+)
+# Сколько задач между received и started держать в памяти
+PENDING_TASKS_LIMIT = 10000
+RECONNECT_DELAY_SECONDS = 5
+
+TASK_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300, 600)
+TERMINAL_STATES = {
+    "task-succeeded": "succeeded",
+    "task-failed": "failed",
+    "task-rejected": "rejected",
+    "task-revoked": "revoked",
+    "task-retried": "retried",
+}
+
+
+class CeleryQueueCollector:
+    """Длина очередей брокера, читается при каждом запросе метрик."""
+
+    def __init__(self, app, queues=EXPORTER_QUEUES):
+        self.app = app
+        self.queues = queues
+
+    def collect(self):
+        gauge = GaugeMetricFamily("celery_queue_length", "Сообщений в очереди брокера", labels=["queue"])
+        try:
+            with self.app.connection_for_read() as connection:
+                channel = connection.default_channel
+                for queue in self.queues:
+                    try:
+                        declared = channel.queue_declare(queue=queue, passive=True)
+                        gauge.add_metric([queue], declared.message_count)
+                    except Exception:
+                        # Очередь еще не создана - ни одной задачи не отправляли
+                        gauge.add_metric([queue], 0)
+        except Exception as e:
+            logger.warning(f"[CELERY EXPORTER] Брокер недоступен: {e}")
+        yield gauge
+
+
+class CeleryEventsExporter:
+    """Переводит события задач Celery в гистограммы и счетчики."""
+
+    def __init__(self, app, registry):
+        self.app = app
+        self._task_label = BoundedLabel(100)
+        self._pending = OrderedDict()
+        self.runtime = Histogram(
+            "celery_task_runtime_seconds", "Время выполнения задачи Celery",
+            ["task"], buckets=TASK_BUCKETS, registry=registry,
+        )
+        self.queue_wait = Histogram(
+            "celery_task_queue_wait_seconds", "Ожидание задачи между получением воркером и стартом",
+            ["task"], buckets=TASK_BUCKETS, registry=registry,
+        )
+        self.tasks = Counter(
+            "celery_tasks", "Завершенные задачи Celery по исходу",
+            ["task", "state"], registry=registry,
+        )
+
+    def on_event(self, event: dict) -> None:
+        event_type = event.get("type")
+        uuid = event.get("uuid")
+        if event_type == "task-received":
+            # Имя задачи есть только в task-received, дальше ищем по uuid
+            self._pending[uuid] = (self._task_label(event.get("name")), event.get("timestamp"))
+            while len(self._pending) > PENDING_TASKS_LIMIT:
+                self._pending.popitem(last=False)
+            return
+        if event_type == "task-started":
+            name, received_at = self._pending.get(uuid, (None, None))
+            started_at = event.get("timestamp")
+            if name and received_at and started_at:
+                self.queue_wait.labels(name).observe(max(started_at - received_at, 0.0))
+            return
+        state = TERMINAL_STATES.get(event_type)
+        if state is None:
+            return
+        name, _ = self._pending.get(uuid, ("unknown", None))
+        if state != "retried":
+            self._pending.pop(uuid, None)
+        self.tasks.labels(name, state).inc()
+        if state == "succeeded" and isinstance(event.get("runtime"), (int, float)):
+            self.runtime.labels(name).observe(event["runtime"])
+
+    def run_forever(self) -> None:
+        handlers = {"*": self.on_event}
+        while True:
+            try:
+                with self.app.connection() as connection:
+                    receiver = self.app.events.Receiver(connection, handlers=handlers)
+                    logger.info("[CELERY EXPORTER] Подписка на события задач")
+                    receiver.capture(limit=None, timeout=None, wakeup=True)
+            except Exception as e:
+                logger.warning(f"[CELERY EXPORTER] Поток событий прерван: {e}, переподключение")
+                time.sleep(RECONNECT_DELAY_SECONDS)
+
+
+def main() -> None:
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(name)s - %(levelname)s - %(message)s")
+    if not PROMETHEUS_AVAILABLE:
+        raise SystemExit("prometheus_client не установлен: pip install prometheus-client")
+
+    from app.celery_app import celery_app
+
+    registry = CollectorRegistry()
+    registry.register(CeleryQueueCollector(celery_app))
+    exporter = CeleryEventsExporter(celery_app, registry)
+    start_http_server(EXPORTER_PORT, registry=registry)
+    logger.info(f"[CELERY EXPORTER] Метрики на :{EXPORTER_PORT}/metrics, очереди: {', '.join(EXPORTER_QUEUES)}")
+
+    events_thread = threading.Thread(target=exporter.run_forever, name="celery-events", daemon=True)
+    events_thread.start()
+    events_thread.join()
+
+
+if __name__ == "__main__":
+    main()
@@ -1,61 +1,191 @@
 """
 Утилиты для определения географического положения по IP адресу.
+
+Страна определяется по локальному файлу диапазонов IP (settings.GEOIP_DB_PATH),
+без обращения к внешним API. Файл - CSV (можно .csv.gz) со строками
+"начало,конец,код страны[,название страны]", где границы диапазона заданы
+строкой IP или целым числом: подходят IP2Location LITE DB1 и DB-IP lite.
+Код страны переводится в английское название (app/utils/country_names.py).
+Диапазоны хранятся в памяти отсортированными, поиск - бинарный.
+
+Файл перечитывается в фоне, когда меняется его mtime (проверка не чаще
+раза в GEOIP_RELOAD_CHECK_SECONDS), до окончания загрузки ответы дают
+старые данные. Обновлять файл нужно атомарно (записать рядом и os.replace).
 """
 
-import httpx
+import asyncio
+import bisect
+import csv
+import functools
+import gzip
+import ipaddress
 import logging
-from typing import Optional
+import time
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+from app.config.settings import settings
+from app.utils.country_names import UNKNOWN_CODES, country_name
 
 logger = logging.getLogger(__name__)
 
+IPV4_MAX = 2 ** 32 - 1
+
+_database: Optional["IpCountryDatabase"] = None
+_checked_at = float("-inf")
+_reload_task: Optional[asyncio.Task] = None
+
+
+class IpCountryDatabase:
+    """Диапазоны IP с бинарным поиском и LRU кэшем результатов."""
+
+    def __init__(self, ranges: Dict[int, List[Tuple[int, int, str]]], mtime: float, cache_size: int):
+        self.mtime = mtime
+        self._starts: Dict[int, List[int]] = {}
+        self._ends: Dict[int, List[int]] = {}
+        self._countries: Dict[int, List[str]] = {}
+        for version, items in ranges.items():
+            items.sort()
+            self._starts[version] = [item[0] for item in items]
+            self._ends[version] = [item[1] for item in items]
+            self._countries[version] = [item[2] for item in items]
+        self.lookup = functools.lru_cache(maxsize=cache_size)(self._lookup)
+
+    def __len__(self) -> int:
+        return sum(len(starts) for starts in self._starts.values())
+
+    @classmethod
+    def load(cls, path: Path, cache_size: int = 4096) -> "IpCountryDatabase":
+        """Читает файл диапазонов (синхронно, вызывать вне event loop)."""
+        mtime = path.stat().st_mtime
+        opener = gzip.open if path.suffix == ".gz" else open
+        ranges: Dict[int, List[Tuple[int, int, str]]] = {4: [], 6: []}
+        names: Dict[str, str] = {}
+        with opener(path, "rt", encoding="utf-8", newline="") as file:
+            for row in csv.reader(file):
+                parsed = _parse_row(row)
+                if parsed is None:
+                    continue
+                version, start, end, country = parsed
+                # Одинаковые названия храним одной строкой
+                country = names.setdefault(country, country)
+                ranges[version].append((start, end, country))
+        return cls(ranges, mtime, cache_size)
+
+    def _lookup(self, ip_address: str) -> Optional[str]:
+        try:
+            address = ipaddress.ip_address(ip_address.strip())
+        except ValueError:
+            return None
+        if address.version == 6 and address.ipv4_mapped:
+            address = address.ipv4_mapped
+        if not address.is_global:
+            return None
+        starts = self._starts.get(address.version)
+        if not starts:
+            return None
+        value = int(address)
+        index = bisect.bisect_right(starts, value) - 1
+        if index >= 0 and value <= self._ends[address.version][index]:
+            return self._countries[address.version][index]
+        return None
+
+
+def _parse_bound(value: str) -> Tuple[Optional[int], int]:
+    """Граница диапазона: (версия IP или None для числа, целое значение)."""
+    value = value.strip()
+    if value.isdigit():
+        return None, int(value)
+    address = ipaddress.ip_address(value)
+    return address.version, int(address)
+
+
+def _parse_row(row: List[str]) -> Optional[Tuple[int, int, int, str]]:
+    if len(row) < 3:
+        return None
+    try:
+        start_version, start = _parse_bound(row[0])
+        end_version, end = _parse_bound(row[1])
+    except ValueError:
+        # Заголовок или поврежденная строка
+        return None
+    code = row[2].strip()
+    name = row[3].strip() if len(row) > 3 else ""
+    if not code or code.upper() in UNKNOWN_CODES:
+        return None
+    version = start_version or end_version or (4 if end <= IPV4_MAX else 6)
+    # IPv4-mapped диапазоны из IPv6 файлов IP2Location (::ffff:0:0/96)
+    if version == 6 and start >= 0xFFFF00000000 and end <= 0xFFFFFFFFFFFF:
+        version, start, end = 4, start - 0xFFFF00000000, end - 0xFFFF00000000
+    # Названия в написании ip-api, которые уже лежат в users.country
+    return version, start, end, country_name(code) or (name if name and name != "-" else code)
+
+
+async def load_geoip_database(path: Optional[Path] = None) -> bool:
+    """
+    Загружает файл диапазонов в фоновом потоке и подменяет текущие данные.
+    При ошибке остаются прежние данные.
+    """
+    global _database, _checked_at
+    _checked_at = time.monotonic()
+    path = Path(path or settings.GEOIP_DB_PATH)
+    loop = asyncio.get_running_loop()
+    started = time.perf_counter()
+    try:
+        database = await loop.run_in_executor(
+            None, functools.partial(IpCountryDatabase.load, path, settings.GEOIP_CACHE_SIZE)
+        )
+    except FileNotFoundError:
+        logger.warning(f"[GEO] Файл диапазонов IP не найден: {path}, страна определяться не будет")
+        return False
+    except Exception as e:
+        logger.warning(f"[GEO] Не удалось загрузить диапазоны IP из {path}: {e}")
+        return False
+    _database = database
+    logger.info(
+        f"[GEO] Загружено {len(database)} диапазонов IP из {path} "
+        f"за {time.perf_counter() - started:.2f} с"
+    )
+    return True
+
+
+def _schedule_reload_if_changed() -> None:
+    global _checked_at, _reload_task
+    now = time.monotonic()
+    if now - _checked_at < settings.GEOIP_RELOAD_CHECK_SECONDS:
+        return
+    _checked_at = now
+    if _reload_task is not None and not _reload_task.done():
+        return
+    try:
+        mtime = Path(settings.GEOIP_DB_PATH).stat().st_mtime
+    except OSError:
+        return
+    if _database is not None and _database.mtime == mtime:
+        return
+    _reload_task = asyncio.get_running_loop().create_task(load_geoip_database())
+
 
 async def get_country_by_ip(ip_address: str) -> Optional[str]:
     """
-    Определяет страну по IP адресу через бесплатный API ip-api.com.
-    
+    Определяет страну по IP адресу по локальной базе диапазонов.
+
     Args:
         ip_address: IP адрес пользователя
-        
+
     Returns:
-        Название страны или None при ошибке
+        Английское название страны ("Russia") либо None,
+        если адрес не публичный, не найден или база еще не загружена
     """
-    if not ip_address or ip_address in ['127.0.0.1', 'localhost', '::1']:
+    if not ip_address:
         return None
-    
-    try:
-        async with httpx.AsyncClient(timeout=5.0) as client:
-            response = await client.get(
-                f"http://ip-api.com/json/{ip_address}",
-                params={"fields": "country,countryCode,status"}
-            )
-            
-            if response.status_code == 200:
-                data = response.json()
-                if data.get("status") == "success":
-                    country = data.get("country")
-                    logger.info(
-                        f"[GEO] IP {ip_address} -> {country}"
-                    )
-                    return country
-                else:
-                    logger.warning(
-                        f"[GEO] Failed to get country for IP {ip_address}: "
-                        f"{data.get('message', 'unknown error')}"
-                    )
-                    return None
-            else:
-                logger.warning(
-                    f"[GEO] HTTP error {response.status_code} "
-                    f"for IP {ip_address}"
-                )
-                return None
-    except (httpx.ConnectError, httpx.ConnectTimeout, OSError) as e:
-        # Обрабатываем DNS ошибки и сетевые ошибки без прерывания процесса
-        logger.warning(f"[GEO] Network error getting country for IP {ip_address}: {e}")
-        return None
-    except Exception as e:
-        logger.warning(f"[GEO] Error getting country for IP {ip_address}: {e}")
+    _schedule_reload_if_changed()
+    database = _database
+    if database is None:
         return None
+    country = database.lookup(ip_address)
+    logger.debug(f"[GEO] IP {ip_address} -> {country}")
+    return country
 
 
 def get_client_ip(request) -> Optional[str]:
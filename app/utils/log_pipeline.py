@@ -0,0 +1,356 @@
+"""
+Асинхронный конвейер логирования.
+
+Обработчики корневого логгера (консоль, файл, Telegram) переносятся за
+очередь: в потоке запроса запись только проходит фильтры и кладется в
+ограниченную очередь, а форматирование и запись в sink выполняет отдельный
+поток (QueueListener). Если sink не успевает и очередь заполнена, запись
+отбрасывается и учитывается в счетчике dropped - логирование никогда не
+блокирует запрос.
+
+В потоке запроса (до очереди) применяются:
+- выборка (LOG_SAMPLING="app.main=0.1,app.chat_bot=0.5"): доля INFO/DEBUG
+  записей логгера (и его дочерних), которая попадает в лог;
+- ограничение частоты: с одного места вызова (файл:строка) проходит не
+  больше LOG_RATE_LIMIT записей ниже ERROR за LOG_RATE_LIMIT_WINDOW секунд,
+  о подавленных пишется одна сводная запись.
+В потоке записи - обрезка длинных сообщений и полей (LOG_MAX_MESSAGE_CHARS)
+и маскировка секретов в структурированных полях.
+
+Структурированные поля передаются через log_event(); LOG_FORMAT=json
+включает вывод JSON строк вместо текста. Логи loguru (часть сервисов)
+перенаправляются в тот же конвейер.
+"""
+import atexit
+import json
+import logging
+import os
+import queue
+import random
+import threading
+import time
+from logging.handlers import QueueHandler, QueueListener
+from typing import Any, Dict, List, Optional, Tuple
+
+LOG_ASYNC = os.getenv("LOG_ASYNC", "true").strip().lower() not in ("0", "false", "no", "off")
+LOG_QUEUE_SIZE = int(os.getenv("LOG_QUEUE_SIZE", "10000"))
+LOG_FORMAT = os.getenv("LOG_FORMAT", "text").strip().lower()
+LOG_MAX_MESSAGE_CHARS = int(os.getenv("LOG_MAX_MESSAGE_CHARS", "2000"))
+LOG_MAX_FIELD_CHARS = int(os.getenv("LOG_MAX_FIELD_CHARS", "300"))
+LOG_SAMPLING = os.getenv("LOG_SAMPLING", "")
+LOG_RATE_LIMIT = int(os.getenv("LOG_RATE_LIMIT", "50"))
+LOG_RATE_LIMIT_WINDOW = float(os.getenv("LOG_RATE_LIMIT_WINDOW", "10"))
+
+DEFAULT_FORMAT = "%(asctime)s - %(name)s - %(levelname)s - %(message)s"
+
+# Значения этих полей не попадают в лог
+REDACTED_FIELDS = frozenset({"password", "token", "access_token", "refresh_token", "authorization", "api_key", "secret"})
+
+# Не даем таблице мест вызова расти бесконечно
+RATE_LIMIT_MAX_SITES = 5000
+
+
+def parse_sampling(spec: str) -> Dict[str, float]:
+    """'app.main=0.1,app.chat_bot=0.5' -> {'app.main': 0.1, 'app.chat_bot': 0.5}."""
+    rates: Dict[str, float] = {}
+    for item in spec.split(","):
+        name, sep, rate = item.strip().partition("=")
+        if sep and name.strip():
+            rates[name.strip()] = min(1.0, max(0.0, float(rate)))
+    return rates
+
+
+def log_event(logger: logging.Logger, event: str, level: int = logging.INFO, **fields: Any) -> None:
+    """
+    Структурированная запись: короткое имя события и поля.
+    Поля форматируются и обрезаются в потоке записи, а не в запросе.
+    """
+    if logger.isEnabledFor(level):
+        logger.log(level, event, extra={"fields": fields}, stacklevel=2)
+
+
+def _truncate(text: str, limit: int) -> str:
+    if limit and len(text) > limit:
+        return f"{text[:limit]}...[+{len(text) - limit} chars]"
+    return text
+
+
+def _render_fields(fields: Dict[str, Any]) -> Dict[str, Any]:
+    rendered = {}
+    for key, value in fields.items():
+        if key.lower() in REDACTED_FIELDS:
+            rendered[key] = "***"
+        elif value is None or isinstance(value, (bool, int, float)):
+            rendered[key] = value
+        else:
+            rendered[key] = _truncate(str(value), LOG_MAX_FIELD_CHARS)
+    return rendered
+
+
+class StructuredFormatter(logging.Formatter):
+    """Текст с полями key=value или JSON строка; длинные сообщения обрезаются."""
+
+    def __init__(self, fmt: Optional[str] = None, json_output: bool = False,
+                 max_message_chars: int = LOG_MAX_MESSAGE_CHARS):
+        super().__init__(fmt or DEFAULT_FORMAT)
+        self.json_output = json_output
+        self.max_message_chars = max_message_chars
+
+    def format(self, record: logging.LogRecord) -> str:
+        message = _truncate(record.getMessage(), self.max_message_chars)
+        fields = _render_fields(getattr(record, "fields", None) or {})
+
+        if self.json_output:
+            payload = {
+                "ts": self.formatTime(record),
+                "level": record.levelname,
+                "logger": record.name,
+                "message": message,
+                **fields,
+            }
+            if record.exc_info and not record.exc_text:
+                record.exc_text = self.formatException(record.exc_info)
+            if record.exc_text:
+                payload["exc"] = record.exc_text
+            return json.dumps(payload, ensure_ascii=False, default=str)
+
+        if fields:
+            message = f"{message} " + " ".join(f"{key}={value}" for key, value in fields.items())
+        # Базовый Formatter подставит message и добавит traceback
+        original = record.msg, record.args
+        record.msg, record.args = message, None
+        try:
+            return super().format(record)
+        finally:
+            record.msg, record.args = original
+
+
+class LogPipelineStats:
+    """Счетчики конвейера (для /health и метрик)."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.enqueued = 0
+        self.dropped = 0
+        self.sampled_out = 0
+        self.rate_limited = 0
+
+    def add(self, name: str, value: int = 1) -> None:
+        with self._lock:
+            setattr(self, name, getattr(self, name) + value)
+
+    def snapshot(self) -> Dict[str, int]:
+        with self._lock:
+            return {
+                "enqueued": self.enqueued,
+                "dropped": self.dropped,
+                "sampled_out": self.sampled_out,
+                "rate_limited": self.rate_limited,
+            }
+
+
+class SamplingRateLimitFilter(logging.Filter):
+    """Выборка по логгерам и ограничение частоты по месту вызова (в потоке запроса)."""
+
+    def __init__(self, stats: LogPipelineStats, sampling: Dict[str, float],
+                 rate_limit: int, window: float):
+        super().__init__()
+        self.stats = stats
+        # Сначала самые длинные префиксы: app.main.chat точнее, чем app.main
+        self.sampling: List[Tuple[str, float]] = sorted(sampling.items(), key=lambda item: -len(item[0]))
+        self.rate_limit = rate_limit
+        self.window = window
+        self._lock = threading.Lock()
+        # (файл, строка) -> [начало окна, записей в окне, подавлено]
+        self._sites: Dict[Tuple[str, int], List[float]] = {}
+        self._pending_summaries: List[Tuple[Tuple[str, int], int, str]] = []
+
+    def _sample_rate(self, name: str) -> float:
+        for prefix, rate in self.sampling:
+            if name == prefix or name.startswith(prefix + "."):
+                return rate
+        return 1.0
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        # Ошибки не отбрасываем никогда
+        if record.levelno >= logging.ERROR:
+            return True
+
+        if record.levelno <= logging.INFO and self.sampling:
+            rate = self._sample_rate(record.name)
+            if rate < 1.0 and random.random() >= rate:
+                self.stats.add("sampled_out")
+                return False
+
+        if self.rate_limit <= 0:
+            return True
+        site = (record.pathname, record.lineno)
+        now = time.monotonic()
+        with self._lock:
+            state = self._sites.get(site)
+            if state is None or now - state[0] >= self.window:
+                if state is not None and state[2]:
+                    self._pending_summaries.append((site, int(state[2]), record.name))
+                if state is None and len(self._sites) >= RATE_LIMIT_MAX_SITES:
+                    self._sites.clear()
+                self._sites[site] = [now, 1, 0]
+                return True
+            if state[1] < self.rate_limit:
+                state[1] += 1
+                return True
+            state[2] += 1
+        self.stats.add("rate_limited")
+        return False
+
+    def take_summaries(self) -> List[Tuple[Tuple[str, int], int, str]]:
+        if not self._pending_summaries:
+            return []
+        with self._lock:
+            summaries, self._pending_summaries = self._pending_summaries, []
+        return summaries
+
+
+class PipelineQueueHandler(QueueHandler):
+    """QueueHandler, который не блокирует и не форматирует в потоке запроса."""
+
+    def __init__(self, log_queue: "queue.Queue", stats: LogPipelineStats,
+                 limiter: Optional[SamplingRateLimitFilter] = None):
+        super().__init__(log_queue)
+        self.stats = stats
+        self.limiter = limiter
+        if limiter is not None:
+            self.addFilter(limiter)
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        # %-аргументы подставляем сразу: объекты могут измениться до записи.
+        # Форматирование (время, шаблон, поля) остается потоку записи.
+        if record.args:
+            record.msg = record.getMessage()
+            record.args = None
+        if record.exc_info:
+            # traceback держит кадры стека запроса - сохраняем текст
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+    def enqueue(self, record: logging.LogRecord) -> None:
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.stats.add("dropped")
+        else:
+            self.stats.add("enqueued")
+
+    def emit(self, record: logging.LogRecord) -> None:
+        super().emit(record)
+        if self.limiter is not None:
+            for (path, lineno), suppressed, name in self.limiter.take_summaries():
+                summary = logging.LogRecord(
+                    name, logging.WARNING, path, lineno,
+                    f"[LOG] Подавлено {suppressed} повторяющихся записей из {os.path.basename(path)}:{lineno}",
+                    None, None,
+                )
+                self.enqueue(summary)
+
+
+class LogPipeline:
+    """Очередь, обработчик для логгера и поток записи в исходные обработчики."""
+
+    def __init__(self, handlers: List[logging.Handler], queue_size: int = LOG_QUEUE_SIZE,
+                 sampling: Optional[Dict[str, float]] = None, rate_limit: int = LOG_RATE_LIMIT,
+                 rate_limit_window: float = LOG_RATE_LIMIT_WINDOW, json_output: bool = LOG_FORMAT == "json"):
+        self.stats = LogPipelineStats()
+        self.queue: "queue.Queue" = queue.Queue(maxsize=queue_size)
+        limiter = SamplingRateLimitFilter(self.stats, sampling or {}, rate_limit, rate_limit_window)
+        self.handler = PipelineQueueHandler(self.queue, self.stats, limiter)
+        for handler in handlers:
+            formatter = handler.formatter
+            # Свои форматтеры (не стандартные) не трогаем
+            if formatter is None or type(formatter) is logging.Formatter:
+                fmt = getattr(formatter, "_fmt", None)
+                handler.setFormatter(StructuredFormatter(fmt, json_output=json_output))
+        self.listener = QueueListener(self.queue, *handlers, respect_handler_level=True)
+        self._started = False
+
+    def start(self) -> None:
+        if not self._started:
+            self.listener.start()
+            self._started = True
+
+    def stop(self) -> None:
+        """Дописывает оставшиеся записи и останавливает поток записи."""
+        if self._started:
+            self._started = False
+            try:
+                self.listener.stop()
+            except queue.Full:
+                # Маркер остановки не поместился: поток записи daemon
+                pass
+
+    def snapshot(self) -> Dict[str, int]:
+        return {**self.stats.snapshot(), "queued": self.queue.qsize(), "capacity": self.queue.maxsize}
+
+
+_pipeline: Optional[LogPipeline] = None
+
+
+def _bridge_loguru() -> None:
+    """Направляет записи loguru в стандартный logging (и дальше в конвейер)."""
+    try:
+        from loguru import logger as loguru_logger
+    except ImportError:
+        return
+
+    def _sink(message) -> None:
+        record = message.record
+        std_logger = logging.getLogger(record["name"] or "loguru")
+        level = record["level"].no
+        if not std_logger.isEnabledFor(level):
+            return
+        exc_info = None
+        if record["exception"] is not None:
+            exc_info = (record["exception"].type, record["exception"].value, record["exception"].traceback)
+        std_logger.handle(std_logger.makeRecord(
+            std_logger.name, level, record["file"].path, record["line"],
+            record["message"], None, exc_info, record["function"],
+        ))
+
+    loguru_logger.remove()
+    loguru_logger.add(_sink, level="DEBUG", format="{message}")
+
+
+def install_log_pipeline(root: Optional[logging.Logger] = None) -> Optional[LogPipeline]:
+    """
+    Переносит текущие обработчики корневого логгера за очередь.
+    Вызывается после настройки обработчиков; повторный вызов ничего не меняет.
+    """
+    global _pipeline
+    if not LOG_ASYNC:
+        return None
+    if _pipeline is not None:
+        return _pipeline
+
+    root = root or logging.getLogger()
+    handlers = list(root.handlers)
+    pipeline = LogPipeline(handlers, sampling=parse_sampling(LOG_SAMPLING))
+    for handler in handlers:
+        root.removeHandler(handler)
+    root.addHandler(pipeline.handler)
+    pipeline.start()
+    atexit.register(pipeline.stop)
+    _bridge_loguru()
+    _pipeline = pipeline
+    return pipeline
+
+
+def get_log_pipeline() -> Optional[LogPipeline]:
+    return _pipeline
+
+
+def shutdown_log_pipeline() -> None:
+    if _pipeline is not None:
+        _pipeline.stop()
+
+
+def log_pipeline_stats() -> Optional[Dict[str, int]]:
+    return _pipeline.snapshot() if _pipeline is not None else None
@@ -0,0 +1,138 @@
+"""
+Канонические ключи медиафайлов и построение публичных URL.
+
+В БД исторически хранятся URL разных форматов (бакет Яндекса, /media/ прокси,
+старые домены, CDN). Таблицы фото хранят нормализованный ключ объекта
+(media_key) и список доступных вариантов (media_variants), поэтому на запросе
+URL собирается форматированием строки, без разбора исходного URL.
+"""
+
+import os
+from functools import lru_cache, partial
+from typing import Iterable, Optional
+
+from sqlalchemy import inspect as sa_inspect
+
+# CDN домен для отдачи медиафайлов (тот же, что использует YandexCloudStorageService)
+CDN_DOMAIN = os.getenv("CDN_DOMAIN", "https://candygirlschat.com").rstrip("/")
+_CDN_HOST = CDN_DOMAIN.replace("https://", "").replace("http://", "")
+
+# Старые домены с /media/ прокси и без него
+_LEGACY_MEDIA_PREFIXES = ("candygirlschat.com/media/", "cherrylust.art/media/")
+_LEGACY_ROOT_PREFIXES = ("cherrylust.art/",)
+
+DEFAULT_VARIANT = "full"
+
+
+@lru_cache(maxsize=65536)
+def extract_media_key(url: Optional[str]) -> Optional[str]:
+    """
+    Извлекает ключ объекта в бакете из URL любого известного формата.
+
+    Поддерживаются CDN URL, /media/ прокси, старые домены и URL бакета
+    (virtual-hosted и path-style). Возвращает None, если URL не указывает
+    на наш бакет (внешние ссылки, локальные пути).
+    """
+    if not url or not isinstance(url, str):
+        return None
+
+    clean = url.split("?", 1)[0].split("#", 1)[0]
+
+    if clean.startswith("/media/"):
+        return clean[len("/media/"):] or None
+
+    for prefix in _LEGACY_MEDIA_PREFIXES:
+        if prefix in clean:
+            return clean.split(prefix, 1)[1] or None
+
+    if "://" in clean:
+        host, _, path = clean.split("://", 1)[1].partition("/")
+        if host == _CDN_HOST and path:
+            return path
+
+    for prefix in _LEGACY_ROOT_PREFIXES:
+        if prefix in clean:
+            return clean.split(prefix, 1)[1] or None
+
+    if ".storage.yandexcloud.net/" in clean:
+        return clean.split(".storage.yandexcloud.net/", 1)[1] or None
+    if "storage.yandexcloud.net/" in clean:
+        path_parts = clean.split("storage.yandexcloud.net/", 1)[1].split("/", 1)
+        if len(path_parts) > 1 and path_parts[1]:
+            return path_parts[1]
+
+    return None
+
+
+def format_variants(variants: Iterable[str]) -> str:
+    """Сериализует набор вариантов для колонки media_variants."""
+    return ",".join(sorted(set(variants)))
+
+
+def build_media_url(media_key: str, variant: Optional[str] = None, media_variants: Optional[str] = None) -> str:
+    """
+    Собирает публичный URL объекта через CDN.
+
+    Если запрошен вариант (thumb, card) и он есть в media_variants, возвращает
+    URL варианта, иначе URL исходного объекта.
+    """
+    if variant and variant != DEFAULT_VARIANT and media_variants and variant in media_variants.split(","):
+        from app.services.image_pipeline import variant_object_key
+        return f"{CDN_DOMAIN}/{variant_object_key(media_key, variant, 'webp')}"
+    return f"{CDN_DOMAIN}/{media_key}"
+
+
+def media_url(
+    url: Optional[str],
+    media_key: Optional[str] = None,
+    variant: Optional[str] = None,
+    media_variants: Optional[str] = None,
+) -> Optional[str]:
+    """
+    Возвращает публичный URL фото.
+
+    Для строк с заполненным media_key - только форматирование строки.
+    Для еще не мигрированных строк ключ извлекается из URL (с кэшем),
+    а внешние URL возвращаются как есть.
+    """
+    if media_key:
+        return build_media_url(media_key, variant, media_variants)
+    key = extract_media_key(url)
+    if key is None:
+        return url
+    return build_media_url(key)
+
+
+def fill_media_key(target, url_attr: str) -> None:
+    """
+    Заполняет media_key модели фото из URL (для обработчиков before_insert/before_update).
+
+    Ключ пересчитывается при вставке и при изменении URL, поэтому все места,
+    создающие записи фото, получают нормализованный ключ без изменений кода.
+    Нераспознанные URL получают пустой ключ, чтобы backfill их не перебирал.
+    При смене ключа варианты сбрасываются и заполняются заново (schedule_media_variants_fill).
+    """
+    if target.media_key is not None and not sa_inspect(target).attrs[url_attr].history.has_changes():
+        return
+    media_key = extract_media_key(getattr(target, url_attr, None)) or ""
+    if target.media_key is not None and media_key != target.media_key:
+        target.media_variants = None
+    target.media_key = media_key
+
+
+def schedule_media_variants_fill(target) -> None:
+    """
+    Планирует заполнение media_variants после коммита (для обработчиков after_insert/after_update).
+
+    Варианты берутся из записи, сделанной при загрузке, или из манифеста
+    в бакете (см. app.services.media_variants).
+    """
+    if not target.media_key or target.media_variants is not None:
+        return
+    from app.database.commit_hooks import run_after_commit
+    from app.services.media_variants import request_media_variants_fill
+    run_after_commit(
+        target,
+        ("media_variants", target.__tablename__, target.id),
+        partial(request_media_variants_fill, type(target), target.id, target.media_key),
+    )
@@ -0,0 +1,193 @@
+"""
+Метрики Prometheus.
+
+Гистограммы и счетчики задержек: HTTP эндпоинты, время до первого токена
+OpenRouter, очередь и выполнение RunPod, попадания в Redis кэш по семействам
+ключей, ожидание соединения из пула БД. Метки низкой кардинальности:
+шаблон роута вместо пути, семейство ключа вместо ключа, класс статуса; для
+значений из внешних данных (модель, имя задачи) число разных значений
+ограничено, лишние попадают в "other".
+
+prometheus_client - необязательная зависимость: без него все функции
+ничего не делают. При нескольких процессах (gunicorn, Celery prefork)
+задайте PROMETHEUS_MULTIPROC_DIR - значения пишутся в общий каталог и
+отдаются суммарно (/metrics и app/utils/celery_exporter.py).
+"""
+import os
+import threading
+from typing import Any, Dict, Optional, Tuple
+
+try:
+    from prometheus_client import (CONTENT_TYPE_LATEST, REGISTRY,
+                                   CollectorRegistry, Counter, Histogram,
+                                   generate_latest, multiprocess)
+    from prometheus_client.core import CounterMetricFamily, GaugeMetricFamily
+    PROMETHEUS_AVAILABLE = True
+except ImportError:
+    CONTENT_TYPE_LATEST = "text/plain; version=0.0.4; charset=utf-8"
+    PROMETHEUS_AVAILABLE = False
+
+METRICS_ENABLED = PROMETHEUS_AVAILABLE and os.getenv("METRICS_ENABLED", "true").strip().lower() not in (
+    "0", "false", "no", "off"
+)
+PROMETHEUS_MULTIPROC_DIR = os.getenv("PROMETHEUS_MULTIPROC_DIR")
+
+# Сколько разных значений допускается у меток из внешних данных
+LABEL_VALUES_LIMIT = 30
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+UPSTREAM_BUCKETS = (0.1, 0.25, 0.5, 1, 2, 3, 5, 8, 13, 20, 30, 60)
+RUNPOD_BUCKETS = (1, 2, 5, 10, 20, 30, 60, 120, 300, 600)
+POOL_WAIT_BUCKETS = (0.0005, 0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+
+
+class BoundedLabel:
+    """Пропускает первые limit разных значений метки, остальные - 'other'."""
+
+    def __init__(self, limit: int = LABEL_VALUES_LIMIT):
+        self.limit = limit
+        self._seen = set()
+        self._lock = threading.Lock()
+
+    def __call__(self, value: Any) -> str:
+        value = str(value) if value else "unknown"
+        if value in self._seen:
+            return value
+        with self._lock:
+            if len(self._seen) < self.limit:
+                self._seen.add(value)
+                return value
+        return "other"
+
+
+_route_label = BoundedLabel(200)
+_model_label = BoundedLabel()
+
+if METRICS_ENABLED:
+    HTTP_REQUEST_SECONDS = Histogram(
+        "http_request_duration_seconds", "Время обработки HTTP запроса",
+        ["method", "route", "status"], buckets=LATENCY_BUCKETS,
+    )
+    OPENROUTER_FIRST_TOKEN_SECONDS = Histogram(
+        "openrouter_time_to_first_token_seconds", "Время до первого токена потокового ответа OpenRouter",
+        ["model"], buckets=UPSTREAM_BUCKETS,
+    )
+    OPENROUTER_REQUEST_SECONDS = Histogram(
+        "openrouter_request_duration_seconds", "Полное время запроса к OpenRouter",
+        ["model", "mode", "outcome"], buckets=UPSTREAM_BUCKETS,
+    )
+    RUNPOD_QUEUE_SECONDS = Histogram(
+        "runpod_queue_seconds", "Время задачи RunPod в очереди (delayTime)",
+        ["kind"], buckets=RUNPOD_BUCKETS,
+    )
+    RUNPOD_EXECUTION_SECONDS = Histogram(
+        "runpod_execution_seconds", "Время выполнения задачи RunPod (executionTime)",
+        ["kind", "status"], buckets=RUNPOD_BUCKETS,
+    )
+    CACHE_REQUESTS = Counter(
+        "cache_requests_total", "Чтения Redis кэша по семействам ключей",
+        ["family", "result"],
+    )
+    DB_POOL_WAIT_SECONDS = Histogram(
+        "db_pool_checkout_wait_seconds", "Ожидание соединения из пула БД",
+        ["pool"], buckets=POOL_WAIT_BUCKETS,
+    )
+
+
+def status_class(status_code: Optional[int]) -> str:
+    return f"{status_code // 100}xx" if status_code else "none"
+
+
+def observe_http_request(method: str, route: Optional[str], status_code: Optional[int], seconds: float) -> None:
+    if METRICS_ENABLED:
+        HTTP_REQUEST_SECONDS.labels(method, _route_label(route or "unmatched"), status_class(status_code)).observe(seconds)
+
+
+def observe_openrouter_first_token(model: str, seconds: float) -> None:
+    if METRICS_ENABLED:
+        OPENROUTER_FIRST_TOKEN_SECONDS.labels(_model_label(model)).observe(seconds)
+
+
+def observe_openrouter_request(model: str, mode: str, outcome: str, seconds: float) -> None:
+    if METRICS_ENABLED:
+        OPENROUTER_REQUEST_SECONDS.labels(_model_label(model), mode, outcome).observe(seconds)
+
+
+def observe_runpod_job(kind: str, status_response: Dict[str, Any]) -> None:
+    """Время в очереди и выполнения из ответа /status RunPod (миллисекунды)."""
+    if not METRICS_ENABLED:
+        return
+    delay_ms = status_response.get("delayTime")
+    execution_ms = status_response.get("executionTime")
+    if isinstance(delay_ms, (int, float)):
+        RUNPOD_QUEUE_SECONDS.labels(kind).observe(delay_ms / 1000)
+    if isinstance(execution_ms, (int, float)):
+        status = str(status_response.get("status") or "unknown").lower()
+        RUNPOD_EXECUTION_SECONDS.labels(kind, status).observe(execution_ms / 1000)
+
+
+def count_cache_lookup(family: str, result: str) -> None:
+    """family - семейство ключа (redis_cache.key_family); result: hit, miss или error."""
+    if METRICS_ENABLED:
+        CACHE_REQUESTS.labels(family, result).inc()
+
+
+def observe_db_pool_wait(pool: str, seconds: float) -> None:
+    if METRICS_ENABLED:
+        DB_POOL_WAIT_SECONDS.labels(pool).observe(seconds)
+
+
+class ProcessStateCollector:
+    """
+    Состояние этого процесса на момент запроса метрик: пулы БД и очередь логов.
+    В режиме нескольких процессов не регистрируется - значения одного
+    воркера без суммирования вводили бы в заблуждение.
+    """
+
+    def collect(self):
+        from app.database.pool import pool_stats
+        from app.utils.log_pipeline import log_pipeline_stats
+
+        checked_out = GaugeMetricFamily("db_pool_checked_out", "Выданные соединения пула БД", labels=["pool"])
+        capacity = GaugeMetricFamily("db_pool_capacity", "Размер пула БД с overflow (0 - без пула)", labels=["pool"])
+        saturated = CounterMetricFamily(
+            "db_pool_saturated_checkouts", "Выдачи соединения при полностью занятом пуле", labels=["pool"]
+        )
+        for stats in pool_stats():
+            checked_out.add_metric([stats["name"]], stats["checked_out"])
+            capacity.add_metric([stats["name"]], stats["capacity"])
+            saturated.add_metric([stats["name"]], stats["saturated_checkouts"])
+        yield checked_out
+        yield capacity
+        yield saturated
+
+        log_stats = log_pipeline_stats()
+        if log_stats:
+            records = CounterMetricFamily("log_records", "Записи конвейера логов по исходу", labels=["outcome"])
+            for outcome in ("enqueued", "dropped", "sampled_out", "rate_limited"):
+                records.add_metric([outcome], log_stats[outcome])
+            yield records
+            queued = GaugeMetricFamily("log_queue_size", "Записей в очереди логов")
+            queued.add_metric([], log_stats["queued"])
+            yield queued
+
+
+_process_collector_registered = False
+
+
+def metrics_registry():
+    """Реестр для отдачи: общий каталог процессов или реестр этого процесса."""
+    global _process_collector_registered
+    if PROMETHEUS_MULTIPROC_DIR:
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+        return registry
+    if not _process_collector_registered:
+        REGISTRY.register(ProcessStateCollector())
+        _process_collector_registered = True
+    return REGISTRY
+
+
+def render_metrics(registry=None) -> Tuple[bytes, str]:
+    """Текст метрик в формате Prometheus и его content type."""
+    return generate_latest(registry or metrics_registry()), CONTENT_TYPE_LATEST
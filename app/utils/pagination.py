@@ -0,0 +1,45 @@
+"""
+Курсоры для keyset-пагинации.
+
+Курсор - base64url от JSON с значениями ключа сортировки последней строки
+страницы. Клиент передает его обратно без изменений.
+"""
+
+import base64
+import json
+from datetime import datetime
+from typing import Any, Dict
+
+
+def encode_cursor(values: Dict[str, Any]) -> str:
+    """Кодирует значения ключа сортировки в непрозрачный курсор."""
+    payload = json.dumps(
+        {key: value.isoformat() if isinstance(value, datetime) else value for key, value in values.items()},
+        separators=(",", ":"),
+        ensure_ascii=False,
+    ).encode("utf-8")
+    return base64.urlsafe_b64encode(payload).decode("ascii").rstrip("=")
+
+
+def decode_cursor(cursor: str) -> Dict[str, Any]:
+    """
+    Декодирует курсор.
+
+    Raises:
+        ValueError: если курсор поврежден
+    """
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        payload = json.loads(base64.urlsafe_b64decode(padded.encode("ascii")))
+    except Exception as exc:
+        raise ValueError("Invalid cursor") from exc
+    if not isinstance(payload, dict):
+        raise ValueError("Invalid cursor")
+    return payload
+
+
+def parse_cursor_datetime(value: Any) -> datetime:
+    """Восстанавливает datetime, сохраненный в курсоре."""
+    if not isinstance(value, str):
+        raise ValueError("Invalid cursor")
+    return datetime.fromisoformat(value)
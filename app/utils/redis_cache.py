@@ -167,6 +167,34 @@ async def close_redis_client():
     _redis_unavailable_since = None
 
 
+# Семейства ключей для метрик попаданий в кэш (статические префиксы key_* ниже).
+# Ключ относится к самому длинному совпавшему префиксу, остальные - "other".
+KEY_FAMILIES = tuple(sorted((
+    "subscription:user", "subscription:stats",
+    "user:email", "user:coins", "user:subscription", "user:characters", "user:favorites",
+    "characters:list", "cache:prewarm",
+    "sitemap:meta", "sitemap:build", "sitemap:rebuild_pending",
+    "admin:stats", "registration:data", "password_change:data",
+    "character", "character:photos", "character:main_photos", "character:comments", "character:ratings",
+    "generation:settings", "generation:fallback", "prompts:default",
+    "chat:history", "chat:status", "db:read_your_writes",
+    "voices:available", "voices:model", "image:metadata", "storage:refs",
+), key=len, reverse=True))
+
+
+def key_family(key: str) -> str:
+    """Семейство ключа кэша (метка метрик без динамической части ключа)."""
+    for family in KEY_FAMILIES:
+        if key.startswith(family) and (len(key) == len(family) or key[len(family)] == ":"):
+            return family
+    return "other"
+
+
+def _count_lookup(key: str, result: str) -> None:
+    from app.utils.metrics import count_cache_lookup
+    count_cache_lookup(key_family(key), result)
+
+
 async def cache_get(key: str, timeout: float = 0.3) -> Optional[Any]:
     """
     Получает значение из кэша с таймаутом.
@@ -184,29 +212,35 @@ async def cache_get(key: str, timeout: float = 0.3) -> Optional[Any]:
         if _redis_unavailable:
             import time
             if _redis_unavailable_since and (time.monotonic() - _redis_unavailable_since) < REDIS_RETRY_INTERVAL:
+                _count_lookup(key, "error")
                 return None
         
         client = await get_redis_client()
         if not client:
+            _count_lookup(key, "error")
             return None
         
         # Добавляем таймаут для Redis запроса
         try:
             value = await asyncio.wait_for(client.get(key), timeout=timeout)
             if value is None:
+                _count_lookup(key, "miss")
                 return None
         except asyncio.TimeoutError:
             # При таймауте помечаем Redis как недоступный для быстрого fallback в будущем
             _redis_unavailable = True
             import time
             _redis_unavailable_since = time.monotonic()
+            _count_lookup(key, "error")
             return None
         except Exception as e:
             # При ошибке помечаем Redis как недоступный
             _redis_unavailable = True
             import time
             _redis_unavailable_since = time.monotonic()
+            _count_lookup(key, "error")
             return None
+        _count_lookup(key, "hit")
         
         # Пытаемся распарсить JSON
         try:
@@ -397,6 +431,28 @@ TTL_CHARACTER_RATINGS = 600  # 10 минут - рейтинги персонаж
 TTL_AVAILABLE_VOICES = 900  # 15 минут - список доступных голосов
 TTL_USER_FAVORITES = 180  # 3 минуты - список избранных персонажей пользователя
 TTL_IMAGE_METADATA = 86400  # 24 часа - метаданные изображений (промпты)
+TTL_SITEMAP = 604800  # 7 дней - собранный sitemap (пересобирается при изменении персонажей и ежедневно)
+TTL_ADMIN_STATS = 3600  # 1 час - снимок статистики админки (пересчитывается каждые 15 минут)
+TTL_CHARACTER_COMMENTS = 60  # 1 минута - первая страница комментариев персонажа (сбрасывается при записи)
+TTL_MEDIA_VARIANTS = 604800  # 7 дней - варианты загруженного изображения (до записи фото в БД)
+
+
+def _build_cache_version() -> str:
+    """
+    Версия пространства ключей кэша.
+    
+    Складывается из версии схемы кэшируемых данных (CACHE_SCHEMA_VERSION,
+    повышается при изменении формата) и идентификатора деплоя (DEPLOY_VERSION,
+    например git sha или тег образа). Новый код читает новое пространство,
+    а ключи старой версии истекают по TTL - без массового удаления на старте.
+    """
+    from app.config.settings import settings
+    schema_version = settings.CACHE_SCHEMA_VERSION
+    deploy_version = (os.getenv("DEPLOY_VERSION") or "").strip()
+    return f"{schema_version}-{deploy_version[:12]}" if deploy_version else schema_version
+
+
+CACHE_VERSION = _build_cache_version()
 
 
 # Функции для генерации ключей кэша
@@ -426,8 +482,41 @@ def key_user_subscription(user_id: int) -> str:
 
 
 def key_characters_list() -> str:
-    """Генерирует ключ для списка персонажей (версия 2 для поддержки платных альбомов)."""
-    return "characters:list:v2"
+    """
+    Генерирует ключ для списка персонажей в текущем пространстве версий.
+    Префикс characters:list: сохранен, поэтому паттерны инвалидации работают для всех версий.
+    """
+    return f"characters:list:{CACHE_VERSION}"
+
+
+def key_cache_prewarm(name: str) -> str:
+    """Генерирует ключ-блокировку прогрева кэша для текущей версии (прогрев выполняется один раз)."""
+    return f"cache:prewarm:{name}:{CACHE_VERSION}"
+
+
+def key_sitemap_meta() -> str:
+    """Генерирует ключ метаданных текущей сборки sitemap (build_id, Last-Modified, ETag файлов)."""
+    return "sitemap:meta"
+
+
+def key_sitemap_build(build_id: str) -> str:
+    """Генерирует ключ с gzip-файлами сборки sitemap."""
+    return f"sitemap:build:{build_id}"
+
+
+def key_sitemap_rebuild_pending() -> str:
+    """Генерирует ключ-флаг запланированной пересборки sitemap (debounce)."""
+    return "sitemap:rebuild_pending"
+
+
+def key_admin_stats_snapshot() -> str:
+    """Генерирует ключ снимка статистики админ-панели."""
+    return "admin:stats:snapshot"
+
+
+def key_admin_stats_counters() -> str:
+    """Генерирует ключ hash со счетчиками итогов админ-панели (обновляются инкрементально)."""
+    return "admin:stats:counters"
 
 
 def key_registration_data(email: str) -> str:
@@ -503,18 +592,21 @@ async def cache_get_json(
 
 
 def key_character(name: str) -> str:
-    """Генерирует ключ для данных персонажа."""
-    return f"character:{name.lower()}"
+    """
+    Генерирует ключ для данных персонажа в текущем пространстве версий.
+    Версия стоит в конце, поэтому паттерны инвалидации character:*<имя>* работают для всех версий.
+    """
+    return f"character:{name.lower()}:{CACHE_VERSION}"
 
 
 def key_character_photos(character_id: int) -> str:
-    """Генерирует ключ для фотографий персонажа."""
-    return f"character:photos:{character_id}"
+    """Генерирует ключ для фотографий персонажа в текущем пространстве версий."""
+    return f"character:photos:{character_id}:{CACHE_VERSION}"
 
 
 def key_character_main_photos(character_id: int) -> str:
-    """Генерирует ключ для главных фотографий персонажа."""
-    return f"character:main_photos:{character_id}"
+    """Генерирует ключ для главных фотографий персонажа в текущем пространстве версий."""
+    return f"character:main_photos:{character_id}:{CACHE_VERSION}"
 
 
 def key_generation_settings() -> str:
@@ -533,8 +625,21 @@ def key_prompts_default() -> str:
 
 
 def key_chat_history(user_id: int, character_name: str, session_id: str) -> str:
-    """Генерирует ключ для истории чата."""
-    return f"chat:history:{user_id}:{character_name.lower()}:{session_id}"
+    """
+    Генерирует ключ последней страницы истории чата (Redis list, от старых к новым).
+    Новые сообщения дописываются в конец списка, старые страницы не кэшируются.
+    """
+    return f"chat:history:latest:{user_id}:{character_name.lower()}:{session_id}"
+
+
+def key_chat_history_pattern(user_id: int, character_name: str) -> str:
+    """Генерирует шаблон ключей последних страниц истории всех сессий персонажа."""
+    return f"chat:history:latest:{user_id}:{character_name.lower()}:*"
+
+
+def key_chat_history_character_pattern(character_name: str) -> str:
+    """Генерирует шаблон ключей последних страниц истории персонажа у всех пользователей."""
+    return f"chat:history:latest:*:{character_name.lower()}:*"
 
 
 def key_chat_status() -> str:
@@ -542,6 +647,16 @@ def key_chat_status() -> str:
     return "chat:status"
 
 
+def key_character_comments(character_name: str) -> str:
+    """Генерирует ключ первой страницы комментариев персонажа (имя без изменения регистра, как в БД)."""
+    return f"character:comments:first:{character_name}"
+
+
+def key_db_read_your_writes(identity: str) -> str:
+    """Генерирует ключ отметки о недавней записи клиента (его чтения идут в основную БД)."""
+    return f"db:read_your_writes:{identity}"
+
+
 def key_user_characters(user_id: int) -> str:
     """Генерирует ключ для списка персонажей пользователя с историей."""
     return f"user:characters:{user_id}"
@@ -561,6 +676,26 @@ def key_available_voices(user_id: Optional[int] = None) -> str:
     return "voices:available:public"
 
 
+def key_voice_model(audio_hash: str) -> str:
+    """Генерирует ключ reference_id голосовой модели Fish Audio по sha256 образца."""
+    return f"voices:model:{audio_hash}"
+
+
+def key_storage_refs(object_key: str) -> str:
+    """Генерирует ключ счетчика ссылок на объект бакета, адресуемый по хэшу содержимого."""
+    return f"storage:refs:{object_key}"
+
+
+def key_storage_ref_lock(object_key: str) -> str:
+    """Генерирует ключ блокировки счетчика ссылок на объект бакета."""
+    return f"storage:refs_lock:{object_key}"
+
+
+def key_media_variants(object_key: str) -> str:
+    """Генерирует ключ списка вариантов изображения, загруженных вместе с объектом бакета."""
+    return f"storage:variants:{object_key}"
+
+
 def key_user_favorites(user_id: int) -> str:
     """Генерирует ключ для списка избранных персонажей пользователя."""
     return f"user:favorites:{user_id}"
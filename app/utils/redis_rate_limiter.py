@@ -1,116 +1,255 @@
 """
 Redis-based rate limiter для распределенных систем.
-Использует Redis для хранения счетчиков запросов.
+
+Решение о пропуске запроса и его учет выполняются одним Lua скриптом,
+то есть атомарно и за один round trip к Redis. Время берется из Redis (TIME),
+поэтому расхождение часов между серверами приложения не влияет на окно.
 """
 
-import time
+import math
+import uuid
 import logging
-from typing import Optional
+from dataclasses import dataclass
+from typing import Dict, Optional
 from app.utils.redis_cache import get_redis_client
 
 logger = logging.getLogger(__name__)
 
 
+POLICY_SLIDING_WINDOW = "sliding_window"
+POLICY_GCRA = "gcra"
+
+# Скользящее окно: журнал запросов в sorted set (score - время в мс).
+# ARGV: limit, window_ms, member, peek
+# Возвращает: {allowed, remaining, retry_after_ms, reset_after_ms}
+SLIDING_WINDOW_SCRIPT = """
+local key = KEYS[1]
+local limit = tonumber(ARGV[1])
+local window = tonumber(ARGV[2])
+local peek = ARGV[4] == '1'
+local t = redis.call('TIME')
+local now = tonumber(t[1]) * 1000 + math.floor(tonumber(t[2]) / 1000)
+
+redis.call('ZREMRANGEBYSCORE', key, 0, now - window)
+local count = redis.call('ZCARD', key)
+
+if count < limit then
+    if peek then
+        return {1, limit - count, 0, 0}
+    end
+    redis.call('ZADD', key, now, ARGV[3])
+    redis.call('PEXPIRE', key, window)
+    return {1, limit - count - 1, 0, window}
+end
+
+local retry = window
+local oldest = redis.call('ZRANGE', key, 0, 0, 'WITHSCORES')
+if oldest[2] then
+    retry = tonumber(oldest[2]) + window - now
+end
+if retry < 1 then
+    retry = 1
+end
+return {0, 0, retry, retry}
+"""
+
+# GCRA (эквивалент token bucket с емкостью limit): хранится только
+# теоретическое время прибытия (TAT) следующего запроса в мс.
+# ARGV: limit, period_ms, peek
+# Возвращает: {allowed, remaining, retry_after_ms, reset_after_ms}
+GCRA_SCRIPT = """
+local key = KEYS[1]
+local limit = tonumber(ARGV[1])
+local period = tonumber(ARGV[2])
+local peek = ARGV[3] == '1'
+local t = redis.call('TIME')
+local now = tonumber(t[1]) * 1000 + math.floor(tonumber(t[2]) / 1000)
+
+local emission = period / limit
+local tat = tonumber(redis.call('GET', key))
+if not tat or tat < now then
+    tat = now
+end
+
+local new_tat = tat + emission
+local diff = now - (new_tat - period)
+
+if diff < 0 then
+    local retry = math.ceil(-diff)
+    return {0, 0, retry, math.ceil(tat - now)}
+end
+
+local remaining = math.floor(diff / emission)
+if peek then
+    return {1, remaining + 1, 0, math.ceil(tat - now)}
+end
+
+local ttl = math.ceil(new_tat - now)
+redis.call('SET', key, string.format('%.3f', new_tat), 'PX', ttl)
+return {1, remaining, 0, ttl}
+"""
+
+_SCRIPTS: Dict[str, str] = {
+    POLICY_SLIDING_WINDOW: SLIDING_WINDOW_SCRIPT,
+    POLICY_GCRA: GCRA_SCRIPT,
+}
+
+
+class RateLimiterUnavailable(Exception):
+    """Redis недоступен или вернул ошибку: решение о лимите не принято."""
+
+
+@dataclass
+class RateLimitResult:
+    """Результат проверки лимита."""
+    allowed: bool
+    limit: int
+    remaining: int
+    retry_after: float = 0.0
+    reset_after: float = 0.0
+
+    @property
+    def headers(self) -> Dict[str, str]:
+        """Стандартные заголовки rate limit для ответа (включая Retry-After при отказе)."""
+        headers = {
+            "X-RateLimit-Limit": str(self.limit),
+            "X-RateLimit-Remaining": str(max(0, self.remaining)),
+            "X-RateLimit-Reset": str(math.ceil(self.reset_after)),
+        }
+        if not self.allowed:
+            headers["Retry-After"] = str(max(1, math.ceil(self.retry_after)))
+        return headers
+
+
 class RedisRateLimiter:
     """
     Rate limiter на основе Redis для работы в распределенных системах.
-    
-    Использует sliding window алгоритм для более точного ограничения.
+
+    Поддерживает две политики:
+    - sliding_window: точное скользящее окно (не более max_requests за window_seconds)
+    - gcra: token bucket с емкостью max_requests и равномерным пополнением
+      за window_seconds; хранит одно число на ключ
     """
-    
-    def __init__(self, max_requests: int = 10, window_seconds: int = 60):
+
+    def __init__(
+        self,
+        max_requests: int = 10,
+        window_seconds: int = 60,
+        policy: str = POLICY_SLIDING_WINDOW,
+        prefix: str = "rate_limit",
+    ):
         """
         Инициализация rate limiter.
-        
+
         Args:
             max_requests: Максимальное количество запросов
             window_seconds: Временное окно в секундах
+            policy: Политика ограничения: sliding_window или gcra
+            prefix: Префикс ключей в Redis
         """
+        if policy not in _SCRIPTS:
+            raise ValueError(f"Неизвестная политика rate limit: {policy}")
         self.max_requests = max_requests
         self.window_seconds = window_seconds
-    
-    async def is_allowed(self, key: str) -> bool:
+        self.policy = policy
+        self.prefix = prefix
+        self._script = None
+
+    def _redis_key(self, key: str) -> str:
+        if self.policy == POLICY_GCRA:
+            return f"{self.prefix}:gcra:{key}"
+        return f"{self.prefix}:{key}"
+
+    async def _run(self, key: str, peek: bool) -> RateLimitResult:
+        redis_client = await get_redis_client()
+        if not redis_client:
+            raise RateLimiterUnavailable("Redis недоступен")
+
+        if self._script is None:
+            # register_script отправляет EVALSHA и сам догружает скрипт при NOSCRIPT
+            self._script = redis_client.register_script(_SCRIPTS[self.policy])
+
+        window_ms = int(self.window_seconds * 1000)
+        if self.policy == POLICY_GCRA:
+            args = [self.max_requests, window_ms, "1" if peek else "0"]
+        else:
+            args = [self.max_requests, window_ms, uuid.uuid4().hex, "1" if peek else "0"]
+
+        allowed, remaining, retry_after_ms, reset_after_ms = await self._script(
+            keys=[self._redis_key(key)], args=args, client=redis_client
+        )
+        return RateLimitResult(
+            allowed=bool(int(allowed)),
+            limit=self.max_requests,
+            remaining=int(remaining),
+            retry_after=int(retry_after_ms) / 1000,
+            reset_after=int(reset_after_ms) / 1000,
+        )
+
+    async def check(self, key: str) -> RateLimitResult:
         """
-        Проверяет, разрешен ли запрос для данного ключа.
-        
+        Атомарно проверяет и учитывает запрос для ключа.
+
         Args:
             key: Уникальный ключ (например, email или IP адрес)
-            
+
         Returns:
-            True если запрос разрешен, False если превышен лимит
+            RateLimitResult с остатком квоты и временем до повтора
+
+        Raises:
+            RateLimiterUnavailable: Redis недоступен или вернул ошибку; вызывающий
+                код решает, чем ограничить запрос (например, in-memory лимитом)
         """
         try:
-            redis_client = await get_redis_client()
-            if not redis_client:
-                # Если Redis недоступен, разрешаем запрос (fallback)
-                logger.warning(f"[RATE_LIMIT] Redis недоступен, разрешаем запрос для {key}")
-                return True
-            
-            now = time.time()
-            window_start = now - self.window_seconds
-            
-            # Ключ для Redis
-            redis_key = f"rate_limit:{key}"
-            
-            # Удаляем старые записи (старше window_seconds)
-            await redis_client.zremrangebyscore(redis_key, 0, window_start)
-            
-            # Подсчитываем количество запросов в текущем окне
-            count = await redis_client.zcard(redis_key)
-            
-            if count >= self.max_requests:
-                logger.warning(f"[RATE_LIMIT] Превышен лимит для {key}: {count}/{self.max_requests}")
-                return False
-            
-            # Добавляем текущий запрос
-            await redis_client.zadd(redis_key, {str(now): now})
-            
-            # Устанавливаем TTL для ключа (автоматическая очистка)
-            await redis_client.expire(redis_key, self.window_seconds + 10)
-            
-            return True
-            
+            result = await self._run(key, peek=False)
+        except RateLimiterUnavailable:
+            logger.warning(f"[RATE_LIMIT] Redis недоступен, лимит для {key} не проверен")
+            raise
         except Exception as e:
             logger.error(f"[RATE_LIMIT] Ошибка проверки лимита для {key}: {e}")
-            # В случае ошибки разрешаем запрос (fail-open)
-            return True
-    
+            raise RateLimiterUnavailable(str(e)) from e
+        if not result.allowed:
+            logger.warning(
+                f"[RATE_LIMIT] Превышен лимит для {key}: {self.max_requests}/{self.window_seconds}s "
+                f"({self.policy}), retry_after={result.retry_after:.1f}s"
+            )
+        return result
+
+    async def is_allowed(self, key: str) -> bool:
+        """
+        Проверяет, разрешен ли запрос для данного ключа.
+
+        Args:
+            key: Уникальный ключ (например, email или IP адрес)
+
+        Returns:
+            True если запрос разрешен, False если превышен лимит
+
+        Raises:
+            RateLimiterUnavailable: Redis недоступен или вернул ошибку
+        """
+        return (await self.check(key)).allowed
+
     async def get_remaining(self, key: str) -> int:
         """
-        Получает количество оставшихся запросов.
-        
+        Получает количество оставшихся запросов (без учета запроса).
+
         Args:
             key: Уникальный ключ
-            
+
         Returns:
             Количество оставшихся запросов
         """
         try:
-            redis_client = await get_redis_client()
-            if not redis_client:
-                return self.max_requests
-            
-            now = time.time()
-            window_start = now - self.window_seconds
-            
-            redis_key = f"rate_limit:{key}"
-            
-            # Удаляем старые записи
-            await redis_client.zremrangebyscore(redis_key, 0, window_start)
-            
-            # Подсчитываем количество запросов
-            count = await redis_client.zcard(redis_key)
-            
-            return max(0, self.max_requests - count)
-            
+            return (await self._run(key, peek=True)).remaining
         except Exception as e:
             logger.error(f"[RATE_LIMIT] Ошибка получения остатка для {key}: {e}")
             return self.max_requests
-    
+
     async def reset(self, key: str) -> None:
         """
         Сбрасывает счетчик для ключа.
-        
+
         Args:
             key: Уникальный ключ
         """
@@ -118,10 +257,8 @@ class RedisRateLimiter:
             redis_client = await get_redis_client()
             if not redis_client:
                 return
-            
-            redis_key = f"rate_limit:{key}"
-            await redis_client.delete(redis_key)
-            
+
+            await redis_client.delete(self._redis_key(key))
+
         except Exception as e:
             logger.error(f"[RATE_LIMIT] Ошибка сброса для {key}: {e}")
-
@@ -0,0 +1,154 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Сравнение прежней цепочки @app.middleware("http") с RequestPipelineMiddleware.
+
+Обе версии подключаются к одинаковому приложению и вызываются напрямую
+через ASGI (без сети), поэтому разница - это только накладные расходы
+middleware. Замеряется:
+- время на запрос для JSON эндпоинта;
+- время до первого куска потокового ответа, когда генератор отдает
+  следующий кусок с задержкой (у буферизующей цепочки оно растет).
+
+Запуск: python scripts/benchmark_middleware.py [--requests 5000]
+"""
+import argparse
+import asyncio
+import os
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from starlette.applications import Starlette
+from starlette.requests import Request
+from starlette.responses import JSONResponse, StreamingResponse
+from starlette.routing import Route
+
+from app.middleware.request_pipeline import RequestPipelineMiddleware, is_direct_browser_navigation
+
+STREAM_CHUNK_DELAY = 0.05
+
+
+async def _json_endpoint(request):
+    return JSONResponse({"ok": True})
+
+
+async def _stream_endpoint(request):
+    async def chunks():
+        for i in range(5):
+            yield f"data: {i}\n\n".encode()
+            await asyncio.sleep(STREAM_CHUNK_DELAY)
+    return StreamingResponse(chunks(), media_type="text/event-stream")
+
+
+def _routes():
+    return [Route("/api/v1/data", _json_endpoint), Route("/api/v1/stream", _stream_endpoint)]
+
+
+def build_legacy_app() -> Starlette:
+    """Четыре BaseHTTPMiddleware в том же порядке, что были в app/main.py."""
+    app = Starlette(routes=_routes())
+
+    @app.middleware("http")
+    async def log_requests_middleware(request: Request, call_next):
+        response = await call_next(request)
+        if response.status_code >= 400:
+            pass
+        return response
+
+    @app.middleware("http")
+    async def block_direct_api_access(request: Request, call_next):
+        if request.url.path.startswith("/api/") and is_direct_browser_navigation(request.headers):
+            return JSONResponse({}, status_code=404)
+        return await call_next(request)
+
+    @app.middleware("http")
+    async def log_voice_requests(request: Request, call_next):
+        response = await call_next(request)
+        if request.method == "GET" and "/voices/" in str(request.url.path):
+            pass
+        return response
+
+    @app.middleware("http")
+    async def log_ratings_requests(request: Request, call_next):
+        response = await call_next(request)
+        if request.method == "POST" and "/youmoney/" in str(request.url):
+            pass
+        return response
+
+    return app
+
+
+def build_pipeline_app() -> Starlette:
+    app = Starlette(routes=_routes())
+    app.add_middleware(RequestPipelineMiddleware)
+    return app
+
+
+def _scope(path: str) -> dict:
+    return {
+        "type": "http", "asgi": {"version": "3.0"}, "http_version": "1.1",
+        "method": "GET", "scheme": "http", "path": path, "raw_path": path.encode(),
+        "root_path": "", "query_string": b"", "client": ("127.0.0.1", 50000), "server": ("bench", 80),
+        "headers": [(b"accept", b"application/json"), (b"user-agent", b"bench")],
+    }
+
+
+async def _call(app, path: str, on_first_body=None) -> None:
+    request_sent = False
+
+    async def receive():
+        nonlocal request_sent
+        if not request_sent:
+            request_sent = True
+            return {"type": "http.request", "body": b"", "more_body": False}
+        # Клиент не отключается до конца ответа
+        await asyncio.Event().wait()
+
+    async def send(message):
+        if on_first_body and message["type"] == "http.response.body" and message.get("body"):
+            on_first_body()
+
+    await app(_scope(path), receive, send)
+
+
+async def bench_requests(app, requests: int) -> float:
+    """Среднее время JSON запроса в микросекундах."""
+    for _ in range(200):  # прогрев
+        await _call(app, "/api/v1/data")
+    started = time.perf_counter()
+    for _ in range(requests):
+        await _call(app, "/api/v1/data")
+    return (time.perf_counter() - started) / requests * 1e6
+
+
+async def bench_first_chunk(app, rounds: int) -> float:
+    """Медиана времени до первого куска потокового ответа в миллисекундах."""
+    samples = []
+    for _ in range(rounds):
+        started = time.perf_counter()
+        first = []
+        await _call(app, "/api/v1/stream", lambda: first or first.append(time.perf_counter() - started))
+        samples.append(first[0] * 1000)
+    return statistics.median(samples)
+
+
+async def main(requests: int, rounds: int) -> None:
+    print(f"{'':<28}{'legacy chain':>14}{'pipeline':>14}")
+    legacy, pipeline = build_legacy_app(), build_pipeline_app()
+    legacy_us = await bench_requests(legacy, requests)
+    pipeline_us = await bench_requests(pipeline, requests)
+    print(f"{'JSON request, us':<28}{legacy_us:>14.1f}{pipeline_us:>14.1f}")
+    legacy_ms = await bench_first_chunk(legacy, rounds)
+    pipeline_ms = await bench_first_chunk(pipeline, rounds)
+    print(f"{'stream first chunk, ms':<28}{legacy_ms:>14.2f}{pipeline_ms:>14.2f}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--requests", type=int, default=5000)
+    parser.add_argument("--stream-rounds", type=int, default=20)
+    args = parser.parse_args()
+    asyncio.run(main(args.requests, args.stream_rounds))
@@ -0,0 +1,84 @@
+from datetime import date, datetime
+
+import pytest
+from httpx import AsyncClient
+from sqlalchemy import delete, select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.models.balance_history import BalanceHistory, BalanceMonthlySummary
+
+# (amount, balance_after, created_at) - два месяца, начисления и списания
+LEDGER = (
+    (100, 100, datetime(2026, 1, 5, 10, 0)),
+    (-30, 70, datetime(2026, 1, 20, 12, 0)),
+    (-20, 50, datetime(2026, 1, 31, 23, 59)),
+    (200, 250, datetime(2026, 2, 1, 0, 0)),
+    (-50, 200, datetime(2026, 2, 14, 9, 30)),
+)
+
+
+@pytest.fixture
+async def ledger(db_session: AsyncSession, test_user_free):
+    entries = [
+        BalanceHistory(
+            user_id=test_user_free.id, amount=amount, balance_before=balance_after - amount,
+            balance_after=balance_after, reason="test", created_at=created_at,
+        )
+        for amount, balance_after, created_at in LEDGER
+    ]
+    db_session.add_all(entries)
+    await db_session.commit()
+    return entries
+
+
+async def _summaries(db_session: AsyncSession, user_id: int) -> dict:
+    result = await db_session.execute(
+        select(BalanceMonthlySummary).where(BalanceMonthlySummary.user_id == user_id)
+    )
+    return {
+        row.month: (row.credits, row.debits, row.operations, row.closing_balance)
+        for row in result.scalars()
+    }
+
+
+@pytest.mark.asyncio
+async def test_monthly_summaries_follow_ledger(db_session: AsyncSession, test_user_free, ledger):
+    assert await _summaries(db_session, test_user_free.id) == {
+        date(2026, 1, 1): (100, 50, 3, 50),
+        date(2026, 2, 1): (200, 50, 2, 200),
+    }
+
+    # Удаление последней записи месяца пересчитывает итоги и баланс на конец месяца
+    await db_session.execute(delete(BalanceHistory).where(BalanceHistory.id == ledger[2].id))
+    await db_session.commit()
+    summaries = await _summaries(db_session, test_user_free.id)
+    assert summaries[date(2026, 1, 1)] == (100, 30, 2, 70)
+
+
+@pytest.mark.asyncio
+async def test_history_pages_with_filters(client: AsyncClient, auth_headers_free, ledger):
+    seen = []
+    cursor = None
+    while True:
+        params = {"limit": 1, "type": "debit", "date_from": "2026-01-10T00:00:00"}
+        if cursor:
+            params["cursor"] = cursor
+        response = await client.get("/api/v1/balance/history", params=params, headers=auth_headers_free)
+        assert response.status_code == 200
+        data = response.json()
+        assert data["total"] == len(LEDGER)
+        seen.extend(item["amount"] for item in data["history"])
+        cursor = data["next_cursor"]
+        if not cursor:
+            break
+
+    assert seen == [-50, -20, -30]
+
+
+@pytest.mark.asyncio
+async def test_balance_summary_endpoint(client: AsyncClient, auth_headers_free, ledger):
+    response = await client.get("/api/v1/balance/summary", params={"months": 1}, headers=auth_headers_free)
+    assert response.status_code == 200
+    assert response.json()["months"] == [
+        {"month": "2026-02-01", "credits": 200, "debits": 50, "operations": 2, "closing_balance": 200}
+    ]
@@ -0,0 +1,90 @@
+import pytest
+from httpx import AsyncClient
+from sqlalchemy import delete, event
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.models.bug_report import BugComment, BugReport, BugStatus
+
+
+@pytest.fixture
+async def bug_reports(db_session: AsyncSession):
+    """Шесть репортов по два комментария, статусы по кругу."""
+    statuses = list(BugStatus)
+    reports = [
+        BugReport(title=f"Bug {i}", description="Steps", status=statuses[i % 3])
+        for i in range(6)
+    ]
+    db_session.add_all(reports)
+    await db_session.flush()
+    for report in reports:
+        db_session.add_all([
+            BugComment(bug_report_id=report.id, content=f"first {report.id}"),
+            BugComment(bug_report_id=report.id, content=f"second {report.id}"),
+        ])
+    await db_session.commit()
+    yield reports
+    await db_session.execute(delete(BugReport).where(BugReport.id.in_([r.id for r in reports])))
+    await db_session.commit()
+
+
+@pytest.fixture
+def query_counter(test_engine):
+    statements = []
+
+    def _count(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+
+    event.listen(test_engine.sync_engine, "before_cursor_execute", _count)
+    yield statements
+    event.remove(test_engine.sync_engine, "before_cursor_execute", _count)
+
+
+@pytest.mark.asyncio
+async def test_bug_report_list_uses_constant_queries(client: AsyncClient, bug_reports, query_counter):
+    response = await client.get("/api/v1/bug-reports/")
+    assert response.status_code == 200
+    data = {item["id"]: item for item in response.json()}
+
+    # Репорты, счетчики и комментарии - по одному запросу на всю страницу
+    assert len([s for s in query_counter if "bug_" in s]) == 3
+    for report in bug_reports:
+        item = data[report.id]
+        assert item["comments_count"] == 2
+        assert [c["content"] for c in item["comments"]] == [f"first {report.id}", f"second {report.id}"]
+        assert item["latest_comment"]["content"] == f"second {report.id}"
+
+
+@pytest.mark.asyncio
+async def test_bug_report_pages_with_status_filter(client: AsyncClient, bug_reports):
+    status = BugStatus.IN_PROGRESS.value
+    expected = [
+        r.id for r in sorted(bug_reports, key=lambda r: (r.created_at, r.id), reverse=True)
+        if r.status == BugStatus.IN_PROGRESS
+    ]
+
+    seen = []
+    cursor = None
+    while True:
+        params = {"status": status, "limit": 1, "include_comments": "false"}
+        if cursor:
+            params["cursor"] = cursor
+        response = await client.get("/api/v1/bug-reports/", params=params)
+        assert response.status_code == 200
+        page = response.json()
+        for item in page["bug_reports"]:
+            assert item["status"] == status
+            assert item["comments"] == []
+            assert item["comments_count"] == 2
+            assert item["latest_comment"]["content"] == f"second {item['id']}"
+        seen.extend(item["id"] for item in page["bug_reports"])
+        cursor = page["next_cursor"]
+        if not cursor:
+            break
+
+    assert [report_id for report_id in seen if report_id in expected] == expected
+
+
+@pytest.mark.asyncio
+async def test_bug_report_list_rejects_bad_filters(client: AsyncClient):
+    assert (await client.get("/api/v1/bug-reports/", params={"status": "unknown"})).status_code == 400
+    assert (await client.get("/api/v1/bug-reports/", params={"cursor": "###"})).status_code == 400
@@ -0,0 +1,98 @@
+import uuid
+from datetime import datetime, timedelta
+
+import pytest
+from httpx import AsyncClient
+from sqlalchemy import delete, select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.models.character_comment import CharacterComment, CharacterCommentCount
+from app.models.user import Users
+
+
+@pytest.fixture
+async def commenter(db_session: AsyncSession):
+    user = Users(
+        email=f"commenter_{uuid.uuid4().hex[:8]}@test.com",
+        username=f"commenter_{uuid.uuid4().hex[:8]}",
+        password_hash="hash",
+    )
+    db_session.add(user)
+    await db_session.commit()
+    yield user
+    await db_session.execute(delete(Users).where(Users.id == user.id))
+    await db_session.commit()
+
+
+async def _count(db_session: AsyncSession, character_name: str) -> int:
+    result = await db_session.execute(
+        select(CharacterCommentCount.comments_count)
+        .where(CharacterCommentCount.character_name == character_name)
+    )
+    return result.scalar() or 0
+
+
+@pytest.mark.asyncio
+async def test_comment_counter_follows_inserts_and_deletes(db_session: AsyncSession, commenter):
+    character_name = f"CountChar_{uuid.uuid4().hex[:8]}"
+    comments = [
+        CharacterComment(character_name=character_name, user_id=commenter.id, content=f"c{i}")
+        for i in range(3)
+    ]
+    db_session.add_all(comments)
+    await db_session.commit()
+    assert await _count(db_session, character_name) == 3
+
+    await db_session.delete(comments[0])
+    await db_session.commit()
+    assert await _count(db_session, character_name) == 2
+
+    # Каскадное удаление вместе с пользователем тоже учитывается
+    await db_session.execute(delete(Users).where(Users.id == commenter.id))
+    await db_session.commit()
+    assert await _count(db_session, character_name) == 0
+
+
+@pytest.mark.asyncio
+async def test_comment_pages_follow_cursor(client: AsyncClient, db_session: AsyncSession, commenter):
+    character_name = f"PageChar_{uuid.uuid4().hex[:8]}"
+    start = datetime(2026, 1, 1)
+    db_session.add_all([
+        # Две пары с одинаковым временем: порядок внутри пары задает id
+        CharacterComment(
+            character_name=character_name, user_id=commenter.id, content=f"c{i}",
+            created_at=start + timedelta(minutes=i // 2),
+        )
+        for i in range(5)
+    ])
+    await db_session.commit()
+    expected = [
+        comment.id for comment in (await db_session.execute(
+            select(CharacterComment)
+            .where(CharacterComment.character_name == character_name)
+            .order_by(CharacterComment.created_at.desc(), CharacterComment.id.desc())
+        )).scalars()
+    ]
+
+    seen = []
+    cursor = None
+    while True:
+        params = {"limit": 2}
+        if cursor:
+            params["cursor"] = cursor
+        response = await client.get(f"/api/v1/character-comments/{character_name}", params=params)
+        assert response.status_code == 200
+        data = response.json()
+        assert data["total"] == 5
+        seen.extend(item["id"] for item in data["comments"])
+        cursor = data["next_cursor"]
+        if not cursor:
+            break
+
+    assert seen == expected
+
+
+@pytest.mark.asyncio
+async def test_comment_list_rejects_bad_cursor(client: AsyncClient):
+    response = await client.get("/api/v1/character-comments/AnyChar", params={"cursor": "###"})
+    assert response.status_code == 400
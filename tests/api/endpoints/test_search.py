@@ -48,3 +48,38 @@ async def test_search_endpoint(client: AsyncClient, db_session: AsyncSession):
     assert response_limit.status_code == 200
     data_limit = response_limit.json()
     assert len(data_limit) == 1
+
+
+@pytest.mark.asyncio
+async def test_search_cursor_pagination_and_typos(client: AsyncClient, db_session: AsyncSession):
+    for i in range(5):
+        db_session.add(CharacterDB(
+            name=f"PagedSearchChar{i}",
+            display_name=f"Paged Search {i}",
+            is_nsfw=False
+        ))
+    await db_session.commit()
+
+    seen = []
+    cursor = None
+    for _ in range(5):
+        params = {"q": "PagedSearch", "limit": 2}
+        if cursor:
+            params["cursor"] = cursor
+        response = await client.get("/api/v1/search/", params=params)
+        assert response.status_code == 200
+        seen.extend(item['name'] for item in response.json() if item['type'] == 'character')
+        cursor = response.headers.get("X-Next-Cursor")
+        if not cursor:
+            break
+
+    # Каждый персонаж ровно один раз, страницы не пересекаются
+    assert sorted(seen) == [f"PagedSearchChar{i}" for i in range(5)]
+
+    # Опечатка находит персонажа за счет trigram similarity
+    response = await client.get("/api/v1/search/", params={"q": "PagedSerch"})
+    assert response.status_code == 200
+    assert any(item['name'].startswith("PagedSearchChar") for item in response.json())
+
+    response = await client.get("/api/v1/search/", params={"q": "PagedSearch", "cursor": "not-a-cursor"})
+    assert response.status_code == 400
@@ -52,7 +52,11 @@ async def test_save_message_success(chat_history_service, db_session):
         # Mock DB operations on the session attached to the service
         with patch.object(chat_history_service.db, 'execute', new_callable=AsyncMock) as mock_execute, \
              patch.object(chat_history_service.db, 'commit', new_callable=AsyncMock) as mock_commit, \
-             patch("app.chat_history.services.chat_history_service.cache_delete", new_callable=AsyncMock) as mock_cache_del:
+             patch("app.chat_history.services.chat_history_service.cache_delete", new_callable=AsyncMock) as mock_cache_del, \
+             patch("app.chat_history.services.chat_history_service.append_to_latest_page", new_callable=AsyncMock) as mock_append:
+            
+            mock_execute.return_value = MagicMock()
+            mock_execute.return_value.first.return_value = MagicMock(id=10, created_at=datetime(2024, 1, 1))
             
             result = await chat_history_service.save_message(
                 user_id, character_name, session_id, message_type, content
@@ -63,54 +67,95 @@ async def test_save_message_success(chat_history_service, db_session):
             assert mock_commit.called
             # Verify cache invalidation called
             assert mock_cache_del.call_count >= 1
+            # Новое сообщение дописывается в кэш последней страницы
+            appended = mock_append.call_args[0][1]
+            assert appended["id"] == 10
+            assert appended["content"] == content
+
+def _history_rows(ids):
+    return [
+        MagicMock(
+            id=message_id, message_type="user", message_content=f"msg {message_id}",
+            image_url=None, image_filename=None, created_at=datetime(2024, 1, 1)
+        )
+        for message_id in ids
+    ]
 
 @pytest.mark.asyncio
-async def test_get_chat_history_from_cache(chat_history_service):
-    """Test get_chat_history returns cached data if available."""
-    user_id = 1
-    character_name = "TestChar"
-    session_id = "session123"
-    
-    cached_data = [{"content": "Cached Hello", "type": "user"}]
+async def test_get_chat_history_page_from_cache(chat_history_service):
+    """Test the newest page is served from the cached list without DB queries."""
+    cached = [{"id": i, "type": "user", "content": f"msg {i}"} for i in (1, 2, 3)]
     
-    with patch("app.chat_history.services.chat_history_service.cache_get", new_callable=AsyncMock) as mock_cache_get, \
-         patch.object(chat_history_service, 'can_save_history', new_callable=AsyncMock) as mock_can_save:
+    with patch("app.chat_history.services.chat_history_service._read_latest_page", new_callable=AsyncMock) as mock_read, \
+         patch.object(chat_history_service, 'can_save_history', new_callable=AsyncMock) as mock_can_save, \
+         patch.object(chat_history_service.db, 'execute', new_callable=AsyncMock) as mock_db_exec:
         
         mock_can_save.return_value = True
-        mock_cache_get.return_value = cached_data
+        mock_read.return_value = cached
         
-        result = await chat_history_service.get_chat_history(user_id, character_name, session_id)
-        assert result == cached_data
+        page = await chat_history_service.get_chat_history_page(1, "TestChar", "session123", limit=2)
         
+        assert [m["id"] for m in page["messages"]] == [2, 3]
+        assert page["has_more_before"] is True
+        assert page["has_more_after"] is False
+        assert not mock_db_exec.called
+
+@pytest.mark.asyncio
+async def test_get_chat_history_page_db_fallback(chat_history_service):
+    """Test cache miss loads the newest page in one query and refills the cache."""
+    with patch("app.chat_history.services.chat_history_service._read_latest_page", new_callable=AsyncMock) as mock_read, \
+         patch("app.chat_history.services.chat_history_service._write_latest_page", new_callable=AsyncMock) as mock_write, \
+         patch.object(chat_history_service, 'can_save_history', new_callable=AsyncMock) as mock_can_save, \
+         patch.object(chat_history_service.db, 'execute', new_callable=AsyncMock) as mock_db_exec:
+        
+        mock_can_save.return_value = True
+        mock_read.return_value = None
+        # Запрос возвращает сообщения от новых к старым
+        mock_db_exec.return_value = MagicMock()
+        mock_db_exec.return_value.scalars.return_value.all.return_value = _history_rows([5, 4, 3])
+        
+        page = await chat_history_service.get_chat_history_page(1, "TestChar", "session123", limit=2)
+        
+        assert [m["id"] for m in page["messages"]] == [4, 5]
+        assert page["has_more_before"] is True
+        assert mock_db_exec.call_count == 1
+        assert [m["id"] for m in mock_write.call_args[0][1]] == [3, 4, 5]
+
+@pytest.mark.asyncio
+async def test_get_chat_history_page_before_cursor(chat_history_service):
+    """Test older pages are read by cursor and never cached."""
+    with patch("app.chat_history.services.chat_history_service._write_latest_page", new_callable=AsyncMock) as mock_write, \
+         patch.object(chat_history_service, 'can_save_history', new_callable=AsyncMock) as mock_can_save, \
+         patch.object(chat_history_service.db, 'execute', new_callable=AsyncMock) as mock_db_exec:
+        
+        mock_can_save.return_value = True
+        mock_db_exec.return_value = MagicMock()
+        mock_db_exec.return_value.scalars.return_value.all.return_value = _history_rows([9, 8])
+        
+        page = await chat_history_service.get_chat_history_page(1, "TestChar", "session123", before=10, limit=2)
+        
+        assert [m["id"] for m in page["messages"]] == [8, 9]
+        assert page["has_more_before"] is False
+        assert page["has_more_after"] is True
+        assert not mock_write.called
+
 @pytest.mark.asyncio
 async def test_get_chat_history_db_fallback(chat_history_service, db_session):
-    """Test get_chat_history fetches from DB if cache miss."""
+    """Test get_chat_history returns the whole history from DB."""
     user_id = 1
     character_name = "TestChar"
     session_id = "session123"
     
-    with patch("app.chat_history.services.chat_history_service.cache_get", new_callable=AsyncMock) as mock_cache_get, \
-         patch("app.chat_history.services.chat_history_service.cache_set", new_callable=AsyncMock) as mock_cache_set, \
-         patch.object(chat_history_service, 'can_save_history', new_callable=AsyncMock) as mock_can_save:
+    with patch.object(chat_history_service, 'can_save_history', new_callable=AsyncMock) as mock_can_save, \
+         patch.object(chat_history_service.db, 'execute', new_callable=AsyncMock) as mock_db_exec:
         
         mock_can_save.return_value = True
-        mock_cache_get.return_value = None
+        mock_db_exec.return_value = MagicMock()
+        mock_db_exec.return_value.scalars.return_value.all.return_value = _history_rows([1, 2])
+        
+        result = await chat_history_service.get_chat_history(user_id, character_name, session_id)
         
-        # We need to mock DB execution result
-        # This is hard with raw SQL or complex selects without inserting data.
-        # For unit test, we can mock db_session.execute
-        
-        mock_result = MagicMock()
-        mock_result.scalars.return_value.all.return_value = [] # Empty history
-        
-        # We have to patch the session attached to service
-        with patch.object(chat_history_service.db, 'execute', new_callable=AsyncMock) as mock_db_exec:
-             mock_db_exec.return_value = mock_result
-             
-             result = await chat_history_service.get_chat_history(user_id, character_name, session_id)
-             
-             assert isinstance(result, list)
-             assert mock_cache_set.called
+        assert [m["id"] for m in result] == [1, 2]
 
 @pytest.mark.asyncio
 async def test_clear_all_chat_history_success(chat_history_service, db_session):
@@ -165,7 +210,7 @@ async def test_get_user_characters_with_history_cache_hit(chat_history_service):
     user_id = 1
     cached_data = [{"id": 1, "name": "Char1"}]
     
-    with patch("app.utils.redis_cache.cache_get", new_callable=AsyncMock) as mock_cache_get:
+    with patch("app.chat_history.services.chat_history_service.cache_get", new_callable=AsyncMock) as mock_cache_get:
         mock_cache_get.return_value = cached_data
         
         result = await chat_history_service.get_user_characters_with_history(user_id)
@@ -176,7 +221,7 @@ async def test_get_user_characters_with_history_no_subscription(chat_history_ser
     """Test returns empty list if no subscription."""
     user_id = 1
     
-    with patch("app.utils.redis_cache.cache_get", new_callable=AsyncMock) as mock_cache_get, \
+    with patch("app.chat_history.services.chat_history_service.cache_get", new_callable=AsyncMock) as mock_cache_get, \
          patch.object(chat_history_service.subscription_service, 'get_user_subscription', new_callable=AsyncMock) as mock_get_sub:
         
         mock_cache_get.return_value = None
@@ -187,82 +232,51 @@ async def test_get_user_characters_with_history_no_subscription(chat_history_ser
 
 @pytest.mark.asyncio
 async def test_get_user_characters_with_history_db_success(chat_history_service):
-    """Test get_user_characters_with_history fetches from DB and merges data."""
+    """Test get_user_characters_with_history reads the user_conversations summary."""
     user_id = 1
     
-    with patch("app.utils.redis_cache.cache_get", new_callable=AsyncMock) as mock_cache_get, \
-         patch("app.utils.redis_cache.cache_set", new_callable=AsyncMock) as mock_cache_set, \
-         patch.object(chat_history_service.subscription_service, 'get_user_subscription', new_callable=AsyncMock) as mock_get_sub, \
+    with patch("app.chat_history.services.chat_history_service.cache_get", new_callable=AsyncMock) as mock_cache_get, \
+         patch("app.chat_history.services.chat_history_service.cache_set", new_callable=AsyncMock) as mock_cache_set, \
          patch.object(chat_history_service.db, 'execute', new_callable=AsyncMock) as mock_execute:
         
         mock_cache_get.return_value = None
-        
-        mock_sub = MagicMock()
-        mock_sub.subscription_type.value = "standard"
-        mock_sub.is_active = True
-        mock_get_sub.return_value = mock_sub
-        
-        from datetime import datetime
         now = datetime.now()
         
-        # 1. ChatSession check (test_sessions)
+        def conversation(character_id, name, image_url):
+            row = MagicMock()
+            row.character_id = character_id
+            row.last_message_at = now
+            row.last_message_preview = "Hello"
+            row.message_count = 5
+            row.last_image_url = image_url
+            row.name = name
+            row.display_name = None
+            row.is_nsfw = False
+            return row
+        
+        # 1. Сводка переписок, 2. главные фото для переписок без изображений
         res1 = MagicMock()
-        res1.scalars.return_value.all.return_value = []
-        
-        # 2. Users.username fetch
+        res1.all.return_value = [
+            conversation(1, "Char1", "http://example.com/img.png"),
+            conversation(2, "Char2", None),
+        ]
+        photo = MagicMock()
+        photo.character_id = 2
+        photo.photo_url = "http://example.com/main.png"
+        photo.media_key = None
+        photo.media_variants = None
         res2 = MagicMock()
-        res2.first.return_value = ("testuser",)
-        
-        # 3. Main query (Characters from ChatSession)
-        res3 = MagicMock()
-        res3.fetchall.return_value = [("Char1", 1, now, 5, now)]
+        res2.all.return_value = [photo]
+        mock_execute.side_effect = [res1, res2]
         
-        # 4. Diagnostic total messages
-        res4 = MagicMock()
-        res4.scalar.return_value = 5
-        
-        # 5. Diagnostic image gen count
-        res5 = MagicMock()
-        res5.scalar.return_value = 0
-        
-        # 6. Sample messages loop (for Char1)
-        res6 = MagicMock()
-        res6.fetchall.return_value = [("Hello", "user", now)]
-        
-        # 7. Real message check (for Char1)
-        res7 = MagicMock()
-        res7.scalar.return_value = 5
-        
-        # 8. ChatHistory fetch
-        res8 = MagicMock()
-        res8.fetchall.return_value = []
-        
-        # 9. ChatHistory image diagnostic fetch
-        res9 = MagicMock()
-        res9.fetchall.return_value = []
-
-        # 10. UserGallery fetch
-        res10 = MagicMock()
-        res10.fetchall.return_value = []
-        
-        # 11. ChatSession ids for assistant images
-        res11 = MagicMock()
-        res11.fetchall.return_value = []
-        
-        # 12. ChatHistory image result (history_image_result)
-        res12 = MagicMock()
-        res12.fetchall.return_value = []
+        result = await chat_history_service.get_user_characters_with_history(user_id)
         
-        mock_execute.side_effect = [res1, res2, res3, res4, res5, res6, res7, res8, res9, res10, res11, res12]
-
-        # Also mock _get_last_image_url
-        with patch.object(chat_history_service, '_get_last_image_url', new_callable=AsyncMock) as mock_get_img:
-            mock_get_img.return_value = "http://example.com/img.png"
-            
-            result = await chat_history_service.get_user_characters_with_history(user_id)
-            
-            assert len(result) == 1
-            assert result[0]["name"] == "Char1"
-            assert result[0]["last_image_url"] == "http://example.com/img.png"
-            assert mock_cache_set.called
+        assert [item["name"] for item in result] == ["Char1", "Char2"]
+        assert result[0]["last_image_url"] == "http://example.com/img.png"
+        assert result[0]["display_name"] == "Char1"
+        assert result[0]["last_message"] == "Hello"
+        assert result[1]["last_image_url"] == "http://example.com/main.png"
+        assert result[1]["photos"] == ["http://example.com/main.png"]
+        assert mock_execute.call_count == 2
+        assert mock_cache_set.called
 
@@ -0,0 +1,93 @@
+"""
+Тесты для сброса кэша последней страницы истории при записях мимо save_message.
+"""
+import asyncio
+import uuid
+
+import pytest
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.chat_history.services import chat_history_service
+from app.models.chat_history import ChatHistory
+from app.models.user import Users
+from app.utils import redis_cache
+from app.utils.prompt_saver import save_prompt_to_history
+
+
+@pytest.fixture
+def invalidated(monkeypatch):
+    calls = []
+    monkeypatch.setattr(
+        chat_history_service, "request_latest_page_invalidation",
+        lambda user_id, character_name, session_id: calls.append((user_id, character_name, session_id)),
+    )
+    return calls
+
+
+@pytest.fixture
+async def user_id(db_session: AsyncSession):
+    user = Users(email=f"history_{uuid.uuid4().hex[:8]}@test.com", password_hash="x")
+    db_session.add(user)
+    await db_session.commit()
+    return user.id
+
+
+@pytest.mark.db
+@pytest.mark.asyncio
+async def test_orm_insert_invalidates_after_commit(db_session: AsyncSession, user_id, invalidated):
+    """Тест: вставка через ORM сбрасывает страницу после коммита, откат - не сбрасывает."""
+    db_session.add(ChatHistory(
+        user_id=user_id, character_name="Anna", session_id="s1", message_type="user", message_content="a"
+    ))
+    await db_session.flush()
+    await db_session.rollback()
+    assert invalidated == []
+
+    db_session.add_all([
+        ChatHistory(user_id=user_id, character_name="Anna", session_id="s1", message_type="user", message_content="b"),
+        ChatHistory(user_id=user_id, character_name="Anna", session_id="s1", message_type="assistant", message_content="c"),
+    ])
+    await db_session.flush()
+    assert invalidated == []
+
+    await db_session.commit()
+    assert invalidated == [(user_id, "Anna", "s1")]
+
+
+@pytest.mark.db
+@pytest.mark.asyncio
+async def test_prompt_saver_update_invalidates_old_and_new_pages(db_session: AsyncSession, user_id, invalidated):
+    """Тест: обновление заглушки промптом сбрасывает страницы и старого, и нового персонажа."""
+    db_session.add(ChatHistory(
+        user_id=user_id, character_name="Old", session_id="task_42", message_type="user", message_content="..."
+    ))
+    await db_session.commit()
+    invalidated.clear()
+
+    await save_prompt_to_history(
+        db_session, user_id, "New", "prompt", image_url="https://example.com/a.webp?x=1", task_id="42"
+    )
+
+    assert set(invalidated) == {(user_id, "Old", "task_42"), (user_id, "New", "task_42")}
+
+
+@pytest.mark.unit
+@pytest.mark.redis
+@pytest.mark.asyncio
+async def test_request_invalidation_deletes_key(fake_redis, monkeypatch):
+    """Тест: синхронная точка входа удаляет ключ последней страницы в фоне."""
+    async def _get_client():
+        return fake_redis
+
+    monkeypatch.setattr(redis_cache, "get_redis_client", _get_client)
+    key = redis_cache.key_chat_history(1, "Anna", "s1")
+    await fake_redis.rpush(key, "{}")
+
+    chat_history_service.request_latest_page_invalidation(1, "Anna", "s1")
+    chat_history_service.request_latest_page_invalidation(None, "Anna", "s1")
+    for _ in range(50):
+        if not await fake_redis.exists(key):
+            break
+        await asyncio.sleep(0.01)
+
+    assert not await fake_redis.exists(key)
@@ -0,0 +1,104 @@
+"""
+Тесты для триггеров сводки user_conversations.
+"""
+import uuid
+from datetime import datetime, timedelta, timezone
+
+import pytest
+from sqlalchemy import select, text, update
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.chat_bot.models.models import CharacterDB
+from app.models.chat_history import ChatHistory
+from app.models.image_generation_history import ImageGenerationHistory
+from app.models.user import Users
+from app.models.user_conversation import UserConversation
+
+
+@pytest.fixture
+async def conversation(db_session: AsyncSession):
+    """Пользователь и персонаж; возвращает (user_id, character_key)."""
+    tag = uuid.uuid4().hex[:8]
+    user = Users(email=f"conv_{tag}@test.com", password_hash="x")
+    character = CharacterDB(name=f"Conv_{tag}", display_name="C", description="d")
+    db_session.add_all([user, character])
+    await db_session.commit()
+    return user.id, character.name
+
+
+async def _summary(db_session: AsyncSession, user_id: int, name: str) -> UserConversation:
+    result = await db_session.execute(
+        select(UserConversation)
+        .where(UserConversation.user_id == user_id, UserConversation.character_key == name.lower())
+        .execution_options(populate_existing=True)
+    )
+    return result.scalar_one_or_none()
+
+
+@pytest.mark.db
+@pytest.mark.asyncio
+async def test_pending_image_replaced_by_real_url(db_session: AsyncSession, conversation):
+    """Тест: pending:-маркер не становится картинкой, реальный URL после UPDATE - становится."""
+    user_id, name = conversation
+    generation = ImageGenerationHistory(
+        user_id=user_id, character_name=name, image_url="pending:task-1", task_id="task-1"
+    )
+    db_session.add(generation)
+    await db_session.commit()
+
+    summary = await _summary(db_session, user_id, name)
+    assert summary is not None
+    assert summary.last_image_url is None
+    assert summary.message_count == 0
+
+    await db_session.execute(
+        update(ImageGenerationHistory)
+        .where(ImageGenerationHistory.id == generation.id)
+        .values(image_url="https://example.com/ready.webp")
+    )
+    await db_session.commit()
+
+    assert (await _summary(db_session, user_id, name)).last_image_url == "https://example.com/ready.webp"
+
+
+@pytest.mark.db
+@pytest.mark.asyncio
+async def test_chat_history_image_url_update(db_session: AsyncSession, conversation):
+    """Тест: URL, проставленный в сообщение истории позже, попадает в сводку без изменения счетчика."""
+    user_id, name = conversation
+    now = datetime.now(timezone.utc)
+    message = ChatHistory(
+        user_id=user_id, character_name=name, session_id="s1", message_type="assistant",
+        message_content="photo", image_url="pending:task-2", created_at=now
+    )
+    db_session.add_all([
+        ChatHistory(
+            user_id=user_id, character_name=name, session_id="s1", message_type="user",
+            message_content="hi", created_at=now - timedelta(minutes=1)
+        ),
+        message,
+    ])
+    await db_session.commit()
+
+    summary = await _summary(db_session, user_id, name)
+    assert summary.message_count == 2
+    assert summary.last_image_url is None
+    assert summary.last_message_preview == "photo"
+
+    message.image_url = "https://example.com/chat.webp"
+    await db_session.commit()
+
+    summary = await _summary(db_session, user_id, name)
+    assert summary.message_count == 2
+    assert summary.last_image_url == "https://example.com/chat.webp"
+
+
+@pytest.mark.db
+@pytest.mark.asyncio
+async def test_character_name_expression_index(db_session: AsyncSession):
+    """Тест: индекс по lower(trim(name)) создается вместе с таблицей characters."""
+    result = await db_session.execute(text(
+        "SELECT indexdef FROM pg_indexes WHERE tablename = 'characters' AND indexname = 'ix_characters_name_key'"
+    ))
+
+    assert "lower(TRIM(BOTH FROM name))" in result.scalar_one()
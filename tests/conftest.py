@@ -10,6 +10,7 @@ import asyncio
 from httpx import AsyncClient
 from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine, async_sessionmaker
 from sqlalchemy.pool import NullPool
+from sqlalchemy import text
 from fakeredis import aioredis as fakeredis
 import redis.asyncio as redis
 
@@ -18,7 +19,7 @@ sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')
 
 from app.main import app
 from app.database.db import Base
-from app.database.db_depends import get_db
+from app.database.db_depends import get_db, get_read_db
 from app.models.subscription import UserSubscription, SubscriptionType, SubscriptionStatus
 from app.auth.dependencies import create_jwt_token
 from datetime import timedelta
@@ -50,6 +51,8 @@ async def test_engine():
     
     # Создаем все таблицы
     async with engine.begin() as conn:
+        # pg_trgm нужен поиску (операторы similarity и <%)
+        await conn.execute(text("CREATE EXTENSION IF NOT EXISTS pg_trgm"))
         await conn.run_sync(Base.metadata.drop_all)
         await conn.run_sync(Base.metadata.create_all)
     
@@ -84,6 +87,7 @@ async def client(db_session: AsyncSession) -> AsyncGenerator[AsyncClient, None]:
         yield db_session
     
     app.dependency_overrides[get_db] = override_get_db
+    app.dependency_overrides[get_read_db] = override_get_db
     
     from httpx import ASGITransport
     async with AsyncClient(transport=ASGITransport(app=app), base_url="http://test") as ac:
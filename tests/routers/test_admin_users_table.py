@@ -0,0 +1,148 @@
+"""
+Тесты для серверной сортировки и keyset-пагинации /admin/users-table.
+"""
+import uuid
+from datetime import datetime, timedelta, timezone
+
+import pytest
+from httpx import AsyncClient
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.api.admin_router import require_admin
+from app.main import app
+from app.models.chat_history import ChatHistory
+from app.models.image_generation_history import ImageGenerationHistory
+from app.models.user import Users
+from app.utils.pagination import encode_cursor
+
+URL = "/api/v1/admin/users-table"
+
+
+@pytest.fixture
+async def admin_client(client: AsyncClient, db_session: AsyncSession):
+    admin = Users(
+        email=f"admin_{uuid.uuid4().hex[:8]}@test.com",
+        password_hash="x",
+        is_admin=True,
+    )
+    app.dependency_overrides[require_admin] = lambda: admin
+    return client
+
+
+@pytest.fixture
+async def table_users(db_session: AsyncSession):
+    """
+    Четыре пользователя с разными значениями всех сортируемых колонок.
+    Возвращает список ID в порядке возрастания created_at.
+    """
+    base = datetime(2020, 1, 1)
+    tag = uuid.uuid4().hex[:8]
+    # (сдвиг created_at в днях, сообщений, фото, часов с последнего сообщения или None)
+    specs = [(1, 30, 2, 5), (2, 10, 0, None), (3, 20, 3, 1), (4, 10, 1, 10)]
+    users = []
+    for offset, messages, _, _ in specs:
+        user = Users(
+            email=f"table_{tag}_{offset}@test.com",
+            password_hash="x",
+            total_messages_sent=messages,
+            created_at=base + timedelta(days=offset),
+        )
+        db_session.add(user)
+        users.append(user)
+    await db_session.flush()
+
+    now = datetime.now(timezone.utc)
+    for user, (_, _, photos, hours_ago) in zip(users, specs):
+        for _ in range(photos):
+            db_session.add(ImageGenerationHistory(
+                user_id=user.id, character_name="Anna", image_url="https://example.com/x.webp"
+            ))
+        if hours_ago is not None:
+            db_session.add(ChatHistory(
+                user_id=user.id, character_name="Anna", session_id="s", message_type="user",
+                message_content="hi", created_at=now - timedelta(hours=hours_ago)
+            ))
+    await db_session.commit()
+    return [user.id for user in users]
+
+
+async def _scan(client: AsyncClient, sort: str, order: str, limit: int = 3):
+    """Проходит все страницы по next_cursor и возвращает строки таблицы."""
+    rows, cursor = [], None
+    while True:
+        params = {"sort": sort, "order": order, "limit": limit}
+        if cursor:
+            params["cursor"] = cursor
+        response = await client.get(URL, params=params)
+        assert response.status_code == 200, response.text
+        data = response.json()
+        assert len(data["users"]) <= limit
+        rows.extend(data["users"])
+        cursor = data["next_cursor"]
+        if not cursor:
+            return rows
+
+
+@pytest.mark.db
+@pytest.mark.asyncio
+@pytest.mark.parametrize("sort, order, expected", [
+    ("created_at", "asc", [0, 1, 2, 3]),
+    ("created_at", "desc", [3, 2, 1, 0]),
+    # Равные значения упорядочиваются по id
+    ("messages_count", "desc", [0, 2, 3, 1]),
+    ("messages_count", "asc", [1, 3, 2, 0]),
+    ("photos_count", "desc", [2, 0, 3, 1]),
+    # Пользователь без сообщений сортируется как самый давний вход
+    ("last_login", "desc", [2, 0, 3, 1]),
+    ("last_login", "asc", [1, 3, 0, 2]),
+])
+async def test_sorting_across_pages(admin_client, table_users, sort, order, expected):
+    """Тест: keyset-пагинация по любой колонке дает полный упорядоченный список без повторов."""
+    rows = await _scan(admin_client, sort, order)
+    ids = [row["id"] for row in rows]
+
+    assert len(ids) == len(set(ids))
+    assert [user_id for user_id in ids if user_id in table_users] == [table_users[i] for i in expected]
+
+
+@pytest.mark.db
+@pytest.mark.asyncio
+async def test_row_statistics(admin_client, table_users):
+    """Тест: строки содержат сгруппированную статистику пользователя."""
+    rows = {row["id"]: row for row in await _scan(admin_client, "id", "asc", limit=500)}
+    first, second = rows[table_users[0]], rows[table_users[1]]
+
+    assert first["messages_count"] == 30
+    assert first["photos_count"] == 2
+    assert first["last_login"] is not None
+    assert first["subscription_type"] == "Нет подписки"
+    assert second["photos_count"] == 0
+    assert second["last_login"] is None
+    assert second["purchased_booster"] is False
+
+
+@pytest.mark.db
+@pytest.mark.asyncio
+async def test_skip_without_cursor(admin_client, table_users):
+    """Тест: skip работает, пока курсор не передан."""
+    full = await admin_client.get(URL, params={"sort": "id", "order": "asc", "limit": 500})
+    shifted = await admin_client.get(URL, params={"sort": "id", "order": "asc", "limit": 500, "skip": 2})
+
+    assert [row["id"] for row in shifted.json()["users"]] == [row["id"] for row in full.json()["users"]][2:]
+    assert full.json()["total"] == shifted.json()["total"] >= len(table_users)
+
+
+@pytest.mark.db
+@pytest.mark.asyncio
+@pytest.mark.parametrize("params", [
+    {"sort": "email"},
+    {"order": "sideways"},
+    {"cursor": "not-a-cursor"},
+    {"sort": "id", "cursor": encode_cursor({"sort": "created_at", "k": "2020-01-01T00:00:00", "id": 1})},
+    {"sort": "last_login", "cursor": encode_cursor({"sort": "last_login", "k": 5, "id": 1})},
+])
+async def test_invalid_params_rejected(admin_client, params):
+    """Тест: неизвестная колонка, порядок и чужой или поврежденный курсор отклоняются."""
+    response = await admin_client.get(URL, params=params)
+
+    assert response.status_code in (400, 422)
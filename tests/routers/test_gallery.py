@@ -2,7 +2,7 @@ import pytest
 from httpx import AsyncClient
 from unittest.mock import AsyncMock, patch, MagicMock
 from app.main import app
-from app.database.db_depends import get_db
+from app.database.db_depends import get_db, get_read_db
 from app.auth.dependencies import get_current_user, get_current_user_optional
 from app.models.user import Users
 from app.models.subscription import UserSubscription, SubscriptionType, SubscriptionStatus
@@ -204,6 +204,7 @@ async def test_list_paid_gallery_access_denied_for_free(mock_db, mock_user):
     async def override_get_current_user():
         return mock_user
     app.dependency_overrides[get_db] = override_get_db
+    app.dependency_overrides[get_read_db] = override_get_db
     app.dependency_overrides[get_current_user] = override_get_current_user
     
     char = MagicMock(spec=CharacterDB)
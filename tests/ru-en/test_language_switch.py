@@ -123,19 +123,17 @@ class TestLanguageSwitch:
         # Проверяем og:image
         assert "https://example.com/photo.jpg" in response.text
 
-    async def test_sitemap_contains_both_languages(self, client: AsyncClient):
+    async def test_sitemap_contains_both_languages(self, client: AsyncClient, monkeypatch):
         """Проверка, что sitemap содержит и RU и EN ссылки."""
-        # Для простоты мокаем пустой список персонажей, если не хотим глубоко лезть в БД
-        mock_session = AsyncMock()
-        mock_result = Mock()
-        mock_result.all.return_value = [] # Нет персонажей
-        mock_result.scalars.return_value.all.return_value = [] # Нет тегов
-        mock_session.execute.return_value = mock_result
-            
-        async def override_get_db():
-            yield mock_session
-        
-        app.dependency_overrides[get_db] = override_get_db
+        from app.services import sitemap_service
+
+        # sitemap собирается в своей сессии (не через get_db): мокаем пустые списки
+        # персонажей и тегов и сбрасываем копию сборки в памяти процесса
+        monkeypatch.setattr(sitemap_service, "_load_sources", AsyncMock(return_value=([], [])))
+        monkeypatch.setattr(sitemap_service, "_local_files", {})
+        monkeypatch.setattr(sitemap_service, "_local_build_id", None)
+        monkeypatch.setattr(sitemap_service, "cache_get_json", AsyncMock(return_value=None))
+        monkeypatch.setattr(sitemap_service, "cache_set_json", AsyncMock(return_value=True))
         
         response = await client.get("/sitemap.xml")
         assert response.status_code == 200
@@ -0,0 +1,83 @@
+"""
+Тесты для конвейера вариантов изображений (thumb/card/full).
+"""
+import json
+import pytest
+from io import BytesIO
+
+from PIL import Image
+
+from app.services.image_pipeline import (
+    build_manifest,
+    encode_variants,
+    manifest_object_key,
+    variant_object_key,
+)
+
+
+def _png(width: int, height: int, mode: str = "RGB") -> bytes:
+    buffer = BytesIO()
+    Image.new(mode, (width, height)).save(buffer, format="PNG")
+    return buffer.getvalue()
+
+
+@pytest.mark.unit
+def test_encode_variants_sizes():
+    """Тест: варианты уменьшаются до своей максимальной стороны с сохранением пропорций."""
+    variants = {v.name: v for v in encode_variants(_png(2000, 1000))}
+
+    assert (variants["full"].width, variants["full"].height) == (2000, 1000)
+    assert (variants["card"].width, variants["card"].height) == (768, 384)
+    assert (variants["thumb"].width, variants["thumb"].height) == (320, 160)
+    for variant in variants.values():
+        decoded = Image.open(BytesIO(variant.data))
+        assert decoded.format == "WEBP"
+        assert decoded.size == (variant.width, variant.height)
+
+
+@pytest.mark.unit
+def test_encode_variants_does_not_upscale():
+    """Тест: маленькое изображение не увеличивается, прозрачность заменяется белым фоном."""
+    variants = encode_variants(_png(200, 100, mode="RGBA"), variants=("thumb", "card"))
+
+    assert [(v.name, v.width, v.height) for v in variants] == [("card", 200, 100), ("thumb", 200, 100)]
+    assert Image.open(BytesIO(variants[0].data)).mode == "RGB"
+
+
+@pytest.mark.unit
+def test_encode_variants_every_format():
+    """Тест: каждый вариант кодируется во все запрошенные форматы."""
+    variants = encode_variants(_png(400, 400), variants=("thumb",), formats=("webp", "webp"), effort="fast")
+
+    assert [(v.name, v.format, v.content_type) for v in variants] == [
+        ("thumb", "webp", "image/webp"),
+        ("thumb", "webp", "image/webp"),
+    ]
+
+
+@pytest.mark.unit
+@pytest.mark.parametrize("object_key, variant, fmt, expected", [
+    ("generated/abc.webp", "full", "webp", "generated/abc.webp"),
+    ("generated/abc.png", "full", "webp", "generated/abc.webp"),
+    ("generated/abc.webp", "thumb", "avif", "generated/abc_thumb.avif"),
+    ("generated/abc.webp", "full", "avif", "generated/abc_full.avif"),
+    ("generated/abc", "card", "webp", "generated/abc_card.webp"),
+    ("dir.v2/abc", "thumb", "webp", "dir.v2/abc_thumb.webp"),
+])
+def test_variant_object_key(object_key, variant, fmt, expected):
+    """Тест: full WebP хранится под исходным ключом, остальные варианты - рядом с суффиксом."""
+    assert variant_object_key(object_key, variant, fmt) == expected
+
+
+@pytest.mark.unit
+def test_build_manifest():
+    """Тест: манифест ссылается на ключи вариантов и их размеры."""
+    variants = encode_variants(_png(1000, 500), variants=("full", "thumb"))
+
+    manifest = json.loads(build_manifest("generated/abc.webp", variants))
+
+    assert manifest_object_key("generated/abc.webp") == "generated/abc.manifest.json"
+    assert manifest["key"] == "generated/abc.webp"
+    assert manifest["variants"]["thumb"]["webp"]["key"] == "generated/abc_thumb.webp"
+    assert manifest["variants"]["thumb"]["webp"]["width"] == 320
+    assert manifest["variants"]["full"]["webp"]["key"] == "generated/abc.webp"
@@ -1,3 +1,4 @@
+import asyncio
 import pytest
 from unittest.mock import AsyncMock, patch, MagicMock, PropertyMock
 from datetime import datetime, timedelta
@@ -269,3 +270,74 @@ async def test_use_photo_generation_success(profit_service):
         assert mock_sub.use_photo_generation.called
         assert profit_service.db.commit.called
         assert mock_emit.called
+
+
+@pytest.mark.asyncio
+async def test_profile_queue_keeps_latest_snapshots():
+    """Bounded profile queue drops the oldest snapshots instead of growing."""
+    from app.services import profit_activate
+
+    queue = await profit_activate.register_profile_listener(9001)
+    try:
+        for i in range(10):
+            await profit_activate._publish_profile_update(9001, {"seq": i})
+
+        assert queue.qsize() == profit_activate.PROFILE_QUEUE_MAXSIZE
+        received = [queue.get_nowait()["seq"] for _ in range(queue.qsize())]
+        assert received == list(range(10 - profit_activate.PROFILE_QUEUE_MAXSIZE, 10))
+    finally:
+        await profit_activate.unregister_profile_listener(9001, queue)
+        await profit_activate.stop_profile_fanout()
+
+
+@pytest.mark.asyncio
+async def test_emit_profile_update_debounces_burst():
+    """A burst of events without Redis produces a single snapshot."""
+    from app.services import profit_activate
+
+    snapshot = AsyncMock(return_value={"user": {"id": 9002}})
+    with patch("app.utils.redis_cache.get_redis_client", new_callable=AsyncMock, return_value=None), \
+         patch.object(profit_activate, "_fanout_listener", new_callable=AsyncMock), \
+         patch.object(profit_activate, "collect_profile_snapshot", snapshot), \
+         patch.object(profit_activate, "PROFILE_DEBOUNCE_SECONDS", 0.01):
+        queue = await profit_activate.register_profile_listener(9002)
+        try:
+            for _ in range(20):
+                await profit_activate.emit_profile_update(9002)
+            payload = await asyncio.wait_for(queue.get(), timeout=1.0)
+
+            assert payload == {"user": {"id": 9002}}
+            assert snapshot.await_count == 1
+        finally:
+            await profit_activate.unregister_profile_listener(9002, queue)
+            await profit_activate.stop_profile_fanout()
+
+
+@pytest.mark.db
+@pytest.mark.asyncio
+async def test_emit_profile_update_waits_for_commit(test_engine):
+    """An update emitted before commit is published only after the commit; a rollback drops it."""
+    from sqlalchemy import text
+    from sqlalchemy.ext.asyncio import async_sessionmaker
+    from app.services import profit_activate
+
+    write = text("UPDATE users SET username = username WHERE id = -1")
+    with patch.object(profit_activate, "_publish_profile_event", new_callable=AsyncMock) as publish:
+        async with async_sessionmaker(test_engine)() as db:
+            await db.execute(write)
+            await profit_activate.emit_profile_update(9003, db)
+            await asyncio.sleep(0)
+            publish.assert_not_awaited()
+
+            await db.commit()
+            await asyncio.sleep(0)
+            publish.assert_awaited_once_with(9003)
+
+            await profit_activate.emit_profile_update(9003, db)
+            assert publish.await_count == 2
+
+            await db.execute(write)
+            await profit_activate.emit_profile_update(9003, db)
+            await db.rollback()
+            await asyncio.sleep(0)
+            assert publish.await_count == 2
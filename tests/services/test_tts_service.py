@@ -0,0 +1,94 @@
+"""
+Тесты для пула Fish Audio в TTS сервисе: семафоры голосов и общий реестр голосовых моделей.
+"""
+import gc
+import pytest
+from types import SimpleNamespace
+from unittest.mock import MagicMock
+
+from app.services import tts_service
+from app.utils import redis_cache
+
+
+@pytest.fixture
+def voice_models_redis(fake_redis, monkeypatch):
+    """Включает голосовые модели и подменяет Redis на fakeredis."""
+    async def _get_client():
+        return fake_redis
+
+    monkeypatch.setattr(tts_service.settings, "FISH_AUDIO_USE_VOICE_MODELS", True)
+    monkeypatch.setattr(redis_cache, "get_redis_client", _get_client)
+    return fake_redis
+
+
+def _fish_client(model_id="model-1"):
+    client = MagicMock()
+    client.voices.create.return_value = SimpleNamespace(id=model_id)
+    return client
+
+
+@pytest.mark.unit
+def test_voice_semaphore_shared_while_referenced():
+    """Тест: пока семафор используется, запросы одного голоса получают тот же объект."""
+    first = tts_service._get_voice_semaphore("voice.mp3")
+    second = tts_service._get_voice_semaphore("voice.mp3")
+
+    assert first is second
+    assert tts_service._get_voice_semaphore("other.mp3") is not first
+
+
+@pytest.mark.unit
+def test_voice_semaphores_do_not_accumulate():
+    """Тест: семафоры уникальных загруженных голосов удаляются после использования."""
+    for i in range(100):
+        tts_service._get_voice_semaphore(f"user_voice_{i}.mp3")
+    gc.collect()
+
+    assert not any(key.startswith("user_voice_") for key in tts_service._voice_semaphores.keys())
+
+
+@pytest.mark.unit
+@pytest.mark.redis
+@pytest.mark.asyncio
+async def test_voice_model_registered_once_across_workers(voice_models_redis):
+    """Тест: модель регистрируется один раз, остальные воркеры берут reference_id из Redis."""
+    audio = b"voice-sample"
+    worker_a = _fish_client()
+    worker_b = _fish_client("model-2")
+
+    assert await tts_service._get_voice_model_id(worker_a, "voice.mp3", audio) == "model-1"
+    assert await tts_service._get_voice_model_id(worker_b, "voice.mp3", audio) == "model-1"
+
+    assert worker_a.voices.create.call_count == 1
+    worker_b.voices.create.assert_not_called()
+    lock_keys = [key async for key in voice_models_redis.scan_iter("voices:model:*:lock")]
+    assert lock_keys == []
+
+
+@pytest.mark.unit
+@pytest.mark.redis
+@pytest.mark.asyncio
+async def test_voice_model_skipped_while_other_worker_registers(voice_models_redis):
+    """Тест: при занятой блокировке используется instant cloning без повторной регистрации."""
+    audio = b"voice-sample"
+    model_key = redis_cache.key_voice_model(tts_service.hashlib.sha256(audio).hexdigest())
+    await voice_models_redis.set(f"{model_key}:lock", "1")
+    client = _fish_client()
+
+    assert await tts_service._get_voice_model_id(client, "voice.mp3", audio) is None
+    client.voices.create.assert_not_called()
+
+
+@pytest.mark.unit
+@pytest.mark.asyncio
+async def test_voice_model_not_registered_without_redis(monkeypatch):
+    """Тест: без Redis модели не регистрируются (иначе каждый воркер создавал бы свою)."""
+    async def _no_client():
+        return None
+
+    monkeypatch.setattr(tts_service.settings, "FISH_AUDIO_USE_VOICE_MODELS", True)
+    monkeypatch.setattr(redis_cache, "get_redis_client", _no_client)
+    client = _fish_client()
+
+    assert await tts_service._get_voice_model_id(client, "voice.mp3", b"voice-sample") is None
+    client.voices.create.assert_not_called()
@@ -0,0 +1,273 @@
+"""
+Тесты для YandexCloudStorageService: дедупликация загрузок (ключи по хэшу, счетчик ссылок, upload_many),
+удаление вариантов и заполнение media_variants.
+"""
+import hashlib
+import json
+import pytest
+from io import BytesIO
+from unittest.mock import MagicMock
+
+from PIL import Image
+
+from botocore.exceptions import ClientError
+
+from app.services import media_variants, yandex_storage
+from app.services.yandex_storage import YandexCloudStorageService
+from app.utils import redis_cache
+
+
+@pytest.fixture
+def storage(monkeypatch):
+    """Сервис с подмененным S3 клиентом: объекты хранятся в словаре."""
+    monkeypatch.setenv("YANDEX_BUCKET_NAME", "test-bucket")
+    monkeypatch.setenv("YANDEX_ACCESS_KEY", "test-access-key-0000")
+    monkeypatch.setenv("YANDEX_SECRET_KEY", "test-secret-key")
+    service = YandexCloudStorageService()
+
+    objects = {}
+
+    def upload_fileobj(fileobj, bucket, key, ExtraArgs=None, Config=None):
+        objects[key] = {"data": fileobj.read(), "extra_args": ExtraArgs}
+
+    def head_object(Bucket, Key):
+        if Key not in objects:
+            raise ClientError({"Error": {"Code": "404"}}, "HeadObject")
+        return {}
+
+    def delete_object(Bucket, Key):
+        objects.pop(Key, None)
+
+    def delete_objects(Bucket, Delete):
+        for item in Delete["Objects"]:
+            objects.pop(item["Key"], None)
+
+    service.s3_client = MagicMock()
+    service.s3_client.upload_fileobj.side_effect = upload_fileobj
+    service.s3_client.head_object.side_effect = head_object
+    service.s3_client.delete_object.side_effect = delete_object
+    service.s3_client.delete_objects.side_effect = delete_objects
+    service.objects = objects
+    return service
+
+
+@pytest.fixture
+def storage_redis(fake_redis, monkeypatch):
+    """Подменяет Redis счетчика ссылок на fakeredis."""
+    async def _get_client():
+        return fake_redis
+
+    monkeypatch.setattr(redis_cache, "get_redis_client", _get_client)
+    monkeypatch.setattr(redis_cache, "_redis_unavailable", False)
+    return fake_redis
+
+
+@pytest.mark.unit
+def test_content_addressed_key():
+    """Тест: ключ по хэшу лежит в папке исходного ключа и сохраняет расширение."""
+    content_hash = "3fa9" + "0" * 60
+
+    assert YandexCloudStorageService.content_addressed_key("user_avatars/1_abc.jpg", content_hash) == (
+        f"user_avatars/h/3f/{content_hash}.jpg"
+    )
+    assert YandexCloudStorageService.content_addressed_key("a/b/photo.png", content_hash, "webp") == (
+        f"a/b/h/3f/{content_hash}.webp"
+    )
+    assert YandexCloudStorageService.content_addressed_key("noext", content_hash) == f"h/3f/{content_hash}"
+    assert YandexCloudStorageService.is_content_addressed_key(f"user_avatars/h/3f/{content_hash}.jpg")
+    assert YandexCloudStorageService.is_content_addressed_key(f"h/3f/{content_hash}")
+    assert not YandexCloudStorageService.is_content_addressed_key("user_avatars/1_abc.jpg")
+
+
+@pytest.mark.unit
+@pytest.mark.redis
+@pytest.mark.asyncio
+async def test_duplicate_upload_is_skipped(storage, storage_redis):
+    """Тест: повторное содержимое не загружается, ссылки считаются, metadata не сохраняется."""
+    data = b"same-bytes"
+    key = f"docs/h/{hashlib.sha256(data).hexdigest()[:2]}/{hashlib.sha256(data).hexdigest()}.txt"
+
+    first = await storage.upload_file(data, "docs/1.txt", content_type="text/plain",
+                                      metadata={"user_id": "1"}, deduplicate=True)
+    second = await storage.upload_file(data, "docs/2.txt", content_type="text/plain",
+                                       metadata={"user_id": "2"}, deduplicate=True)
+
+    assert first == second
+    assert first.endswith(key)
+    assert storage.s3_client.upload_fileobj.call_count == 1
+    assert "Metadata" not in storage.objects[key]["extra_args"]
+    assert await storage_redis.get(redis_cache.key_storage_refs(key)) == "2"
+
+
+@pytest.mark.unit
+@pytest.mark.redis
+@pytest.mark.asyncio
+async def test_shared_object_deleted_with_last_reference(storage, storage_redis):
+    """Тест: общий объект удаляется только вместе с последней ссылкой."""
+    data = b"avatar"
+    digest = hashlib.sha256(data).hexdigest()
+    key = f"docs/h/{digest[:2]}/{digest}.txt"
+    for name in ("a", "b"):
+        await storage.upload_file(data, f"docs/{name}.txt", content_type="text/plain", deduplicate=True)
+
+    assert await storage.delete_file(key)
+    assert key in storage.objects
+
+    assert await storage.delete_file(key)
+    assert key not in storage.objects
+    assert not await storage_redis.exists(redis_cache.key_storage_refs(key))
+
+    # Новая загрузка того же содержимого снова создает объект
+    await storage.upload_file(data, "docs/c.txt", content_type="text/plain", deduplicate=True)
+    assert key in storage.objects
+
+
+@pytest.mark.unit
+@pytest.mark.asyncio
+async def test_dedup_falls_back_without_redis(storage, monkeypatch):
+    """Тест: без Redis загрузка идет под обычным ключом, общий объект не удаляется."""
+    async def _no_client():
+        return None
+
+    monkeypatch.setattr(redis_cache, "get_redis_client", _no_client)
+
+    url = await storage.upload_file(b"x", "docs/1.txt", content_type="text/plain", deduplicate=True)
+
+    assert url.endswith("docs/1.txt")
+    assert not await storage.delete_file("docs/h/2d/2d71.txt")
+    storage.s3_client.delete_object.assert_not_called()
+
+
+@pytest.mark.unit
+@pytest.mark.asyncio
+async def test_dedup_disabled_by_default(storage):
+    """Тест: по умолчанию файл загружается под исходным ключом с metadata."""
+    await storage.upload_file(b"x", "docs/1.txt", content_type="text/plain", metadata={"user_id": "1"})
+
+    assert storage.objects["docs/1.txt"]["extra_args"]["Metadata"] == {"user_id": "1"}
+
+
+@pytest.mark.unit
+@pytest.mark.asyncio
+async def test_upload_many_keeps_order_and_errors(storage):
+    """Тест: upload_many возвращает URL или исключение для каждого элемента в исходном порядке."""
+    uploads = [
+        {"file_data": b"1", "object_key": "album/1.txt", "content_type": "text/plain"},
+        {"file_data": "/nonexistent/file.txt", "object_key": "album/2.txt", "content_type": "text/plain"},
+        {"file_data": b"3", "object_key": "album/3.txt", "content_type": "text/plain"},
+    ]
+
+    results = await storage.upload_many(uploads, max_concurrency=2)
+
+    assert results[0].endswith("album/1.txt")
+    assert isinstance(results[1], Exception)
+    assert results[2].endswith("album/3.txt")
+    assert set(storage.objects) == {"album/1.txt", "album/3.txt"}
+
+
+@pytest.mark.unit
+@pytest.mark.asyncio
+async def test_delete_image_removes_variants_and_manifest(storage):
+    """Тест: удаление изображения удаляет варианты и манифест, соседние объекты остаются."""
+    buffer = BytesIO()
+    Image.new("RGB", (1200, 800)).save(buffer, format="PNG")
+    storage.objects["album/1b_thumb.webp"] = {"data": b"other", "extra_args": {}}
+
+    await storage.upload_file(buffer.getvalue(), "album/1.png", content_type="image/png")
+    assert "album/1.webp" in storage.objects
+    assert "album/1.manifest.json" in storage.objects
+    assert "album/1_thumb.webp" in storage.objects
+
+    assert await storage.delete_file("album/1.webp")
+    assert set(storage.objects) == {"album/1b_thumb.webp"}
+
+
+@pytest.mark.unit
+@pytest.mark.asyncio
+async def test_delete_non_image_skips_variants(storage):
+    """Тест: для не-изображений варианты не удаляются."""
+    await storage.upload_file(b"x", "docs/1.txt", content_type="text/plain")
+
+    assert await storage.delete_file("docs/1.txt")
+    storage.s3_client.delete_objects.assert_not_called()
+
+
+@pytest.mark.unit
+def test_cloud_save_task_uses_upload_many(storage, monkeypatch):
+    """Тест: фоновое сохранение загружает пакет через upload_many, битый base64 дает None."""
+    import base64
+    from app.services import yandex_storage
+    from app.tasks.generation_tasks import save_images_to_cloud_task
+
+    calls = []
+    upload_many = storage.upload_many
+
+    async def _upload_many(uploads, max_concurrency=None):
+        calls.append([item["object_key"] for item in uploads])
+        return await upload_many(uploads, max_concurrency)
+
+    monkeypatch.setattr(storage, "upload_many", _upload_many)
+    monkeypatch.setattr(yandex_storage, "get_yandex_storage_service", lambda: storage)
+    images = [base64.b64encode(b"first").decode(), "abc", base64.b64encode(b"third").decode()]
+
+    result = save_images_to_cloud_task.run(images, seed=7, character_name="Anna")
+
+    assert len(calls) == 1 and len(calls[0]) == 2
+    assert result["saved"] == 2
+    assert result["cloud_urls"][1] is None
+    assert result["cloud_urls"][0].endswith(calls[0][0])
+
+
+def _png_bytes() -> bytes:
+    buffer = BytesIO()
+    Image.new("RGB", (1200, 800)).save(buffer, format="PNG")
+    return buffer.getvalue()
+
+
+@pytest.mark.unit
+@pytest.mark.redis
+@pytest.mark.asyncio
+async def test_upload_remembers_variants(storage, storage_redis):
+    """Тест: загрузка изображения запоминает варианты, по которым заполняется media_variants."""
+    await storage.upload_file(_png_bytes(), "album/1.png", content_type="image/png")
+
+    assert await storage_redis.get(redis_cache.key_media_variants("album/1.webp")) == "card,full,thumb"
+    assert await media_variants.resolve_variants("album/1.webp") == "card,full,thumb"
+
+
+@pytest.mark.unit
+@pytest.mark.redis
+@pytest.mark.asyncio
+async def test_failed_variants_remember_full_only(storage, storage_redis):
+    """Тест: если варианты не загрузились, доступен только исходный объект."""
+    upload_fileobj = storage.s3_client.upload_fileobj.side_effect
+
+    def _fail_variants(fileobj, bucket, key, ExtraArgs=None, Config=None):
+        if key != "album/1.webp":
+            raise OSError("network")
+        upload_fileobj(fileobj, bucket, key, ExtraArgs, Config)
+
+    storage.s3_client.upload_fileobj.side_effect = _fail_variants
+
+    await storage.upload_file(_png_bytes(), "album/1.png", content_type="image/png")
+
+    assert await storage_redis.get(redis_cache.key_media_variants("album/1.webp")) == "full"
+
+
+@pytest.mark.unit
+@pytest.mark.redis
+@pytest.mark.asyncio
+async def test_resolve_variants_falls_back_to_manifest(storage, storage_redis, monkeypatch):
+    """Тест: без записи в Redis варианты читаются из манифеста, без манифеста - только full."""
+    manifest = {"variants": {"full": {}, "thumb": {}}}
+
+    def get_object(Bucket, Key):
+        if Key != "album/1.manifest.json":
+            raise KeyError(Key)
+        return {"Body": BytesIO(json.dumps(manifest).encode())}
+
+    storage.s3_client.get_object.side_effect = get_object
+    monkeypatch.setattr(yandex_storage, "get_yandex_storage_service", lambda: storage)
+
+    assert await media_variants.resolve_variants("album/1.webp") == "full,thumb"
+    assert await media_variants.resolve_variants("album/2.webp") == "full"
@@ -0,0 +1,62 @@
+"""
+Тесты для инкрементальных счетчиков статистики админ-панели.
+"""
+import pytest
+from sqlalchemy import text
+
+from app.models.chat_history import ChatHistory
+from app.services import admin_stats
+
+
+@pytest.fixture
+def counter_deltas(monkeypatch):
+    """Собирает приращения, дошедшие до record_counter_delta."""
+    deltas = []
+    monkeypatch.setattr(admin_stats, "record_counter_delta", lambda field, delta: deltas.append((field, delta)))
+    return deltas
+
+
+def _message(user_id: int) -> ChatHistory:
+    return ChatHistory(
+        user_id=user_id,
+        character_name="anna",
+        session_id="s1",
+        message_type="user",
+        message_content="hi",
+    )
+
+
+@pytest.mark.db
+@pytest.mark.asyncio
+async def test_orm_insert_counted_after_commit(db_session, test_user_free, counter_deltas):
+    """Тест: вставка через ORM учитывается после коммита, а не при flush; откат отбрасывает приращение."""
+    db_session.add(_message(test_user_free.id))
+    await db_session.flush()
+    assert counter_deltas == []
+
+    await db_session.commit()
+    assert counter_deltas == [("total_messages", 1)]
+
+    db_session.add(_message(test_user_free.id))
+    await db_session.flush()
+    await db_session.rollback()
+    assert counter_deltas == [("total_messages", 1)]
+
+
+@pytest.mark.db
+@pytest.mark.asyncio
+async def test_raw_insert_counted_after_commit(db_session, test_user_free, counter_deltas):
+    """Тест: вставки через raw SQL учитываются отдельными приращениями после коммита."""
+    for _ in range(2):
+        await db_session.execute(
+            text(
+                "INSERT INTO chat_history (user_id, character_name, session_id, message_type, message_content) "
+                "VALUES (:user_id, 'anna', 's1', 'user', 'hi')"
+            ),
+            {"user_id": test_user_free.id},
+        )
+        admin_stats.record_counter_delta_after_commit(db_session, "total_messages", 1)
+    assert counter_deltas == []
+
+    await db_session.commit()
+    assert counter_deltas == [("total_messages", 1), ("total_messages", 1)]
@@ -0,0 +1,200 @@
+"""
+Тесты для версионированного пространства ключей кэша персонажей и прогрева кэша.
+"""
+import fnmatch
+import json
+import uuid
+import pytest
+from contextlib import asynccontextmanager
+
+from fastapi import Response
+
+from app.chat_bot.api import character_endpoints
+from app.chat_bot.models.models import CharacterDB
+from app.config.settings import settings
+from app.database.read_routing import READ_FROM_REPLICA
+from app.utils import redis_cache
+
+
+@pytest.mark.unit
+@pytest.mark.parametrize("build_key", [
+    redis_cache.key_characters_list,
+    lambda: redis_cache.key_character("Anna"),
+    lambda: redis_cache.key_character_photos(7),
+    lambda: redis_cache.key_character_main_photos(7),
+])
+def test_character_keys_follow_cache_version(build_key, monkeypatch):
+    """Тест: смена версии схемы кэша меняет ключи списка и отдельных персонажей."""
+    monkeypatch.setattr(redis_cache, "CACHE_VERSION", "v1")
+    old_key = build_key()
+    monkeypatch.setattr(redis_cache, "CACHE_VERSION", "v2")
+    new_key = build_key()
+
+    assert old_key != new_key
+    assert old_key.endswith(":v1") and new_key.endswith(":v2")
+
+
+@pytest.mark.unit
+def test_versioned_keys_match_invalidation_patterns():
+    """Тест: паттерны инвалидации персонажа покрывают версионированные ключи."""
+    assert fnmatch.fnmatch(redis_cache.key_character("Anna"), "character:*anna*")
+    assert fnmatch.fnmatch(redis_cache.key_character_photos(42), "character:*42*")
+    assert fnmatch.fnmatch(redis_cache.key_characters_list(), "characters:list:*")
+    assert redis_cache.key_family(redis_cache.key_character_photos(42)) == "character:photos"
+
+
+@pytest.mark.unit
+def test_cache_version_includes_deploy_version(monkeypatch):
+    """Тест: версия кэша складывается из CACHE_SCHEMA_VERSION и DEPLOY_VERSION."""
+    monkeypatch.setattr(settings, "CACHE_SCHEMA_VERSION", "v9")
+    monkeypatch.delenv("DEPLOY_VERSION", raising=False)
+    assert redis_cache._build_cache_version() == "v9"
+
+    monkeypatch.setenv("DEPLOY_VERSION", "0123456789abcdef")
+    assert redis_cache._build_cache_version() == "v9-0123456789ab"
+
+
+@pytest.fixture
+def prewarm_env(fake_redis, monkeypatch):
+    """Прогрев без БД: Redis - fakeredis, read_characters подменяется в тестах."""
+    async def _get_client():
+        return fake_redis
+
+    @asynccontextmanager
+    async def _session():
+        yield None
+
+    monkeypatch.setattr(redis_cache, "get_redis_client", _get_client)
+    monkeypatch.setattr(character_endpoints, "async_session_maker", _session)
+    return fake_redis
+
+
+@pytest.mark.unit
+@pytest.mark.redis
+@pytest.mark.asyncio
+async def test_prewarm_runs_once_per_version(prewarm_env, monkeypatch):
+    """Тест: успешный прогрев держит блокировку, повторный вызов ничего не делает."""
+    calls = []
+
+    async def _read_characters(*args, **kwargs):
+        calls.append(kwargs["limit"])
+
+    async def _cache_exists(key, timeout=0.3):
+        return True
+
+    monkeypatch.setattr(character_endpoints, "read_characters", _read_characters)
+    monkeypatch.setattr(character_endpoints, "cache_exists", _cache_exists)
+
+    assert await character_endpoints.prewarm_characters_cache()
+    assert not await character_endpoints.prewarm_characters_cache()
+    assert calls == [1000]
+    assert await prewarm_env.exists(redis_cache.key_cache_prewarm("characters_list"))
+
+
+@pytest.mark.unit
+@pytest.mark.redis
+@pytest.mark.asyncio
+@pytest.mark.parametrize("failure", ["raises", "not_cached"])
+async def test_prewarm_releases_lock_on_failure(prewarm_env, monkeypatch, failure):
+    """Тест: при неудачном прогреве блокировка снимается и следующий вызов прогревает заново."""
+    async def _read_characters(*args, **kwargs):
+        if failure == "raises":
+            raise RuntimeError("db is down")
+
+    async def _cache_exists(key, timeout=0.3):
+        return False
+
+    monkeypatch.setattr(character_endpoints, "read_characters", _read_characters)
+    monkeypatch.setattr(character_endpoints, "cache_exists", _cache_exists)
+
+    assert not await character_endpoints.prewarm_characters_cache()
+    assert not await prewarm_env.exists(redis_cache.key_cache_prewarm("characters_list"))
+
+    async def _cached(key, timeout=0.3):
+        return True
+
+    async def _read_ok(*args, **kwargs):
+        return None
+
+    monkeypatch.setattr(character_endpoints, "read_characters", _read_ok)
+    monkeypatch.setattr(character_endpoints, "cache_exists", _cached)
+    assert await character_endpoints.prewarm_characters_cache()
+
+
+class _ReplicaSession:
+    """Сессия реплики: в тестах заполнения кэша запросы к ней не ожидаются."""
+
+    info = {READ_FROM_REPLICA: True}
+
+    async def execute(self, *args, **kwargs):
+        raise AssertionError("список персонажей прочитан с реплики")
+
+
+@pytest.fixture
+def list_cache(monkeypatch):
+    """Кэш списка персонажей в словаре и учет сессий основной БД."""
+    cache = {}
+    primary_sessions = []
+
+    async def _cache_get(key, timeout=None):
+        return cache.get(key)
+
+    async def _cache_set(key, value, ttl_seconds=None, timeout=None):
+        cache[key] = value
+        return True
+
+    async def _cache_delete(key, timeout=None):
+        cache.pop(key, None)
+        return True
+
+    monkeypatch.setattr(character_endpoints, "cache_get", _cache_get)
+    monkeypatch.setattr(character_endpoints, "cache_set", _cache_set)
+    monkeypatch.setattr(character_endpoints, "cache_delete", _cache_delete)
+    return cache, primary_sessions
+
+
+@pytest.mark.db
+@pytest.mark.asyncio
+async def test_characters_list_cache_filled_from_primary(db_session, list_cache, monkeypatch):
+    """Тест: при промахе кэша на реплике список читается и кэшируется с основной БД."""
+    cache, primary_sessions = list_cache
+
+    @asynccontextmanager
+    async def _primary():
+        primary_sessions.append(db_session)
+        yield db_session
+
+    monkeypatch.setattr(character_endpoints, "async_session_maker", _primary)
+    name = f"ReplicaChar_{uuid.uuid4().hex[:8]}"
+    db_session.add(CharacterDB(name=name, display_name="R", description="d"))
+    await db_session.commit()
+
+    response = await character_endpoints.read_characters(
+        Response(), skip=0, limit=1000, force_refresh=False, db=_ReplicaSession()
+    )
+
+    assert primary_sessions == [db_session]
+    assert name in [c["name"] for c in json.loads(response.body)]
+    assert name in [c["name"] for c in cache[f"{redis_cache.key_characters_list()}:0:1000"]]
+
+
+@pytest.mark.unit
+@pytest.mark.asyncio
+async def test_characters_list_cache_hit_served_from_replica(list_cache, monkeypatch):
+    """Тест: при попадании в кэш основная БД не открывается."""
+    cache, primary_sessions = list_cache
+
+    @asynccontextmanager
+    async def _primary():
+        primary_sessions.append(1)
+        yield None
+
+    monkeypatch.setattr(character_endpoints, "async_session_maker", _primary)
+    cache[f"{redis_cache.key_characters_list()}:0:10"] = [{"id": 1, "name": "Cached"}]
+
+    response = await character_endpoints.read_characters(
+        Response(), skip=0, limit=10, force_refresh=False, db=_ReplicaSession()
+    )
+
+    assert primary_sessions == []
+    assert [c["name"] for c in json.loads(response.body)] == ["Cached"]
@@ -0,0 +1,148 @@
+"""
+Тесты для индекса character_photos: триггеры на таблицах-источниках и keyset-страницы галереи.
+"""
+import uuid
+from datetime import datetime, timedelta, timezone
+
+import pytest
+from httpx import AsyncClient
+from sqlalchemy import delete, select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.chat_bot.models.models import CharacterDB
+from app.models.character_photo import CharacterPhoto
+from app.models.chat_history import ChatHistory
+from app.models.image_generation_history import ImageGenerationHistory
+from app.models.user import Users
+from app.models.user_gallery import UserGallery
+
+
+@pytest.fixture
+async def owner(db_session: AsyncSession):
+    """Создатель персонажа; возвращает (user_id, имя персонажа)."""
+    tag = uuid.uuid4().hex[:8]
+    user = Users(email=f"photos_{tag}@test.com", password_hash="x")
+    db_session.add(user)
+    await db_session.flush()
+    character = CharacterDB(name=f"Photos_{tag}", display_name="P", description="d", user_id=user.id)
+    db_session.add(character)
+    await db_session.commit()
+    return user.id, character.name
+
+
+async def _photos(db_session: AsyncSession, user_id: int, name: str):
+    result = await db_session.execute(
+        select(CharacterPhoto)
+        .where(CharacterPhoto.user_id == user_id, CharacterPhoto.character_key == name.lower())
+        .order_by(CharacterPhoto.id)
+        .execution_options(populate_existing=True)
+    )
+    return result.scalars().all()
+
+
+@pytest.mark.db
+@pytest.mark.asyncio
+async def test_insert_indexes_photo_once(db_session: AsyncSession, owner):
+    """Тест: один URL из нескольких источников дает одну строку, pending: не индексируется."""
+    user_id, name = owner
+    db_session.add_all([
+        ChatHistory(
+            user_id=user_id, character_name=f" {name} ", session_id="s", message_type="assistant",
+            message_content="a red dress", image_url="https://cdn.test/a.webp?v=1", generation_time=7
+        ),
+        UserGallery(user_id=user_id, character_name=name, image_url="https://cdn.test/a.webp"),
+        ChatHistory(
+            user_id=user_id, character_name=name, session_id="s", message_type="assistant",
+            message_content="Генерация изображения", image_url="pending:task-1"
+        ),
+    ])
+    await db_session.commit()
+
+    photos = await _photos(db_session, user_id, name)
+    assert [(p.image_url, p.prompt, p.generation_time, p.source) for p in photos] == [
+        ("https://cdn.test/a.webp", "a red dress", 7, "chat_history"),
+    ]
+
+
+@pytest.mark.db
+@pytest.mark.asyncio
+async def test_pending_generation_indexed_after_url_update(db_session: AsyncSession, owner):
+    """Тест: запись генерации попадает в индекс, когда pending:-маркер заменяется реальным URL."""
+    user_id, name = owner
+    generation = ImageGenerationHistory(
+        user_id=user_id, character_name=name, prompt="on the beach",
+        image_url="pending:task-2", task_id="task-2"
+    )
+    db_session.add(generation)
+    await db_session.commit()
+    assert await _photos(db_session, user_id, name) == []
+
+    await db_session.execute(
+        update(ImageGenerationHistory)
+        .where(ImageGenerationHistory.id == generation.id)
+        .values(image_url="https://cdn.test/b.webp", generation_time=12)
+    )
+    await db_session.commit()
+
+    photos = await _photos(db_session, user_id, name)
+    assert [(p.image_url, p.prompt, p.generation_time, p.source) for p in photos] == [
+        ("https://cdn.test/b.webp", "on the beach", 12, "image_generation"),
+    ]
+
+
+@pytest.mark.db
+@pytest.mark.asyncio
+async def test_source_delete_keeps_photo_until_last_source(db_session: AsyncSession, owner):
+    """Тест: фото удаляется из индекса только вместе с последним источником URL."""
+    user_id, name = owner
+    db_session.add_all([
+        ChatHistory(
+            user_id=user_id, character_name=name, session_id="s", message_type="assistant",
+            message_content="x", image_url="https://cdn.test/c.webp"
+        ),
+        UserGallery(user_id=user_id, character_name=name, image_url="https://cdn.test/c.webp?size=full"),
+    ])
+    await db_session.commit()
+
+    await db_session.execute(delete(ChatHistory).where(ChatHistory.user_id == user_id))
+    await db_session.commit()
+    assert [p.image_url for p in await _photos(db_session, user_id, name)] == ["https://cdn.test/c.webp"]
+
+    await db_session.execute(delete(UserGallery).where(UserGallery.user_id == user_id))
+    await db_session.commit()
+    assert await _photos(db_session, user_id, name) == []
+
+
+@pytest.mark.db
+@pytest.mark.asyncio
+async def test_photos_keyset_pages(client: AsyncClient, db_session: AsyncSession, owner):
+    """Тест: страницы галереи идут от новых к старым по next_cursor без повторов и пропусков."""
+    user_id, name = owner
+    base = datetime(2026, 1, 1, tzinfo=timezone.utc)
+    # Два фото с одинаковым временем проверяют разрешение по id
+    times = [base, base + timedelta(minutes=1), base + timedelta(minutes=1), base + timedelta(minutes=2), base + timedelta(minutes=3)]
+    db_session.add_all([
+        UserGallery(user_id=user_id, character_name=name, image_url=f"https://cdn.test/p{i}.webp", created_at=at)
+        for i, at in enumerate(times)
+    ])
+    await db_session.commit()
+
+    urls, cursor = [], None
+    for _ in range(len(times)):
+        params = {"limit": 2}
+        if cursor:
+            params["cursor"] = cursor
+        response = await client.get(f"/api/v1/characters/{name}/photos/", params=params)
+        assert response.status_code == 200, response.text
+        page = response.json()
+        assert len(page["photos"]) <= 2
+        urls.extend(photo["url"] for photo in page["photos"])
+        cursor = page["next_cursor"]
+        if not cursor:
+            break
+
+    assert cursor is None
+    assert urls == [f"https://cdn.test/p{i}.webp" for i in (4, 3, 2, 1, 0)]
+
+    response = await client.get(f"/api/v1/characters/{name}/photos/", params={"cursor": "broken"})
+    assert response.status_code == 400
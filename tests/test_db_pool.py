@@ -0,0 +1,83 @@
+import pytest
+from sqlalchemy import create_engine, text
+from sqlalchemy.pool import NullPool, QueuePool
+
+from app.database.pool import (
+    PoolMetrics,
+    ROLE_API,
+    ROLE_BEAT,
+    ROLE_CELERY,
+    ROLE_SCRIPT,
+    detect_process_role,
+    pool_settings,
+    postgres_connect_args,
+)
+
+
+@pytest.fixture(autouse=True)
+def clean_pool_env(monkeypatch):
+    for name in ("DB_PROCESS_ROLE", "DB_POOL_SIZE", "DB_MAX_OVERFLOW", "DB_POOL_TIMEOUT", "DB_POOL_RECYCLE"):
+        monkeypatch.delenv(name, raising=False)
+
+
+@pytest.mark.unit
+@pytest.mark.parametrize("argv, role", [
+    (["/usr/local/bin/gunicorn", "app.main:app", "--workers", "4"], ROLE_API),
+    (["/usr/local/lib/python3.11/site-packages/uvicorn/__main__.py", "app.main:app"], ROLE_API),
+    (["/usr/local/bin/celery", "-A", "app.celery_app", "worker"], ROLE_CELERY),
+    (["/usr/local/bin/celery", "-A", "app.celery_app", "beat"], ROLE_BEAT),
+    (["/usr/local/bin/alembic", "upgrade", "head"], ROLE_SCRIPT),
+    ([], ROLE_SCRIPT),
+])
+def test_detect_process_role_from_argv(argv, role):
+    assert detect_process_role(argv) == role
+
+
+@pytest.mark.unit
+def test_process_role_env_overrides_argv(monkeypatch):
+    monkeypatch.setenv("DB_PROCESS_ROLE", "celery")
+    assert detect_process_role(["/usr/local/bin/gunicorn"]) == ROLE_CELERY
+
+
+@pytest.mark.unit
+def test_pool_settings_per_role(monkeypatch):
+    assert pool_settings(ROLE_CELERY) == {"poolclass": NullPool}
+
+    monkeypatch.setenv("DB_POOL_SIZE", "6")
+    settings = pool_settings(ROLE_API)
+    assert settings["pool_size"] == 6
+    assert pool_settings(ROLE_API, scale=0.5)["pool_size"] == 3
+    # Переопределения не превращают NullPool в постоянный пул
+    assert pool_settings(ROLE_BEAT) == {"poolclass": NullPool}
+
+
+@pytest.mark.unit
+def test_pgbouncer_connect_args_disable_prepared_statements():
+    connect_args = postgres_connect_args(pgbouncer=True)
+    assert connect_args["statement_cache_size"] == 0
+    assert connect_args["prepared_statement_cache_size"] == 0
+    assert connect_args["prepared_statement_name_func"]() != connect_args["prepared_statement_name_func"]()
+    assert "server_settings" not in connect_args
+
+    assert postgres_connect_args(pgbouncer=False)["server_settings"] == {"jit": "off"}
+
+
+@pytest.mark.unit
+def test_pool_metrics_count_checkouts_and_saturation():
+    engine = create_engine("sqlite://", poolclass=QueuePool, pool_size=1, max_overflow=1)
+    metrics = PoolMetrics("test", pool_size=1, max_overflow=1)
+    metrics.attach(engine)
+    try:
+        with engine.connect() as first, engine.connect() as second:
+            first.execute(text("SELECT 1"))
+            second.execute(text("SELECT 1"))
+            assert metrics.snapshot()["checked_out"] == 2
+        snapshot = metrics.snapshot()
+    finally:
+        engine.dispose()
+
+    assert snapshot["checked_out"] == 0
+    assert snapshot["peak_checked_out"] == 2
+    assert snapshot["checkouts"] == 2
+    assert snapshot["saturated_checkouts"] == 1
+    assert snapshot["connects"] == 2
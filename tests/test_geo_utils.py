@@ -0,0 +1,137 @@
+"""
+Тесты определения страны по локальной базе диапазонов IP.
+"""
+import gzip
+import os
+from datetime import date
+
+import pytest
+
+from app.scripts import update_geoip_database
+from app.utils import geo_utils
+from app.utils.geo_utils import IpCountryDatabase, get_country_by_ip, load_geoip_database
+
+IP2LOCATION_CSV = (
+    '"0","16777215","-","-"\n'
+    '"16777216","16777471","US","United States of America"\n'
+    '"34603008","34668543","RU","Russian Federation"\n'
+)
+
+DBIP_CSV = (
+    "1.0.0.0,1.0.0.255,AU\n"
+    "2.16.0.0,2.16.255.255,DE\n"
+    "2a00:1450::,2a00:1450:ffff:ffff:ffff:ffff:ffff:ffff,IE\n"
+)
+
+
+@pytest.fixture
+def geo_state(monkeypatch, tmp_path):
+    """Чистое состояние модуля и файл базы во временной директории."""
+    db_path = tmp_path / "ip_country.csv"
+    monkeypatch.setattr(geo_utils, "_database", None)
+    monkeypatch.setattr(geo_utils, "_checked_at", float("-inf"))
+    monkeypatch.setattr(geo_utils, "_reload_task", None)
+    monkeypatch.setattr(geo_utils.settings, "GEOIP_DB_PATH", db_path)
+    monkeypatch.setattr(geo_utils.settings, "GEOIP_RELOAD_CHECK_SECONDS", 0)
+    return db_path
+
+
+@pytest.mark.unit
+def test_integer_ranges_with_names(tmp_path):
+    """Тест: названия из файла заменяются названиями ip-api по коду страны."""
+    path = tmp_path / "db1.csv"
+    path.write_text(IP2LOCATION_CSV + '"34668544","34668799","QQ","Unknown Land"\n')
+    database = IpCountryDatabase.load(path)
+
+    assert len(database) == 3
+    assert database.lookup("1.0.0.10") == "United States"
+    assert database.lookup("2.16.0.1") == "Russia"
+    assert database.lookup("2.17.0.1") == "Unknown Land"
+    assert database.lookup("2.17.1.1") is None
+
+
+@pytest.mark.unit
+def test_text_ranges_gzip_and_ipv6(tmp_path):
+    path = tmp_path / "dbip.csv.gz"
+    with gzip.open(path, "wt") as file:
+        file.write(DBIP_CSV)
+    database = IpCountryDatabase.load(path)
+
+    assert database.lookup("1.0.0.1") == "Australia"
+    assert database.lookup("::ffff:2.16.3.4") == "Germany"
+    assert database.lookup("2a00:1450:4001::1") == "Ireland"
+    assert database.lookup("2a00:1451::1") is None
+
+
+@pytest.mark.unit
+def test_private_and_invalid_addresses(tmp_path):
+    path = tmp_path / "dbip.csv"
+    path.write_text("0.0.0.0,255.255.255.255,US\n::,ffff::,ZZ\n")
+    database = IpCountryDatabase.load(path)
+
+    for address in ("127.0.0.1", "10.1.2.3", "192.168.0.1", "::1", "localhost", ""):
+        assert database.lookup(address) is None
+    assert database.lookup("8.8.8.8") == "United States"
+    # ZZ - диапазон без страны
+    assert database.lookup("2a00:1450::1") is None
+
+
+@pytest.mark.unit
+@pytest.mark.asyncio
+async def test_get_country_by_ip_reloads_changed_file(geo_state):
+    geo_state.write_text("8.8.8.0,8.8.8.255,US,United States\n")
+    assert await load_geoip_database() is True
+    assert await get_country_by_ip("8.8.8.8") == "United States"
+
+    geo_state.write_text("8.8.8.0,8.8.8.255,NL\n")
+    stat = geo_state.stat()
+    os.utime(geo_state, (stat.st_atime, stat.st_mtime + 10))
+
+    # Пока файл перечитывается, ответ дают старые данные
+    assert await get_country_by_ip("8.8.8.8") == "United States"
+    await geo_utils._reload_task
+    assert await get_country_by_ip("8.8.8.8") == "The Netherlands"
+
+
+@pytest.mark.unit
+@pytest.mark.asyncio
+async def test_get_country_by_ip_without_database(geo_state):
+    assert await load_geoip_database() is False
+    assert await get_country_by_ip("8.8.8.8") is None
+
+
+@pytest.mark.unit
+def test_update_script_candidate_urls():
+    template = "https://example.com/country-{month}.csv.gz"
+
+    assert update_geoip_database.candidate_urls(template, date(2026, 1, 15)) == [
+        "https://example.com/country-2026-01.csv.gz",
+        "https://example.com/country-2025-12.csv.gz",
+    ]
+    assert update_geoip_database.candidate_urls("https://example.com/fixed.csv") == ["https://example.com/fixed.csv"]
+
+
+@pytest.mark.unit
+def test_update_script_replaces_file_only_when_valid(tmp_path, monkeypatch):
+    path = tmp_path / "geoip" / "ip_country.csv"
+    payloads = {
+        "https://example.com/broken.csv.gz": gzip.compress(b"not,a,range\n"),
+        "https://example.com/good.csv.gz": gzip.compress(DBIP_CSV.encode()),
+    }
+
+    def _download(url, destination):
+        destination.write_bytes(gzip.decompress(payloads[url]))
+
+    monkeypatch.setattr(update_geoip_database, "download", _download)
+    monkeypatch.setattr(update_geoip_database, "MIN_RANGES", 2)
+
+    assert not update_geoip_database.update_database(path, ["https://example.com/broken.csv.gz"])
+    assert not path.exists()
+
+    assert update_geoip_database.update_database(
+        path, ["https://example.com/missing.csv.gz", "https://example.com/good.csv.gz"]
+    )
+    assert IpCountryDatabase.load(path).lookup("1.0.0.1") == "Australia"
+    assert [p.name for p in path.parent.iterdir()] == ["ip_country.csv"]
+    assert update_geoip_database.is_fresh(path, 30)
+    assert not update_geoip_database.is_fresh(path, None)
@@ -0,0 +1,132 @@
+import json
+import logging
+import threading
+import time
+
+import pytest
+
+from app.utils.log_pipeline import (
+    LogPipeline,
+    StructuredFormatter,
+    log_event,
+    parse_sampling,
+)
+
+
+class _ListHandler(logging.Handler):
+    def __init__(self, gate: threading.Event = None):
+        super().__init__()
+        self.gate = gate
+        self.lines = []
+
+    def emit(self, record):
+        if self.gate is not None:
+            self.gate.wait(5)
+        self.lines.append(self.format(record))
+
+
+@pytest.fixture
+def make_logger():
+    """Логгер с конвейером; конвейер останавливается после теста."""
+    created = []
+
+    def _make(sink: logging.Handler, **kwargs):
+        pipeline = LogPipeline([sink], **kwargs)
+        logger = logging.getLogger(f"test.pipeline.{len(created)}.{id(pipeline)}")
+        logger.propagate = False
+        logger.setLevel(logging.DEBUG)
+        logger.addHandler(pipeline.handler)
+        pipeline.start()
+        created.append((logger, pipeline))
+        return logger, pipeline
+
+    yield _make
+    for logger, pipeline in created:
+        pipeline.stop()
+        logger.removeHandler(pipeline.handler)
+
+
+@pytest.mark.unit
+def test_slow_sink_drops_instead_of_blocking(make_logger):
+    gate = threading.Event()
+    sink = _ListHandler(gate)
+    logger, pipeline = make_logger(sink, queue_size=5, rate_limit=0)
+
+    for i in range(50):
+        logger.info("message %d", i)
+    stats = pipeline.snapshot()
+    gate.set()
+
+    assert stats["dropped"] > 0
+    assert stats["enqueued"] + stats["dropped"] == 50
+
+
+@pytest.mark.unit
+def test_rate_limit_per_call_site_with_summary(make_logger):
+    sink = _ListHandler()
+    logger, pipeline = make_logger(sink, rate_limit=3, rate_limit_window=0.05)
+
+    def noisy(count):
+        for i in range(count):
+            logger.info(f"noisy {i}")
+
+    noisy(10)
+    logger.error("always passes")
+    # Новое окно: сводка о подавленных выходит со следующей записью этого места
+    time.sleep(0.06)
+    noisy(1)
+    pipeline.stop()
+
+    assert pipeline.stats.rate_limited == 7
+    assert any("always passes" in line for line in sink.lines)
+    assert any("Подавлено 7" in line for line in sink.lines)
+    assert len([line for line in sink.lines if "noisy" in line]) == 4
+
+
+@pytest.mark.unit
+def test_sampling_by_logger_prefix(make_logger):
+    sink = _ListHandler()
+    logger, pipeline = make_logger(sink, sampling={"test.pipeline": 0.0}, rate_limit=0)
+
+    for _ in range(20):
+        logger.info("sampled")
+    logger.warning("kept")
+    pipeline.stop()
+
+    assert pipeline.stats.sampled_out == 20
+    assert [line.rsplit(" - ", 1)[-1] for line in sink.lines] == ["kept"]
+
+
+@pytest.mark.unit
+def test_structured_fields_are_truncated_and_redacted():
+    logger = logging.getLogger("test.structured")
+    record = logger.makeRecord(
+        logger.name, logging.INFO, __file__, 1, "[CHAT] request", None, None,
+        extra={"fields": {"user_id": 7, "token": "secret", "message": "x" * 1000}},
+    )
+
+    text = StructuredFormatter("%(message)s").format(record)
+    assert text.startswith("[CHAT] request user_id=7 token=*** message=xxx")
+    assert "[+700 chars]" in text
+
+    payload = json.loads(StructuredFormatter(json_output=True).format(record))
+    assert payload["user_id"] == 7
+    assert payload["token"] == "***"
+    assert payload["message"].endswith("[+700 chars]")
+
+
+@pytest.mark.unit
+def test_log_event_reports_caller_location(make_logger):
+    sink = _ListHandler()
+    sink.setFormatter(StructuredFormatter("%(filename)s %(message)s"))
+    logger, pipeline = make_logger(sink, rate_limit=0)
+
+    log_event(logger, "event", answer=42)
+    pipeline.stop()
+
+    assert sink.lines == ["test_log_pipeline.py event answer=42"]
+
+
+@pytest.mark.unit
+def test_parse_sampling():
+    assert parse_sampling("app.main=0.1, app.chat_bot=2,broken") == {"app.main": 0.1, "app.chat_bot": 1.0}
@@ -0,0 +1,244 @@
+"""
+Тесты пула SMTP соединений и очереди отправки писем.
+
+Вместо реального SMTP сервера используется простой сервер-приемник в
+отдельном потоке: он считает соединения и авторизации и по запросу теста
+отвечает на DATA временной (421) или постоянной (550) ошибкой.
+"""
+import asyncio
+import smtplib
+import socketserver
+import threading
+
+import pytest
+
+from app.mail_service import sender
+from app.mail_service.sender import (
+    EmailSender,
+    MailDispatcher,
+    SMTPPool,
+    build_verification_message,
+    is_transient_error,
+)
+
+
+class _SinkHandler(socketserver.StreamRequestHandler):
+    def _reply(self, line: str) -> None:
+        self.wfile.write(f"{line}\r\n".encode())
+        self.wfile.flush()
+
+    def handle(self):
+        sink = self.server.sink
+        with sink.lock:
+            sink.connections += 1
+        self._reply("220 sink ESMTP")
+        while True:
+            line = self.rfile.readline()
+            if not line:
+                return
+            command = line.decode().strip()
+            verb = command.split(" ", 1)[0].upper()
+            if verb == "EHLO":
+                self._reply("250-sink")
+                self._reply("250 AUTH PLAIN")
+            elif verb == "HELO":
+                self._reply("250 sink")
+            elif verb == "AUTH":
+                with sink.lock:
+                    sink.logins += 1
+                self._reply("235 Authentication successful")
+            elif verb in ("MAIL", "RCPT", "RSET", "NOOP"):
+                self._reply("250 OK")
+            elif verb == "DATA":
+                self._reply("354 End data with <CR><LF>.<CR><LF>")
+                data = []
+                while True:
+                    chunk = self.rfile.readline()
+                    if not chunk or chunk in (b".\r\n", b".\n"):
+                        break
+                    data.append(chunk)
+                with sink.lock:
+                    failure = sink.failures.pop(0) if sink.failures else None
+                if failure == 421:
+                    self._reply("421 Try again later")
+                    return
+                if failure:
+                    self._reply(f"{failure} Mailbox unavailable")
+                    continue
+                with sink.lock:
+                    sink.delivered.append(b"".join(data))
+                self._reply("250 Queued")
+            elif verb == "QUIT":
+                self._reply("221 Bye")
+                return
+            else:
+                self._reply("502 Command not implemented")
+
+
+class SmtpSink:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.connections = 0
+        self.logins = 0
+        self.delivered = []
+        self.failures = []
+        self.server = socketserver.ThreadingTCPServer(("127.0.0.1", 0), _SinkHandler)
+        self.server.daemon_threads = True
+        self.server.sink = self
+        self.port = self.server.server_address[1]
+        self._thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self._thread.start()
+
+    def close(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+@pytest.fixture
+def smtp_sink(monkeypatch):
+    sink = SmtpSink()
+    # Повторы в тестах без ожидания
+    monkeypatch.setattr(sender, "retry_delay", lambda attempt, backoff=0: 0.01)
+    yield sink
+    sink.close()
+
+
+def _pool(sink, size=2):
+    return SMTPPool(
+        host="127.0.0.1", port=sink.port, username="user", password="secret",
+        use_tls=False, size=size, max_idle=60, timeout=5,
+    )
+
+
+@pytest.mark.unit
+@pytest.mark.asyncio
+async def test_dispatcher_batches_over_persistent_connections(smtp_sink):
+    pool = _pool(smtp_sink)
+    dispatcher = MailDispatcher(pool, batch_size=10, max_attempts=3)
+    try:
+        results = await asyncio.gather(*[
+            dispatcher.send(build_verification_message(f"user{i}@test.com", "123456", "noreply@test.com"))
+            for i in range(30)
+        ])
+        # Повторная отправка идет по уже открытым соединениям
+        assert await dispatcher.send(build_verification_message("late@test.com", "654321", "noreply@test.com"))
+    finally:
+        await dispatcher.close()
+
+    assert all(results)
+    assert len(smtp_sink.delivered) == 31
+    assert pool.connections_opened <= pool.size
+    assert smtp_sink.logins == pool.connections_opened
+
+
+@pytest.mark.unit
+@pytest.mark.asyncio
+async def test_dispatcher_retries_transient_failure(smtp_sink):
+    smtp_sink.failures = [421]
+    pool = _pool(smtp_sink, size=1)
+    dispatcher = MailDispatcher(pool, batch_size=5, max_attempts=3)
+    try:
+        assert await dispatcher.send(build_verification_message("retry@test.com", "111111", "noreply@test.com"))
+    finally:
+        await dispatcher.close()
+
+    assert len(smtp_sink.delivered) == 1
+    # После 421 соединение закрыто и открыто заново
+    assert pool.connections_opened == 2
+
+
+@pytest.mark.unit
+@pytest.mark.asyncio
+async def test_dispatcher_does_not_retry_permanent_failure(smtp_sink):
+    smtp_sink.failures = [550]
+    pool = _pool(smtp_sink, size=1)
+    dispatcher = MailDispatcher(pool, batch_size=5, max_attempts=3)
+    try:
+        assert not await dispatcher.send(build_verification_message("bad@test.com", "222222", "noreply@test.com"))
+        # Соединение осталось рабочим для следующих писем
+        assert await dispatcher.send(build_verification_message("good@test.com", "333333", "noreply@test.com"))
+    finally:
+        await dispatcher.close()
+
+    assert len(smtp_sink.delivered) == 1
+    assert pool.connections_opened == 1
+
+
+@pytest.mark.unit
+def test_email_sender_reuses_pool_connection(smtp_sink):
+    pool = _pool(smtp_sink, size=1)
+    email_sender = EmailSender(pool=pool)
+    try:
+        assert email_sender.send_verification_email("a@test.com", "444444")
+        assert email_sender.send_password_reset_email("a@test.com", "555555")
+    finally:
+        pool.close()
+
+    assert len(smtp_sink.delivered) == 2
+    assert smtp_sink.connections == 1
+    assert smtp_sink.logins == 1
+
+
+@pytest.mark.unit
+def test_transient_error_classification():
+    assert is_transient_error(smtplib.SMTPServerDisconnected("closed"))
+    assert is_transient_error(smtplib.SMTPDataError(451, b"try later"))
+    assert not is_transient_error(smtplib.SMTPDataError(554, b"rejected"))
+    assert is_transient_error(smtplib.SMTPRecipientsRefused({"a@test.com": (450, b"busy")}))
+    assert not is_transient_error(smtplib.SMTPRecipientsRefused({"a@test.com": (550, b"no such user")}))
+    assert not is_transient_error(smtplib.SMTPAuthenticationError(535, b"bad credentials"))
+    assert is_transient_error(TimeoutError())
+
+
+class _BlockingPool:
+    """Пул без сети: send_messages ждет release и возвращает заданные ошибки."""
+
+    size = 1
+
+    def __init__(self, errors):
+        self.release = threading.Event()
+        self.errors = list(errors)
+        self.sent = []
+
+    def send_messages(self, messages):
+        self.release.wait(5)
+        self.sent.extend(messages)
+        return [self.errors.pop(0) if self.errors else None for _ in messages]
+
+    def close(self):
+        pass
+
+
+@pytest.mark.unit
+@pytest.mark.asyncio
+@pytest.mark.parametrize("errors, delivered", [
+    ([], True),
+    ([smtplib.SMTPDataError(451, b"try later")] * 3, False),
+])
+async def test_auth_email_does_not_wait_for_delivery(monkeypatch, capsys, errors, delivered):
+    """Тест: обработчик только ставит письмо в очередь, повторы и итог - в фоне."""
+    from app.auth.utils import send_verification_email
+
+    monkeypatch.setattr(sender, "retry_delay", lambda attempt, backoff=0: 0.01)
+    monkeypatch.setattr(sender, "smtp_config_error", lambda: None)
+    pool = _BlockingPool(errors)
+    dispatcher = MailDispatcher(pool, batch_size=5, max_attempts=3)
+    monkeypatch.setattr(sender, "_dispatcher", dispatcher)
+    try:
+        await asyncio.wait_for(send_verification_email("user@test.com", "777777"), timeout=1)
+        assert pool.sent == []
+
+        pool.release.set()
+        attempts = 1 if delivered else 3
+        for _ in range(200):
+            if len(pool.sent) == attempts:
+                break
+            await asyncio.sleep(0.01)
+        # Колбэк результата выполняется на следующей итерации event loop
+        await asyncio.sleep(0.05)
+    finally:
+        await dispatcher.close()
+
+    assert len(pool.sent) == attempts
+    fallback = "Verification code 777777 for user@test.com (real sending disabled)"
+    assert (fallback in capsys.readouterr().out) is not delivered
@@ -0,0 +1,85 @@
+"""
+Тесты для канонических ключей медиафайлов и построения URL.
+"""
+import pytest
+
+from app.utils.media_urls import (
+    CDN_DOMAIN,
+    build_media_url,
+    extract_media_key,
+    format_variants,
+    media_url,
+)
+
+
+@pytest.mark.unit
+@pytest.mark.parametrize("url, expected", [
+    (f"{CDN_DOMAIN}/generated/abc.webp", "generated/abc.webp"),
+    (f"{CDN_DOMAIN}/generated/abc.webp?v=2#top", "generated/abc.webp"),
+    ("/media/generated/abc.webp", "generated/abc.webp"),
+    ("https://candygirlschat.com/media/user_avatars/1.webp", "user_avatars/1.webp"),
+    ("https://cherrylust.art/media/generated/abc.webp", "generated/abc.webp"),
+    ("https://cherrylust.art/generated/abc.webp", "generated/abc.webp"),
+    ("https://bucket.storage.yandexcloud.net/generated/abc.webp", "generated/abc.webp"),
+    ("https://storage.yandexcloud.net/bucket/generated/abc.webp", "generated/abc.webp"),
+])
+def test_extract_media_key(url, expected):
+    """Тест: ключ объекта извлекается из URL всех известных форматов."""
+    assert extract_media_key(url) == expected
+
+
+@pytest.mark.unit
+@pytest.mark.parametrize("url", [
+    None,
+    "",
+    "/media/",
+    "https://storage.yandexcloud.net/bucket",
+    "https://example.com/image.png",
+    "/static/photos/local.png",
+])
+def test_extract_media_key_foreign_urls(url):
+    """Тест: внешние ссылки, локальные пути и пустые значения не дают ключа."""
+    assert extract_media_key(url) is None
+
+
+@pytest.mark.unit
+def test_build_media_url_variants():
+    """Тест: вариант берется, только если он есть в media_variants."""
+    variants = format_variants(["thumb", "card", "thumb"])
+
+    assert variants == "card,thumb"
+    assert build_media_url("generated/abc.webp") == f"{CDN_DOMAIN}/generated/abc.webp"
+    assert build_media_url("generated/abc.webp", "thumb", variants) == f"{CDN_DOMAIN}/generated/abc_thumb.webp"
+    assert build_media_url("generated/abc.webp", "full", variants) == f"{CDN_DOMAIN}/generated/abc.webp"
+    assert build_media_url("generated/abc.webp", "thumb", "card") == f"{CDN_DOMAIN}/generated/abc.webp"
+    assert build_media_url("generated/abc.webp", "thumb", None) == f"{CDN_DOMAIN}/generated/abc.webp"
+
+
+@pytest.mark.unit
+def test_media_url():
+    """Тест: media_key используется напрямую, без ключа URL нормализуется или возвращается как есть."""
+    assert media_url("https://ignored", media_key="generated/abc.webp") == f"{CDN_DOMAIN}/generated/abc.webp"
+    assert media_url("/media/generated/abc.webp") == f"{CDN_DOMAIN}/generated/abc.webp"
+    assert media_url("https://example.com/image.png") == "https://example.com/image.png"
+    assert media_url(None) is None
+
+
+@pytest.mark.unit
+def test_fill_media_key_resets_variants_on_new_key():
+    """Тест: при смене URL на другой объект media_variants сбрасывается для повторного заполнения."""
+    from app.models.user_gallery import UserGallery
+    from app.utils.media_urls import fill_media_key
+
+    photo = UserGallery(
+        user_id=1,
+        image_url=f"{CDN_DOMAIN}/generated/abc.webp",
+        media_key="generated/abc.webp",
+        media_variants="card,full,thumb",
+    )
+    fill_media_key(photo, "image_url")
+    assert photo.media_variants == "card,full,thumb"
+
+    photo.image_url = f"{CDN_DOMAIN}/generated/def.webp"
+    fill_media_key(photo, "image_url")
+    assert photo.media_key == "generated/def.webp"
+    assert photo.media_variants is None
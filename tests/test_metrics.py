@@ -0,0 +1,54 @@
+import pytest
+
+from app.utils.metrics import BoundedLabel, status_class
+
+
+@pytest.mark.unit
+def test_bounded_label_limits_distinct_values():
+    label = BoundedLabel(limit=2)
+
+    assert [label(v) for v in ("a", "b", "c", "a", None)] == ["a", "b", "other", "a", "other"]
+
+
+@pytest.mark.unit
+def test_status_class():
+    assert [status_class(code) for code in (200, 404, 503, None)] == ["2xx", "4xx", "5xx", "none"]
+
+
+@pytest.mark.unit
+@pytest.mark.parametrize("key, family", [
+    ("user:coins:42", "user:coins"),
+    ("character:photos:anna", "character:photos"),
+    ("character:anna", "character"),
+    ("characters:list", "characters:list"),
+    ("characterless:1", "other"),
+    ("unknown:key", "other"),
+])
+def test_cache_key_family(key, family):
+    from app.utils.redis_cache import key_family
+
+    assert key_family(key) == family
+
+
+@pytest.mark.unit
+def test_celery_events_feed_histograms():
+    pytest.importorskip("prometheus_client")
+    from prometheus_client import CollectorRegistry
+
+    from app.utils.celery_exporter import CeleryEventsExporter
+
+    registry = CollectorRegistry()
+    exporter = CeleryEventsExporter(app=None, registry=registry)
+    for event in (
+        {"type": "task-received", "uuid": "1", "name": "app.tasks.render", "timestamp": 100.0},
+        {"type": "task-started", "uuid": "1", "timestamp": 102.5},
+        {"type": "task-succeeded", "uuid": "1", "runtime": 1.25, "timestamp": 103.75},
+        {"type": "task-failed", "uuid": "2", "timestamp": 104.0},
+    ):
+        exporter.on_event(event)
+
+    value = registry.get_sample_value
+    assert value("celery_task_queue_wait_seconds_sum", {"task": "app.tasks.render"}) == 2.5
+    assert value("celery_task_runtime_seconds_sum", {"task": "app.tasks.render"}) == 1.25
+    assert value("celery_tasks_total", {"task": "app.tasks.render", "state": "succeeded"}) == 1
+    assert value("celery_tasks_total", {"task": "unknown", "state": "failed"}) == 1
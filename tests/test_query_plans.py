@@ -0,0 +1,353 @@
+"""
+Регрессионные тесты планов запросов для горячих запросов чата, истории, галереи,
+баг-репортов, комментариев и истории баланса.
+
+Таблицы заполняются синтетическими данными, после ANALYZE для каждого запроса
+строится EXPLAIN. Тест падает, если запрос ушел в последовательное сканирование
+таблицы или перестал использовать предназначенный для него индекс
+(индексы из миграций f0a1b2c3d4e5, a0b1c2d3e4f6, b0c1d2e3f4a5, c0d1e2f3a4b5
+и моделей).
+"""
+import json
+
+import pytest
+from sqlalchemy import desc, func, select, tuple_
+from sqlalchemy.dialects import postgresql
+from sqlalchemy.dialects.postgresql import distinct_on
+
+from app.chat_bot.models.models import ChatMessageDB, ChatSession
+from app.models.balance_history import BalanceHistory
+from app.models.bug_report import BugComment, BugReport, BugStatus
+from app.models.character_comment import CharacterComment
+from app.models.character_photo import CharacterPhoto
+from app.models.chat_history import ChatHistory
+from app.models.user_gallery import UserGallery
+
+pytestmark = pytest.mark.db
+
+USERS = 10
+CHARACTERS = 20
+SESSIONS = 2000
+SESSIONS_WITH_MESSAGES = 200
+MESSAGES = 20000
+HISTORY_CHARACTERS = 10
+HISTORY_ROWS = 10000
+GALLERY_ROWS = 5000
+BUG_REPORTS = 3000
+BUG_COMMENTS = 15000
+CHARACTER_COMMENTS = 10000
+BALANCE_ROWS = 20000
+
+SEED_SQL = (
+    f"""
+    INSERT INTO users (email, username, password_hash, coins, total_messages_sent,
+                       has_welcome_discount, welcome_discount_used, is_active, is_verified, is_admin, created_at)
+    SELECT 'plan_' || g || '@test.com', 'plan_user_' || g, 'hash', 0, 0, false, false, true, false, false, now()
+      FROM generate_series(1, {USERS}) g
+    """,
+    f"""
+    INSERT INTO characters (name, is_nsfw, total_messages_count)
+    SELECT 'plan_char_' || g, false, 0 FROM generate_series(0, {CHARACTERS - 1}) g
+    """,
+    # Каждая седьмая сессия гостевая (user_id IS NULL)
+    f"""
+    INSERT INTO chat_sessions (character_id, user_id, started_at)
+    SELECT c.id,
+           CASE WHEN g % 7 = 0 THEN NULL ELSE 'plan_' || (g % 100) END,
+           now() - g * interval '1 minute'
+      FROM generate_series(1, {SESSIONS}) g
+      JOIN characters c ON c.name = 'plan_char_' || (g % {CHARACTERS})
+    """,
+    f"""
+    INSERT INTO chat_messages (session_id, role, content, "timestamp")
+    SELECT s.ids[1 + g % {SESSIONS_WITH_MESSAGES}],
+           CASE WHEN g % 2 = 0 THEN 'user' ELSE 'assistant' END,
+           'message ' || g,
+           now() - g * interval '1 second'
+      FROM generate_series(1, {MESSAGES}) g,
+           (SELECT array_agg(id ORDER BY id) AS ids FROM chat_sessions) s
+    """,
+    # Фото в каждом четвертом сообщении истории
+    f"""
+    INSERT INTO chat_history (user_id, character_name, session_id, message_type, message_content,
+                              image_url, created_at)
+    SELECT u.ids[1 + g % {USERS}],
+           'plan_char_' || ((g / {USERS}) % {HISTORY_CHARACTERS}),
+           'session_' || (g % 3),
+           CASE WHEN g % 2 = 0 THEN 'user' ELSE 'assistant' END,
+           'history ' || g,
+           CASE WHEN g % 4 = 0 THEN 'https://cdn.test/plan/' || g || '.png' END,
+           now() - g * interval '1 second'
+      FROM generate_series(1, {HISTORY_ROWS}) g,
+           (SELECT array_agg(id ORDER BY id) AS ids FROM users WHERE left(email, 5) = 'plan_') u
+    """,
+    f"""
+    INSERT INTO user_gallery (user_id, image_url, character_name, created_at)
+    SELECT u.ids[1 + g % {USERS}],
+           'https://cdn.test/gallery/' || g || '.png',
+           'plan_char_' || (g % {HISTORY_CHARACTERS}),
+           now() - g * interval '1 second'
+      FROM generate_series(1, {GALLERY_ROWS}) g,
+           (SELECT array_agg(id ORDER BY id) AS ids FROM users WHERE left(email, 5) = 'plan_') u
+    """,
+    f"""
+    INSERT INTO bug_reports (title, description, status, user_id, created_at)
+    SELECT 'plan bug ' || g, 'description ' || g,
+           (ARRAY['PENDING', 'IN_PROGRESS', 'COMPLETED'])[1 + g % 3]::bugstatus,
+           u.ids[1 + g % {USERS}],
+           now() - g * interval '1 minute'
+      FROM generate_series(1, {BUG_REPORTS}) g,
+           (SELECT array_agg(id ORDER BY id) AS ids FROM users WHERE left(email, 5) = 'plan_') u
+    """,
+    f"""
+    INSERT INTO bug_comments (bug_report_id, user_id, content, created_at)
+    SELECT r.ids[1 + g % {BUG_REPORTS}], NULL, 'comment ' || g, now() - g * interval '1 second'
+      FROM generate_series(1, {BUG_COMMENTS}) g,
+           (SELECT array_agg(id ORDER BY id) AS ids FROM bug_reports) r
+    """,
+    f"""
+    INSERT INTO character_comments (character_name, user_id, content, is_edited, created_at)
+    SELECT 'plan_char_' || (g % {CHARACTERS}), u.ids[1 + g % {USERS}], 'comment ' || g, false,
+           now() - g * interval '1 second'
+      FROM generate_series(1, {CHARACTER_COMMENTS}) g,
+           (SELECT array_agg(id ORDER BY id) AS ids FROM users WHERE left(email, 5) = 'plan_') u
+    """,
+    f"""
+    INSERT INTO balance_history (user_id, amount, balance_before, balance_after, reason, created_at)
+    SELECT u.ids[1 + g % {USERS}], CASE WHEN g % 3 = 0 THEN 10 ELSE -5 END, 0, 0, 'plan',
+           now() - g * interval '1 minute'
+      FROM generate_series(1, {BALANCE_ROWS}) g,
+           (SELECT array_agg(id ORDER BY id) AS ids FROM users WHERE left(email, 5) = 'plan_') u
+    """,
+)
+
+ANALYZED_TABLES = (
+    "users", "characters", "chat_sessions", "chat_messages",
+    "chat_history", "user_gallery", "character_photos", "bug_reports", "bug_comments",
+    "character_comments", "character_comment_counts",
+    "balance_history", "balance_monthly_summaries",
+)
+
+
+@pytest.fixture(scope="module")
+async def plan_conn(test_engine):
+    """Соединение с засеянными таблицами; все изменения откатываются после модуля."""
+    async with test_engine.connect() as conn:
+        transaction = await conn.begin()
+        for statement in SEED_SQL:
+            await conn.exec_driver_sql(statement)
+        for table in ANALYZED_TABLES:
+            await conn.exec_driver_sql(f"ANALYZE {table}")
+        yield conn
+        await transaction.rollback()
+
+
+@pytest.fixture(scope="module")
+async def seeded_ids(plan_conn):
+    """Идентификаторы из засеянных данных для параметров запросов."""
+    row = (await plan_conn.exec_driver_sql("""
+        SELECT (SELECT min(id) FROM users WHERE left(email, 5) = 'plan_') AS user_id,
+               (SELECT id FROM characters WHERE name = 'plan_char_1') AS character_id,
+               (SELECT min(session_id) FROM chat_messages) AS session_id,
+               (SELECT array_agg(id) FROM (SELECT id FROM bug_reports ORDER BY created_at DESC, id DESC
+                                            LIMIT 20) r) AS bug_report_ids
+    """)).one()
+    return row
+
+
+async def _explain(conn, stmt) -> dict:
+    compiled = stmt.compile(dialect=postgresql.dialect(), compile_kwargs={"literal_binds": True})
+    plan = (await conn.exec_driver_sql(f"EXPLAIN (FORMAT JSON) {compiled}")).scalar()
+    if isinstance(plan, str):
+        plan = json.loads(plan)
+    return plan[0]["Plan"]
+
+
+def _nodes(plan: dict):
+    yield plan
+    for child in plan.get("Plans", []):
+        yield from _nodes(child)
+
+
+def _assert_uses_index(plan: dict, table: str, index: str) -> None:
+    nodes = list(_nodes(plan))
+    dump = json.dumps(plan, indent=2)
+    assert not any(
+        node["Node Type"] == "Seq Scan" and node.get("Relation Name") == table for node in nodes
+    ), f"Seq Scan on {table}:\n{dump}"
+    # Тип сканирования (Index Scan или Bitmap Index Scan + Sort) планировщик выбирает
+    # по объему данных, поэтому проверяется только использование индекса
+    assert any(node.get("Index Name") == index for node in nodes), f"{index} not used:\n{dump}"
+
+
+async def test_latest_user_session_uses_composite_index(plan_conn, seeded_ids):
+    stmt = (
+        select(ChatSession)
+        .where(ChatSession.character_id == seeded_ids.character_id, ChatSession.user_id == "plan_1")
+        .order_by(ChatSession.started_at.desc())
+        .limit(1)
+    )
+    plan = await _explain(plan_conn, stmt)
+    _assert_uses_index(plan, "chat_sessions", "ix_chat_sessions_user_character_started")
+
+
+async def test_latest_guest_session_uses_partial_index(plan_conn, seeded_ids):
+    stmt = (
+        select(ChatSession)
+        .where(ChatSession.character_id == seeded_ids.character_id, ChatSession.user_id.is_(None))
+        .order_by(ChatSession.started_at.desc())
+        .limit(1)
+    )
+    plan = await _explain(plan_conn, stmt)
+    _assert_uses_index(plan, "chat_sessions", "ix_chat_sessions_guest_character_started")
+
+
+async def test_session_messages_in_order_use_composite_index(plan_conn, seeded_ids):
+    stmt = (
+        select(ChatMessageDB)
+        .where(ChatMessageDB.session_id == seeded_ids.session_id)
+        .order_by(ChatMessageDB.timestamp.asc(), ChatMessageDB.id.asc())
+    )
+    plan = await _explain(plan_conn, stmt)
+    _assert_uses_index(plan, "chat_messages", "ix_chat_messages_session_timestamp")
+
+
+async def test_recent_session_messages_use_composite_index(plan_conn, seeded_ids):
+    stmt = (
+        select(ChatMessageDB)
+        .where(ChatMessageDB.session_id == seeded_ids.session_id)
+        .order_by(ChatMessageDB.timestamp.desc())
+        .limit(20)
+    )
+    plan = await _explain(plan_conn, stmt)
+    _assert_uses_index(plan, "chat_messages", "ix_chat_messages_session_timestamp")
+
+
+async def test_chat_history_page_uses_conversation_index(plan_conn, seeded_ids):
+    stmt = (
+        select(ChatHistory.id, ChatHistory.message_content)
+        .where(
+            ChatHistory.user_id == seeded_ids.user_id,
+            ChatHistory.character_name == "plan_char_1",
+            ChatHistory.session_id == "session_1",
+        )
+        .order_by(ChatHistory.id.desc())
+        .limit(51)
+    )
+    plan = await _explain(plan_conn, stmt)
+    _assert_uses_index(plan, "chat_history", "ix_chat_history_conversation")
+
+
+async def test_last_history_image_uses_partial_index(plan_conn, seeded_ids):
+    stmt = (
+        select(ChatHistory.image_url)
+        .where(ChatHistory.user_id == seeded_ids.user_id)
+        .where(ChatHistory.character_name == "plan_char_1")
+        .where(ChatHistory.image_url.isnot(None))
+        .order_by(ChatHistory.created_at.desc())
+        .limit(1)
+    )
+    plan = await _explain(plan_conn, stmt)
+    _assert_uses_index(plan, "chat_history", "ix_chat_history_user_character_images")
+
+
+async def test_gallery_page_uses_user_created_index(plan_conn, seeded_ids):
+    stmt = (
+        select(UserGallery)
+        .where(UserGallery.user_id == seeded_ids.user_id)
+        .order_by(UserGallery.created_at.desc())
+        .limit(20)
+        .offset(0)
+    )
+    plan = await _explain(plan_conn, stmt)
+    _assert_uses_index(plan, "user_gallery", "ix_user_gallery_user_created")
+
+
+async def test_character_photos_page_uses_index(plan_conn, seeded_ids):
+    stmt = (
+        select(CharacterPhoto)
+        .where(CharacterPhoto.character_key == "plan_char_1", CharacterPhoto.user_id == seeded_ids.user_id)
+        .order_by(CharacterPhoto.created_at.desc(), CharacterPhoto.id.desc())
+        .limit(51)
+    )
+    plan = await _explain(plan_conn, stmt)
+    _assert_uses_index(plan, "character_photos", "ix_character_photos_character_user_created")
+
+
+async def test_bug_reports_status_page_uses_index(plan_conn, seeded_ids):
+    before = (await plan_conn.exec_driver_sql(
+        "SELECT created_at, id FROM bug_reports ORDER BY created_at DESC, id DESC OFFSET 1000 LIMIT 1"
+    )).one()
+    stmt = (
+        select(BugReport)
+        .where(BugReport.status == BugStatus.IN_PROGRESS)
+        .where(tuple_(BugReport.created_at, BugReport.id) < tuple_(before.created_at, before.id))
+        .order_by(desc(BugReport.created_at), desc(BugReport.id))
+        .limit(21)
+    )
+    plan = await _explain(plan_conn, stmt)
+    _assert_uses_index(plan, "bug_reports", "ix_bug_reports_status_created")
+
+
+async def test_bug_reports_page_uses_created_index(plan_conn, seeded_ids):
+    stmt = (
+        select(BugReport)
+        .order_by(desc(BugReport.created_at), desc(BugReport.id))
+        .limit(21)
+    )
+    plan = await _explain(plan_conn, stmt)
+    _assert_uses_index(plan, "bug_reports", "ix_bug_reports_created")
+
+
+async def test_bug_comment_counts_use_report_index(plan_conn, seeded_ids):
+    stmt = (
+        select(BugComment.bug_report_id, func.count(BugComment.id))
+        .where(BugComment.bug_report_id.in_(seeded_ids.bug_report_ids))
+        .group_by(BugComment.bug_report_id)
+    )
+    plan = await _explain(plan_conn, stmt)
+    _assert_uses_index(plan, "bug_comments", "ix_bug_comments_report_created")
+
+
+async def test_latest_bug_comments_use_report_index(plan_conn, seeded_ids):
+    stmt = (
+        select(BugComment)
+        .where(BugComment.bug_report_id.in_(seeded_ids.bug_report_ids))
+        .ext(distinct_on(BugComment.bug_report_id))
+        .order_by(desc(BugComment.bug_report_id), desc(BugComment.created_at), desc(BugComment.id))
+    )
+    plan = await _explain(plan_conn, stmt)
+    _assert_uses_index(plan, "bug_comments", "ix_bug_comments_report_created")
+
+
+async def test_character_comments_page_uses_keyset_index(plan_conn, seeded_ids):
+    before = (await plan_conn.exec_driver_sql(
+        "SELECT created_at, id FROM character_comments WHERE character_name = 'plan_char_1' "
+        "ORDER BY created_at DESC, id DESC OFFSET 200 LIMIT 1"
+    )).one()
+    stmt = (
+        select(CharacterComment)
+        .where(CharacterComment.character_name == "plan_char_1")
+        .where(tuple_(CharacterComment.created_at, CharacterComment.id) < tuple_(before.created_at, before.id))
+        .order_by(desc(CharacterComment.created_at), desc(CharacterComment.id))
+        .limit(51)
+    )
+    plan = await _explain(plan_conn, stmt)
+    _assert_uses_index(plan, "character_comments", "ix_character_comments_character_created")
+
+
+async def test_balance_history_page_uses_keyset_index(plan_conn, seeded_ids):
+    before = (await plan_conn.exec_driver_sql(
+        f"SELECT created_at, id FROM balance_history WHERE user_id = {seeded_ids.user_id} "
+        "ORDER BY created_at DESC, id DESC OFFSET 300 LIMIT 1"
+    )).one()
+    stmt = (
+        select(BalanceHistory)
+        .where(BalanceHistory.user_id == seeded_ids.user_id)
+        .where(BalanceHistory.amount < 0)
+        .where(tuple_(BalanceHistory.created_at, BalanceHistory.id) < tuple_(before.created_at, before.id))
+        .order_by(desc(BalanceHistory.created_at), desc(BalanceHistory.id))
+        .limit(51)
+    )
+    plan = await _explain(plan_conn, stmt)
+    _assert_uses_index(plan, "balance_history", "ix_balance_history_user_created")
@@ -0,0 +1,165 @@
+"""
+Тесты для атомарного Redis rate limiter.
+Проверяет, что при конкурентных запросах лимит не превышается.
+"""
+import pytest
+import asyncio
+import uuid
+
+# Lua скрипты в fakeredis выполняются через lupa (fakeredis[lua])
+pytest.importorskip("lupa")
+
+from app.auth.rate_limiter import RateLimiter, get_rate_limiter
+from app.utils import redis_rate_limiter
+from app.utils.redis_rate_limiter import (
+    RateLimiterUnavailable,
+    RedisRateLimiter,
+    POLICY_SLIDING_WINDOW,
+    POLICY_GCRA,
+)
+
+
+@pytest.fixture
+def limiter_redis(fake_redis, monkeypatch):
+    """Подменяет Redis клиент rate limiter на fakeredis."""
+    async def _get_client():
+        return fake_redis
+
+    monkeypatch.setattr(redis_rate_limiter, "get_redis_client", _get_client)
+    return fake_redis
+
+
+@pytest.mark.unit
+@pytest.mark.redis
+@pytest.mark.asyncio
+@pytest.mark.parametrize("policy", [POLICY_SLIDING_WINDOW, POLICY_GCRA])
+async def test_concurrent_requests_not_over_admitted(limiter_redis, policy):
+    """Тест: из 50 одновременных запросов проходят ровно max_requests."""
+    limiter = RedisRateLimiter(max_requests=10, window_seconds=60, policy=policy)
+
+    results = await asyncio.gather(*(limiter.check("user@example.com") for _ in range(50)))
+
+    allowed = [r for r in results if r.allowed]
+    assert len(allowed) == 10
+    assert sorted(r.remaining for r in allowed) == list(range(10))
+    assert all(r.retry_after > 0 for r in results if not r.allowed)
+
+
+@pytest.mark.unit
+@pytest.mark.redis
+@pytest.mark.asyncio
+@pytest.mark.parametrize("policy", [POLICY_SLIDING_WINDOW, POLICY_GCRA])
+async def test_keys_are_independent(limiter_redis, policy):
+    """Тест: лимиты разных ключей не влияют друг на друга."""
+    limiter = RedisRateLimiter(max_requests=2, window_seconds=60, policy=policy)
+
+    assert await limiter.is_allowed("a")
+    assert await limiter.is_allowed("a")
+    assert not await limiter.is_allowed("a")
+    assert await limiter.is_allowed("b")
+
+
+@pytest.mark.unit
+@pytest.mark.redis
+@pytest.mark.asyncio
+@pytest.mark.parametrize("policy", [POLICY_SLIDING_WINDOW, POLICY_GCRA])
+async def test_get_remaining_does_not_consume(limiter_redis, policy):
+    """Тест: get_remaining не расходует квоту, reset ее восстанавливает."""
+    limiter = RedisRateLimiter(max_requests=3, window_seconds=60, policy=policy)
+
+    assert await limiter.get_remaining("k") == 3
+    assert await limiter.get_remaining("k") == 3
+    await limiter.check("k")
+    assert await limiter.get_remaining("k") == 2
+
+    await limiter.reset("k")
+    assert await limiter.get_remaining("k") == 3
+
+
+@pytest.mark.unit
+@pytest.mark.redis
+@pytest.mark.asyncio
+async def test_rejected_result_headers(limiter_redis):
+    """Тест: отказ содержит Retry-After и нулевой остаток."""
+    limiter = RedisRateLimiter(max_requests=1, window_seconds=30)
+
+    first = await limiter.check("ip")
+    second = await limiter.check("ip")
+
+    assert first.allowed
+    assert first.headers["X-RateLimit-Remaining"] == "0"
+    assert "Retry-After" not in first.headers
+    assert not second.allowed
+    assert second.headers["X-RateLimit-Limit"] == "1"
+    assert 1 <= int(second.headers["Retry-After"]) <= 30
+
+
+@pytest.mark.unit
+@pytest.mark.asyncio
+async def test_unavailable_without_redis(monkeypatch):
+    """Тест: без Redis check сообщает о недоступности, а не пропускает запрос."""
+    async def _no_client():
+        return None
+
+    monkeypatch.setattr(redis_rate_limiter, "get_redis_client", _no_client)
+    limiter = RedisRateLimiter(max_requests=1, window_seconds=60)
+
+    with pytest.raises(RateLimiterUnavailable):
+        await limiter.check("x")
+
+
+@pytest.mark.unit
+@pytest.mark.asyncio
+async def test_unavailable_on_redis_error(monkeypatch):
+    """Тест: ошибка Redis при выполнении скрипта тоже сообщается как недоступность."""
+    class _BrokenRedis:
+        def register_script(self, script):
+            async def _run(**kwargs):
+                raise ConnectionError("redis is down")
+            return _run
+
+    async def _broken_client():
+        return _BrokenRedis()
+
+    monkeypatch.setattr(redis_rate_limiter, "get_redis_client", _broken_client)
+    limiter = RedisRateLimiter(max_requests=1, window_seconds=60)
+
+    with pytest.raises(RateLimiterUnavailable):
+        await limiter.check("x")
+
+
+@pytest.mark.unit
+@pytest.mark.asyncio
+async def test_memory_fallback_enforces_limit(monkeypatch):
+    """Тест: при недоступном Redis RateLimiter.check_async ограничивает запросы in-memory."""
+    async def _no_client():
+        return None
+
+    monkeypatch.setattr(redis_rate_limiter, "get_redis_client", _no_client)
+    limiter = RateLimiter(max_requests=2, window_seconds=60)
+
+    results = [await limiter.check_async("user@example.com") for _ in range(3)]
+
+    assert [r.allowed for r in results] == [True, True, False]
+    assert results[-1].headers["Retry-After"]
+
+
+@pytest.mark.integration
+@pytest.mark.asyncio
+async def test_login_rate_limited_when_redis_down(client, monkeypatch):
+    """Тест: при остановленном Redis перебор паролей на /auth/login/ получает 429."""
+    async def _no_client():
+        return None
+
+    monkeypatch.setattr(redis_rate_limiter, "get_redis_client", _no_client)
+    limiter = get_rate_limiter()
+    email = f"bruteforce_{uuid.uuid4().hex[:8]}@test.com"
+    payload = {"email": email, "password": "wrong-password"}
+
+    statuses = [
+        (await client.post("/api/v1/auth/login/", json=payload)).status_code
+        for _ in range(limiter.max_requests + 1)
+    ]
+
+    assert statuses[:-1] == [401] * limiter.max_requests
+    assert statuses[-1] == 429
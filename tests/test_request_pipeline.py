@@ -0,0 +1,101 @@
+import asyncio
+import logging
+
+import pytest
+from httpx import ASGITransport, AsyncClient
+from starlette.applications import Starlette
+from starlette.responses import JSONResponse, StreamingResponse
+from starlette.routing import Route
+
+from app.middleware.request_pipeline import RequestPipelineMiddleware
+
+BROWSER_HEADERS = {
+    "user-agent": "Mozilla/5.0 Chrome/120.0",
+    "accept": "text/html,application/xhtml+xml",
+}
+
+
+def _build_app(stream_gate: asyncio.Event = None) -> Starlette:
+    async def data(request):
+        return JSONResponse({"ok": True})
+
+    async def missing(request):
+        return JSONResponse({"detail": "Not found"}, status_code=404)
+
+    async def stream(request):
+        async def events():
+            yield b"data: first\n\n"
+            # Второй кусок отдается только после того, как клиент получил первый
+            await stream_gate.wait()
+            yield b"data: second\n\n"
+        return StreamingResponse(events(), media_type="text/event-stream")
+
+    app = Starlette(routes=[
+        Route("/api/v1/data", data),
+        Route("/api/v1/missing", missing),
+        Route("/api/v1/auth/google/login", data),
+        Route("/api/v1/stream", stream),
+    ])
+    app.add_middleware(RequestPipelineMiddleware, blocked_api_html="blocked")
+    return app
+
+
+@pytest.mark.unit
+@pytest.mark.asyncio
+async def test_direct_browser_navigation_to_api_is_blocked():
+    async with AsyncClient(transport=ASGITransport(app=_build_app()), base_url="http://test") as client:
+        navigate = await client.get("/api/v1/data", headers={"sec-fetch-mode": "navigate"})
+        legacy_browser = await client.get("/api/v1/data", headers=BROWSER_HEADERS)
+        fetch = await client.get("/api/v1/data", headers={"sec-fetch-mode": "cors", **BROWSER_HEADERS})
+        oauth = await client.get("/api/v1/auth/google/login", headers={"sec-fetch-mode": "navigate"})
+
+    assert navigate.status_code == 404
+    assert navigate.text == "blocked"
+    assert legacy_browser.status_code == 404
+    assert fetch.json() == {"ok": True}
+    assert oauth.json() == {"ok": True}
+
+
+@pytest.mark.unit
+@pytest.mark.asyncio
+async def test_error_responses_are_logged(caplog):
+    async with AsyncClient(transport=ASGITransport(app=_build_app()), base_url="http://test") as client:
+        with caplog.at_level(logging.WARNING, logger="app.middleware.request_pipeline"):
+            await client.get("/api/v1/data")
+            await client.get("/api/v1/missing")
+
+    messages = [record.getMessage() for record in caplog.records]
+    assert messages == ["[ERROR] GET /api/v1/missing -> 404"]
+
+
+@pytest.mark.unit
+@pytest.mark.asyncio
+async def test_streaming_response_is_not_buffered():
+    gate = asyncio.Event()
+    app = _build_app(gate)
+    received = []
+    first_chunk = asyncio.Event()
+
+    async def receive():
+        await asyncio.Event().wait()
+
+    async def send(message):
+        received.append(message)
+        if message["type"] == "http.response.body" and message.get("body") == b"data: first\n\n":
+            first_chunk.set()
+
+    scope = {
+        "type": "http", "asgi": {"version": "3.0"}, "http_version": "1.1",
+        "method": "GET", "scheme": "http", "path": "/api/v1/stream", "raw_path": b"/api/v1/stream",
+        "root_path": "", "query_string": b"", "headers": [], "client": ("127.0.0.1", 1234),
+        "server": ("test", 80),
+    }
+    request = asyncio.create_task(app(scope, receive, send))
+    # Первый кусок доходит до клиента, пока генератор еще ждет
+    await asyncio.wait_for(first_chunk.wait(), timeout=2)
+    assert not request.done()
+
+    gate.set()
+    await asyncio.wait_for(request, timeout=2)
+    bodies = [m.get("body") for m in received if m["type"] == "http.response.body"]
+    assert b"data: second\n\n" in bodies
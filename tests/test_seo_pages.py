@@ -0,0 +1,102 @@
+"""
+Тесты для инвалидации SSR страниц персонажей после коммита.
+"""
+import uuid
+
+import pytest
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.chat_bot.models.models import CharacterDB
+from app.services import seo_pages
+
+
+@pytest.fixture
+def invalidated(monkeypatch):
+    calls = []
+    monkeypatch.setattr(seo_pages, "request_character_page_invalidation", calls.append)
+    return calls
+
+
+def _character() -> CharacterDB:
+    return CharacterDB(name=f"SeoChar_{uuid.uuid4().hex[:8]}", display_name="S", description="d")
+
+
+@pytest.mark.db
+@pytest.mark.asyncio
+async def test_page_invalidated_after_commit(db_session: AsyncSession, invalidated):
+    """Тест: страница сбрасывается после коммита, а не при flush."""
+    character = _character()
+    db_session.add(character)
+    await db_session.flush()
+    assert invalidated == []
+
+    await db_session.commit()
+    assert invalidated == [character.id]
+
+
+@pytest.mark.db
+@pytest.mark.asyncio
+async def test_page_invalidated_once_per_transaction(db_session: AsyncSession, invalidated):
+    """Тест: несколько правок SEO полей в одной транзакции дают один сброс."""
+    character = _character()
+    db_session.add(character)
+    await db_session.commit()
+    invalidated.clear()
+
+    character.description = "first"
+    await db_session.flush()
+    character.seo_lore_ru = "second"
+    await db_session.commit()
+
+    assert invalidated == [character.id]
+
+
+@pytest.mark.db
+@pytest.mark.asyncio
+async def test_page_not_invalidated_on_rollback_or_other_fields(db_session: AsyncSession, invalidated):
+    """Тест: откат и правка полей вне SEO_PAGE_FIELDS страницу не сбрасывают."""
+    character = _character()
+    db_session.add(character)
+    await db_session.commit()
+    character_id = character.id
+    invalidated.clear()
+
+    character.description = "changed"
+    await db_session.flush()
+    await db_session.rollback()
+    assert invalidated == []
+
+    character = await db_session.get(CharacterDB, character_id)
+    character.is_nsfw = not character.is_nsfw
+    await db_session.commit()
+    assert invalidated == []
+
+
+@pytest.mark.db
+@pytest.mark.asyncio
+async def test_page_invalidated_after_delete(db_session: AsyncSession, invalidated):
+    """Тест: удаление персонажа сбрасывает страницу с его ID после коммита."""
+    character = _character()
+    db_session.add(character)
+    await db_session.commit()
+    character_id = character.id
+    invalidated.clear()
+
+    await db_session.delete(character)
+    await db_session.commit()
+
+    assert invalidated == [character_id]
+
+
+@pytest.mark.unit
+def test_request_invalidation_evicts_local_pages(monkeypatch):
+    """Тест: синхронный сброс без цикла событий очищает локальный кэш страниц."""
+    monkeypatch.setattr(seo_pages, "_pages", seo_pages.OrderedDict({
+        (5, "ru"): (0.0, 0.0, b"page"),
+        (6, "ru"): (0.0, 0.0, b"other"),
+    }))
+
+    seo_pages.request_character_page_invalidation(5)
+    seo_pages.request_character_page_invalidation(None)
+
+    assert list(seo_pages._pages) == [(6, "ru")]
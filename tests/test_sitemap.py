@@ -0,0 +1,154 @@
+"""
+Тесты для предварительно собранного sitemap: разбиение на файлы, условные запросы, пересборка после коммита.
+"""
+import gzip
+import uuid
+from datetime import datetime, timezone
+
+import pytest
+from sqlalchemy.ext.asyncio import AsyncSession
+from starlette.requests import Request
+
+from app.chat_bot.models.models import CharacterDB
+from app.main import _sitemap_response
+from app.services import sitemap_service
+from app.services.sitemap_service import (
+    INDEX_NAME,
+    MAX_URLS_PER_SITEMAP,
+    SitemapFile,
+    render_sitemap_files,
+    render_url_blocks,
+)
+
+
+def _request(headers: dict) -> Request:
+    return Request({
+        "type": "http",
+        "method": "GET",
+        "path": "/sitemap.xml",
+        "headers": [(k.lower().encode(), v.encode()) for k, v in headers.items()],
+    })
+
+
+def _sitemap_file(xml: str = "<urlset></urlset>") -> SitemapFile:
+    return SitemapFile(
+        name=INDEX_NAME,
+        body=gzip.compress(xml.encode("utf-8")),
+        etag='"abc-123"',
+        last_modified=datetime(2026, 1, 2, 3, 4, 5, tzinfo=timezone.utc),
+    )
+
+
+@pytest.mark.unit
+def test_single_file_up_to_limit():
+    """Тест: до 50 000 URL sitemap.xml - обычный urlset."""
+    files = render_sitemap_files(["<url></url>"] * MAX_URLS_PER_SITEMAP, "2026-01-01")
+
+    assert list(files) == [INDEX_NAME]
+    assert files[INDEX_NAME].count("<url>") == MAX_URLS_PER_SITEMAP
+    assert "<urlset" in files[INDEX_NAME]
+
+
+@pytest.mark.unit
+def test_split_into_index_over_limit():
+    """Тест: больше 50 000 URL - sitemap.xml становится индексом страниц sitemap-N.xml."""
+    files = render_sitemap_files(["<url></url>"] * (2 * MAX_URLS_PER_SITEMAP + 1), "2026-01-01")
+
+    assert set(files) == {INDEX_NAME, "sitemap-1.xml", "sitemap-2.xml", "sitemap-3.xml"}
+    assert [files[f"sitemap-{n}.xml"].count("<url>") for n in (1, 2, 3)] == [
+        MAX_URLS_PER_SITEMAP, MAX_URLS_PER_SITEMAP, 1,
+    ]
+    index = files[INDEX_NAME]
+    assert "<sitemapindex" in index
+    assert index.count("<sitemap>") == 3
+    assert f"{sitemap_service.DOMAIN}/sitemap-3.xml" in index
+
+
+@pytest.mark.unit
+def test_url_blocks_have_both_languages():
+    """Тест: каждый персонаж и тег выводится для обоих языков с hreflang."""
+    blocks = render_url_blocks([7], ["a&b", None], "2026-01-01")
+    characters = [b for b in blocks if "chat?character=7" in b]
+    tags = [b for b in blocks if "/tags/" in b]
+
+    assert len(characters) == 2
+    assert all('hreflang="en"' in b and 'hreflang="ru"' in b for b in characters)
+    assert len(tags) == 2
+    assert all("/tags/a&amp;b" in b for b in tags)
+
+
+@pytest.mark.unit
+@pytest.mark.parametrize("headers", [
+    {"If-None-Match": '"abc-123"'},
+    {"If-None-Match": 'W/"other", "abc-123"'},
+    {"If-None-Match": "*"},
+    {"If-Modified-Since": "Fri, 02 Jan 2026 03:04:05 GMT"},
+])
+def test_conditional_request_not_modified(headers):
+    """Тест: совпавший ETag или Last-Modified дает 304 без тела."""
+    response = _sitemap_response(_request(headers), _sitemap_file())
+
+    assert response.status_code == 304
+    assert response.body == b""
+    assert response.headers["ETag"] == '"abc-123"'
+
+
+@pytest.mark.unit
+def test_conditional_request_modified():
+    """Тест: другой ETag имеет приоритет над совпавшим If-Modified-Since."""
+    response = _sitemap_response(_request({
+        "If-None-Match": '"old"',
+        "If-Modified-Since": "Fri, 02 Jan 2026 03:04:05 GMT",
+    }), _sitemap_file())
+
+    assert response.status_code == 200
+
+
+@pytest.mark.unit
+def test_body_encoding_follows_accept_encoding():
+    """Тест: gzip отдается как есть, иначе тело распаковывается."""
+    sitemap_file = _sitemap_file("<urlset>x</urlset>")
+
+    gzipped = _sitemap_response(_request({"Accept-Encoding": "gzip, br"}), sitemap_file)
+    plain = _sitemap_response(_request({}), sitemap_file)
+
+    assert gzipped.headers["Content-Encoding"] == "gzip"
+    assert gzipped.body == sitemap_file.body
+    assert "Content-Encoding" not in plain.headers
+    assert plain.body == b"<urlset>x</urlset>"
+    assert gzipped.headers["Last-Modified"] == "Fri, 02 Jan 2026 03:04:05 GMT"
+
+
+@pytest.fixture
+def rebuild_calls(monkeypatch):
+    calls = []
+    monkeypatch.setattr(sitemap_service, "request_sitemap_rebuild", lambda: calls.append(1))
+    return calls
+
+
+@pytest.mark.db
+@pytest.mark.asyncio
+async def test_rebuild_requested_after_commit(db_session: AsyncSession, rebuild_calls):
+    """Тест: пересборка планируется после коммита, а не при flush."""
+    character = CharacterDB(name=f"SitemapChar_{uuid.uuid4().hex[:8]}", display_name="S", description="d")
+    db_session.add(character)
+    await db_session.flush()
+    assert rebuild_calls == []
+
+    await db_session.commit()
+    assert rebuild_calls == [1]
+
+    await db_session.delete(character)
+    await db_session.commit()
+    assert rebuild_calls == [1, 1]
+
+
+@pytest.mark.db
+@pytest.mark.asyncio
+async def test_rebuild_not_requested_on_rollback(db_session: AsyncSession, rebuild_calls):
+    """Тест: откат транзакции отменяет запланированную пересборку."""
+    db_session.add(CharacterDB(name=f"SitemapChar_{uuid.uuid4().hex[:8]}", display_name="S", description="d"))
+    await db_session.flush()
+    await db_session.rollback()
+
+    assert rebuild_calls == []